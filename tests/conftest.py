@@ -0,0 +1,35 @@
+###############################################################################
+##
+## conftest.py
+##
+## Description:
+##    pytest set up of the tests of the Maya independent xgenProxy modules.
+##    The modules live at the root of the repository, next to the plug-ins,
+##    and every test gets its own empty disk cache root.
+##
+##       python -m pytest tests
+##
+################################################################################
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xgenProxyDiskCache
+
+
+@pytest.fixture(autouse=True)
+def cacheRoot(tmpdir, monkeypatch):
+    """
+     Points $XGEN_PROXY_CACHE_DIR to a directory of the test, so tests
+     neither share cached data nor touch the user's cache.
+    """
+    root = str(tmpdir.join("cache"))
+    monkeypatch.setenv(xgenProxyDiskCache.kCacheDirEnv, root)
+    xgenProxyDiskCache.clearStampCache()
+    yield root
+    # writes queued by the test go to its own directory
+    xgenProxyDiskCache.flushWrites()
@@ -0,0 +1,75 @@
+import math
+import re
+
+import xgenProxyBatchExport
+
+kBounds = [-1.0, -1.0, -1.0, 1.0, 1.0, 1.0]
+
+
+def _translation(x, y, z):
+    matrix = list(xgenProxyBatchExport.kIdentity)
+    matrix[12:15] = [x, y, z]
+    return matrix
+
+
+def _scene(proxies):
+    # a camera at x = 1000 looking down -Z, seeing nothing of the origin
+    return xgenProxyBatchExport.prepareScene({
+        "version": xgenProxyBatchExport.kSceneVersion,
+        "cameras": {"camera": {"horizontalFieldOfView": math.radians(54.0),
+                               "verticalFieldOfView": math.radians(30.0),
+                               "matrix": _translation(1000.0, 0.0, 50.0)}},
+        "proxies": [dict(proxy, name="proxy%d" % i, bounds=proxy.get("bounds", kBounds))
+                    for i, proxy in enumerate(proxies)],
+    })
+
+
+def _culled(scene, frames=(1.0,)):
+    camera = scene["cameras"]["camera"]
+    return [xgenProxyBatchExport.isCulled(proxy, camera, proxy["bounds"], 0.0, list(frames))
+            for proxy in scene["proxies"]]
+
+
+def testCullsTransformedBounds():
+    # the bounds are in the object space of the proxies
+    rotation = [0.0, 0.0, 1.0, 0.0,
+                0.0, 1.0, 0.0, 0.0,
+                -1.0, 0.0, 0.0, 0.0,
+                0.0, 0.0, 0.0, 1.0]
+    scene = _scene([
+        {},
+        {"matrix": _translation(1000.0, 0.0, 0.0)},
+        # object -Z turned to world +X, in front of the camera
+        {"matrix": rotation, "bounds": [-1.0, -1.0, -1001.0, 1.0, 1.0, -999.0]},
+        {"bounds": [-1.0, -1.0, -1001.0, 1.0, 1.0, -999.0]},
+    ])
+    assert _culled(scene) == [True, False, False, True]
+
+
+def testCullsAnimatedProxies():
+    scene = _scene([{"matrices": {"1.000": _translation(0.0, 0.0, 0.0), "2.000": _translation(1000.0, 0.0, 0.0)}}])
+    assert _culled(scene, [1.0]) == [True]
+    assert _culled(scene, [2.0]) == [False]
+    # kept when in view at any motion sample
+    assert _culled(scene, [1.0, 2.0]) == [False]
+
+
+def testRecordCullsInPlace():
+    scene = _scene([{"matrix": _translation(1000.0, 0.0, 0.0)}, {}])
+    for proxy in scene["proxies"]:
+        proxy["aiFrustumCull"] = True
+        proxy["cullingCamera"] = "camera"
+    records = [xgenProxyBatchExport.resolveRecord(scene, proxy, 1.0) for proxy in scene["proxies"]]
+    assert [record["culled"] for record in records] == [False, True]
+    assert [record["hidden"] for record in records] == [False, True]
+
+
+def testTypedCameraXformIsInverse():
+    scene = _scene([{"aiTypedUserData": True, "cullingCamera": "camera"}])
+    record = xgenProxyBatchExport.resolveRecord(scene, scene["proxies"][0], 1.0)
+    text = xgenProxyBatchExport.assNode(record)
+    typed = [float(v) for v in re.search(r"^ irRenderCameraXform (.*)$", text, re.M).group(1).split()]
+    assert typed == _translation(-1000.0, 0.0, -50.0)
+    # the legacy string keeps the mix of the matrix and its inverse
+    legacy = re.search(r'^ irRenderCamXform "(.*)"$', text, re.M).group(1).split(",")
+    assert [float(v) for v in legacy[12:15]] == [-1000.0, 0.0, -50.0]
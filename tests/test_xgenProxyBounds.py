@@ -0,0 +1,114 @@
+import pytest
+
+import xgenProxyBounds
+import xgenProxyDiskCache
+
+
+@pytest.fixture
+def abcFile(tmpdir, monkeypatch):
+    """
+     Returns the path of an Alembic file stand-in whose patch bounds are
+     given by their name, counting the reads.
+    """
+    path = tmpdir.join("patches.abc")
+    path.write("")
+    reads = []
+
+    def readBounds(path, mtime, patch, seconds):
+        reads.append((patch, seconds))
+        if patch == "missing":
+            return None
+        if patch == "broken":
+            raise RuntimeError("cannot read")
+        size = float(patch[-1])
+        return (-size, -size, -size, size, size + seconds, size)
+
+    monkeypatch.setattr(xgenProxyBounds, "available", lambda: True)
+    monkeypatch.setattr(xgenProxyBounds, "_readBounds", readBounds)
+    xgenProxyBounds.clearMemoryCache()
+    yield str(path), reads
+    xgenProxyBounds.clearMemoryCache()
+
+
+def testPadBounds():
+    assert xgenProxyBounds.padBounds((0, 1, 2, 3, 4, 5), 1.0) == (-1.0, 0.0, 1.0, 4.0, 5.0, 6.0)
+
+
+def testResolvePatches():
+    # globs match nothing without an Alembic file
+    assert xgenProxyBounds.resolvePatches("", " a, b  a,c body_*") == ["a", "b", "c"]
+
+
+def testPatchBoundsCache(abcFile):
+    path, reads = abcFile
+    assert xgenProxyBounds.patchBounds(path, "p1", 24.0, 24.0) == (-1.0, -1.0, -1.0, 1.0, 2.0, 1.0)
+    assert xgenProxyBounds.patchBounds(path, "p1", 24.0, 24.0) == (-1.0, -1.0, -1.0, 1.0, 2.0, 1.0)
+    assert xgenProxyBounds.patchBounds(path, "missing", 24.0, 24.0) is None
+    assert xgenProxyBounds.patchBounds(path, "missing", 24.0, 24.0) is None
+    assert len(reads) == 2
+
+    assert xgenProxyBounds.unionBounds(path, ["p1", "p2"], 24.0, 24.0) == (-2.0, -2.0, -2.0, 2.0, 3.0, 2.0)
+    assert xgenProxyBounds.unionBounds(path, ["p1", "missing"], 24.0, 24.0) is None
+
+
+def testPatchBoundsBySampleTime(abcFile):
+    path, reads = abcFile
+    # frame 24 is one second at 24 fps and 0.8 at 30 fps
+    assert xgenProxyBounds.patchBounds(path, "p1", 24.0, 24.0)[4] == 2.0
+    assert xgenProxyBounds.patchBounds(path, "p1", 24.0, 30.0)[4] == 1.8
+    # the same sample at another frame rate
+    assert xgenProxyBounds.patchBounds(path, "p1", 30.0, 30.0)[4] == 2.0
+    assert reads == [("p1", 1.0), ("p1", 0.8)]
+
+
+def testFailedReadsAreNotCached(abcFile):
+    path, reads = abcFile
+    assert xgenProxyBounds.patchBounds(path, "broken", 24.0, 24.0) is None
+    assert xgenProxyBounds.patchBounds(path, "broken", 24.0, 24.0) is None
+    assert len(reads) == 2
+    xgenProxyDiskCache.flushWrites()
+    assert xgenProxyDiskCache.readJsonLines(xgenProxyBounds._cacheFile(path)) == []
+
+
+def testDiskCacheIsAppendedOnFlush(abcFile):
+    path, reads = abcFile
+    for frame in range(1, 5):
+        xgenProxyBounds.patchBounds(path, "p1", frame, 24.0)
+    cacheFile = xgenProxyBounds._cacheFile(path)
+    assert xgenProxyDiskCache.readJsonLines(cacheFile) == []
+
+    xgenProxyDiskCache.flushWrites()
+    assert len(xgenProxyDiskCache.readJsonLines(cacheFile)) == 4
+
+    # a new session reads the disk cache
+    xgenProxyBounds.clearMemoryCache()
+    del reads[:]
+    assert xgenProxyBounds.patchBounds(path, "p1", 2, 24.0) == (-1.0, -1.0, -1.0, 1.0, 1.0 + 2 / 24.0, 1.0)
+    assert reads == []
+
+
+def testStaleDiskCacheIsCompacted(abcFile):
+    path, reads = abcFile
+    cacheFile = xgenProxyBounds._cacheFile(path)
+    xgenProxyDiskCache.writeJson(cacheFile, {"path": path, "mtime": -1.0, "bounds": {"p1@1.000": [0] * 6}})
+    assert xgenProxyBounds.patchBounds(path, "p1", 1, 24.0) == (-1.0, -1.0, -1.0, 1.0, 1.0 + 1 / 24.0, 1.0)
+    assert len(reads) == 1
+
+    xgenProxyDiskCache.flushWrites()
+    lines = xgenProxyDiskCache.readJsonLines(cacheFile)
+    assert [line["mtime"] for line in lines] == [xgenProxyDiskCache.fileStamp(path)] * 2
+    assert lines[0]["bounds"] == {}
+
+
+def testMemoryCacheLimit(abcFile, tmpdir, monkeypatch):
+    path, reads = abcFile
+    other = tmpdir.join("other.abc")
+    other.write("")
+    monkeypatch.setattr(xgenProxyBounds, "kMemoryCacheEntries", 3)
+
+    for frame in range(3):
+        xgenProxyBounds.patchBounds(path, "p1", frame, 24.0)
+    xgenProxyBounds.patchBounds(str(other), "p1", 0, 24.0)
+    # the least recently used file is dropped, the one in use is kept
+    assert list(xgenProxyBounds._memoryCache.keys()) == [(str(other), xgenProxyDiskCache.fileStamp(str(other)))]
+    assert xgenProxyBounds._memoryState["entries"] == 1
@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+import xgenProxyCollection
+import xgenProxyDiskCache
+
+kCollection = """# XGen Collection File
+#
+FileVersion 18
+
+Palette
+\tname\t\t\tcollection1
+\txgDataPath\t\t${PROJECT}xgen/collections/collection1
+endAttrs
+
+Description
+\tname\t\t\thair
+\tflipNormals\t\tfalse
+endAttrs
+
+SplinePrimitive
+\tname\t\t\tSplinePrimitive
+\tlength\t\t\t"$a=2.5000;#0.05,5.0\\n$a"
+endAttrs
+
+RandomGenerator
+\tname\t\t\tRandomGenerator
+\tdensity\t\t\t"$a=40.0000;#1.0,100.0\\n$a"
+endAttrs
+
+ClumpingFXModule
+\tname\t\t\tclumping1
+\tactive\t\t\ttrue
+endAttrs
+
+Patches\thair\t1
+\tPatch\tSubd\tscalp
+\tPatch\tSubd\tbeard
+endPatches
+
+Description
+\tname\t\t\tfur
+endAttrs
+
+CardPrimitive
+\tname\t\t\tCardPrimitive
+\tlength\t\t\t$len * 2
+endAttrs
+
+Patches\tfur\t1
+\tPatch\tSubd\tbody
+endPatches
+"""
+
+
+@pytest.fixture
+def collectionFile(tmpdir):
+    path = tmpdir.join("collection.xgen")
+    path.write(kCollection)
+    xgenProxyCollection.clearMemoryCache()
+    yield str(path)
+    xgenProxyCollection.clearMemoryCache()
+
+
+def testIndex(collectionFile):
+    index = xgenProxyCollection.collection(collectionFile)
+    assert index.palettes() == ["collection1"]
+    assert index.descriptions("collection1") == ["hair", "fur"]
+    assert index.patches("collection1", "hair") == ["scalp", "beard"]
+    assert index.patches("collection1", "fur") == ["body"]
+    assert index.modules("collection1", "hair") == [("SplinePrimitive", "SplinePrimitive"),
+                                                    ("RandomGenerator", "RandomGenerator"),
+                                                    ("ClumpingFXModule", "clumping1")]
+    assert index.descriptions("missing") == []
+    assert index.patches("collection1", "missing") == []
+
+
+def testAttributes(collectionFile):
+    index = xgenProxyCollection.collection(collectionFile)
+    assert index.attributes("collection1")["xgDataPath"] == "${PROJECT}xgen/collections/collection1"
+    assert index.attributes("collection1", "hair") == {"name": "hair", "flipNormals": "false"}
+    assert index.primitiveAttributes("collection1", "fur")["length"] == "$len * 2"
+    assert index.attributes("missing") == {}
+
+
+def testIndexIsCached(collectionFile):
+    index = xgenProxyCollection.collection(collectionFile)
+    assert xgenProxyCollection.collection(collectionFile) is index
+
+    # the index is written to disk when the queued writes are flushed
+    cacheFile = xgenProxyCollection._cacheFile(collectionFile, index.mtime)
+    assert not os.path.exists(cacheFile)
+    xgenProxyDiskCache.flushWrites()
+    assert xgenProxyDiskCache.readJson(cacheFile)["palettes"][0][0] == "collection1"
+
+    # a new session loads it
+    xgenProxyCollection.clearMemoryCache()
+    loaded = xgenProxyCollection.collection(collectionFile)
+    assert loaded is not index
+    assert loaded.toData() == index.toData()
+    assert loaded.attributes("collection1", "hair") == index.attributes("collection1", "hair")
+
+
+def testResolveNames(collectionFile):
+    assert xgenProxyCollection.resolveNames(collectionFile, "", "") == ("collection1", "")
+    assert xgenProxyCollection.resolveNames(collectionFile, "", "fur") == ("collection1", "fur")
+    assert xgenProxyCollection.resolveNames("", "p", "d") == ("p", "d")
+
+
+def testValidate(collectionFile):
+    assert xgenProxyCollection.validate(collectionFile, "collection1", "hair", ["scalp"]) == ""
+    assert "palette 'p'" in xgenProxyCollection.validate(collectionFile, "p", "hair")
+    assert "description 'd'" in xgenProxyCollection.validate(collectionFile, "collection1", "d")
+    assert "patch 'body'" in xgenProxyCollection.validate(collectionFile, "collection1", "hair", ["body"])
+    assert xgenProxyCollection.validate("", "p", "d") == "no xgen collection file"
+    assert "cannot read" in xgenProxyCollection.validate(os.path.join(collectionFile, "missing"), "p", "d")
+    assert xgenProxyCollection.descriptionChoices(collectionFile) == ["collection1/hair", "collection1/fur"]
+
+
+def testGroomLength(collectionFile):
+    assert xgenProxyCollection.groomLength(collectionFile, "collection1", "hair") == 2.5
+    # expressions other than sliders are unknown
+    assert xgenProxyCollection.groomLength(collectionFile, "collection1", "fur") is None
+    assert xgenProxyCollection.groomLength(collectionFile, "collection1", "missing") is None
+
+
+def testGroomDensity(collectionFile):
+    assert xgenProxyCollection.groomDensity(collectionFile, "collection1", "hair") == 40.0
+    assert xgenProxyCollection.groomDensity(collectionFile, "collection1", "fur") is None
+    assert xgenProxyCollection.groomDensity(os.path.join(collectionFile, "missing"), "collection1", "hair") is None
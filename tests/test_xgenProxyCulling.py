@@ -0,0 +1,66 @@
+import math
+
+import xgenProxyCulling
+
+kIdentity = [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]]
+
+
+def translation(x, y, z):
+    matrix = [list(row) for row in kIdentity]
+    matrix[3] = [x, y, z, 1.0]
+    return matrix
+
+
+def perspectiveFrustum(worldToView=kIdentity, portHeight=200):
+    # 90 degrees field of view looking down -z, from 1 to 100 units
+    return xgenProxyCulling.Frustum(worldToView, xgenProxyCulling.perspective(-1.0, 1.0, -1.0, 1.0, 1.0, 100.0),
+                                    portHeight)
+
+
+def testMultiply():
+    a = translation(1.0, 2.0, 3.0)
+    assert xgenProxyCulling.multiply(kIdentity, a) == a
+    assert xgenProxyCulling.multiply(a, translation(1.0, 0.0, 0.0)) == translation(2.0, 2.0, 3.0)
+
+
+def testPlanesAreNormalized():
+    for a, b, c, d in perspectiveFrustum().planes:
+        assert abs(math.sqrt(a * a + b * b + c * c) - 1.0) < 1e-9
+
+
+def testPerspectiveBoxes():
+    frustum = perspectiveFrustum()
+    assert frustum.boxVisible((-1.0, -1.0, -11.0), (1.0, 1.0, -9.0))
+    # straddling a plane is visible
+    assert frustum.boxVisible((9.0, -1.0, -11.0), (12.0, 1.0, -9.0))
+    # behind the eye, beside the frustum, before near and past far
+    assert not frustum.boxVisible((-1.0, -1.0, 9.0), (1.0, 1.0, 11.0))
+    assert not frustum.boxVisible((12.0, -1.0, -11.0), (13.0, 1.0, -9.0))
+    assert not frustum.boxVisible((-1.0, -13.0, -11.0), (1.0, -12.0, -9.0))
+    assert not frustum.boxVisible((-0.1, -0.1, -0.5), (0.1, 0.1, -0.2))
+    assert not frustum.boxVisible((-1.0, -1.0, -120.0), (1.0, 1.0, -110.0))
+
+
+def testCameraTransform():
+    # the camera at z = 20, so the world to view matrix moves the world by -20
+    frustum = perspectiveFrustum(translation(0.0, 0.0, -20.0))
+    assert frustum.boxVisible((-1.0, -1.0, -1.0), (1.0, 1.0, 1.0))
+    assert not frustum.boxVisible((-1.0, -1.0, 25.0), (1.0, 1.0, 30.0))
+
+
+def testOrthographicBoxes():
+    projection = xgenProxyCulling.orthographic(-5.0, 5.0, -5.0, 5.0, 0.0, 50.0)
+    frustum = xgenProxyCulling.Frustum(kIdentity, projection, 100)
+    assert frustum.boxVisible((4.0, 4.0, -40.0), (6.0, 6.0, -30.0))
+    assert not frustum.boxVisible((6.0, -1.0, -10.0), (7.0, 1.0, -9.0))
+    assert not frustum.boxVisible((-1.0, -1.0, 1.0), (1.0, 1.0, 2.0))
+    # sizes do not depend on the distance
+    assert frustum.pixelRadius((0.0, 0.0, -1.0), 1.0) == frustum.pixelRadius((0.0, 0.0, -40.0), 1.0) == 10.0
+
+
+def testPixelRadius():
+    frustum = perspectiveFrustum()
+    assert abs(frustum.pixelRadius((0.0, 0.0, -10.0), 1.0) - 10.0) < 1e-9
+    assert abs(frustum.pixelRadius((0.0, 0.0, -50.0), 1.0) - 2.0) < 1e-9
+    assert frustum.pixelRadius((0.0, 0.0, -0.5), 1.0) == float("inf")
+    assert frustum.pixelRadius((0.0, 0.0, 10.0), 1.0) == float("inf")
@@ -0,0 +1,53 @@
+import os
+
+import xgenProxyDiskCache
+
+
+def testJsonLines(tmpdir):
+    path = str(tmpdir.join("lines.jsonl"))
+    xgenProxyDiskCache.writeJson(path, {"a": 1})
+    xgenProxyDiskCache.queueAppend(path, {"b": 2})
+    xgenProxyDiskCache.queueAppend(path, {"c": 3})
+    assert xgenProxyDiskCache.readJsonLines(path) == [{"a": 1}]
+
+    xgenProxyDiskCache.flushWrites()
+    assert xgenProxyDiskCache.pendingWrites() == 0
+    assert xgenProxyDiskCache.readJsonLines(path) == [{"a": 1}, {"b": 2}, {"c": 3}]
+
+    # a line cut short is skipped
+    with open(path, "a") as f:
+        f.write('{"d": ')
+    assert xgenProxyDiskCache.readJsonLines(path) == [{"a": 1}, {"b": 2}, {"c": 3}]
+
+
+def testQueuedJsonReplacesLines(tmpdir):
+    path = str(tmpdir.join("lines.jsonl"))
+    xgenProxyDiskCache.queueAppend(path, {"a": 1})
+    xgenProxyDiskCache.queueJson(path, {"b": 2})
+    xgenProxyDiskCache.queueAppend(path, {"c": 3})
+    xgenProxyDiskCache.flushWrites()
+    assert xgenProxyDiskCache.readJsonLines(path) == [{"b": 2}, {"c": 3}]
+    assert xgenProxyDiskCache.readJson(str(tmpdir.join("missing.json"))) is None
+
+
+def testFlushScheduler(tmpdir):
+    scheduled = []
+    xgenProxyDiskCache.setFlushScheduler(scheduled.append)
+    try:
+        path = str(tmpdir.join("lines.jsonl"))
+        xgenProxyDiskCache.queueAppend(path, {"a": 1})
+        xgenProxyDiskCache.queueAppend(path, {"b": 2})
+        # scheduled once until flushed
+        assert scheduled == [xgenProxyDiskCache.flushWrites]
+        assert not os.path.exists(path)
+        scheduled[0]()
+        assert len(xgenProxyDiskCache.readJsonLines(path)) == 2
+    finally:
+        xgenProxyDiskCache.setFlushScheduler(None)
+
+
+def testCacheDirectory(cacheRoot):
+    path = xgenProxyDiskCache.cacheDirectory("test")
+    assert path == os.path.join(cacheRoot, "test")
+    assert os.path.isdir(path)
+    assert xgenProxyDiskCache.keyFileName("a", 1) != xgenProxyDiskCache.keyFileName("a", "1")
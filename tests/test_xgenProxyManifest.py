@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import xgenProxyManifest
+
+
+def writeFile(tmpdir, name, text):
+    path = tmpdir.join(name)
+    path.write(text)
+    return str(path)
+
+
+def testJsonManifest(tmpdir):
+    path = writeFile(tmpdir, "proxies.json", json.dumps({"proxies": [
+        {"name": "proxy1", "palette": "collection1", "shapeType": "circle",
+         "radius": "2.5", "translate": [1, 2, 3], "patch": ""},
+        {"shapeType": 2, "translateX": "4"},
+    ]}))
+    proxies = xgenProxyManifest.readManifest(path)
+    assert proxies == [
+        {"name": "proxy1", "palette": "collection1", "shapeType": 1, "radius": 2.5,
+         "translate": (1.0, 2.0, 3.0)},
+        {"shapeType": 2, "translate": (4.0, 0.0, 0.0)},
+    ]
+
+
+def testCsvManifest(tmpdir):
+    path = writeFile(tmpdir, "proxies.csv",
+                     "name,shapeType,height,translate\n"
+                     "proxy1,Triangle,3,1 2 3\n"
+                     "proxy2,0,,\n")
+    proxies = xgenProxyManifest.readManifest(path)
+    assert proxies == [
+        {"name": "proxy1", "shapeType": 2, "height": 3.0, "translate": (1.0, 2.0, 3.0)},
+        {"name": "proxy2", "shapeType": 0},
+    ]
+
+
+@pytest.mark.parametrize("shapeType", [-1, 3, 1.5, "square"])
+def testInvalidShapeType(tmpdir, shapeType):
+    path = writeFile(tmpdir, "proxies.json", json.dumps([{"shapeType": shapeType}]))
+    with pytest.raises(xgenProxyManifest.ManifestError) as e:
+        xgenProxyManifest.readManifest(path)
+    assert "entry 1" in str(e.value)
+
+
+def testInvalidManifests(tmpdir):
+    invalid = [
+        ("list.json", json.dumps({"proxies": {"name": "proxy1"}})),
+        ("entry.json", json.dumps(["proxy1"])),
+        ("translate.json", json.dumps([{"translate": [1, 2]}])),
+        ("radius.csv", "name,radius\nproxy1,wide\n"),
+        ("broken.json", "[{"),
+    ]
+    for name, text in invalid:
+        with pytest.raises(xgenProxyManifest.ManifestError):
+            xgenProxyManifest.readManifest(writeFile(tmpdir, name, text))
+    with pytest.raises(xgenProxyManifest.ManifestError):
+        xgenProxyManifest.readManifest(str(tmpdir.join("missing.json")))
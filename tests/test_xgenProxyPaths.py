@@ -0,0 +1,29 @@
+import xgenProxyPaths
+
+
+def testFrameTokens():
+    resolve = xgenProxyPaths.resolvePath
+    assert resolve("/p/patches.<frame>.abc", 7) == "/p/patches.7.abc"
+    assert resolve("/p/patches.####.abc", 7) == "/p/patches.0007.abc"
+    assert resolve("/p/patches.$F.abc", 7) == "/p/patches.7.abc"
+    assert resolve("/p/patches.$F4.abc", 7) == "/p/patches.0007.abc"
+    assert resolve("/p/patches_$F4", 12345) == "/p/patches_12345"
+    assert resolve("/p/patches.abc", 7) == "/p/patches.abc"
+    assert resolve("", 7) == ""
+
+
+def testVariablesAreNotFrameTokens():
+    resolve = xgenProxyPaths.resolvePath
+    assert resolve("$FOO/patches.$F4.abc", 7) == "$FOO/patches.0007.abc"
+    assert resolve("/p/$F_DIR/$F4x.abc", 7) == "/p/$F_DIR/$F4x.abc"
+    assert not xgenProxyPaths.hasTokens("$FOO/patches.abc")
+    assert xgenProxyPaths.hasTokens("$FOO/patches.$F.abc")
+
+
+def testFrameNumber():
+    assert xgenProxyPaths.frameNumber(1.4) == 1
+    assert xgenProxyPaths.frameNumber(1.5) == 2
+    assert xgenProxyPaths.frameNumber(-1.5) == -2
+    assert xgenProxyPaths.resolvePath("/p/####.abc", -3) == "/p/-003.abc"
+    # fractional frames share the memo entry of their whole frame
+    assert xgenProxyPaths.resolvePath("/p/####.abc", 2.75) == "/p/0003.abc"
@@ -0,0 +1,77 @@
+import xgenProxyCulling
+import xgenProxyPicking
+
+kIdentity = [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]]
+
+
+def pickSpace(x, y, size=10, portSize=100):
+    # 90 degrees field of view looking down -z, picking a size x size pixel
+    # square with its lower left corner at x, y
+    projection = xgenProxyCulling.perspective(-1.0, 1.0, -1.0, 1.0, 1.0, 100.0)
+    pick = xgenProxyPicking.pickMatrix(x, y, size, size, portSize, portSize)
+    return xgenProxyPicking.pickFrustum(kIdentity, projection, pick)
+
+
+def rectangle(x0, x1, y0, y1, z):
+    return [x0, y0, z(x0), x1, y0, z(x1), x1, y1, z(x1), x0, y1, z(x0)]
+
+
+def assertClose(a, b):
+    assert max(abs(u - v) for u, v in zip(a, b)) < 1e-6, (a, b)
+
+
+def testInteriorHitPoint():
+    matrix = pickSpace(45, 45).matrix
+    outline = rectangle(-2.0, 2.0, -2.0, 2.0, lambda x: -10.0)
+    assert xgenProxyPicking.hitPoint(outline, matrix, False) is None
+    depth, point = xgenProxyPicking.hitPoint(outline, matrix, True)
+    assertClose(point, (0.0, 0.0, -10.0))
+
+
+def testTiltedHitPointIsPerspectiveCorrect():
+    # the pick ray through x = 0.5 in normalized device coordinates is
+    # x = -z / 2, it meets the plane z = -10 - x at (10, 0, -20)
+    matrix = pickSpace(70, 45).matrix
+    outline = rectangle(-20.0, 20.0, -5.0, 5.0, lambda x: -10.0 - x)
+    depth, point = xgenProxyPicking.hitPoint(outline, matrix, True)
+    assertClose(point, (10.0, 0.0, -20.0))
+
+    nearer = rectangle(-20.0, 20.0, -5.0, 5.0, lambda x: -5.0 - x)
+    assert xgenProxyPicking.hitPoint(nearer, matrix, True)[0] < depth
+
+
+def testOutlineHitPoint():
+    matrix = pickSpace(45, 45).matrix
+    # the left edge goes through the pick ray
+    outline = rectangle(0.0, 4.0, -2.0, 2.0, lambda x: -10.0)
+    for filled in (False, True):
+        depth, point = xgenProxyPicking.hitPoint(outline, matrix, filled)
+        assertClose(point, (0.0, 0.0, -10.0))
+
+
+def testMissesAndClipping():
+    matrix = pickSpace(45, 45).matrix
+    assert xgenProxyPicking.hitPoint(rectangle(3.0, 4.0, -2.0, 2.0, lambda x: -10.0), matrix, True) is None
+    # behind the eye
+    assert xgenProxyPicking.hitPoint(rectangle(-2.0, 2.0, -2.0, 2.0, lambda x: 10.0), matrix, True) is None
+    # reaching behind the eye past x = 5, clipped at the eye plane
+    depth, point = xgenProxyPicking.hitPoint(rectangle(-2.0, 8.0, -2.0, 2.0, lambda x: -10.0 + 2.0 * x), matrix,
+                                             True)
+    assertClose(point, (0.0, 0.0, -10.0))
+
+
+def testGridQuery():
+    grid = xgenProxyPicking.Grid(xgenProxyPicking.cellSizeFor([((0.0, 0.0, 0.0), (1.0, 1.0, 1.0))]))
+    grid.insert("near", (-1.0, -1.0, -11.0), (1.0, 1.0, -9.0))
+    grid.insert("aside", (30.0, -1.0, -11.0), (32.0, 1.0, -9.0))
+    grid.insert("large", (-500.0, -500.0, -20.0), (500.0, 500.0, -19.0))
+    frustum = pickSpace(45, 45)
+    assert sorted(grid.query(frustum)) == ["large", "near"]
+
+    version = grid.version
+    grid.insert("near", (30.0, -1.0, -11.0), (32.0, 1.0, -9.0))
+    assert grid.version > version
+    assert grid.query(frustum) == ["large"]
+    grid.remove("large")
+    assert grid.query(frustum) == []
+    assert len(grid) == 2 and "aside" in grid
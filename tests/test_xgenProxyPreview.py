@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+import xgenProxyBounds
+import xgenProxyDiskCache
+import xgenProxyPreview
+
+# a unit square patch made of two triangles, moving up by one unit per second
+kPositions = [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (1.0, 1.0, 0.0), (0.0, 1.0, 0.0)]
+
+
+@pytest.fixture
+def patchFile(monkeypatch):
+    reads = {"count": 0, "fail": 0}
+
+    def readMesh(path, mtime, patch, seconds=None):
+        reads["count"] += 1
+        if reads["fail"]:
+            reads["fail"] -= 1
+            raise RuntimeError("cannot read")
+        offset = seconds or 0.0
+        return [(x, y + offset, z) for x, y, z in kPositions], [4], [0, 1, 2, 3]
+
+    monkeypatch.setattr(xgenProxyBounds, "available", lambda: True)
+    monkeypatch.setattr(xgenProxyDiskCache, "fileStamp", lambda path: 1.0)
+    monkeypatch.setattr(xgenProxyPreview, "_readMesh", readMesh)
+    monkeypatch.setattr(xgenProxyPreview, "kRootPointsPerPatch", 1000)
+    xgenProxyPreview.clearMemoryCache()
+    yield reads
+    xgenProxyPreview.setLayoutCallback(None)
+    xgenProxyPreview.clearMemoryCache()
+
+
+def testKeptIdsOnlyGrow():
+    low = set(xgenProxyPreview.keptIds(7, 1000, 10.0))
+    high = set(xgenProxyPreview.keptIds(7, 1000, 50.0))
+    assert low < high
+    assert 50 < len(low) < 150
+    assert len(xgenProxyPreview.keptIds(7, 1000, 100.0)) == 1000
+    assert len(xgenProxyPreview.keptIds(7, 1000, 0.0)) == 0
+
+
+def testDensity(patchFile):
+    layout = xgenProxyPreview.scatter(3, kPositions, [4], [0, 1, 2, 3], 100.0)
+    assert len(layout[0]) == 100
+    assert len(xgenProxyPreview.scatter(3, kPositions, [4], [0, 1, 2, 3])[0]) == 1000
+    assert len(xgenProxyPreview.scatter(3, kPositions, [4], [0, 1, 2, 3], 1e9)[0]) == 1000
+    assert len(xgenProxyPreview.scatter(3, kPositions, [4], [0, 1, 2, 3], 0.0)[0]) == 0
+
+    points = xgenProxyPreview.previewPoints("/p.abc", ["scalp"], 24.0, 24.0, 100.0, 100.0)
+    assert len(points) == 300
+    # moved with the patch, one unit up at one second
+    ys = points[1::3]
+    assert 1.0 <= min(ys) and max(ys) <= 2.0
+
+
+def testFailuresAreNotCached(patchFile):
+    patchFile["fail"] = 1
+    assert xgenProxyPreview.patchPoints("/p.abc", "scalp", 1.0, 24.0, 100.0, 10.0) is xgenProxyPreview.kReadFailed
+    assert not xgenProxyPreview.isCached("/p.abc", "scalp", 1.0, 100.0, 10.0)
+    assert len(xgenProxyPreview.patchPoints("/p.abc", "scalp", 1.0, 24.0, 100.0, 10.0)) == 30
+    assert xgenProxyPreview.isCached("/p.abc", "scalp", 1.0, 100.0, 10.0)
+
+    # one failed patch fails the preview of all of them
+    patchFile["fail"] = 1
+    points = xgenProxyPreview.previewPoints("/p.abc", ["beard", "scalp"], 1.0, 24.0, 100.0, 10.0)
+    assert points is xgenProxyPreview.kReadFailed
+    assert len(xgenProxyPreview.previewPoints("/p.abc", ["beard", "scalp"], 1.0, 24.0, 100.0, 10.0)) == 60
+
+
+def testLayoutsAreBounded(patchFile, monkeypatch):
+    monkeypatch.setattr(xgenProxyPreview, "kLayoutCount", 3)
+    for frame, patch in enumerate(["a", "b", "c", "a", "d"]):
+        xgenProxyPreview.patchPoints("/p.abc", patch, float(frame), 24.0, 100.0, 10.0)
+    # the least recently used goes first
+    assert [key[2] for key in xgenProxyPreview._layouts] == ["c", "a", "d"]
+
+
+def testIdSetsAreBounded(patchFile):
+    for percent in range(1, 20):
+        xgenProxyPreview.patchPoints("/p.abc", "scalp", 1.0, 24.0, float(percent))
+    for entry in xgenProxyPreview._layouts.values():
+        assert len(entry["ids"]) == xgenProxyPreview.kIdSetsPerLayout
+
+
+def testBackgroundLayout(patchFile, monkeypatch):
+    ready = threading.Event()
+    scattered = []
+    proceed = threading.Event()
+
+    def readMesh(path, mtime, patch, seconds=None):
+        if seconds is None:
+            proceed.wait(10.0)
+        return kPositions, [4], [0, 1, 2, 3]
+
+    def layoutReady(path, patch):
+        scattered.append((path, patch))
+        ready.set()
+
+    monkeypatch.setattr(xgenProxyPreview, "_readMesh", readMesh)
+    xgenProxyPreview.setLayoutCallback(layoutReady)
+    assert xgenProxyPreview.previewPoints("/p.abc", ["scalp", "beard"], 1.0, 24.0, 100.0, 10.0, wait=False) is None
+    proceed.set()
+    assert ready.wait(10.0)
+    # waiting reads still get the points
+    assert len(xgenProxyPreview.previewPoints("/p.abc", ["scalp", "beard"], 1.0, 24.0, 100.0, 10.0)) == 60
+    assert ("/p.abc", "scalp") in scattered
+    assert len(xgenProxyPreview.previewPoints("/p.abc", ["scalp", "beard"], 1.0, 24.0, 100.0, 10.0,
+                                              wait=False)) == 60
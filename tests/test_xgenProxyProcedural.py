@@ -0,0 +1,96 @@
+import os
+import re
+
+import xgenProxyBatchExport
+import xgenProxyBounds
+import xgenProxyCollection
+import xgenProxyProcedural
+
+kRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _translatorSource():
+    with open(os.path.join(kRoot, "xgenProxyTranslator.cpp"), "rb") as f:
+        return f.read().decode("ascii")
+
+
+def testHeaderIsCurrent():
+    # python xgenProxyProcedural.py regenerates it
+    with open(xgenProxyProcedural.headerPath(), "rb") as f:
+        assert f.read().decode("ascii") == xgenProxyProcedural.headerText()
+
+
+def testTranslatorUsesHeader():
+    source = _translatorSource()
+    assert '#include "xgenProxyProcedural.h"' in source
+    # no rule of the tables is written out in the translator again
+    for _, text in xgenProxyProcedural.kDataFlags:
+        if text.strip() not in ("%f", "0.0"):
+            assert '"%s"' % text not in source, text
+    for unit, factor in xgenProxyProcedural.kUnitFactors:
+        assert '"%s"' % factor not in source, unit
+    for _, name, _ in xgenProxyProcedural.kParameters:
+        assert '(shape, "%s"' % name not in source, name
+    assert '"%s"' % xgenProxyProcedural.kDeferLoadEnv not in source
+    # every macro the translator uses is generated
+    header = xgenProxyProcedural.headerText()
+    for macro in set(re.findall(r"\b(?:DATA|PARAM|PATCH|UNIT)_[A-Z_]+\b", source)):
+        assert "#define %s " % macro in header or macro in ("UNIT_FACTORS",), macro
+
+
+def testDataString():
+    prefix = xgenProxyProcedural.dataPrefix(1, 2, 3, 12.5, "/c.xgen", "pal", "/g.abc")
+    suffix = xgenProxyProcedural.dataSuffix("desc", 24.0, [11.75, 12.25], xgenProxyProcedural.worldArgument("100.0"))
+    assert prefix + "scalp" + suffix == (
+        "-debug 1 -warning 2 -stats 3 -frame 12.500000  -file /c.xgen -palette pal -geom /g.abc -patch scalp"
+        " -description desc -fps 24.000000  -motionSamplesLookup 11.750000 12.250000 "
+        " -motionSamplesPlacement 11.750000 12.250000 "
+        " -world 100.0;0;0;0;0;100.0;0;0;0;0;100.0;0;0;0;0;1")
+    assert xgenProxyProcedural.dataSuffix("desc", 24.0, [], "").endswith(
+        " -motionSamplesLookup 0.0 -motionSamplesPlacement 0.0")
+
+
+def testUnits():
+    assert xgenProxyProcedural.unitFactor("m") == "100.0"
+    assert xgenProxyProcedural.unitFactor("cm") == "1"
+    factor, world = xgenProxyBatchExport.unitConversion("in")
+    assert abs(factor - 2.54) < 1e-6
+    assert world == xgenProxyProcedural.worldArgument("2.54")
+
+
+def testPatchRules():
+    value = " scalp,beard\tbody\r\n  brow* "
+    assert xgenProxyProcedural.splitPatches(value) == ["scalp", "beard", "body", "brow*"]
+    assert [p for p in xgenProxyBounds.kPatchSeparators.split(value) if p] == ["scalp", "beard", "body", "brow*"]
+    assert xgenProxyProcedural.isPattern("brow*")
+    assert bool(xgenProxyBounds.kGlobCharacters.search("brow[12]"))
+    assert not xgenProxyProcedural.isPattern("brow")
+    assert xgenProxyProcedural.patchNodeName("|p|pShape", 0, "scalp") == "|p|pShape"
+    assert xgenProxyProcedural.patchNodeName("|p|pShape", 1, "beard") == "|p|pShape@beard"
+
+
+def testExporterFollowsTables(tmpdir):
+    xgenPath = str(tmpdir.join("standIn.xgen"))
+    with open(xgenPath, "w") as f:
+        f.write(xgenProxyBatchExport.standInCollection())
+    xgenProxyCollection.clearMemoryCache()
+
+    scene = xgenProxyBatchExport.prepareScene(xgenProxyBatchExport.standInScene(6, xgenPath))
+    for proxy in scene["proxies"]:
+        proxy["patch"] = "scalp beard"
+        proxy["aiTypedUserData"] = True
+        record = xgenProxyBatchExport.resolveRecord(scene, proxy, 3.0)
+        # the stand-in collection holds every palette and description used
+        assert record["namesStatus"] == ""
+
+        samples = record["timeSamples"]
+        prefix = xgenProxyProcedural.dataPrefix(1, 1, 1, 3.0, xgenPath, proxy["palette"], "/stand-in/patches.0003.abc")
+        suffix = xgenProxyProcedural.dataSuffix(proxy["description"], 24.0, samples, scene["_unit"][1])
+        assert record["data"] == [prefix + "scalp" + suffix, prefix + "beard" + suffix]
+
+        text = xgenProxyBatchExport.assNode(record)
+        assert ' name "%s@beard"' % proxy["name"] in text
+        declared = re.findall(r"^ declare (\w+) (.*)$", text, re.M)
+        assert declared
+        for name, declaration in declared:
+            assert xgenProxyProcedural.kParameterDeclarations[name] == declaration
@@ -0,0 +1,178 @@
+import os
+import tempfile
+
+import pytest
+
+import xgenProxyDiskCache
+import xgenProxyRecordCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+     Makes time.time() return now[0], so tests decide when records are
+     used.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(xgenProxyRecordCache.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def shared(tmpdir, monkeypatch):
+    """
+     Keeps the records in the files of the cache root, the index of this
+     host going to a temp directory of the test.
+    """
+    monkeypatch.setenv(xgenProxyRecordCache.kSharedEnv, "1")
+    monkeypatch.setattr(tempfile, "tempdir", str(tmpdir.mkdir("host1")))
+    xgenProxyRecordCache.stats(reset=True)
+    yield xgenProxyDiskCache.cacheDirectory(xgenProxyRecordCache.kCacheName)
+
+
+def _entry(name, padding=0):
+    record = {"name": name, "data": "x" * (100 + padding)}
+    return "key-" + name, xgenProxyRecordCache.contentHash(record), record
+
+
+def _store(clock, names):
+    for name in names:
+        clock[0] += 10.0
+        xgenProxyRecordCache.store([_entry(name)])
+
+
+def testStoreAndLookup(clock):
+    xgenProxyRecordCache.stats(reset=True)
+    key, digest, record = _entry("a")
+    # records shared by several keys are stored once
+    xgenProxyRecordCache.store([(key, digest, record), ("key-b", digest, record)])
+    found = xgenProxyRecordCache.lookup([key, "key-b", "key-missing"])
+    assert found == {key: (digest, record), "key-b": (digest, record)}
+    assert xgenProxyRecordCache.usage()[:2] == (1, 2)
+    assert xgenProxyRecordCache.stats() == {"hits": 2, "misses": 1, "stored": 2, "evicted": 0}
+    assert not xgenProxyRecordCache.isShared()
+
+
+def testTrimEvictsLeastRecentlyUsed(clock):
+    _store(clock, ["a", "b", "c"])
+    # a lookup makes "a" the most recently used
+    clock[0] += 10.0
+    assert len(xgenProxyRecordCache.lookup(["key-a"])) == 1
+
+    records, keys, total = xgenProxyRecordCache.usage()
+    assert xgenProxyRecordCache.trim(total) == 0
+    assert xgenProxyRecordCache.trim(total - 1) == 1
+    found = xgenProxyRecordCache.lookup(["key-a", "key-b", "key-c"])
+    assert sorted(found) == ["key-a", "key-c"]
+    # the keys of the dropped record go with it
+    assert xgenProxyRecordCache.usage()[:2] == (2, 2)
+
+
+def testTrimDownToRatio(clock):
+    _store(clock, ["r%d" % i for i in range(20)])
+    records, keys, total = xgenProxyRecordCache.usage()
+    evicted = xgenProxyRecordCache.trim(total // 2)
+    assert xgenProxyRecordCache.usage()[2] <= total // 2 * xgenProxyRecordCache.kTrimRatio
+    assert xgenProxyRecordCache.usage()[0] == 20 - evicted
+    # the oldest go first
+    found = xgenProxyRecordCache.lookup(["key-r%d" % i for i in range(20)])
+    assert sorted(found) == sorted("key-r%d" % i for i in range(evicted, 20))
+
+
+def testLimitFromEnvironment(monkeypatch):
+    monkeypatch.setenv(xgenProxyRecordCache.kLimitEnv, "2")
+    assert xgenProxyRecordCache.limitBytes() == 2 * 1024 * 1024
+    monkeypatch.setenv(xgenProxyRecordCache.kLimitEnv, "lots")
+    assert xgenProxyRecordCache.limitBytes() == xgenProxyRecordCache.kDefaultLimitMB * 1024 * 1024
+
+
+def testSharedRootKeepsNoDatabase(clock, shared, cacheRoot, tmpdir, monkeypatch):
+    key, digest, record = _entry("a")
+    xgenProxyRecordCache.store([(key, digest, record)])
+    assert xgenProxyRecordCache.isShared()
+    for directory, names, fileNames in os.walk(cacheRoot):
+        assert not [fileName for fileName in fileNames if fileName.startswith(xgenProxyRecordCache.kDatabaseName)]
+    assert xgenProxyDiskCache.readJson(os.path.join(shared, "keys", key[:2], key + ".json")) == {"digest": digest}
+    assert xgenProxyDiskCache.readJson(os.path.join(shared, "objects", digest[:2], digest + ".json")) == record
+
+    # another host reads the shared files, and indexes them
+    monkeypatch.setattr(tempfile, "tempdir", str(tmpdir.mkdir("host2")))
+    assert xgenProxyRecordCache.usage()[:2] == (0, 0)
+    assert xgenProxyRecordCache.lookup([key, "key-missing"]) == {key: (digest, record)}
+    assert xgenProxyRecordCache.usage()[:2] == (1, 1)
+
+
+def testSharedTrim(clock, shared, tmpdir, monkeypatch):
+    _store(clock, ["a", "b", "c"])
+    objects = dict((name, os.path.join(shared, "objects", digest[:2], digest + ".json"))
+                   for name, digest in [(name, _entry(name)[1]) for name in "abc"])
+    for i, name in enumerate("bac"):
+        os.utime(objects[name], (1000.0 + i, 1000.0 + i))
+
+    total = sum(os.path.getsize(path) for path in objects.values()) + 3 * xgenProxyRecordCache.kKeyBytes
+    assert xgenProxyRecordCache.trim(total) == 0
+    assert xgenProxyRecordCache.trim(total - 1) == 1
+    assert not os.path.exists(objects["b"])
+    assert not os.path.exists(os.path.join(shared, "keys", "ke", "key-b.json"))
+    assert xgenProxyRecordCache.stats()["evicted"] == 1
+
+    # the index of this host was not over the limit, another one misses
+    monkeypatch.setattr(tempfile, "tempdir", str(tmpdir.mkdir("host2")))
+    assert sorted(xgenProxyRecordCache.lookup(["key-a", "key-b", "key-c"])) == ["key-a", "key-c"]
+
+
+def testSharedTrimCountsBoth(clock, shared):
+    _store(clock, ["a", "b", "c"])
+    assert xgenProxyRecordCache.usage()[0] == 3
+    # over the limit both in the index of this host and in the files
+    assert xgenProxyRecordCache.trim(1) == 6
+    assert xgenProxyRecordCache.usage()[0] == 0
+    assert xgenProxyRecordCache.stats()["evicted"] == 6
+
+
+def testSharedLookupTouchesRecords(clock, shared):
+    key, digest, record = _entry("a")
+    xgenProxyRecordCache.store([(key, digest, record)])
+    path = os.path.join(shared, "objects", digest[:2], digest + ".json")
+    os.utime(path, (1.0, 1.0))
+
+    # used again within kTouchInterval of the last use, from the index
+    clock[0] += 1.0
+    xgenProxyRecordCache.lookup([key])
+    assert os.path.getmtime(path) == 1.0
+    clock[0] += xgenProxyRecordCache.kTouchInterval + 1.0
+    xgenProxyRecordCache.lookup([key])
+    assert os.path.getmtime(path) > 1.0
+
+
+def testSharedKeyOfEvictedRecord(clock, shared, tmpdir, monkeypatch):
+    key, digest, record = _entry("a")
+    xgenProxyRecordCache.store([(key, digest, record)])
+    os.remove(os.path.join(shared, "objects", digest[:2], digest + ".json"))
+
+    monkeypatch.setattr(tempfile, "tempdir", str(tmpdir.mkdir("host2")))
+    assert xgenProxyRecordCache.lookup([key]) == {}
+    assert not os.path.exists(os.path.join(shared, "keys", key[:2], key + ".json"))
+
+
+def testClearShared(clock, shared):
+    _store(clock, ["a", "b"])
+    xgenProxyRecordCache.clear()
+    assert xgenProxyRecordCache.lookup(["key-a", "key-b"]) == {}
+    assert not os.path.exists(os.path.join(shared, "objects"))
+
+
+def testNetworkFileSystems():
+    mounts = [
+        "/dev/sda1 / ext4 rw 0 0",
+        "server:/export /mnt/share nfs4 rw 0 0",
+        "//server/cache /mnt/smb\\040cache cifs rw 0 0",
+        "/dev/sdb1 /mnt/share/local ext4 rw 0 0",
+    ]
+    fileSystemType = xgenProxyDiskCache._fileSystemType
+    assert fileSystemType("/mnt/share/xgenProxyCache", mounts) == "nfs4"
+    assert fileSystemType("/mnt/share", mounts) == "nfs4"
+    assert fileSystemType("/mnt/sharex", mounts) == "ext4"
+    assert fileSystemType("/mnt/share/local/cache", mounts) == "ext4"
+    assert fileSystemType("/mnt/smb cache/x", mounts) == "cifs"
+    assert not xgenProxyDiskCache.isNetworkPath(tempfile.gettempdir())
@@ -0,0 +1,51 @@
+import xgenProxyShapes
+
+
+def testClampDimensions():
+    assert xgenProxyShapes.clampDimensions(-1.0, 0.0, -2.0) == (0.0, 0.1, 0.1)
+    assert xgenProxyShapes.clampDimensions(2.0, 3.0, 4.0) == (2.0, 3.0, 4.0)
+
+
+def testGeometryKeyIgnoresUnusedDimensions():
+    circle = xgenProxyShapes.kCircle
+    rectangle = xgenProxyShapes.kRectangle
+    assert xgenProxyShapes.geometryKey(circle, 1.0, 2.0, 3.0) == xgenProxyShapes.geometryKey(circle, 1.0, 5.0, 6.0)
+    assert xgenProxyShapes.geometryKey(rectangle, 1.0, 2.0, 3.0) == \
+        xgenProxyShapes.geometryKey(rectangle, 7.0, 2.0, 3.0)
+    assert xgenProxyShapes.geometryKey(rectangle, 1.0, 2.0, 3.0) != \
+        xgenProxyShapes.geometryKey(xgenProxyShapes.kTriangle, 1.0, 2.0, 3.0)
+
+
+def testOutlines():
+    rectangle = xgenProxyShapes.outline(xgenProxyShapes.kRectangle, 1.0, 2.0, 4.0)
+    assert list(rectangle) == [-1.0, -2.0, 0.0, 1.0, -2.0, 0.0, 1.0, 2.0, 0.0, -1.0, 2.0, 0.0]
+    assert len(xgenProxyShapes.outline(xgenProxyShapes.kTriangle, 1.0, 2.0, 4.0)) == 9
+
+    circle = xgenProxyShapes.outline(xgenProxyShapes.kCircle, 2.0, 1.0, 1.0, 16)
+    assert len(circle) == 16 * 3
+    for i in range(0, len(circle), 3):
+        assert abs(circle[i] ** 2 + circle[i + 1] ** 2 - 4.0) < 1e-5
+        assert circle[i + 2] == 0.0
+
+
+def testIndices():
+    assert list(xgenProxyShapes.triangleIndices(4)) == [0, 1, 2, 0, 2, 3]
+    assert list(xgenProxyShapes.lineIndices(3)) == [0, 1, 1, 2, 2, 0]
+
+
+def testCircleLevel():
+    assert xgenProxyShapes.circleLevel(0.0) == xgenProxyShapes.kCircleLevels[0]
+    assert xgenProxyShapes.circleLevel(1e9) == xgenProxyShapes.kCircleSegments
+    levels = [xgenProxyShapes.circleLevel(radius) for radius in (1.0, 10.0, 100.0, 1000.0)]
+    assert levels == sorted(levels)
+
+
+def testUnitScale():
+    for shapeType in (xgenProxyShapes.kRectangle, xgenProxyShapes.kCircle, xgenProxyShapes.kTriangle):
+        unit = xgenProxyShapes.outline(shapeType, 1.0, 1.0, 1.0)
+        scaled = xgenProxyShapes.outline(shapeType, 1.5, 2.0, 3.0)
+        sx, sy = xgenProxyShapes.unitScale(shapeType, 1.5, 2.0, 3.0)
+        assert len(unit) == len(scaled)
+        for i in range(0, len(unit), 3):
+            assert abs(unit[i] * sx - scaled[i]) < 1e-5
+            assert abs(unit[i + 1] * sy - scaled[i + 1]) < 1e-5
@@ -5,9 +5,15 @@
 ## Description:
 ##    Registers a new type of shape with maya called "xgenProxy".
 ##    This shape will display rectangles, triangles, and circles using basic gl
+##    in the legacy viewport. Viewport 2.0 drawing is provided by the geometry
+##    override in xgenProxyDrawOverride.py, which is loaded with this plug-in.
+##
+##    The legacy draw skips proxies outside the view and draws the ones
+##    smaller than a few pixels as a point. The "xgenProxyViewportCulling"
+##    and "xgenProxyLodPixels" option vars tune it, viewportStats() gives
+##    the counts of the last refresh of every model panel.
 ##
 ##
-##    There are no output attributes for this shape.
 ##    The following input attributes define the type of shape to draw.
 ##
 ##       shapeType  : 0=rectangle, 1=circle, 2=triangle
@@ -15,6 +21,44 @@
 ##       height		: rectangle and triangle height
 ##		 width		: rectangle and triangle width
 ##
+##    The bounds of the groom are computed from the patch geometry in the
+##    alembicFilePath file, see xgenProxyBounds.py, at the frame given by
+##    the time attribute (connect it to time1.outTime for animated patches).
+##
+##       descriptionPadding : pad by the groom length of the description,
+##                            read from the xgenFilePath collection (see
+##                            xgenProxyCollection.groomLength()), so every
+##                            proxy of a description uses the same padding
+##       groomPadding     : groom length, added around the patch bounds when
+##                          descriptionPadding is off or the collection does
+##                          not give the length
+##       groomBoundsMin   : output, minimum corner of the groom bounds
+##       groomBoundsMax   : output, maximum corner of the groom bounds
+##       groomBoundsValid : output, false when the bounds are unknown
+##
+##    patch may list several patches, separated by spaces or commas, and
+##    use glob patterns matched against the Alembic file. The xgen
+##    procedural renders a single patch, the translator exports one
+##    procedural per patch, all sharing the settings of the proxy.
+##
+##       resolvedPatches  : output, space separated list of the patches
+##
+##    palette and description are checked against the xgenFilePath
+##    collection, see xgenProxyCollection.py. An empty name is resolved
+##    when the collection leaves a single choice.
+##
+##       resolvedPalette     : output, palette name used by the translator
+##       resolvedDescription : output, description name used by the translator
+##       xgenNamesStatus     : output, why the names are not part of the
+##                             collection, empty when they are
+##
+##    xgenFilePath and alembicFilePath may contain frame tokens (<frame>,
+##    ####, $F4), replaced for the frame given by the time attribute, see
+##    xgenProxyPaths.py. Everything above uses the resolved paths.
+##
+##       resolvedXgenFilePath    : output, xgenFilePath for the current frame
+##       resolvedAlembicFilePath : output, alembicFilePath for the current frame
+##
 ################################################################################
 
 # Usage:
@@ -22,6 +66,14 @@
 # maya.cmds.loadPlugin("xgenProxy.py")
 # maya.cmds.createNode("xgenProxy")
 #
+# Many proxies are better created at once from a JSON or CSV manifest, see
+# xgenProxyManifest.py:
+# maya.cmds.xgenProxyCreate(manifest="/path/to/layout.json")
+#
+# Render farm frames can skip loading the scene: xgenProxySceneSnapshot.py
+# writes the proxies to a scene description once, xgenProxyBatchExport.py
+# then exports their procedurals for a frame range without Maya.
+#
 # An object will be created with reference to the node.  By default it will be a rectangle.
 # Use the different options node options to change the type of shape or its size and shape.
 # Add textures or manipulate as with any other object.
@@ -32,12 +84,38 @@ import maya.OpenMayaMPx as OpenMayaMPx
 import maya.OpenMayaRender as OpenMayaRender
 import maya.OpenMayaUI as OpenMayaUI
 
+import maya.cmds as cmds
+import maya.utils
+
 import math
+import os
 import sys
+import threading
+
+localPath = os.path.dirname(os.path.realpath(__file__))
+if localPath not in sys.path:
+    sys.path.append(localPath)
+
+import xgenProxyBounds
+import xgenProxyCollection
+import xgenProxyCulling
+import xgenProxyDiskCache
+import xgenProxyManifest
+import xgenProxyPaths
+import xgenProxyPickIndex
+import xgenProxyPlaybackCache
+import xgenProxyPrefetch
+import xgenProxyPreview
+import xgenProxyRegistry
+import xgenProxyShapes
 
 kPluginNodeTypeName = "xgenProxy"
 xgenProxyId = OpenMaya.MTypeId(0x8671309)
 
+# Viewport 2.0 support, see xgenProxyDrawOverride.py
+kDrawClassification = "drawdb/geometry/xgenProxy"
+kDrawOverridePlugin = "xgenProxyDrawOverride.py"
+
 glRenderer = OpenMayaRender.MHardwareRenderer.theRenderer()
 glFT = glRenderer.glFunctionTable()
 
@@ -51,6 +129,42 @@ kDefaultRadius = 1.0
 kDefaultHeight = 2.0
 kDefaultWidth = 2.0
 kDefaultShapeType = 0
+kDefaultGroomPadding = 1.0
+
+# Number of plugs pulled by xgenProxy.geometry() since the counter was last
+# reset, see geometryPlugReads().
+kGeometryPlugReads = [0]
+
+# Bulk creation of proxies from a manifest, see xgenProxyManifest.py
+kCreateCommandName = "xgenProxyCreate"
+kManifestFlag = "-m"
+kManifestLongFlag = "-manifest"
+
+# True while xgenProxyCreate builds proxies, see bulkCreationActive().
+kBulkCreation = [False]
+
+# Culling and level of detail of the legacy viewport draw, tuned through
+# option vars: proxies outside the view are not drawn at all, proxies
+# smaller than kLodPixelsOptionVar pixels are drawn as a point.
+kCullingOptionVar = "xgenProxyViewportCulling"
+kLodPixelsOptionVar = "xgenProxyLodPixels"
+kDefaultLodPixels = 2.0
+
+# model panel being refreshed, set by its pre render callback
+kViewState = {"panel": None, "frustum": None, "lodPixels": kDefaultLodPixels, "counts": None}
+# panel -> drawn, culled and reduced proxy counts of its last refresh
+kViewStats = {}
+# panel -> (pre render, post render) callback ids
+kViewCallbacks = {}
+# scene callback ids re-installing kViewCallbacks
+kSceneCallbacks = []
+
+# Materials evaluated by the legacy shaded draw, by (model panel, renderer,
+# shading group hash), the hash being None for the default material, see
+# evaluatedMaterial(). Every entry has a dirty callback on its shading group
+# flagging it when its shader network changes.
+kMaterialCache = {}
+kMaterialStats = {"hits": 0, "misses": 0}
 
 
 class basicGeom:
@@ -58,6 +172,11 @@ class basicGeom:
     height = kDefaultHeight
     width = kDefaultWidth
     shapeType = kDefaultShapeType
+    # padded groom bounds, None when unknown
+    bounds = None
+    previewMode = xgenProxyPreview.kPreviewPlaceholder
+    # preview root points as a float array of x, y, z triplets
+    previewPoints = None
 
 
 class xgenProxy(OpenMayaMPx.MPxSurfaceShape):
@@ -80,9 +199,32 @@ class xgenProxy(OpenMayaMPx.MPxSurfaceShape):
         xgenDebugLogLevel = OpenMaya.MObject()
         xgenWarningLogLevel = OpenMaya.MObject()
         xgenStatsLogLevel = OpenMaya.MObject()
-
-        # geometry
+        groomPadding = OpenMaya.MObject()
+        previewMode = OpenMaya.MObject()
+        previewPercent = OpenMaya.MObject()
+        groomBoundsMin = OpenMaya.MObject()
+        groomBoundsMax = OpenMaya.MObject()
+        groomBoundsValid = OpenMaya.MObject()
+        resolvedPatches = OpenMaya.MObject()
+        resolvedXgenFilePath = OpenMaya.MObject()
+        resolvedAlembicFilePath = OpenMaya.MObject()
+        resolvedPalette = OpenMaya.MObject()
+        resolvedDescription = OpenMaya.MObject()
+        xgenNamesStatus = OpenMaya.MObject()
+        drawGeometry = OpenMaya.MObject()
+
+        # geometry evaluated by compute for the draw code. compute may run
+        # on any evaluation thread, it replaces the whole object under the
+        # lock and draw code never reads the plugs themselves.
         self.__myGeometry = basicGeom()
+        self.__geometryLock = threading.Lock()
+        self.__geometryDirty = True
+
+        # instance number -> (geometry, world matrix, world bounds)
+        self.__worldBounds = {}
+
+        # key of the frames of this proxy in xgenProxyPlaybackCache
+        self.__playbackOwner = xgenProxyPlaybackCache.newOwner()
 
     # override
     def postConstructor(self):
@@ -97,98 +239,191 @@ class xgenProxy(OpenMayaMPx.MPxSurfaceShape):
         """
         self.setRenderable(True)
 
+    # override
+    def schedulingType(self):
+        """
+         compute only reads the data block, the patch and collection files
+         and the shared caches of the xgenProxy modules, which are locked,
+         so proxies can be evaluated concurrently by the Evaluation
+         Manager. The caches queue their disk writes, which are done when
+         Maya is idle, see xgenProxyDiskCache.flushWrites().
+        """
+        return OpenMayaMPx.MPxNode.kParallel
+
     # override
     def compute(self, plug, dataBlock):
         """
-         Since there are no output attributes this is not necessary but
-         if we wanted to compute an output mesh for rendering it would
-         be done here base on the inputs.
+         Computes the outputs describing the groom for the frame given by
+         the time attribute: resolved paths, patches and names, the groom
+         bounds and the geometry drawn by the viewport.
         """
-        if plug == xgenProxy.time:
-            dataHandle = dataBlock.inputValue(xgenProxy.xgenFilePath)
-            xgenString = dataHandle.asString()
-            outputHandle = dataBlock.outputValue(xgenProxy.xgenFilePath)
-            outputHandle.setString(xgenString)
-
-            dataHandle = dataBlock.inputValue(xgenProxy.alembicFilePath)
-            xgenString = dataHandle.asString()
-            outputHandle = dataBlock.outputValue(xgenProxy.alembicFilePath)
-            outputHandle.setString(xgenString)
-
-            dataHandle = dataBlock.inputValue(xgenProxy.palette)
-            xgenString = dataHandle.asString()
-            outputHandle = dataBlock.outputValue(xgenProxy.palette)
-            outputHandle.setString(xgenString)
-
-            dataHandle = dataBlock.inputValue(xgenProxy.description)
-            xgenString = dataHandle.asString()
-            outputHandle = dataBlock.outputValue(xgenProxy.description)
-            outputHandle.setString(xgenString)
-
-            dataHandle = dataBlock.inputValue(xgenProxy.patch)
-            xgenString = dataHandle.asString()
-            outputHandle = dataBlock.outputValue(xgenProxy.patch)
-            outputHandle.setString(xgenString)
+        if plug == xgenProxy.drawGeometry:
+            geom = basicGeom()
+            geom.shapeType = dataBlock.inputValue(xgenProxy.aShapeType).asShort()
+            geom.radius, geom.width, geom.height = xgenProxyShapes.clampDimensions(
+                dataBlock.inputValue(xgenProxy.aRadius).asDouble(),
+                dataBlock.inputValue(xgenProxy.aWidth).asDouble(),
+                dataBlock.inputValue(xgenProxy.aHeight).asDouble())
+
+            geom.previewMode = dataBlock.inputValue(xgenProxy.previewMode).asShort()
+
+            # frames already played are read back from the playback cache,
+            # keyed by the version of the Alembic file as well
+            frame, fps = self.__frame(dataBlock)
+            path = self.__resolvedPath(dataBlock, xgenProxy.alembicFilePath, frame)
+            frameKey = (xgenProxyPlaybackCache.frameKey(frame), xgenProxyDiskCache.fileStamp(path))
+            cached = xgenProxyPlaybackCache.lookup(self.__playbackOwner, frameKey)
+            if cached is not None:
+                geom.bounds, geom.previewPoints = cached
+            else:
+                if dataBlock.inputValue(xgenProxy.groomBoundsValid).asBool():
+                    low = dataBlock.inputValue(xgenProxy.groomBoundsMin).asDouble3()
+                    high = dataBlock.inputValue(xgenProxy.groomBoundsMax).asDouble3()
+                    geom.bounds = tuple(low) + tuple(high)
+
+                pending = False
+                if xgenProxyPreview.showsPoints(geom.previewMode):
+                    patches = xgenProxyBounds.resolvePatches(path, dataBlock.inputValue(xgenProxy.patch).asString())
+                    xgenPath, palette, description = self.__names(dataBlock, frame)
+                    # patches still scattering in the background are drawn
+                    # once _previewLayoutReady() dirtied the proxy
+                    points = xgenProxyPreview.previewPoints(
+                        path, patches, frame, fps, dataBlock.inputValue(xgenProxy.previewPercent).asDouble(),
+                        xgenProxyCollection.groomDensity(xgenPath, palette, description), wait=False)
+                    # failed reads are tried again by the next evaluation
+                    pending = points is None or points is xgenProxyPreview.kReadFailed
+                    if not pending:
+                        geom.previewPoints = points
+
+                if not pending:
+                    xgenProxyPlaybackCache.store(self.__playbackOwner, frameKey, geom.bounds, geom.previewPoints)
+
+            with self.__geometryLock:
+                self.__myGeometry = geom
+                self.__geometryDirty = False
+
+            dataBlock.outputValue(xgenProxy.drawGeometry).setBool(True)
+            dataBlock.setClean(plug)
 
+        elif (plug == xgenProxy.resolvedXgenFilePath) or (plug == xgenProxy.resolvedAlembicFilePath):
+            frame = self.__frame(dataBlock)[0]
+            dataBlock.outputValue(xgenProxy.resolvedXgenFilePath).setString(
+                self.__resolvedPath(dataBlock, xgenProxy.xgenFilePath, frame))
+            dataBlock.outputValue(xgenProxy.resolvedAlembicFilePath).setString(
+                self.__resolvedPath(dataBlock, xgenProxy.alembicFilePath, frame))
+
+            dataBlock.setClean(xgenProxy.resolvedXgenFilePath)
+            dataBlock.setClean(xgenProxy.resolvedAlembicFilePath)
+
+        elif ((plug == xgenProxy.groomBoundsMin) or (plug == xgenProxy.groomBoundsMax) or
+                (plug == xgenProxy.groomBoundsValid) or
+                (plug.isChild() and ((plug.parent() == xgenProxy.groomBoundsMin) or
+                                     (plug.parent() == xgenProxy.groomBoundsMax)))):
+            frame, fps = self.__frame(dataBlock)
+            path = self.__resolvedPath(dataBlock, xgenProxy.alembicFilePath, frame)
+            patch = dataBlock.inputValue(xgenProxy.patch).asString()
+            padding = dataBlock.inputValue(xgenProxy.groomPadding).asDouble()
+            if dataBlock.inputValue(xgenProxy.descriptionPadding).asBool():
+                xgenPath, palette, description = self.__names(dataBlock, frame)
+                length = xgenProxyCollection.groomLength(xgenPath, palette, description)
+                if length is not None:
+                    padding = length
+
+            patches = xgenProxyBounds.resolvePatches(path, patch)
+            bounds = xgenProxyBounds.unionBounds(path, patches, frame, fps)
+            valid = bounds is not None
+            if valid:
+                bounds = xgenProxyBounds.padBounds(bounds, padding)
+            else:
+                bounds = (0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+            dataBlock.outputValue(xgenProxy.groomBoundsMin).set3Double(bounds[0], bounds[1], bounds[2])
+            dataBlock.outputValue(xgenProxy.groomBoundsMax).set3Double(bounds[3], bounds[4], bounds[5])
+            dataBlock.outputValue(xgenProxy.groomBoundsValid).setBool(valid)
+
+            dataBlock.setClean(xgenProxy.groomBoundsMin)
+            dataBlock.setClean(xgenProxy.groomBoundsMax)
+            dataBlock.setClean(xgenProxy.groomBoundsValid)
+
+        elif plug == xgenProxy.resolvedPatches:
+            path = self.__resolvedPath(dataBlock, xgenProxy.alembicFilePath, self.__frame(dataBlock)[0])
+            patch = dataBlock.inputValue(xgenProxy.patch).asString()
+            patches = xgenProxyBounds.resolvePatches(path, patch)
+            dataBlock.outputValue(xgenProxy.resolvedPatches).setString(" ".join(patches))
             dataBlock.setClean(plug)
+
+        elif ((plug == xgenProxy.resolvedPalette) or (plug == xgenProxy.resolvedDescription) or
+                (plug == xgenProxy.xgenNamesStatus)):
+            frame = self.__frame(dataBlock)[0]
+            xgenPath = self.__resolvedPath(dataBlock, xgenProxy.xgenFilePath, frame)
+            alembicPath = self.__resolvedPath(dataBlock, xgenProxy.alembicFilePath, frame)
+            palette = dataBlock.inputValue(xgenProxy.palette).asString()
+            description = dataBlock.inputValue(xgenProxy.description).asString()
+            patch = dataBlock.inputValue(xgenProxy.patch).asString()
+
+            palette, description = xgenProxyCollection.resolveNames(xgenPath, palette, description)
+            patches = xgenProxyBounds.resolvePatches(alembicPath, patch)
+            status = xgenProxyCollection.validate(xgenPath, palette, description, patches)
+
+            dataBlock.outputValue(xgenProxy.resolvedPalette).setString(palette)
+            dataBlock.outputValue(xgenProxy.resolvedDescription).setString(description)
+            dataBlock.outputValue(xgenProxy.xgenNamesStatus).setString(status)
+
+            dataBlock.setClean(xgenProxy.resolvedPalette)
+            dataBlock.setClean(xgenProxy.resolvedDescription)
+            dataBlock.setClean(xgenProxy.xgenNamesStatus)
         else:
             return OpenMaya.kUnknownParameter
 
-    # override
-    def getInternalValue(self, plug, datahandle):
+    def __frame(self, dataBlock):
         """
-         Handle internal attributes.
-         In order to impose limits on our attribute values we
-         mark them internal and use the values in fGeometry intead.
+         Returns the frame given by the time attribute and the number of
+         frames per second, in the current time unit.
         """
-        if (plug == xgenProxy.aRadius):
-            datahandle.setDouble(self.__myGeometry.radius)
-
-        elif (plug == xgenProxy.aHeight):
-            datahandle.setDouble(self.__myGeometry.height)
-
-        elif (plug == xgenProxy.aWidth):
-            datahandle.setDouble(self.__myGeometry.width)
+        uiUnit = OpenMaya.MTime.uiUnit()
+        frame = dataBlock.inputValue(xgenProxy.time).asTime().asUnits(uiUnit)
+        fps = OpenMaya.MTime(1.0, OpenMaya.MTime.kSeconds).asUnits(uiUnit)
+        return frame, fps
 
-        else:
-            return OpenMayaMPx.MPxSurfaceShape.getInternalValue(self, plug, datahandle)
+    def __names(self, dataBlock, frame):
+        """
+         Returns the resolved xgen collection path, palette and description
+         of the proxy.
+        """
+        xgenPath = self.__resolvedPath(dataBlock, xgenProxy.xgenFilePath, frame)
+        palette, description = xgenProxyCollection.resolveNames(
+            xgenPath, dataBlock.inputValue(xgenProxy.palette).asString(),
+            dataBlock.inputValue(xgenProxy.description).asString())
+        return xgenPath, palette, description
 
-        return True
+    def __resolvedPath(self, dataBlock, attribute, frame):
+        """
+         Returns the value of a path attribute with its frame tokens
+         replaced, see xgenProxyPaths.py.
+        """
+        return xgenProxyPaths.resolvePath(dataBlock.inputValue(attribute).asString(), frame)
 
     # override
-    def setInternalValue(self, plug, datahandle):
+    def setDependentsDirty(self, plug, plugArray):
         """
-         Handle internal attributes.
-         In order to impose limits on our attribute values we
-         mark them internal and use the values in fGeometry intead.
+         Flag the evaluated geometry as stale when one of the attributes
+         it is built from changes, so that DG evaluation pulls it again
+         before the next draw. The Evaluation Manager computes it before
+         drawing anyway. Changes of any of them but time also drop the
+         frames of the playback cache and the proxies listed by the
+         prefetcher.
         """
-
-        # the minimum radius is 0
-        #
-        if (plug == xgenProxy.aRadius):
-            radius = datahandle.asDouble()
-
-            if (radius < 0):
-                radius = 0
-
-            self.__myGeometry.radius = radius
-
-        elif (plug == xgenProxy.aHeight):
-            val = datahandle.asDouble()
-            if (val <= 0):
-                val = 0.1
-            self.__myGeometry.height = val
-
-        elif (plug == xgenProxy.aWidth):
-            val = datahandle.asDouble()
-            if (val <= 0):
-                val = 0.1
-            self.__myGeometry.width = val
-
-        else:
-            return OpenMayaMPx.MPxSurfaceShape.setInternalValue(self, plug, datahandle)
-
-        return True
+        for attribute in xgenProxy.drawInputs:
+            if plug == attribute:
+                with self.__geometryLock:
+                    self.__geometryDirty = True
+                xgenProxyPickIndex.nodeDirty(self.thisMObject())
+                if plug != xgenProxy.time:
+                    xgenProxyPlaybackCache.invalidate(self.__playbackOwner)
+                    xgenProxyPrefetch.invalidateTargets()
+                break
+
+        return OpenMayaMPx.MPxSurfaceShape.setDependentsDirty(self, plug, plugArray)
 
     # override
     def isBounded(self):
@@ -198,13 +433,19 @@ class xgenProxy(OpenMayaMPx.MPxSurfaceShape):
     def boundingBox(self):
         """
          Returns the bounding box for the shape.
-         In this case just use the radius and height attributes
-         to determine the bounding box.
+         This is the bounds of the groom when they are known, grown to
+         include the placeholder drawn from the radius, width and height
+         attributes.
         """
         result = OpenMaya.MBoundingBox()
 
         geom = self.geometry()
 
+        bounds = geom.bounds
+        if bounds is not None:
+            result.expand(OpenMaya.MPoint(bounds[0], bounds[1], bounds[2]))
+            result.expand(OpenMaya.MPoint(bounds[3], bounds[4], bounds[5]))
+
         r = geom.radius
         result.expand(OpenMaya.MPoint(r, r, r))
         result.expand(OpenMaya.MPoint(-r, -r, -r))
@@ -219,29 +460,410 @@ class xgenProxy(OpenMayaMPx.MPxSurfaceShape):
 
         return result
 
+    def groomBounds(self):
+        """
+         Returns the padded groom bounds as a (xmin, ymin, zmin, xmax, ymax,
+         zmax) tuple, or None when they are unknown.
+        """
+        return self.geometry().bounds
+
+    def worldBounds(self, path):
+        """
+         Returns the world space bounds of the instance drawn through path
+         as ((xmin, ymin, zmin), (xmax, ymax, zmax)). They are only
+         recomputed when the geometry or the world matrix changed.
+        """
+        geom = self.geometry()
+        matrix = path.inclusiveMatrix()
+        key = path.instanceNumber()
+
+        cached = self.__worldBounds.get(key)
+        if cached is not None and cached[0] is geom and cached[1] == matrix:
+            return cached[2]
+
+        box = self.boundingBox()
+        box.transformUsing(matrix)
+        low = box.min()
+        high = box.max()
+        bounds = ((low.x, low.y, low.z), (high.x, high.y, high.z))
+        self.__worldBounds[key] = (geom, matrix, bounds)
+        return bounds
+
     def geometry(self):
         """
-         This function gets the values of all the attributes and
-         assigns them to the fGeometry. Calling MPlug::getValue
-         will ensure that the values are up-to-date.
+         Returns the geometry evaluated by compute. In DG evaluation the
+         drawGeometry output is pulled first when an input changed since
+         the last compute, so no other plug is read here. The compute it
+         triggers from draw code reads files but never writes any, the
+         caches queue their writes to idle time.
         """
-        # return self.__myGeometry
+        with self.__geometryLock:
+            dirty = self.__geometryDirty
+        if dirty:
+            OpenMaya.MPlug(self.thisMObject(), xgenProxy.drawGeometry).asBool()
+            kGeometryPlugReads[0] += 1
+
+        with self.__geometryLock:
+            return self.__myGeometry
+
+
+def geometryPlugReads(reset=False):
+    """
+     Returns how many plugs xgenProxy.geometry() has pulled, across all
+     proxies, and optionally resets the counter.
+    """
+    count = kGeometryPlugReads[0]
+    if reset:
+        kGeometryPlugReads[0] = 0
+    return count
+
+
+def bulkCreationActive():
+    """
+     Returns True while xgenProxyCreate is building proxies. Callbacks
+     reacting to new nodes or attribute changes should ignore them and
+     catch up once the command is done.
+    """
+    return kBulkCreation[0]
+
+
+class xgenProxyCreateCmd(OpenMayaMPx.MPxCommand):
+    """
+     xgenProxyCreate -manifest file
+
+     Creates and configures every proxy of a JSON or CSV manifest through
+     a single MDagModifier, so the whole layout is one undo step. Viewport
+     refreshes and the proxy registry are suspended while the proxies are
+     built. Returns the names of the new shapes.
+    """
 
-        this_object = self.thisMObject()
+    def __init__(self):
+        OpenMayaMPx.MPxCommand.__init__(self)
+        self.__proxies = []
+        self.__modifier = None
+        self.__shapes = []
 
-        plug = OpenMaya.MPlug(this_object, xgenProxy.aRadius)
-        self.__myGeometry.radius = plug.asDouble()
+    # override
+    def isUndoable(self):
+        return True
+
+    # override
+    def doIt(self, args):
+        argData = OpenMaya.MArgDatabase(self.syntax(), args)
+        if not argData.isFlagSet(kManifestFlag):
+            OpenMayaMPx.MPxCommand.displayError("%s needs a %s file" % (kCreateCommandName, kManifestLongFlag))
+            raise RuntimeError(kManifestLongFlag)
 
-        plug.setAttribute(xgenProxy.aHeight)
-        self.__myGeometry.height = plug.asDouble()
+        try:
+            self.__proxies = xgenProxyManifest.readManifest(argData.flagArgumentString(kManifestFlag, 0))
+        except xgenProxyManifest.ManifestError as e:
+            OpenMayaMPx.MPxCommand.displayError(str(e))
+            raise
 
-        plug.setAttribute(xgenProxy.aWidth)
-        self.__myGeometry.width = plug.asDouble()
+        self.redoIt()
 
-        plug.setAttribute(xgenProxy.aShapeType)
-        self.__myGeometry.shapeType = plug.asShort()  # enum????
+    # override
+    def redoIt(self):
+        kBulkCreation[0] = True
+        xgenProxyRegistry.suspend()
+        cmds.refresh(suspend=True)
+        try:
+            if self.__modifier is None:
+                self.__modifier = OpenMaya.MDagModifier()
+                self.__shapes = self.__build(self.__modifier)
+            else:
+                self.__modifier.doIt()
+        finally:
+            cmds.refresh(suspend=False)
+            xgenProxyRegistry.resume()
+            kBulkCreation[0] = False
+
+        self.clearResult()
+        for shape in self.__shapes:
+            self.appendToResult(shape)
 
-        return self.__myGeometry
+    # override
+    def undoIt(self):
+        kBulkCreation[0] = True
+        xgenProxyRegistry.suspend()
+        try:
+            self.__modifier.undoIt()
+        finally:
+            xgenProxyRegistry.resume()
+            kBulkCreation[0] = False
+
+    def __cameraMessages(self):
+        """
+         Returns the message plug of every culling camera named by the
+         manifest, by name.
+        """
+        result = {}
+        for proxy in self.__proxies:
+            name = proxy.get("cullingCamera")
+            if name is None or name in result:
+                continue
+            selection = OpenMaya.MSelectionList()
+            path = OpenMaya.MDagPath()
+            try:
+                selection.add(name)
+                selection.getDagPath(0, path)
+                path.extendToShape()
+            except RuntimeError:
+                OpenMayaMPx.MPxCommand.displayError("%s: no camera called %s" % (kCreateCommandName, name))
+                raise
+            result[name] = OpenMaya.MFnDependencyNode(path.node()).findPlug("message")
+        return result
+
+    def __build(self, modifier):
+        # look up the cameras before touching the scene, so an invalid
+        # manifest leaves nothing behind
+        cameras = self.__cameraMessages()
+
+        nodes = []
+        for proxy in self.__proxies:
+            transform = modifier.createNode("transform")
+            shape = modifier.createNode(kPluginNodeTypeName, transform)
+            if "name" in proxy:
+                modifier.renameNode(transform, proxy["name"])
+                modifier.renameNode(shape, proxy["name"] + "Shape")
+            nodes.append((transform, shape))
+        modifier.doIt()
+
+        # the plugs of the new nodes can only be edited once they exist
+        for proxy, (transform, shape) in zip(self.__proxies, nodes):
+            node = OpenMaya.MFnDependencyNode(shape)
+            for field in xgenProxyManifest.kStringFields:
+                if field in proxy:
+                    modifier.newPlugValueString(node.findPlug(field), proxy[field])
+            for field in xgenProxyManifest.kDoubleFields:
+                if field in proxy:
+                    modifier.newPlugValueDouble(node.findPlug(field), proxy[field])
+            if "shapeType" in proxy:
+                modifier.newPlugValueShort(node.findPlug("shapeType"), proxy["shapeType"])
+            if "cullingCamera" in proxy:
+                modifier.connect(cameras[proxy["cullingCamera"]], node.findPlug("cullingCamera"))
+            if "translate" in proxy:
+                parent = OpenMaya.MFnDependencyNode(transform)
+                for axis, value in zip("XYZ", proxy["translate"]):
+                    modifier.newPlugValueDouble(parent.findPlug("translate" + axis), value)
+        modifier.doIt()
+
+        return [OpenMaya.MFnDagNode(shape).partialPathName() for transform, shape in nodes]
+
+
+def createCmdCreator():
+    return OpenMayaMPx.asMPxPtr(xgenProxyCreateCmd())
+
+
+def createCmdSyntaxCreator():
+    syntax = OpenMaya.MSyntax()
+    syntax.addFlag(kManifestFlag, kManifestLongFlag, OpenMaya.MSyntax.kString)
+    return syntax
+
+
+def _materialDirty(*args):
+    # the last argument is the client data, the shading group hash
+    entry = kMaterialCache.get(args[-1])
+    if entry is not None:
+        entry["valid"] = False
+
+
+def evaluatedMaterial(shapeUI, view, path):
+    """
+     Returns the cache entry of the material the legacy draw uses for
+     path: a dictionary holding the evaluated "material" and, for
+     textured materials, the "data" its texture was evaluated into.
+     Materials are evaluated per view and renderer, and only evaluated
+     again once their shading network has been dirtied.
+    """
+    usingDefaultMat = view.usingDefaultMaterial()
+    if usingDefaultMat:
+        material = OpenMayaUI.MMaterial.defaultMaterial()
+        shadingEngine = None
+        key = (kViewState["panel"], view.rendererString(), None)
+    else:
+        material = OpenMayaMPx.MPxSurfaceShapeUI.material(shapeUI, path)
+        shadingEngine = material.shadingEngine()
+        key = (kViewState["panel"], view.rendererString(), OpenMaya.MObjectHandle(shadingEngine).hashCode())
+
+    entry = kMaterialCache.get(key)
+    if entry is not None and entry["handle"] is not None and (
+            not entry["handle"].isValid() or not entry["handle"].object() == shadingEngine):
+        # deleted shading group, its callback went with it, or another
+        # shading group with the same hash
+        _removeMaterialCallback(entry)
+        del kMaterialCache[key]
+        entry = None
+    if entry is not None and entry["valid"]:
+        kMaterialStats["hits"] += 1
+        return entry
+    kMaterialStats["misses"] += 1
+
+    # Evaluate the material and if necessary, the texture.
+    try:
+        material.evaluateMaterial(view, path)
+    except RuntimeError:
+        print "Couldn't evaluate material"
+        raise
+
+    if entry is None:
+        # the texture is evaluated into draw data of the entry's own
+        # geometry, not of the first proxy drawn with the shading group
+        entry = {"callback": None, "handle": None, "geometry": basicGeom()}
+        if shadingEngine is not None:
+            entry["callback"] = OpenMaya.MNodeMessage.addNodeDirtyCallback(shadingEngine, _materialDirty, key)
+            entry["handle"] = OpenMaya.MObjectHandle(shadingEngine)
+        kMaterialCache[key] = entry
+
+    data = None
+    if not usingDefaultMat and material.materialIsTextured():
+        data = OpenMayaUI.MDrawData()
+        shapeUI.getDrawData(entry["geometry"], data)
+        material.evaluateTexture(data)
+
+    entry["material"] = material
+    entry["data"] = data
+    entry["valid"] = True
+    return entry
+
+
+def _removeMaterialCallback(entry):
+    if entry["callback"] is not None and entry["handle"].isValid():
+        try:
+            OpenMaya.MMessage.removeCallback(entry["callback"])
+        except RuntimeError:
+            # removed with its shading group
+            pass
+
+
+def clearMaterialCache(*args):
+    for entry in kMaterialCache.values():
+        _removeMaterialCallback(entry)
+    kMaterialCache.clear()
+
+
+def materialCacheStats(reset=False):
+    """
+     Returns the material cache (hits, misses) of the legacy shaded draw
+     since the counters were last reset, and optionally resets them.
+    """
+    result = (kMaterialStats["hits"], kMaterialStats["misses"])
+    if reset:
+        kMaterialStats["hits"] = 0
+        kMaterialStats["misses"] = 0
+    return result
+
+
+def _dirtyPreviews(path):
+    for node in cmds.ls(type=kPluginNodeTypeName) or []:
+        if cmds.getAttr(node + ".resolvedAlembicFilePath") == path:
+            # evaluates the drawn geometry again, with its points
+            cmds.dgdirty(node + ".previewPercent")
+
+
+def _previewLayoutReady(path, patch):
+    """
+     Called from the thread that scattered the preview points of a patch,
+     see xgenProxyPreview.setLayoutCallback().
+    """
+    maya.utils.executeDeferred(_dirtyPreviews, path)
+
+
+def optionVarValue(name, default):
+    if cmds.optionVar(exists=name):
+        return cmds.optionVar(query=name)
+    return default
+
+
+def panelFrustum(panel):
+    """
+     Returns the view frustum of the camera of a model panel, fitted to
+     the panel's aspect ratio.
+    """
+    view = OpenMayaUI.M3dView()
+    OpenMayaUI.M3dView.getM3dViewFromModelPanel(panel, view)
+    cameraPath = OpenMaya.MDagPath()
+    view.getCamera(cameraPath)
+    camera = OpenMaya.MFnCamera(cameraPath)
+
+    # left, right, bottom, top
+    utils = [OpenMaya.MScriptUtil() for i in range(4)]
+    ptrs = [util.asDoublePtr() for util in utils]
+    aspect = float(view.portWidth()) / max(view.portHeight(), 1)
+    camera.getViewingFrustum(aspect, ptrs[0], ptrs[1], ptrs[2], ptrs[3], True, False, True)
+    window = [OpenMaya.MScriptUtil.getDouble(ptr) for ptr in ptrs]
+
+    near = camera.nearClippingPlane()
+    far = camera.farClippingPlane()
+    if camera.isOrtho():
+        projection = xgenProxyCulling.orthographic(window[0], window[1], window[2], window[3], near, far)
+    else:
+        projection = xgenProxyCulling.perspective(window[0], window[1], window[2], window[3], near, far)
+
+    inverse = cameraPath.inclusiveMatrixInverse()
+    worldToView = [[inverse(i, j) for j in range(4)] for i in range(4)]
+    return xgenProxyCulling.Frustum(worldToView, projection, view.portHeight())
+
+
+def _viewPreRender(panel, clientData):
+    frustum = None
+    if optionVarValue(kCullingOptionVar, 1):
+        try:
+            frustum = panelFrustum(panel)
+        except RuntimeError:
+            pass
+    kViewState["panel"] = panel
+    kViewState["frustum"] = frustum
+    kViewState["lodPixels"] = float(optionVarValue(kLodPixelsOptionVar, kDefaultLodPixels))
+    kViewState["counts"] = {"drawn": 0, "culled": 0, "reduced": 0}
+
+
+def _viewPostRender(panel, clientData):
+    if kViewState["counts"] is not None:
+        kViewStats[panel] = kViewState["counts"]
+    kViewState["panel"] = None
+    kViewState["frustum"] = None
+    kViewState["counts"] = None
+
+
+def installViewCallbacks(*args):
+    """
+     Hooks the culling of the legacy draw to every model panel that is
+     not hooked yet. Panels can be rebuilt when a scene is opened, so
+     this runs again after every file open and new scene.
+    """
+    for panel in cmds.getPanel(type="modelPanel") or []:
+        if panel in kViewCallbacks:
+            continue
+        try:
+            kViewCallbacks[panel] = (
+                OpenMayaUI.MUiMessage.add3dViewPreRenderMsgCallback(panel, _viewPreRender),
+                OpenMayaUI.MUiMessage.add3dViewPostRenderMsgCallback(panel, _viewPostRender))
+        except RuntimeError:
+            # panel without a 3d view yet
+            pass
+
+
+def removeViewCallbacks():
+    for callbackIds in kViewCallbacks.values():
+        for callbackId in callbackIds:
+            try:
+                OpenMaya.MMessage.removeCallback(callbackId)
+            except RuntimeError:
+                # removed with its panel
+                pass
+    kViewCallbacks.clear()
+    kViewState["panel"] = None
+    kViewState["frustum"] = None
+    kViewState["counts"] = None
+
+
+def viewportStats():
+    """
+     Returns, per model panel, how many proxies the last legacy viewport
+     refresh drew, culled and drew as a point.
+    """
+    return dict((panel, dict(counts)) for panel, counts in kViewStats.items())
 
 
 def printMsg(msg):
@@ -250,10 +872,37 @@ def printMsg(msg):
     OpenMaya.MStreamUtils.writeCharBuffer(stream, msg)
 
 
+def projectedRadius(view, path, radius):
+    """
+     Returns the approximate size, in pixels, of radius in object space
+     once drawn in view.
+    """
+    matrix = path.inclusiveMatrix()
+    center = OpenMaya.MPoint(0.0, 0.0, 0.0) * matrix
+
+    xUtil = OpenMaya.MScriptUtil()
+    xPtr = xUtil.asShortPtr()
+    yUtil = OpenMaya.MScriptUtil()
+    yPtr = yUtil.asShortPtr()
+
+    view.worldToView(center, xPtr, yPtr)
+    cx = OpenMaya.MScriptUtil.getShort(xPtr)
+    cy = OpenMaya.MScriptUtil.getShort(yPtr)
+
+    result = 0.0
+    for edge in (OpenMaya.MPoint(radius, 0.0, 0.0), OpenMaya.MPoint(0.0, radius, 0.0)):
+        view.worldToView(edge * matrix, xPtr, yPtr)
+        dx = OpenMaya.MScriptUtil.getShort(xPtr) - cx
+        dy = OpenMaya.MScriptUtil.getShort(yPtr) - cy
+        result = max(result, math.sqrt(dx * dx + dy * dy))
+    return result
+
+
 class xgenProxyUI(OpenMayaMPx.MPxSurfaceShapeUI):
     # private enums
     __kDrawRectangle, __kDrawCircle, __kDrawTriangle = range(3)
-    __kDrawWireframe, __kDrawWireframeOnShaded, __kDrawSmoothShaded, __kDrawFlatShaded, __kLastToken = range(5)
+    __kDrawWireframe, __kDrawWireframeOnShaded, __kDrawSmoothShaded, __kDrawFlatShaded, __kDrawPoint, \
+        __kLastToken = range(6)
 
     def __init__(self):
         OpenMayaMPx.MPxSurfaceShapeUI.__init__(self)
@@ -265,11 +914,26 @@ class xgenProxyUI(OpenMayaMPx.MPxSurfaceShapeUI):
          draw queue. The data should hold all the information
          needed to draw the shape.
         """
+        shapeNode = self.surfaceShape()
+
+        # Skip proxies outside the view before building anything, and draw
+        # the ones too small to be seen as a point.
+        reduced = False
+        frustum = kViewState["frustum"]
+        counts = kViewState["counts"]
+        if frustum is not None:
+            low, high = shapeNode.worldBounds(info.multiPath())
+            if not frustum.boxVisible(low, high):
+                counts["culled"] += 1
+                return
+            center = [(low[i] + high[i]) / 2.0 for i in range(3)]
+            radius = math.sqrt(sum((high[i] - low[i]) ** 2 for i in range(3))) / 2.0
+            reduced = frustum.pixelRadius(center, radius) < kViewState["lodPixels"]
+
         data = OpenMayaUI.MDrawData()
         # printMsg("**before getProtoype\n");
         request = info.getPrototype(self)
         # printMsg("**after getProtoype\n");
-        shapeNode = self.surfaceShape()
         geom = shapeNode.geometry()
         self.getDrawData(geom, data)
         request.setDrawData(data)
@@ -278,6 +942,15 @@ class xgenProxyUI(OpenMayaMPx.MPxSurfaceShapeUI):
         if (not info.objectDisplayStatus(OpenMayaUI.M3dView.kDisplayMeshes)):
             return
 
+        if counts is not None:
+            counts["reduced" if reduced else "drawn"] += 1
+
+        if reduced:
+            self.getDrawRequestsWireframe(request, info)
+            request.setToken(xgenProxyUI.__kDrawPoint)
+            queue.add(request)
+            return
+
         # Use display status to determine what color to draw the object
         if (info.displayStyle() == OpenMayaUI.M3dView.kWireFrame):
             self.getDrawRequestsWireframe(request, info)
@@ -300,10 +973,20 @@ class xgenProxyUI(OpenMayaMPx.MPxSurfaceShapeUI):
          From the given draw request, get the draw data and determine
          which basic to draw and with what values.
         """
+        token = request.token()
+        if token == xgenProxyUI.__kDrawPoint:
+            # too small on screen for the shape to be seen
+            glFT.glPushAttrib(OpenMayaRender.MGL_ALL_ATTRIB_BITS)
+            glFT.glPointSize(3.0)
+            glFT.glBegin(OpenMayaRender.MGL_POINTS)
+            glFT.glVertex3f(0.0, 0.0, 0.0)
+            glFT.glEnd()
+            glFT.glPopAttrib()
+            return
+
         data = request.drawData()
         shapeNode = self.surfaceShape()
         geom = shapeNode.geometry()
-        token = request.token()
         drawTexture = False
 
         # set up texturing if it is shaded
@@ -336,19 +1019,35 @@ class xgenProxyUI(OpenMayaMPx.MPxSurfaceShapeUI):
         else:
             glFT.glPolygonMode(OpenMayaRender.MGL_FRONT_AND_BACK, OpenMayaRender.MGL_LINE)
 
+        # preview of the primitive root points
+        if geom.previewPoints:
+            points = geom.previewPoints
+            glFT.glPushAttrib(OpenMayaRender.MGL_ALL_ATTRIB_BITS)
+            glFT.glDisable(OpenMayaRender.MGL_LIGHTING)
+            glFT.glDisable(OpenMayaRender.MGL_TEXTURE_2D)
+            glFT.glPointSize(2.0)
+            glFT.glBegin(OpenMayaRender.MGL_POINTS)
+            for i in range(0, len(points), 3):
+                glFT.glVertex3f(points[i], points[i + 1], points[i + 2])
+            glFT.glEnd()
+            glFT.glPopAttrib()
+
         # draw the shapes
-        if (geom.shapeType == xgenProxyUI.__kDrawCircle):
-            # circle
+        if not xgenProxyPreview.showsPlaceholder(geom.previewMode):
+            pass
+
+        elif (geom.shapeType == xgenProxyUI.__kDrawCircle):
+            # circle, tessellated according to its size on screen
+            segments = xgenProxyShapes.circleLevel(projectedRadius(view, request.multiPath(), geom.radius))
+            table = xgenProxyShapes.unitCircle(segments)
+            r = geom.radius
             glFT.glBegin(OpenMayaRender.MGL_POLYGON)
-            for i in range(0, 360):
-                rad = (i * 2 * math.pi) / 360;
-                glFT.glNormal3f(0.0, 0.0, 1.0)
-                if (i == 360):
-                    glFT.glTexCoord3f(geom.radius * math.cos(0), geom.radius * math.sin(0), 0.0)
-                    glFT.glVertex3f(geom.radius * math.cos(0), geom.radius * math.sin(0), 0.0)
-                else:
-                    glFT.glTexCoord3f(geom.radius * math.cos(rad), geom.radius * math.sin(rad), 0.0)
-                    glFT.glVertex3f(geom.radius * math.cos(rad), geom.radius * math.sin(rad), 0.0)
+            glFT.glNormal3f(0.0, 0.0, 1.0)
+            for i in range(0, len(table), 2):
+                x = r * table[i]
+                y = r * table[i + 1]
+                glFT.glTexCoord3f(x, y, 0.0)
+                glFT.glVertex3f(x, y, 0.0)
             glFT.glEnd()
 
         elif (geom.shapeType == xgenProxyUI.__kDrawRectangle):
@@ -400,13 +1099,17 @@ class xgenProxyUI(OpenMayaMPx.MPxSurfaceShapeUI):
     def select(self, selectInfo, selectionList, worldSpaceSelectPts):
         """
          Select function. Gets called when the bbox for the object is selected.
-         This function just selects the object without doing any intersection tests.
+         The drawn rectangle, circle or triangle is hit tested against the
+         selection, see xgenProxyPickIndex.py.
         """
+        point = xgenProxyPickIndex.hit(selectInfo)
+        if point is None:
+            return False
 
         priorityMask = OpenMaya.MSelectionMask(OpenMaya.MSelectionMask.kSelectObjectsMask)
         item = OpenMaya.MSelectionList()
         item.add(selectInfo.selectPath())
-        xformedPt = OpenMaya.MPoint()
+        xformedPt = OpenMaya.MPoint(point[0], point[1], point[2])
         selectInfo.addSelection(item, xformedPt, selectionList,
                                 worldSpaceSelectPts, priorityMask, False)
         return True
@@ -435,28 +1138,20 @@ class xgenProxyUI(OpenMayaMPx.MPxSurfaceShapeUI):
             request.setColor(kHiliteColor, activeColorTable)
 
     def getDrawRequestsShaded(self, request, info, queue, data):
-        # Need to get the material info
+        # Need to get the material info, evaluated once per shading group
         path = info.multiPath()  # path to your dag object
         view = info.view()  # view to draw to
-        material = OpenMayaMPx.MPxSurfaceShapeUI.material(self, path)
-        usingDefaultMat = view.usingDefaultMaterial()
-        if usingDefaultMat:
-            material = OpenMayaUI.MMaterial.defaultMaterial()
+        entry = evaluatedMaterial(self, view, path)
 
         displayStatus = info.displayStatus()
 
-        # Evaluate the material and if necessary, the texture.
-        try:
-            material.evaluateMaterial(view, path)
-        except RuntimeError:
-            print "Couldn't evaluate material"
-            raise
-
-        drawTexture = not usingDefaultMat
-        if (drawTexture and material.materialIsTextured()):
-            material.evaluateTexture(data)
+        # textured materials share the draw data their texture was
+        # evaluated into
+        if entry["data"] is not None:
+            data = entry["data"]
+            request.setDrawData(data)
 
-        request.setMaterial(material)
+        request.setMaterial(entry["material"])
 
         # create a draw request for wireframe on shaded if necessary.
         if ((displayStatus == OpenMayaUI.M3dView.kActive) or
@@ -494,7 +1189,6 @@ def nodeInitializer():
     def setOptions(attr):
         attr.setHidden(False)
         attr.setKeyable(True)
-        attr.setInternal(True)
 
     numericAttr = OpenMaya.MFnNumericAttribute()
 
@@ -574,11 +1268,130 @@ def nodeInitializer():
     setOptions(stringAttr)
     xgenProxy.addAttribute(xgenProxy.patch)
 
-    xgenProxy.attributeAffects(xgenProxy.time, xgenProxy.xgenFilePath)
-    xgenProxy.attributeAffects(xgenProxy.time, xgenProxy.alembicFilePath)
-    xgenProxy.attributeAffects(xgenProxy.time, xgenProxy.palette)
-    xgenProxy.attributeAffects(xgenProxy.time, xgenProxy.description)
-    xgenProxy.attributeAffects(xgenProxy.time, xgenProxy.patch)
+    numericAttr = OpenMaya.MFnNumericAttribute()
+    xgenProxy.groomPadding = numericAttr.create("groomPadding", "gpad", OpenMaya.MFnNumericData.kDouble,
+                                                kDefaultGroomPadding)
+    numericAttr.setHidden(False)
+    numericAttr.setKeyable(True)
+    numericAttr.setMin(0.0)
+    xgenProxy.addAttribute(xgenProxy.groomPadding)
+
+    xgenProxy.descriptionPadding = numericAttr.create("descriptionPadding", "dpad",
+                                                      OpenMaya.MFnNumericData.kBoolean, True)
+    numericAttr.setHidden(False)
+    numericAttr.setKeyable(True)
+    xgenProxy.addAttribute(xgenProxy.descriptionPadding)
+
+    # point cloud preview of the primitives, see xgenProxyPreview.py
+    xgenProxy.previewMode = enumAttr.create("previewMode", "pvm", xgenProxyPreview.kPreviewPlaceholder)
+    for i, mode in enumerate(xgenProxyPreview.kPreviewModes):
+        enumAttr.addField(mode, i)
+    enumAttr.setHidden(False)
+    enumAttr.setKeyable(True)
+    xgenProxy.addAttribute(xgenProxy.previewMode)
+
+    xgenProxy.previewPercent = numericAttr.create("previewPercent", "pvp", OpenMaya.MFnNumericData.kDouble,
+                                                  xgenProxyPreview.kDefaultPreviewPercent)
+    numericAttr.setHidden(False)
+    numericAttr.setKeyable(True)
+    numericAttr.setMin(0.0)
+    numericAttr.setMax(100.0)
+    xgenProxy.addAttribute(xgenProxy.previewPercent)
+
+    def setOptions(attr):
+        attr.setHidden(True)
+        attr.setWritable(False)
+        attr.setStorable(False)
+
+    xgenProxy.groomBoundsMin = numericAttr.createPoint("groomBoundsMin", "gbmn")
+    setOptions(numericAttr)
+    xgenProxy.addAttribute(xgenProxy.groomBoundsMin)
+
+    xgenProxy.groomBoundsMax = numericAttr.createPoint("groomBoundsMax", "gbmx")
+    setOptions(numericAttr)
+    xgenProxy.addAttribute(xgenProxy.groomBoundsMax)
+
+    xgenProxy.groomBoundsValid = numericAttr.create("groomBoundsValid", "gbv", OpenMaya.MFnNumericData.kBoolean,
+                                                    False)
+    setOptions(numericAttr)
+    xgenProxy.addAttribute(xgenProxy.groomBoundsValid)
+
+    resolvedPatchesData = OpenMaya.MFnStringData().create('')
+    xgenProxy.resolvedPatches = stringAttr.create("resolvedPatches", "rptch", OpenMaya.MFnData.kString,
+                                                  resolvedPatchesData)
+    setOptions(stringAttr)
+    xgenProxy.addAttribute(xgenProxy.resolvedPatches)
+    xgenProxy.attributeAffects(xgenProxy.alembicFilePath, xgenProxy.resolvedPatches)
+    xgenProxy.attributeAffects(xgenProxy.patch, xgenProxy.resolvedPatches)
+
+    resolvedPaletteData = OpenMaya.MFnStringData().create('')
+    xgenProxy.resolvedPalette = stringAttr.create("resolvedPalette", "rpal", OpenMaya.MFnData.kString,
+                                                  resolvedPaletteData)
+    setOptions(stringAttr)
+    xgenProxy.addAttribute(xgenProxy.resolvedPalette)
+
+    resolvedDescriptionData = OpenMaya.MFnStringData().create('')
+    xgenProxy.resolvedDescription = stringAttr.create("resolvedDescription", "rdesc", OpenMaya.MFnData.kString,
+                                                      resolvedDescriptionData)
+    setOptions(stringAttr)
+    xgenProxy.addAttribute(xgenProxy.resolvedDescription)
+
+    xgenNamesStatusData = OpenMaya.MFnStringData().create('')
+    xgenProxy.xgenNamesStatus = stringAttr.create("xgenNamesStatus", "xgns", OpenMaya.MFnData.kString,
+                                                  xgenNamesStatusData)
+    setOptions(stringAttr)
+    xgenProxy.addAttribute(xgenProxy.xgenNamesStatus)
+
+    for output in (xgenProxy.resolvedPalette, xgenProxy.resolvedDescription, xgenProxy.xgenNamesStatus):
+        xgenProxy.attributeAffects(xgenProxy.xgenFilePath, output)
+        xgenProxy.attributeAffects(xgenProxy.alembicFilePath, output)
+        xgenProxy.attributeAffects(xgenProxy.palette, output)
+        xgenProxy.attributeAffects(xgenProxy.description, output)
+        xgenProxy.attributeAffects(xgenProxy.patch, output)
+
+    for output in (xgenProxy.groomBoundsMin, xgenProxy.groomBoundsMax, xgenProxy.groomBoundsValid):
+        xgenProxy.attributeAffects(xgenProxy.alembicFilePath, output)
+        xgenProxy.attributeAffects(xgenProxy.patch, output)
+        xgenProxy.attributeAffects(xgenProxy.groomPadding, output)
+        xgenProxy.attributeAffects(xgenProxy.descriptionPadding, output)
+        xgenProxy.attributeAffects(xgenProxy.xgenFilePath, output)
+        xgenProxy.attributeAffects(xgenProxy.palette, output)
+        xgenProxy.attributeAffects(xgenProxy.description, output)
+        xgenProxy.attributeAffects(xgenProxy.time, output)
+
+    resolvedXgenFilePathData = OpenMaya.MFnStringData().create('')
+    xgenProxy.resolvedXgenFilePath = stringAttr.create("resolvedXgenFilePath", "rxfp", OpenMaya.MFnData.kString,
+                                                       resolvedXgenFilePathData)
+    setOptions(stringAttr)
+    xgenProxy.addAttribute(xgenProxy.resolvedXgenFilePath)
+    xgenProxy.attributeAffects(xgenProxy.xgenFilePath, xgenProxy.resolvedXgenFilePath)
+    xgenProxy.attributeAffects(xgenProxy.time, xgenProxy.resolvedXgenFilePath)
+
+    resolvedAlembicFilePathData = OpenMaya.MFnStringData().create('')
+    xgenProxy.resolvedAlembicFilePath = stringAttr.create("resolvedAlembicFilePath", "rafp", OpenMaya.MFnData.kString,
+                                                          resolvedAlembicFilePathData)
+    setOptions(stringAttr)
+    xgenProxy.addAttribute(xgenProxy.resolvedAlembicFilePath)
+    xgenProxy.attributeAffects(xgenProxy.alembicFilePath, xgenProxy.resolvedAlembicFilePath)
+    xgenProxy.attributeAffects(xgenProxy.time, xgenProxy.resolvedAlembicFilePath)
+
+    # frame tokens make the resolved names and patches time dependent
+    for output in (xgenProxy.resolvedPatches, xgenProxy.resolvedPalette, xgenProxy.resolvedDescription,
+                   xgenProxy.xgenNamesStatus):
+        xgenProxy.attributeAffects(xgenProxy.time, output)
+
+    xgenProxy.drawGeometry = numericAttr.create("drawGeometry", "dgeo", OpenMaya.MFnNumericData.kBoolean, False)
+    setOptions(numericAttr)
+    xgenProxy.addAttribute(xgenProxy.drawGeometry)
+
+    # every input the drawn geometry and bounds depend on, directly or
+    # through the groom bounds
+    xgenProxy.drawInputs = (xgenProxy.aShapeType, xgenProxy.aRadius, xgenProxy.aHeight, xgenProxy.aWidth,
+                            xgenProxy.alembicFilePath, xgenProxy.patch, xgenProxy.groomPadding, xgenProxy.time,
+                            xgenProxy.descriptionPadding, xgenProxy.xgenFilePath, xgenProxy.palette,
+                            xgenProxy.description, xgenProxy.previewMode, xgenProxy.previewPercent)
+    for attribute in xgenProxy.drawInputs:
+        xgenProxy.attributeAffects(attribute, xgenProxy.drawGeometry)
 
 
 # initialize the script plug-in
@@ -586,15 +1399,81 @@ def initializePlugin(mobject):
     mplugin = OpenMayaMPx.MFnPlugin(mobject, "Autodesk", "2017", "Any")
     try:
         mplugin.registerShape(kPluginNodeTypeName, xgenProxyId,
-                              nodeCreator, nodeInitializer, uiCreator)
+                              nodeCreator, nodeInitializer, uiCreator, kDrawClassification)
     except:
         sys.stderr.write("Failed to register node: %s" % kPluginNodeTypeName)
         raise
 
+    try:
+        mplugin.registerCommand(kCreateCommandName, createCmdCreator, createCmdSyntaxCreator)
+    except:
+        sys.stderr.write("Failed to register command: %s" % kCreateCommandName)
+        raise
+
+    # index of the proxies of the scene, see xgenProxyRegistry.py
+    xgenProxyRegistry.install()
+
+    xgenProxyPlaybackCache.setBudget(optionVarValue(xgenProxyPlaybackCache.kBudgetOptionVar,
+                                                    xgenProxyPlaybackCache.kDefaultBudgetMB))
+    # hit testing of the legacy viewport selection
+    xgenProxyPickIndex.install()
+
+    # culling of the legacy draw
+    if OpenMaya.MGlobal.mayaState() == OpenMaya.MGlobal.kInteractive:
+        installViewCallbacks()
+        for message in (OpenMaya.MSceneMessage.kAfterOpen, OpenMaya.MSceneMessage.kAfterNew):
+            kSceneCallbacks.append(OpenMaya.MSceneMessage.addCallback(message, installViewCallbacks))
+        for message in (OpenMaya.MSceneMessage.kBeforeOpen, OpenMaya.MSceneMessage.kBeforeNew):
+            kSceneCallbacks.append(OpenMaya.MSceneMessage.addCallback(message, clearMaterialCache))
+            kSceneCallbacks.append(OpenMaya.MSceneMessage.addCallback(message, xgenProxyPlaybackCache.clear))
+
+        # background loading of the upcoming frames during playback
+        xgenProxyPrefetch.install()
+
+        # cache files are written when Maya is idle, not from compute
+        xgenProxyDiskCache.setFlushScheduler(maya.utils.executeDeferred)
+
+        # preview points are scattered in the background, not in compute
+        xgenProxyPreview.setLayoutCallback(_previewLayoutReady)
+
+    # The geometry override is an API 2.0 plug-in living next to this one.
+    try:
+        overridePath = os.path.join(mplugin.loadPath(), kDrawOverridePlugin)
+        if not cmds.pluginInfo(kDrawOverridePlugin, query=True, loaded=True):
+            cmds.loadPlugin(overridePath, quiet=True)
+    except:
+        sys.stderr.write("Failed to load Viewport 2.0 override: %s" % kDrawOverridePlugin)
+
 
 # uninitialize the script plug-in
 def uninitializePlugin(mobject):
     mplugin = OpenMayaMPx.MFnPlugin(mobject)
+    xgenProxyRegistry.uninstall()
+    xgenProxyPickIndex.uninstall()
+    xgenProxyPrefetch.uninstall()
+    xgenProxyDiskCache.setFlushScheduler(None)
+    xgenProxyDiskCache.flushWrites()
+    xgenProxyPreview.setLayoutCallback(None)
+
+    for callbackId in kSceneCallbacks:
+        OpenMaya.MMessage.removeCallback(callbackId)
+    del kSceneCallbacks[:]
+    removeViewCallbacks()
+    clearMaterialCache()
+    xgenProxyPlaybackCache.clear()
+
+    try:
+        if cmds.pluginInfo(kDrawOverridePlugin, query=True, loaded=True):
+            cmds.unloadPlugin(kDrawOverridePlugin)
+    except:
+        sys.stderr.write("Failed to unload Viewport 2.0 override: %s" % kDrawOverridePlugin)
+
+    try:
+        mplugin.deregisterCommand(kCreateCommandName)
+    except:
+        sys.stderr.write("Failed to deregister command: %s" % kCreateCommandName)
+        raise
+
     try:
         mplugin.deregisterNode(xgenProxyId)
     except:
@@ -0,0 +1,1050 @@
+###############################################################################
+##
+## xgenProxyBatchExport.py
+##
+## Description:
+##    Headless export of the xgen procedurals of the xgenProxy nodes for a
+##    frame range, so render farm frames can skip loading the Maya scene
+##    and CXgProxyDescriptionTranslator::Update().
+##
+##    xgenProxySceneSnapshot.py reads every proxy of a Maya scene once and
+##    writes a scene description (JSON). This module resolves, for every
+##    frame and proxy, what the translator would: the procedural data
+##    string, bounds, time samples, culling camera parameters and load
+##    mode. Each frame is written as a standalone .ass file of procedural
+##    nodes, or as a JSON file of those records. Frames are spread over a
+##    pool of processes.
+##
+##    The data string, unit factors, patch names and user parameters
+##    follow the tables of xgenProxyProcedural.py, which the translator
+##    is built with too.
+##
+##    It does not need Maya, only the Maya independent xgenProxy modules,
+##    and PyAlembic to compute bounds from the patches (see
+##    xgenProxyBounds.py). Run it from the command line:
+##
+##       python xgenProxyBatchExport.py scene.json -s 1 -e 240 -o /out -j 8
+##
+##    With --stand-in COUNT, a scene of COUNT proxies with fixed bounds is
+##    written to scene.json first, along with the collection file it uses,
+##    to test and time the exporter without Maya. A summary of frames per second and of the time spent in every
+##    stage (loading the scene, bounds, resolving, writing) is printed,
+##    see report().
+##
+##    Records are cached on disk by the inputs they are resolved from, see
+##    xgenProxyRecordCache.py, unless --no-cache is given. Every export
+##    writes a manifest next to the frames, listing the content hash of
+##    the record of every proxy at every frame: a frame whose records did
+##    not change since the last export to the same directory is not
+##    written again, and --changes compares the manifest with the one of
+##    another export to list the proxies that changed, see
+##    changedProxies().
+##
+##    Scene description, every field being optional unless noted:
+##
+##       version     : kSceneVersion (required)
+##       fps         : frames per second of the scene time unit
+##       linearUnit  : Maya linear unit ("cm", "m", "in", ...)
+##       dso         : path of the xgen procedural, by default the one of
+##                     $MTOA_PATH when exporting
+##       frames      : {"start", "end", "step"}, range used when none is
+##                     given on the command line
+##       motionBlur  : Arnold render options, {"enable", "steps",
+##                     "rangeType", "length", "start", "end"}
+##       cameras     : name -> {"ortho", "horizontalFieldOfView",
+##                     "verticalFieldOfView" (radians), "aspectRatio",
+##                     "matrix" or "matrices"}
+##       proxies     : list of the proxies, with the kProxyDefaults fields,
+##                     "name" (required), "matrix" or "matrices", and
+##                     "bounds" to use instead of reading the patches
+##
+##    Matrices are 16 floats of the world matrix, row by row. "matrices"
+##    holds animated ones by frame ("%.3f"), the sample nearest to a frame
+##    is used. Path attributes keep their frame tokens, they are resolved
+##    for every frame, see xgenProxyPaths.py.
+##
+##    Shaders are not part of the descriptions. A proxy's "shader" names
+##    the Arnold node of its shading group, the frame files are meant to be
+##    rendered along with the shaders exported once for the job.
+##
+################################################################################
+
+import argparse
+import bisect
+import json
+import math
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+import xgenProxyBounds
+import xgenProxyCollection
+import xgenProxyDiskCache
+import xgenProxyPaths
+import xgenProxyProcedural
+import xgenProxyRecordCache
+
+kSceneVersion = 1
+kFormats = ("ass", "json")
+
+# Proxy fields read by the translator, with the defaults of the attributes.
+kProxyDefaults = {
+    "xgenFilePath": "",
+    "alembicFilePath": "",
+    "palette": "",
+    "description": "",
+    "patch": "",
+    "groomPadding": 1.0,
+    "descriptionPadding": True,
+    "cullingCamera": "",
+    "shader": "",
+    "xgenDebugLogLevel": 1,
+    "xgenWarningLogLevel": 1,
+    "xgenInfoLogLevel": 1,
+    "renderMode": 1,
+    "aiMinPixelWidth": 0.15,
+    "aiMode": 0,
+    "motionBlurOverride": 0,
+    "motionBlurMode": 3,
+    "motionBlurSteps": 3,
+    "motionBlurFactor": 0.5,
+    "aiLoadMode": 0,
+    "aiFrustumCull": False,
+    "aiCullingMargin": 0.1,
+    "aiTypedUserData": False,
+}
+
+# Arnold render options motion range types.
+kRangeStartOnFrame, kRangeCenterOnFrame, kRangeEndOnFrame, kRangeCustom = range(4)
+
+kIdentity = [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0]
+
+kStages = ("load", "cache", "bounds", "resolve", "write")
+
+kManifestVersion = 1
+
+# Warnings listed by report(), the others are only counted.
+kReportedWarnings = 20
+
+# Palettes of the stand-in scenes, and descriptions of each palette.
+kStandInPalettes = 3
+kStandInDescriptions = 7
+
+
+class SceneError(Exception):
+    pass
+
+
+def _f32(value):
+    """
+     Returns value rounded to single precision, the precision the
+     translator keeps its parameters in.
+    """
+    return struct.unpack("f", struct.pack("f", value))[0]
+
+
+def frameKey(frame):
+    return "%.3f" % frame
+
+
+def frameRange(start, end, step=1.0):
+    if step <= 0.0:
+        raise ValueError("the frame step must be positive")
+    count = int(math.floor((end - start) / step + 1e-6)) + 1
+    return [start + i * step for i in range(max(count, 0))]
+
+
+def _samples(entry):
+    """
+     Returns the sorted (frame, matrix) samples of a camera or proxy, or
+     None when it is not animated.
+    """
+    matrices = entry.get("matrices")
+    if not matrices:
+        return None
+    return sorted((float(frame), matrix) for frame, matrix in matrices.items())
+
+
+def _matrixAt(entry, samples, frame):
+    if samples:
+        i = bisect.bisect_left([sample[0] for sample in samples], frame)
+        if i == len(samples) or (i > 0 and frame - samples[i - 1][0] <= samples[i][0] - frame):
+            i -= 1
+        return samples[i][1]
+    return entry.get("matrix") or kIdentity
+
+
+def readScene(path):
+    """
+     Returns the scene description stored at path, with the defaults of
+     missing proxy fields filled in.
+    """
+    try:
+        with open(path, "r") as f:
+            scene = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        raise SceneError("cannot read scene description %s: %s" % (path, e))
+    if not isinstance(scene, dict) or scene.get("version") != kSceneVersion:
+        raise SceneError("%s is not a version %d xgenProxy scene description" % (path, kSceneVersion))
+    return prepareScene(scene)
+
+
+def prepareScene(scene):
+    """
+     Fills the defaults of a scene description in place and returns it.
+    """
+    scene.setdefault("fps", 24.0)
+    scene.setdefault("linearUnit", "cm")
+    scene.setdefault("motionBlur", {})
+    scene.setdefault("cameras", {})
+    for camera in scene["cameras"].values():
+        camera["_samples"] = _samples(camera)
+        # inverse matrices and parameters by frame, see cameraParams()
+        camera["_inverses"] = {}
+        camera["_params"] = {}
+        camera["_key"] = _staticKey(camera)
+        camera["_keys"] = {}
+
+    # the same for every proxy and frame
+    scene["_unit"] = unitConversion(scene["linearUnit"])
+    scene["_offsets"] = motionOffsets(scene["motionBlur"])
+    scene["_dso"] = dsoPath(scene)
+    scene["_key"] = xgenProxyDiskCache.keyFileName(
+        xgenProxyRecordCache.kRecordVersion, scene["fps"], scene["linearUnit"], sorted(scene["motionBlur"].items()),
+        scene["_dso"], os.environ.get(xgenProxyProcedural.kDeferLoadEnv))
+
+    proxies = []
+    for i, entry in enumerate(scene.get("proxies", [])):
+        if not entry.get("name"):
+            raise SceneError("proxy %d has no name" % i)
+        proxy = dict(kProxyDefaults)
+        proxy.update(entry)
+        proxy["_samples"] = _samples(proxy)
+        proxy["_key"] = _staticKey(proxy)
+        proxies.append(proxy)
+    scene["proxies"] = proxies
+    return scene
+
+
+def unitConversion(linearUnit):
+    """
+     Returns the factor to centimeters of the linear unit and the -world
+     argument of the procedural data.
+    """
+    factor = xgenProxyProcedural.unitFactor(linearUnit)
+    return _f32(float(factor)), xgenProxyProcedural.worldArgument(factor)
+
+
+def dsoPath(scene):
+    if scene.get("dso"):
+        return scene["dso"]
+    name = "xgen_procedural.dll" if os.name == "nt" else "xgen_procedural.so"
+    return os.environ.get("MTOA_PATH", "") + "/procedurals/" + name
+
+
+def motionOffsets(motionBlur):
+    """
+     Returns the motion sample times of the Arnold render options,
+     relative to the frame, or an empty list when motion blur is off.
+    """
+    if not motionBlur.get("enable"):
+        return []
+    steps = int(motionBlur.get("steps", 2))
+    length = float(motionBlur.get("length", 1.0))
+    rangeType = int(motionBlur.get("rangeType", kRangeCenterOnFrame))
+    if rangeType == kRangeStartOnFrame:
+        start, end = 0.0, length
+    elif rangeType == kRangeEndOnFrame:
+        start, end = -length, 0.0
+    elif rangeType == kRangeCustom:
+        start, end = float(motionBlur.get("start", -0.25)), float(motionBlur.get("end", 0.25))
+    else:
+        start, end = -length / 2.0, length / 2.0
+    if steps < 2:
+        return [start]
+    return [start + (end - start) * i / (steps - 1) for i in range(steps)]
+
+
+def timeSamples(proxy, offsets, motionLength):
+    """
+     Returns the motion time samples of a proxy, relative to the frame,
+     like the translator.
+    """
+    override = int(proxy["motionBlurOverride"])
+    steps = 1
+    factor = 0.5
+    if override == 0:
+        if offsets:
+            steps = len(offsets)
+            factor = motionLength
+    elif override == 1:
+        steps = int(proxy["motionBlurSteps"])
+        factor = _f32(proxy["motionBlurFactor"])
+
+    samples = []
+    if override == 2 or steps <= 1 or factor <= 0.0:
+        return samples
+
+    if override == 0:
+        for i in range(steps):
+            sample = _f32(offsets[i])
+            # xgen does not refresh motion blur changes when starting at 0
+            if i == 0 and sample == 0.0:
+                sample = _f32(0.0001)
+            samples.append(sample)
+    else:
+        stepSize = _f32(factor / (steps - 1))
+        mode = int(proxy["motionBlurMode"])
+        for i in range(steps):
+            if mode == 0:
+                samples.append(_f32(0.0001 + stepSize * i))
+            elif mode == 1:
+                samples.append(_f32(-factor / 2.0 + stepSize * i))
+            else:
+                samples.append(_f32(-factor + stepSize * i))
+    return samples
+
+
+def _inverse(m):
+    """
+     Returns the inverse of the flat 4x4 matrix m.
+    """
+    rows = [list(m[i * 4:i * 4 + 4]) + [1.0 if i == j else 0.0 for j in range(4)] for i in range(4)]
+    for col in range(4):
+        pivot = max(range(col, 4), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            return list(kIdentity)
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        scale = 1.0 / rows[col][col]
+        rows[col] = [value * scale for value in rows[col]]
+        for r in range(4):
+            if r != col and rows[r][col] != 0.0:
+                factor = rows[r][col]
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col])]
+    return [rows[i][4 + j] for i in range(4) for j in range(4)]
+
+
+def _cameraInverse(camera, frame):
+    inverse = camera["_inverses"].get(frame)
+    if inverse is None:
+        inverse = _inverse(_matrixAt(camera, camera["_samples"], frame))
+        camera["_inverses"][frame] = inverse
+    return inverse
+
+
+def cameraParams(camera, frame):
+    """
+     Returns the culling camera parameters passed to the procedural, with
+     the mix of the matrix and its inverse the procedural expects for the
+     irRenderCamXform string ("inverseMatrix") and the real inverse for
+     the typed irRenderCameraXform ("inverse"). They are computed once per
+     camera and frame.
+    """
+    if camera is None:
+        return {"ortho": False, "position": [0.0] * 3, "fov": 0.0, "inverseMatrix": [0.0] * 16,
+                "inverse": [0.0] * 16, "ratio": 1.0}
+    params = camera["_params"].get(frame)
+    if params is None:
+        params = _cameraParams(camera, frame)
+        camera["_params"][frame] = params
+    return params
+
+
+def _cameraParams(camera, frame):
+    tm = _matrixAt(camera, camera["_samples"], frame)
+    tmi = _cameraInverse(camera, frame)
+    return {
+        # the translator always reports perspective cameras
+        "ortho": False,
+        "position": [_f32(tm[12]), _f32(tm[13]), _f32(tm[14])],
+        "fov": _f32(math.degrees(camera.get("horizontalFieldOfView", 0.0))),
+        "inverseMatrix": [_f32(v) for v in (tm[0], tm[4], tm[8], tm[3],
+                                            tm[1], tm[5], tm[9], tm[7],
+                                            tm[2], tm[6], tm[10], tm[11],
+                                            tmi[12], tmi[13], tmi[14], tm[15])],
+        "inverse": [_f32(v) for v in tmi],
+        "ratio": _f32(camera.get("aspectRatio", 1.0)),
+    }
+
+
+def _multiply(a, b):
+    """
+     Returns the product of two 4x4 matrices of 16 floats, row by row.
+    """
+    return [sum(a[i * 4 + k] * b[k * 4 + j] for k in range(4)) for i in range(4) for j in range(4)]
+
+
+def isOutsideFrustum(bounds, toCamera, tanX, tanY):
+    """
+     Returns True when the box lies entirely on the outer side of one of
+     the planes of a camera looking down -Z, given the matrix from the
+     space of the box to the camera space (the world matrix of the box
+     times the inverse world matrix of the camera).
+    """
+    outside = [0] * 5
+    m = toCamera
+    for corner in range(8):
+        x = bounds[3] if corner & 1 else bounds[0]
+        y = bounds[4] if corner & 2 else bounds[1]
+        z = bounds[5] if corner & 4 else bounds[2]
+        px = x * m[0] + y * m[4] + z * m[8] + m[12]
+        py = x * m[1] + y * m[5] + z * m[9] + m[13]
+        depth = -(x * m[2] + y * m[6] + z * m[10] + m[14])
+        if depth <= 0.0:
+            outside[0] += 1
+        if px < -depth * tanX:
+            outside[1] += 1
+        if px > depth * tanX:
+            outside[2] += 1
+        if py < -depth * tanY:
+            outside[3] += 1
+        if py > depth * tanY:
+            outside[4] += 1
+    return 8 in outside
+
+
+def sampleFrames(frame, samples):
+    """
+     Returns the frames the groom is tested at: those of the motion time
+     samples, or the frame alone without motion blur.
+    """
+    return [frame + sample for sample in samples] or [frame]
+
+
+def isCulled(proxy, camera, bounds, margin, frames):
+    """
+     Returns True when the bounds, in scene units and in the object space
+     of the proxy, are outside the camera at every one of the frames (see
+     sampleFrames()), the proxy and the camera being where they are at
+     each of them.
+    """
+    if camera.get("ortho"):
+        return False
+    tanX = math.tan(camera.get("horizontalFieldOfView", 0.0) * 0.5) * (1.0 + margin)
+    tanY = math.tan(camera.get("verticalFieldOfView", 0.0) * 0.5) * (1.0 + margin)
+    for frame in frames:
+        toCamera = _multiply(_matrixAt(proxy, proxy["_samples"], frame), _cameraInverse(camera, frame))
+        if not isOutsideFrustum(bounds, toCamera, tanX, tanY):
+            return False
+    return True
+
+
+def _deferLoad(loadMode):
+    if loadMode == 1:
+        return False
+    if loadMode == 2:
+        return True
+    try:
+        return int(os.environ.get(xgenProxyProcedural.kDeferLoadEnv, "0")) != 0
+    except ValueError:
+        return False
+
+
+def proxyBounds(proxy, frames, fps, xgenPath="", palette="", description=""):
+    """
+     Returns the padded bounds of the groom of a proxy in scene units,
+     enclosing it at all the frames (see sampleFrames()), or None when
+     they are unknown at any of them. The padding is the groom length of
+     the description like in the xgenProxy node, see its
+     descriptionPadding attribute.
+    """
+    if proxy.get("bounds"):
+        return tuple(proxy["bounds"])
+    bounds = None
+    for frame in frames:
+        alembicPath = xgenProxyPaths.resolvePath(proxy["alembicFilePath"], frame)
+        patches = xgenProxyBounds.resolvePatches(alembicPath, proxy["patch"])
+        frameBounds = xgenProxyBounds.unionBounds(alembicPath, patches, frame, fps)
+        if frameBounds is None:
+            return None
+        if bounds is None:
+            bounds = frameBounds
+        else:
+            bounds = tuple([min(a, b) for a, b in zip(bounds[:3], frameBounds[:3])] +
+                           [max(a, b) for a, b in zip(bounds[3:], frameBounds[3:])])
+    padding = proxy["groomPadding"]
+    if proxy["descriptionPadding"]:
+        length = xgenProxyCollection.groomLength(xgenPath, palette, description)
+        if length is not None:
+            padding = length
+    return xgenProxyBounds.padBounds(bounds, padding)
+
+
+def resolveRecord(scene, proxy, frame, timings=None):
+    """
+     Returns the export record of a proxy at frame: everything the
+     translator sets on its procedural node. timings, when given, gets the
+     seconds spent on the bounds and on the rest added.
+    """
+    start = time.time()
+    fps = scene["fps"]
+    factor, unitMatrix = scene["_unit"]
+
+    xgenPath = xgenProxyPaths.resolvePath(proxy["xgenFilePath"], frame)
+    alembicPath = xgenProxyPaths.resolvePath(proxy["alembicFilePath"], frame)
+    palette, description = xgenProxyCollection.resolveNames(xgenPath, proxy["palette"], proxy["description"])
+    patches = xgenProxyBounds.resolvePatches(alembicPath, proxy["patch"])
+    status = xgenProxyCollection.validate(xgenPath, palette, description, patches)
+
+    offsets = scene["_offsets"]
+    motionLength = _f32(float(scene["motionBlur"].get("length", 1.0)))
+    samples = timeSamples(proxy, offsets, motionLength)
+    frames = sampleFrames(frame, samples)
+
+    boundsStart = time.time()
+    bounds = proxyBounds(proxy, frames, fps, xgenPath, palette, description)
+    boundsTime = time.time() - boundsStart
+
+    hasBounds = bounds is not None
+    if hasBounds:
+        box = [_f32(_f32(value) * factor) for value in bounds]
+    else:
+        size = _f32(float(xgenProxyProcedural.kUnknownBoundsSize) * factor)
+        box = [-size, -size, -size, size, size, size]
+
+    camera = scene["cameras"].get(proxy["cullingCamera"]) if proxy["cullingCamera"] else None
+    typed = bool(proxy["aiTypedUserData"])
+
+    # one procedural per patch, the xgen procedural renders a single one
+    unresolved = False
+    if not patches:
+        # an empty attribute leaves the patch to the procedural, patterns
+        # matching nothing leave nothing to render
+        unresolved = bool(proxy["patch"].strip(xgenProxyProcedural.kPatchSeparators))
+        if unresolved and not status:
+            status = "patch '%s' matches no patch of %s" % (proxy["patch"], alembicPath)
+        patches = [""]
+
+    prefix = xgenProxyProcedural.dataPrefix(proxy["xgenDebugLogLevel"], proxy["xgenWarningLogLevel"],
+                                            proxy["xgenInfoLogLevel"], frame, xgenPath, palette, alembicPath)
+    suffix = xgenProxyProcedural.dataSuffix(description, _f32(fps), samples, unitMatrix)
+
+    culled = False
+    if proxy["aiFrustumCull"] and hasBounds and camera is not None:
+        culled = isCulled(proxy, camera, bounds, proxy["aiCullingMargin"], frames)
+    hidden = culled or unresolved
+
+    record = {
+        "name": proxy["name"],
+        "dso": scene["_dso"],
+        "patches": patches,
+        "data": [prefix + patch + suffix for patch in patches],
+        "min": box[:3],
+        "max": box[3:],
+        "hasBounds": hasBounds,
+        "loadAtInit": not (_deferLoad(int(proxy["aiLoadMode"])) and hasBounds) and not hidden,
+        "culled": culled,
+        "hidden": hidden,
+        "matrix": list(_matrixAt(proxy, proxy["_samples"], frame)),
+        "timeSamples": samples,
+        "typedUserData": typed,
+        "camera": cameraParams(camera, frame),
+        "renderMode": int(proxy["renderMode"]),
+        "aiMode": int(proxy["aiMode"]),
+        "aiMinPixelWidth": _f32(proxy["aiMinPixelWidth"]),
+        "shader": proxy["shader"],
+        "namesStatus": status,
+    }
+    if timings is not None:
+        timings["bounds"] += boundsTime
+        timings["resolve"] += time.time() - start - boundsTime
+    return record
+
+
+def _staticKey(entry):
+    """
+     Returns the key of the fields of a proxy or camera, and of its matrix
+     when it is not animated.
+    """
+    return xgenProxyDiskCache.keyFileName(sorted((name, value) for name, value in entry.items()
+                                                 if not name.startswith("_") and name != "matrices"))
+
+
+def _cameraKey(camera, frame, frames):
+    key = camera["_keys"].get((frame, tuple(frames)))
+    if key is None:
+        key = xgenProxyDiskCache.keyFileName(camera["_key"], [_matrixAt(camera, camera["_samples"], sampleFrame)
+                                                              for sampleFrame in [frame] + frames])
+        camera["_keys"][(frame, tuple(frames))] = key
+    return key
+
+
+def recordKey(scene, proxy, frame):
+    """
+     Returns the key of everything the record of a proxy at frame is
+     resolved from, including the versions of the files it reads.
+    """
+    xgenPath = xgenProxyPaths.resolvePath(proxy["xgenFilePath"], frame)
+    motionLength = _f32(float(scene["motionBlur"].get("length", 1.0)))
+    frames = sampleFrames(frame, timeSamples(proxy, scene["_offsets"], motionLength))
+    # the bounds enclose the groom at every motion sample
+    alembicPaths = sorted(set(xgenProxyPaths.resolvePath(proxy["alembicFilePath"], f) for f in [frame] + frames))
+    camera = scene["cameras"].get(proxy["cullingCamera"]) if proxy["cullingCamera"] else None
+    return xgenProxyDiskCache.keyFileName(
+        scene["_key"], proxy["_key"], frameKey(frame),
+        _matrixAt(proxy, proxy["_samples"], frame) if proxy["_samples"] else None,
+        _cameraKey(camera, frame, frames) if camera is not None else None,
+        xgenPath, xgenProxyDiskCache.fileStamp(xgenPath),
+        [(path, xgenProxyDiskCache.fileStamp(path)) for path in alembicPaths])
+
+
+def resolveRecords(scene, frame, timings, useCache=True):
+    """
+     Returns the (content hash, record) of every proxy at frame. With
+     useCache, records are read from the record cache, the missing ones
+     are resolved and added to it.
+    """
+    proxies = scene["proxies"]
+    cached = {}
+    if useCache:
+        start = time.time()
+        keys = [recordKey(scene, proxy, frame) for proxy in proxies]
+        cached = xgenProxyRecordCache.lookup(keys)
+        timings["cache"] += time.time() - start
+    else:
+        keys = [None] * len(proxies)
+
+    result = []
+    missing = []
+    for key, proxy in zip(keys, proxies):
+        entry = cached.get(key)
+        if entry is None:
+            record = resolveRecord(scene, proxy, frame, timings)
+            entry = (xgenProxyRecordCache.contentHash(record), record)
+            missing.append((key, entry[0], record))
+        result.append(entry)
+
+    if useCache:
+        start = time.time()
+        xgenProxyRecordCache.store(missing)
+        timings["cache"] += time.time() - start
+    return result
+
+
+def _quote(value):
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _float(value):
+    """
+     Returns the shortest text Arnold reads back as the single precision
+     value.
+    """
+    value = _f32(value)
+    for digits in (6, 7, 8):
+        text = "%.*g" % (digits, value)
+        if _f32(float(text)) == value:
+            return text
+    return "%.9g" % value
+
+
+def _floats(values):
+    return " ".join(_float(value) for value in values)
+
+
+def assNode(record):
+    """
+     Returns the .ass text of the procedural nodes of an export record, one
+     per patch.
+    """
+    nodes = []
+    for i, (patch, data) in enumerate(zip(record["patches"], record["data"])):
+        name = xgenProxyProcedural.patchNodeName(record["name"], i, patch)
+        nodes.append(_assProcedural(record, name, data))
+    return "\n".join(nodes)
+
+
+def _declared(name, value):
+    """
+     Returns the .ass lines declaring the user parameter name, as in
+     xgenProxyProcedural.kParameters, and setting it to value.
+    """
+    return [" declare %s %s" % (name, xgenProxyProcedural.kParameterDeclarations[name]), " %s %s" % (name, value)]
+
+
+def _assProcedural(record, name, data):
+    lines = [
+        "procedural",
+        "{",
+        " name " + _quote(name),
+        " dso " + _quote(record["dso"]),
+        " data " + _quote(data),
+        " min " + _floats(record["min"]),
+        " max " + _floats(record["max"]),
+        " load_at_init " + ("on" if record["loadAtInit"] else "off"),
+        " matrix",
+    ]
+    matrix = record["matrix"]
+    lines.extend("  " + _floats(matrix[i * 4:i * 4 + 4]) for i in range(4))
+    if record["hidden"]:
+        lines.append(" visibility 0")
+    if record["shader"]:
+        lines.append(" shader " + _quote(record["shader"]))
+        lines.extend(_declared("xgen_shader", "1 1 NODE " + _quote(record["shader"])))
+
+    samples = record["timeSamples"]
+    if samples:
+        lines.extend(_declared("time_samples", "%d 1 FLOAT %s" % (len(samples), _floats(samples))))
+
+    # the strings the xgen procedural reads, and the same values typed for
+    # procedurals reading those
+    camera = record["camera"]
+    position = ",".join("%f" % value for value in camera["position"])
+    lines.extend(_declared("irRenderCam", _quote(("true," if camera["ortho"] else "false,") + position)))
+    lines.extend(_declared("irRenderCamFOV", _quote("%f" % camera["fov"])))
+    lines.extend(_declared("irRenderCamXform", _quote(",".join("%f" % value for value in camera["inverseMatrix"]))))
+    lines.extend(_declared("irRenderCamRatio", _quote("%f" % camera["ratio"])))
+    if record["typedUserData"]:
+        lines.extend(_declared("irRenderCameraOrtho", "on" if camera["ortho"] else "off"))
+        lines.extend(_declared("irRenderCameraPos", "3 1 FLOAT " + _floats(camera["position"])))
+        lines.extend(_declared("irRenderCameraFOV", _float(camera["fov"])))
+        lines.extend(_declared("irRenderCameraXform", _floats(camera["inverse"])))
+        lines.extend(_declared("irRenderCameraRatio", _float(camera["ratio"])))
+
+    lines.extend(_declared("xgen_renderMethod", _quote("%i" % record["renderMode"])))
+    lines.extend(_declared("ai_mode", "%d" % record["aiMode"]))
+    lines.extend(_declared("ai_min_pixel_width", _float(record["aiMinPixelWidth"])))
+    lines.extend(["}", ""])
+    return "\n".join(lines)
+
+
+def frameText(records, frame, format):
+    if format == "json":
+        return json.dumps({"frame": frame, "procedurals": records}, indent=1, sort_keys=True)
+    header = "### xgenProxy procedurals, frame %g\n\n" % frame
+    return header + "\n".join(assNode(record) for record in records)
+
+
+def outputPath(outputDir, prefix, frame, format):
+    if frame == int(frame):
+        name = "%s.%04d.%s" % (prefix, int(frame), format)
+    else:
+        name = "%s.%08.3f.%s" % (prefix, frame, format)
+    return os.path.join(outputDir, name)
+
+
+def _writeText(path, text):
+    """
+     Atomically replaces path with text, so a retried task never leaves a
+     partial frame behind.
+    """
+    handle, tmpPath = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(handle, "w") as f:
+            f.write(text)
+        if os.name == "nt" and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmpPath, path)
+    except (IOError, OSError):
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+
+
+def _frameHash(digests, format):
+    return xgenProxyDiskCache.keyFileName(format, digests)
+
+
+def exportFrame(scene, frame, outputDir, prefix, format, useCache=True, previousHash=None):
+    """
+     Writes the procedurals of all the proxies at frame, unless the file
+     written by the export of previousHash is there with the same records.
+     Returns the path with the record hashes, counts and timings of the
+     frame.
+    """
+    timings = dict((stage, 0.0) for stage in kStages)
+    xgenProxyRecordCache.stats(reset=True)
+    pairs = resolveRecords(scene, frame, timings, useCache)
+    cacheStats = xgenProxyRecordCache.stats(reset=True)
+    # bounds read for the frame, appended once per Alembic file
+    xgenProxyDiskCache.flushWrites()
+    digests = [digest for digest, record in pairs]
+    records = [record for digest, record in pairs]
+    frameHash = _frameHash(digests, format)
+
+    start = time.time()
+    path = outputPath(outputDir, prefix, frame, format)
+    skipped = frameHash == previousHash and os.path.exists(path)
+    if not skipped:
+        _writeText(path, frameText(records, frame, format))
+    timings["write"] = time.time() - start
+
+    warnings = set("%s: %s" % (record["name"], record["namesStatus"]) for record in records if record["namesStatus"])
+    return {
+        "frame": frame,
+        "path": path,
+        "proxies": len(records),
+        "culled": sum(1 for record in records if record["culled"]),
+        "timings": timings,
+        "warnings": sorted(warnings),
+        "hash": frameHash,
+        "records": dict((record["name"], digest) for digest, record in pairs),
+        "skipped": skipped,
+        "cacheHits": cacheStats["hits"],
+        "cacheMisses": cacheStats["misses"],
+    }
+
+
+# Scene of the worker processes, loaded once by _initWorker().
+_worker = {"scene": None, "load": 0.0}
+
+
+def _initWorker(scenePath):
+    start = time.time()
+    _worker["scene"] = readScene(scenePath)
+    _worker["load"] = time.time() - start
+
+
+def _exportJob(job):
+    result = exportFrame(_worker["scene"], *job)
+    # the load time is reported by the first frame of every worker
+    result["timings"]["load"] = _worker["load"]
+    _worker["load"] = 0.0
+    return result
+
+
+def manifestPath(outputDir, prefix):
+    return os.path.join(outputDir, prefix + ".manifest.json")
+
+
+def readManifest(path):
+    """
+     Returns the manifest written by an export, or an empty one when there
+     is none.
+    """
+    manifest = xgenProxyDiskCache.readJson(path)
+    if not manifest or manifest.get("version") != kManifestVersion:
+        return {"version": kManifestVersion, "frames": {}}
+    return manifest
+
+
+def changedProxies(previous, current):
+    """
+     Returns the names of the proxies whose record differs between two
+     manifests at a frame they both list, or that only one of them has.
+    """
+    changed = set()
+    for key, frame in current["frames"].items():
+        before = previous["frames"].get(key)
+        if before is None:
+            continue
+        records = frame["records"]
+        beforeRecords = before["records"]
+        changed.update(name for name in records if records[name] != beforeRecords.get(name))
+        changed.update(name for name in beforeRecords if name not in records)
+    return sorted(changed)
+
+
+def exportFrames(scenePath, frames, outputDir, format="ass", processes=None, prefix=None, useCache=True):
+    """
+     Writes one file of procedurals per frame to outputDir, spreading the
+     frames over processes worker processes (all cores by default, 1 runs
+     in this process), and updates the manifest of outputDir. Returns the
+     statistics of the export, see report().
+    """
+    if format not in kFormats:
+        raise ValueError("unknown format %s, expected one of %s" % (format, ", ".join(kFormats)))
+    if not os.path.isdir(outputDir):
+        os.makedirs(outputDir)
+    prefix = prefix or os.path.splitext(os.path.basename(scenePath))[0]
+    processes = processes or multiprocessing.cpu_count()
+    processes = max(min(processes, len(frames)), 1)
+
+    start = time.time()
+    manifest = readManifest(manifestPath(outputDir, prefix))
+    if manifest.get("format") != format:
+        manifest = {"version": kManifestVersion, "format": format, "frames": {}}
+    jobs = [(frame, outputDir, prefix, format, useCache, manifest["frames"].get(frameKey(frame), {}).get("hash"))
+            for frame in frames]
+    if processes == 1:
+        _initWorker(scenePath)
+        results = [_exportJob(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(processes, _initWorker, (scenePath,))
+        try:
+            results = list(pool.imap_unordered(_exportJob, jobs))
+        finally:
+            pool.close()
+            pool.join()
+
+    for result in results:
+        manifest["frames"][frameKey(result["frame"])] = {
+            "file": os.path.basename(result["path"]),
+            "hash": result["hash"],
+            "records": result["records"],
+        }
+    xgenProxyDiskCache.writeJson(manifestPath(outputDir, prefix), manifest)
+    evicted = xgenProxyRecordCache.trim() if useCache else 0
+    wall = time.time() - start
+
+    timings = dict((stage, sum(result["timings"][stage] for result in results)) for stage in kStages)
+    warnings = set()
+    for result in results:
+        warnings.update(result["warnings"])
+    return {
+        "frames": len(results),
+        "proxies": results[0]["proxies"] if results else 0,
+        "culled": sum(result["culled"] for result in results),
+        "processes": processes,
+        "wall": wall,
+        "framesPerSecond": len(results) / wall if wall > 0.0 else 0.0,
+        "timings": timings,
+        "paths": sorted(result["path"] for result in results),
+        "warnings": sorted(warnings),
+        "skipped": sum(1 for result in results if result["skipped"]),
+        "cacheHits": sum(result["cacheHits"] for result in results),
+        "cacheMisses": sum(result["cacheMisses"] for result in results),
+        "evicted": evicted,
+        "manifest": manifest,
+    }
+
+
+def report(stats):
+    """
+     Returns the summary of exportFrames() statistics as lines of text.
+     Stage timings are summed over the worker processes.
+    """
+    lines = ["%d frames of %d proxies in %.3f s with %d processes, %.2f frames/s, %d procedurals culled" % (
+        stats["frames"], stats["proxies"], stats["wall"], stats["processes"], stats["framesPerSecond"],
+        stats["culled"])]
+    lines.append("    record cache %d hits %d misses, %d records evicted, %d unchanged frames not written" % (
+        stats["cacheHits"], stats["cacheMisses"], stats["evicted"], stats["skipped"]))
+    for stage in kStages:
+        lines.append("    %-8s %10.3f s %10.4f ms per frame" % (
+            stage, stats["timings"][stage], stats["timings"][stage] * 1000.0 / max(stats["frames"], 1)))
+    warnings = stats["warnings"]
+    for warning in warnings[:kReportedWarnings]:
+        lines.append("warning: " + warning)
+    if len(warnings) > kReportedWarnings:
+        lines.append("... and %d more warnings" % (len(warnings) - kReportedWarnings))
+    return lines
+
+
+def standInCollection():
+    """
+     Returns the text of the xgen collection file of the stand-in scenes:
+     the palettes and descriptions they use, without any patch section, so
+     that any patch name is valid.
+    """
+    lines = ["# XGen Collection File", "#", "FileVersion 18", ""]
+    for palette in range(kStandInPalettes):
+        lines.extend(["Palette", "\tname\t\t\tpalette%d" % palette, "endAttrs", ""])
+        for description in range(kStandInDescriptions):
+            lines.extend(["Description", "\tname\t\t\tdescription%d" % description, "endAttrs", ""])
+    return "\n".join(lines)
+
+
+def standInScene(proxyCount, xgenPath, cameraCount=1, seed=0):
+    """
+     Returns a scene description of proxyCount proxies with fixed bounds
+     laid out on a grid, a third of them animated and culled by one of
+     cameraCount cameras, for testing without Maya. xgenPath is the path of
+     the collection file written with standInCollection().
+    """
+    rng = random.Random(seed)
+    side = int(math.ceil(math.sqrt(max(proxyCount, 1))))
+    cameras = {}
+    for i in range(cameraCount):
+        matrix = list(kIdentity)
+        matrix[12:15] = [i * 10.0, 5.0, side * 4.0]
+        cameras["|camera%d|cameraShape%d" % (i + 1, i + 1)] = {
+            "ortho": False,
+            "horizontalFieldOfView": math.radians(54.43),
+            "verticalFieldOfView": math.radians(31.42),
+            "aspectRatio": 1.7778,
+            "matrix": matrix,
+        }
+    names = sorted(cameras)
+
+    proxies = []
+    for i in range(proxyCount):
+        x = (i % side) * 4.0
+        z = (i // side) * 4.0
+        proxy = {
+            "name": "|xgenProxy%d|xgenProxyShape%d" % (i + 1, i + 1),
+            "xgenFilePath": xgenPath,
+            "alembicFilePath": "/stand-in/patches.$F4.abc",
+            "palette": "palette%d" % (i % kStandInPalettes),
+            "description": "description%d" % (i % kStandInDescriptions),
+            "patch": "patch%d" % i,
+            "bounds": [x - 1.0, -0.5, z - 1.0, x + 1.0, rng.uniform(1.0, 3.0), z + 1.0],
+            "shader": "hairShader%d" % (i % 5),
+            "motionBlurOverride": i % 3,
+            "aiFrustumCull": bool(names) and i % 3 == 0,
+            "cullingCamera": names[i % len(names)] if names else "",
+            "aiTypedUserData": i % 2 == 0,
+        }
+        if i % 3 == 1:
+            matrices = {}
+            for frame in range(1, 25):
+                matrix = list(kIdentity)
+                matrix[13] = frame * 0.1
+                matrices[frameKey(frame)] = matrix
+            proxy["matrices"] = matrices
+        proxies.append(proxy)
+
+    return {
+        "version": kSceneVersion,
+        "fps": 24.0,
+        "linearUnit": "cm",
+        "frames": {"start": 1.0, "end": 24.0, "step": 1.0},
+        "motionBlur": {"enable": True, "steps": 3, "rangeType": kRangeCenterOnFrame, "length": 0.5},
+        "cameras": cameras,
+        "proxies": proxies,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exports the xgen procedurals of an xgenProxy scene "
+                                                 "description for a frame range.")
+    parser.add_argument("scene", help="scene description written by xgenProxySceneSnapshot")
+    parser.add_argument("-s", "--start", type=float, help="first frame, the scene range by default")
+    parser.add_argument("-e", "--end", type=float, help="last frame, the scene range by default")
+    parser.add_argument("-b", "--step", type=float, help="frame step, the scene step by default")
+    parser.add_argument("-o", "--output", default=".", help="output directory")
+    parser.add_argument("-f", "--format", choices=kFormats, default="ass", help="output format")
+    parser.add_argument("-p", "--prefix", help="output file name prefix, the scene name by default")
+    parser.add_argument("-j", "--processes", type=int, default=0, help="worker processes, all cores by default")
+    parser.add_argument("--no-cache", action="store_true", help="resolve every record again")
+    parser.add_argument("--changes", metavar="MANIFEST",
+                        help="list the proxies that changed since the export of this manifest")
+    parser.add_argument("--stand-in", type=int, metavar="COUNT",
+                        help="write a stand-in scene of COUNT proxies to the scene path, and its "
+                             "collection file next to it, first")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.stand_in is not None:
+            xgenPath = os.path.splitext(os.path.abspath(args.scene))[0] + ".xgen"
+            with open(xgenPath, "w") as f:
+                f.write(standInCollection())
+            with open(args.scene, "w") as f:
+                json.dump(standInScene(args.stand_in, xgenPath), f)
+        scene = readScene(args.scene)
+    except (SceneError, IOError, OSError) as e:
+        sys.stderr.write("xgenProxyBatchExport: %s\n" % e)
+        return 1
+
+    frames = scene.get("frames", {})
+    start = args.start if args.start is not None else frames.get("start", 1.0)
+    end = args.end if args.end is not None else frames.get("end", start)
+    step = args.step if args.step is not None else frames.get("step", 1.0)
+
+    stats = exportFrames(args.scene, frameRange(start, end, step), args.output, args.format,
+                         args.processes, args.prefix, not args.no_cache)
+    for line in report(stats):
+        print(line)
+    if args.changes:
+        changed = changedProxies(readManifest(args.changes), stats["manifest"])
+        print("%d proxies changed since %s" % (len(changed), args.changes))
+        for name in changed:
+            print("    " + name)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
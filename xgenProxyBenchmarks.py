@@ -0,0 +1,881 @@
+###############################################################################
+##
+## xgenProxyBenchmarks.py
+##
+## Description:
+##    Timing helpers for the xgenProxy shape. They are meant to be run from
+##    an interactive Maya session (the viewport ones need a model panel):
+##
+##       import xgenProxyBenchmarks
+##       xgenProxyBenchmarks.benchmarkDraw(5000)
+##
+##    Unless they take a scene to open, benchmarks start from a new, empty
+##    scene.
+##
+################################################################################
+
+import maya.OpenMaya as OpenMaya
+import maya.OpenMayaUI as OpenMayaUI
+import maya.cmds as cmds
+
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import xgenProxyBatchExport
+import xgenProxySceneSnapshot
+
+kPluginName = "xgenProxy.py"
+
+kLegacyRenderer = "base_OpenGL_Renderer"
+kViewport2Renderer = "vp2Renderer"
+
+# "00:01:23   1024MB   | message"
+kArnoldLogLine = re.compile(r"^\s*(\d+):(\d+):(\d+)\s+(\d+)MB")
+
+# export summary of the translator, see ReportExportStats()
+kStringStatsLine = re.compile(r"(\d+) xgen procedurals, (\d+) strings of (\d+) bytes set, "
+                              r"data buffer grown (\d+) times")
+kArnoldOptions = "defaultArnoldRenderOptions"
+
+
+def printResult(label, total, count):
+    print "%-32s %10.3f s total %10.4f ms per item" % (label, total, (total * 1000.0) / max(count, 1))
+
+
+def pluginModule():
+    """
+     Returns the module Maya imported the xgenProxy plug-in as.
+    """
+    return sys.modules[kPluginName.split(".")[0]]
+
+
+def newScene():
+    cmds.file(new=True, force=True)
+    if not cmds.pluginInfo(kPluginName, query=True, loaded=True):
+        cmds.loadPlugin(kPluginName)
+
+
+def createProxies(count, shapeType=0):
+    """
+     Creates count proxies laid out on a square grid in the XZ plane and
+     returns the names of the shapes.
+    """
+    side = int(math.ceil(math.sqrt(count)))
+    shapes = []
+    for i in range(count):
+        shape = cmds.createNode("xgenProxy")
+        cmds.setAttr(shape + ".shapeType", shapeType)
+        transform = cmds.listRelatives(shape, parent=True)[0]
+        cmds.setAttr(transform + ".translate", (i % side) * 3.0, 0.0, (i // side) * 3.0)
+        shapes.append(shape)
+    return shapes
+
+
+def modelPanel():
+    for panel in cmds.getPanel(visiblePanels=True) or []:
+        if cmds.getPanel(typeOf=panel) == "modelPanel":
+            return panel
+    raise RuntimeError("No visible model panel to benchmark in")
+
+
+def timeRefresh(panel, renderer, refreshCount):
+    cmds.modelEditor(panel, edit=True, rendererName=renderer)
+    cmds.refresh(force=True)
+
+    start = time.time()
+    for i in range(refreshCount):
+        cmds.refresh(force=True, currentView=True)
+    return time.time() - start
+
+
+def benchmarkDraw(proxyCount=5000, refreshCount=20, shapeTypes=(0, 1, 2)):
+    """
+     Compares the per proxy draw time of the legacy draw() path against
+     the Viewport 2.0 geometry override, for every shape type.
+    """
+    panel = modelPanel()
+    previousRenderer = cmds.modelEditor(panel, query=True, rendererName=True)
+    try:
+        for shapeType in shapeTypes:
+            newScene()
+            createProxies(proxyCount, shapeType)
+            cmds.viewFit(all=True)
+
+            drawCount = proxyCount * refreshCount
+            total = timeRefresh(panel, kLegacyRenderer, refreshCount)
+            printResult("shapeType %d legacy draw()" % shapeType, total, drawCount)
+            total = timeRefresh(panel, kViewport2Renderer, refreshCount)
+            printResult("shapeType %d Viewport 2.0" % shapeType, total, drawCount)
+    finally:
+        cmds.modelEditor(panel, edit=True, rendererName=previousRenderer)
+
+
+def benchmarkGeometryCache(proxyCount=10000, refreshCount=10):
+    """
+     Reports how many plugs xgenProxy.geometry() pulls while refreshing the
+     legacy viewport. With the geometry cache only the first refresh and
+     the refresh following an attribute change should pull anything.
+    """
+    panel = modelPanel()
+    previousRenderer = cmds.modelEditor(panel, query=True, rendererName=True)
+    try:
+        newScene()
+        shapes = createProxies(proxyCount)
+        cmds.viewFit(all=True)
+
+        plugin = pluginModule()
+        plugin.geometryPlugReads(reset=True)
+        total = timeRefresh(panel, kLegacyRenderer, refreshCount)
+        printResult("%d refreshes" % refreshCount, total, proxyCount * refreshCount)
+        print "plug reads: %d (%.2f per proxy per refresh)" % (
+            plugin.geometryPlugReads(), plugin.geometryPlugReads() / float(proxyCount * refreshCount))
+
+        for shape in shapes:
+            cmds.setAttr(shape + ".radius", 2.0)
+        plugin.geometryPlugReads(reset=True)
+        timeRefresh(panel, kLegacyRenderer, refreshCount)
+        print "plug reads after editing radius: %d" % plugin.geometryPlugReads()
+    finally:
+        cmds.modelEditor(panel, edit=True, rendererName=previousRenderer)
+
+
+def kickStats(assFile, kickArgs=()):
+    """
+     Renders assFile with kick and returns (time to first bucket, peak
+     memory in MB) parsed from the Arnold log. Arnold prefixes every log
+     line with the elapsed time and the current memory use.
+    """
+    kick = os.path.join(os.environ["MTOA_PATH"], "bin", "kick")
+    command = [kick, "-i", assFile, "-dw", "-dp", "-v", "2", "-o", os.devnull] + list(kickArgs)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    log = process.communicate()[0]
+
+    firstBucket = None
+    peakMemory = 0
+    for line in log.splitlines():
+        match = kArnoldLogLine.match(line)
+        if not match:
+            continue
+        hours, minutes, seconds, memory = [int(v) for v in match.groups()]
+        peakMemory = max(peakMemory, memory)
+        if firstBucket is None and "% done" in line:
+            firstBucket = hours * 3600 + minutes * 60 + seconds
+    return firstBucket, peakMemory
+
+
+def benchmarkDeferredLoading(scene=None, outputDir=None):
+    """
+     Exports scene (or the current scene) once with every proxy loaded at
+     init and once with every proxy deferred, renders both with kick and
+     reports time to first bucket and peak memory.
+    """
+    if scene:
+        cmds.file(scene, open=True, force=True)
+    outputDir = outputDir or tempfile.mkdtemp(prefix="xgenProxyDeferred")
+
+    shapes = cmds.ls(type="xgenProxy") or []
+    previous = dict((shape, cmds.getAttr(shape + ".aiLoadMode")) for shape in shapes)
+    try:
+        for mode, label in ((1, "load at init"), (2, "deferred")):
+            for shape in shapes:
+                cmds.setAttr(shape + ".aiLoadMode", mode)
+            assFile = os.path.join(outputDir, "deferred_%d.ass" % mode)
+            cmds.arnoldExportAss(filename=assFile)
+            firstBucket, peakMemory = kickStats(assFile)
+            print "%-16s first bucket %5s s   peak memory %8d MB" % (label, firstBucket, peakMemory)
+    finally:
+        for shape, mode in previous.items():
+            cmds.setAttr(shape + ".aiLoadMode", mode)
+
+
+def benchmarkExport(proxyCount=1000, exportCount=3, outputDir=None):
+    """
+     Times exporting proxyCount proxies to an .ass file and reports the
+     cost per exported node. Run it against two builds of the translator
+     to compare them.
+    """
+    if not cmds.pluginInfo("mtoa", query=True, loaded=True):
+        cmds.loadPlugin("mtoa")
+    outputDir = outputDir or tempfile.mkdtemp(prefix="xgenProxyExport")
+
+    newScene()
+    createProxies(proxyCount)
+
+    assFile = os.path.join(outputDir, "export.ass")
+    # the first export also pays for loading the translator
+    cmds.arnoldExportAss(filename=assFile)
+
+    start = time.time()
+    for i in range(exportCount):
+        cmds.arnoldExportAss(filename=assFile)
+    total = time.time() - start
+    printResult("export %d proxies" % proxyCount, total, proxyCount * exportCount)
+    return total / (proxyCount * exportCount)
+
+
+def exportStringStats(logFile):
+    """
+     Returns the (procedurals, strings, bytes, data buffer growths) the
+     translator reported in an Arnold log file, summed over its export
+     summaries.
+    """
+    totals = [0, 0, 0, 0]
+    with open(logFile) as f:
+        for line in f:
+            match = kStringStatsLine.search(line)
+            if match:
+                totals = [total + int(value) for total, value in zip(totals, match.groups())]
+    return totals
+
+
+def benchmarkTypedUserData(proxyCount=10000, exportCount=3):
+    """
+     Compares the per node export cost without and with the typed culling
+     camera user data of aiTypedUserData, and prints the strings the
+     translator sets per node, read from its export summaries in the
+     Arnold log.
+    """
+    for typed in (False, True):
+        newScene()
+        if not cmds.pluginInfo("mtoa", query=True, loaded=True):
+            cmds.loadPlugin("mtoa")
+        shapes = createProxies(proxyCount)
+        camera = cmds.camera()[1]
+        for shape in shapes:
+            cmds.connectAttr(camera + ".message", shape + ".cullingCamera")
+            cmds.setAttr(shape + ".aiTypedUserData", typed)
+
+        outputDir = tempfile.mkdtemp(prefix="xgenProxyTyped")
+        assFile = os.path.join(outputDir, "export.ass")
+        cmds.arnoldExportAss(filename=assFile)
+
+        logFile = os.path.join(outputDir, "export.log")
+        cmds.setAttr(kArnoldOptions + ".log_to_file", True)
+        cmds.setAttr(kArnoldOptions + ".log_filename", logFile, type="string")
+        cmds.setAttr(kArnoldOptions + ".log_verbosity", 2)
+        start = time.time()
+        for i in range(exportCount):
+            cmds.arnoldExportAss(filename=assFile)
+        total = time.time() - start
+        printResult("typed user data %s" % ("on" if typed else "off"), total, proxyCount * exportCount)
+
+        procedurals, strings, stringBytes, growths = exportStringStats(logFile)
+        print "    %.1f strings, %.0f bytes per node, data buffer grown %d times" % (
+            strings / float(max(procedurals, 1)), stringBytes / float(max(procedurals, 1)), growths)
+
+
+def assVisibility(assFile):
+    """
+     Returns the names of the procedurals of an .ass file, mapped to
+     whether they are visible.
+    """
+    visible = {}
+    name = None
+    with open(assFile) as f:
+        for line in f:
+            tokens = line.split()
+            if tokens[:1] == ["procedural"]:
+                name = None
+            elif tokens[:1] == ["name"] and name is None:
+                name = tokens[1].strip('"')
+                visible[name] = True
+            elif tokens[:2] == ["visibility", "0"] and name is not None:
+                visible[name] = False
+    return visible
+
+
+def checkExportCulling(alembicFilePath, patch, outputDir=None):
+    """
+     Exports a proxy translated and rotated far from the origin, in front
+     of its culling camera, and an untransformed one outside of it, and
+     raises an AssertionError unless the translator culls only the second
+     one, also when the proxies move during the shutter. Needs a patch
+     Alembic file for the groom bounds.
+    """
+    if not cmds.pluginInfo("mtoa", query=True, loaded=True):
+        cmds.loadPlugin("mtoa")
+    outputDir = outputDir or tempfile.mkdtemp(prefix="xgenProxyCulling")
+    newScene()
+
+    shapes = createProxies(2)
+    cameraTransform, cameraShape = cmds.camera()
+    for shape in shapes:
+        cmds.setAttr(shape + ".alembicFilePath", alembicFilePath, type="string")
+        cmds.setAttr(shape + ".patch", patch, type="string")
+        cmds.setAttr(shape + ".aiFrustumCull", True)
+        cmds.connectAttr(cameraShape + ".message", shape + ".cullingCamera")
+    assert cmds.getAttr(shapes[0] + ".groomBoundsValid"), "no groom bounds for patch %s" % patch
+
+    # the camera looks down -Z at the first proxy, far from the origin
+    moved = cmds.listRelatives(shapes[0], parent=True)[0]
+    cmds.setAttr(moved + ".translate", 5000.0, 0.0, 0.0)
+    cmds.setAttr(moved + ".rotate", 0.0, 90.0, 30.0)
+    center = cmds.exactWorldBoundingBox(moved)
+    cmds.setAttr(cameraTransform + ".translate", (center[0] + center[3]) * 0.5, (center[1] + center[4]) * 0.5,
+                 center[5] + 100.0)
+    cmds.setAttr(cmds.listRelatives(shapes[1], parent=True)[0] + ".translate", 0.0, 0.0, 0.0)
+
+    for motionBlur in (False, True):
+        cmds.setAttr(kArnoldOptions + ".motion_blur_enable", motionBlur)
+        assFile = os.path.join(outputDir, "culling_%d.ass" % motionBlur)
+        cmds.arnoldExportAss(filename=assFile)
+        visible = assVisibility(assFile)
+        for shape, expected in zip(shapes, (True, False)):
+            found = [value for name, value in visible.items() if name.split("|")[-1] == shape]
+            assert found == [expected], "%s %s with motion blur %s" % (
+                shape, "culled" if expected else "kept", "on" if motionBlur else "off")
+    print "%-32s %s" % ("export culling", "transformed proxies culled in place")
+
+
+def assData(assFile):
+    """
+     Returns the sorted data strings of the procedurals of an .ass file.
+    """
+    with open(assFile) as f:
+        return sorted(re.findall(r'^\s*data "(.*)"\s*$', f.read(), re.M))
+
+
+def benchmarkMultiPatch(xgenFilePath, alembicFilePath, palette, description, patches, exportCount=3,
+                        outputDir=None):
+    """
+     Compares one proxy listing all of patches with one proxy per patch,
+     on the Maya side: the time to create the proxies and resolve their
+     patches and bounds, and the time to export them. The xgen procedural
+     renders a single patch, so both layouts export one procedural per
+     patch, which is checked, and render alike. Needs a real xgen
+     collection and its patch Alembic file.
+    """
+    if not cmds.pluginInfo("mtoa", query=True, loaded=True):
+        cmds.loadPlugin("mtoa")
+    outputDir = outputDir or tempfile.mkdtemp(prefix="xgenProxyMultiPatch")
+
+    layouts = (("%d single patch proxies" % len(patches), [[patch] for patch in patches]),
+               ("1 proxy of %d patches" % len(patches), [patches]))
+    exported = []
+    for label, groups in layouts:
+        newScene()
+        start = time.time()
+        for group in groups:
+            shape = cmds.createNode("xgenProxy")
+            cmds.setAttr(shape + ".xgenFilePath", xgenFilePath, type="string")
+            cmds.setAttr(shape + ".alembicFilePath", alembicFilePath, type="string")
+            cmds.setAttr(shape + ".palette", palette, type="string")
+            cmds.setAttr(shape + ".description", description, type="string")
+            cmds.setAttr(shape + ".patch", " ".join(group), type="string")
+            cmds.getAttr(shape + ".resolvedPatches")
+            cmds.getAttr(shape + ".groomBoundsValid")
+        created = time.time() - start
+
+        assFile = os.path.join(outputDir, "multipatch_%d.ass" % len(groups))
+        # the first export also pays for loading the translator
+        cmds.arnoldExportAss(filename=assFile)
+        start = time.time()
+        for i in range(exportCount):
+            cmds.arnoldExportAss(filename=assFile)
+        exportTime = (time.time() - start) / exportCount
+
+        data = assData(assFile)
+        exported.append(data)
+        print "%-32s create %8.3f s   export %8.3f s   %d procedurals" % (label, created, exportTime, len(data))
+    assert exported[0] == exported[1], "the layouts export different procedurals"
+
+
+def benchmarkCollectionIndex(xgenFilePath, proxyCount=1000):
+    """
+     Times validating the names of proxyCount proxies sharing one xgen
+     collection: the first lookup builds (or loads) the index, the others
+     should only hit the memory cache.
+    """
+    import xgenProxyCollection
+
+    for label, clearDisk in (("cold index", True), ("disk cached index", False)):
+        xgenProxyCollection.clearMemoryCache()
+        if clearDisk:
+            cacheFile = xgenProxyCollection._cacheFile(xgenFilePath, os.path.getmtime(xgenFilePath))
+            if os.path.exists(cacheFile):
+                os.remove(cacheFile)
+
+        start = time.time()
+        xgenProxyCollection.collection(xgenFilePath)
+        printResult(label, time.time() - start, 1)
+
+    start = time.time()
+    for i in range(proxyCount):
+        palette, description = xgenProxyCollection.resolveNames(xgenFilePath, "", "")
+        xgenProxyCollection.validate(xgenFilePath, palette, description)
+    printResult("validate %d proxies" % proxyCount, time.time() - start, proxyCount)
+
+
+def benchmarkFrameTokens(proxyCount=5000, frameCount=48, template="/tmp/xgenProxy/patches.####.abc"):
+    """
+     Scrubs frameCount frames with proxyCount proxies whose alembicFilePath
+     holds frame tokens, and times resolving the paths and groom bounds.
+    """
+    newScene()
+    shapes = createProxies(proxyCount)
+    for shape in shapes:
+        cmds.setAttr(shape + ".alembicFilePath", template, type="string")
+        cmds.connectAttr("time1.outTime", shape + ".time")
+
+    start = time.time()
+    for frame in range(1, frameCount + 1):
+        cmds.currentTime(frame, update=False)
+        for shape in shapes:
+            cmds.getAttr(shape + ".resolvedAlembicFilePath")
+            cmds.getAttr(shape + ".groomBoundsValid")
+    printResult("scrub %d frames" % frameCount, time.time() - start, proxyCount * frameCount)
+
+
+def benchmarkParallelEvaluation(proxyCount=10000, frameCount=48):
+    """
+     Plays frameCount frames of proxyCount animated proxies under each
+     evaluation mode and compares the wall time of the Evaluation Manager
+     in serial and parallel mode with DG evaluation. The Evaluation
+     Manager falls back to serial evaluation in safe mode.
+    """
+    newScene()
+    shapes = createProxies(proxyCount)
+    for shape in shapes:
+        cmds.connectAttr("time1.outTime", shape + ".time")
+    cmds.setKeyframe(shapes[0], attribute="radius", time=1, value=1.0)
+    cmds.setKeyframe(shapes[0], attribute="radius", time=frameCount, value=2.0)
+    curve = cmds.listConnections(shapes[0] + ".radius", source=True)[0]
+    for shape in shapes[1:]:
+        cmds.connectAttr(curve + ".output", shape + ".radius")
+
+    previousMode = cmds.evaluationManager(query=True, mode=True)[0]
+    try:
+        for mode in ("off", "serial", "parallel"):
+            cmds.evaluationManager(mode=mode)
+            cmds.currentTime(1)
+            cmds.refresh(force=True)
+
+            start = time.time()
+            for frame in range(1, frameCount + 1):
+                cmds.currentTime(frame)
+                cmds.refresh(force=True)
+            printResult("evaluation %s" % mode, time.time() - start, proxyCount * frameCount)
+
+        print "safe mode: %s" % cmds.evaluationManager(query=True, safeMode=True)
+    finally:
+        cmds.evaluationManager(mode=previousMode)
+
+
+def benchmarkBulkCreation(proxyCount=5000, manifestDir=None):
+    """
+     Compares creating proxyCount configured proxies with createNode and
+     setAttr per node against one xgenProxyCreate call reading a manifest.
+     Reports nodes per second for both.
+    """
+    import json
+
+    manifestDir = manifestDir or tempfile.mkdtemp(prefix="xgenProxyManifest")
+    side = int(math.ceil(math.sqrt(proxyCount)))
+    proxies = [{"name": "proxy%d" % i,
+                "xgenFilePath": "/show/crowd/collection.xgen",
+                "alembicFilePath": "/show/crowd/patches.abc",
+                "palette": "crowd",
+                "description": "hair",
+                "patch": "agent%d" % i,
+                "translate": [(i % side) * 3.0, 0.0, (i // side) * 3.0]} for i in range(proxyCount)]
+    manifest = os.path.join(manifestDir, "manifest.json")
+    with open(manifest, "w") as f:
+        json.dump({"proxies": proxies}, f)
+
+    newScene()
+    start = time.time()
+    for proxy in proxies:
+        shape = cmds.createNode("xgenProxy")
+        transform = cmds.listRelatives(shape, parent=True)[0]
+        for field in ("xgenFilePath", "alembicFilePath", "palette", "description", "patch"):
+            cmds.setAttr(shape + "." + field, proxy[field], type="string")
+        cmds.setAttr(transform + ".translate", *proxy["translate"])
+    total = time.time() - start
+    print "%-32s %10.3f s %10.1f nodes/s" % ("createNode + setAttr", total, proxyCount / total)
+
+    newScene()
+    start = time.time()
+    cmds.xgenProxyCreate(manifest=manifest)
+    total = time.time() - start
+    print "%-32s %10.3f s %10.1f nodes/s" % ("xgenProxyCreate", total, proxyCount / total)
+
+
+def checkRegistry(label):
+    """
+     Raises an AssertionError listing the first differences between the
+     proxy registry and the scene when they do not match.
+    """
+    import xgenProxyRegistry
+
+    errors = xgenProxyRegistry.verify()
+    print "%-32s %s" % (label, "consistent" if not errors else "%d errors" % len(errors))
+    assert not errors, "registry %s: %s" % (label, "; ".join(errors[:10]))
+
+
+def benchmarkRegistry(proxyCount=5000, queryCount=100, descriptions=10, outputDir=None):
+    """
+     Checks that the proxy registry stays consistent through edits, undo,
+     redo and file reference loads, then compares finding the proxies of
+     one description through the registry and through ls and getAttr.
+    """
+    import xgenProxyRegistry
+
+    outputDir = outputDir or tempfile.mkdtemp(prefix="xgenProxyRegistry")
+    newScene()
+    cmds.undoInfo(state=True, infinity=True)
+
+    shapes = createProxies(proxyCount)
+    for i, shape in enumerate(shapes):
+        cmds.setAttr(shape + ".palette", "crowd", type="string")
+        cmds.setAttr(shape + ".description", "desc%d" % (i % descriptions), type="string")
+        cmds.setAttr(shape + ".patch", "agent%d" % i, type="string")
+    checkRegistry("create")
+
+    cmds.setAttr(shapes[0] + ".description", "renamed", type="string")
+    checkRegistry("edit")
+    cmds.undo()
+    checkRegistry("undo edit")
+    cmds.redo()
+    checkRegistry("redo edit")
+
+    cmds.delete(cmds.listRelatives(shapes[1], parent=True))
+    checkRegistry("delete")
+    cmds.undo()
+    checkRegistry("undo delete")
+
+    # cameras are found by transform and by shape, whichever is connected
+    cameraTransform, cameraShape = cmds.camera()
+    cmds.connectAttr(cameraShape + ".message", shapes[2] + ".cullingCamera")
+    cmds.connectAttr(cameraTransform + ".message", shapes[3] + ".cullingCamera")
+    checkRegistry("connect camera")
+    for camera in (cameraTransform, cameraShape):
+        found = xgenProxyRegistry.proxies(camera=camera)
+        assert found == sorted([shapes[2], shapes[3]]), "camera query %s returns %s" % (camera, found)
+
+    referenceFile = os.path.join(outputDir, "reference.ma")
+    cmds.file(rename=referenceFile)
+    cmds.file(save=True, type="mayaAscii", force=True)
+    newScene()
+    cmds.file(referenceFile, reference=True, namespace="ref")
+    checkRegistry("reference load")
+    referenceNode = cmds.referenceQuery(referenceFile, referenceNode=True)
+    cmds.file(unloadReference=referenceNode)
+    checkRegistry("reference unload")
+    cmds.file(loadReference=referenceNode)
+    checkRegistry("reference reload")
+
+    start = time.time()
+    for i in range(queryCount):
+        [shape for shape in cmds.ls(type="xgenProxy") if cmds.getAttr(shape + ".description") == "desc0"]
+    printResult("ls + getAttr", time.time() - start, queryCount)
+
+    start = time.time()
+    for i in range(queryCount):
+        found = xgenProxyRegistry.proxies(description="desc0")
+    printResult("registry", time.time() - start, queryCount)
+    expected = sorted(shape for shape in cmds.ls(type="xgenProxy") if cmds.getAttr(shape + ".description") == "desc0")
+    assert found == expected, "registry returns %d proxies of desc0 instead of %d" % (len(found), len(expected))
+
+
+def benchmarkViewportCulling(proxyCount=10000, refreshCount=20, lodPixels=(0.0, 2.0, 8.0)):
+    """
+     Times legacy viewport refreshes of proxyCount proxies, with only part
+     of them in view, with culling off and on for several level of detail
+     thresholds, and prints the drawn, culled and reduced counts.
+    """
+    panel = modelPanel()
+    plugin = pluginModule()
+    previousRenderer = cmds.modelEditor(panel, query=True, rendererName=True)
+    previousCulling = plugin.optionVarValue(plugin.kCullingOptionVar, 1)
+    previousLod = plugin.optionVarValue(plugin.kLodPixelsOptionVar, plugin.kDefaultLodPixels)
+    try:
+        newScene()
+        shapes = createProxies(proxyCount)
+        # look at a corner of the grid so most proxies are off screen
+        cmds.viewFit(cmds.listRelatives(shapes[:proxyCount // 20], parent=True))
+
+        cmds.optionVar(intValue=(plugin.kCullingOptionVar, 0))
+        total = timeRefresh(panel, kLegacyRenderer, refreshCount)
+        printResult("culling off", total, proxyCount * refreshCount)
+
+        cmds.optionVar(intValue=(plugin.kCullingOptionVar, 1))
+        for pixels in lodPixels:
+            cmds.optionVar(floatValue=(plugin.kLodPixelsOptionVar, pixels))
+            total = timeRefresh(panel, kLegacyRenderer, refreshCount)
+            printResult("culling on, lod %g pixels" % pixels, total, proxyCount * refreshCount)
+            print "    %s" % plugin.viewportStats().get(panel)
+    finally:
+        cmds.optionVar(intValue=(plugin.kCullingOptionVar, previousCulling))
+        cmds.optionVar(floatValue=(plugin.kLodPixelsOptionVar, previousLod))
+        cmds.modelEditor(panel, edit=True, rendererName=previousRenderer)
+
+
+def benchmarkMaterialCache(proxyCount=2000, refreshCount=20, texture=None):
+    """
+     Times shaded legacy viewport refreshes of proxyCount proxies sharing
+     one shading group, textured with the given image file when one is
+     given, and reports the material cache hits and misses.
+    """
+    panel = modelPanel()
+    plugin = pluginModule()
+    previousRenderer = cmds.modelEditor(panel, query=True, rendererName=True)
+    previousStyle = cmds.modelEditor(panel, query=True, displayAppearance=True)
+    previousTextures = cmds.modelEditor(panel, query=True, displayTextures=True)
+    try:
+        newScene()
+        shapes = createProxies(proxyCount)
+        shader = cmds.shadingNode("lambert", asShader=True)
+        shadingGroup = cmds.sets(renderable=True, noSurfaceShader=True, empty=True)
+        cmds.connectAttr(shader + ".outColor", shadingGroup + ".surfaceShader")
+        if texture:
+            fileNode = cmds.shadingNode("file", asTexture=True)
+            cmds.setAttr(fileNode + ".fileTextureName", texture, type="string")
+            cmds.connectAttr(fileNode + ".outColor", shader + ".color")
+        cmds.sets(shapes, edit=True, forceElement=shadingGroup)
+        cmds.viewFit(all=True)
+        cmds.modelEditor(panel, edit=True, displayAppearance="smoothShaded", displayTextures=bool(texture))
+
+        plugin.materialCacheStats(reset=True)
+        total = timeRefresh(panel, kLegacyRenderer, refreshCount)
+        printResult("shaded refresh", total, proxyCount * refreshCount)
+        print "material cache hits %d misses %d" % plugin.materialCacheStats(reset=True)
+
+        cmds.setAttr(shader + ".color", 1.0, 0.0, 0.0, type="double3")
+        timeRefresh(panel, kLegacyRenderer, 1)
+        print "after a shader edit: hits %d misses %d" % plugin.materialCacheStats()
+    finally:
+        cmds.modelEditor(panel, edit=True, rendererName=previousRenderer, displayAppearance=previousStyle,
+                         displayTextures=previousTextures)
+
+
+def benchmarkInstancedDraw(proxyCounts=(1000, 10000, 50000), refreshCount=20):
+    """
+     Compares Viewport 2.0 refreshes of the geometry override, one set of
+     buffers per proxy, against the instanced sub-scene override sharing
+     the unit shape buffers of every proxy of a shape type.
+    """
+    panel = modelPanel()
+    previousRenderer = cmds.modelEditor(panel, query=True, rendererName=True)
+    newScene()
+    override = sys.modules["xgenProxyDrawOverride"]
+    previousInstanced = override.kInstancedDrawing[0]
+    try:
+        for proxyCount in proxyCounts:
+            newScene()
+            createProxies(proxyCount)
+            cmds.viewFit(all=True)
+
+            drawCount = proxyCount * refreshCount
+            for instanced in (False, True):
+                override.setInstancedDrawing(instanced)
+                total = timeRefresh(panel, kViewport2Renderer, refreshCount)
+                printResult("%d proxies %s" % (proxyCount, "instanced" if instanced else "geometry override"),
+                            total, drawCount)
+            print "    shared geometries %d, shared shaders %d" % (len(override._geometryPool),
+                                                                    len(override._shaderPool))
+    finally:
+        override.setInstancedDrawing(previousInstanced)
+        cmds.modelEditor(panel, edit=True, rendererName=previousRenderer)
+
+
+def benchmarkSelection(proxyCounts=(1000, 10000, 50000), pickCount=50):
+    """
+     Times click and marquee selections in the legacy viewport for growing
+     numbers of proxies, and prints the proxies hit tested per pick, which
+     should stay flat.
+    """
+    panel = modelPanel()
+    previousRenderer = cmds.modelEditor(panel, query=True, rendererName=True)
+    pickIndex = sys.modules["xgenProxyPickIndex"]
+    try:
+        for proxyCount in proxyCounts:
+            newScene()
+            shapes = createProxies(proxyCount)
+            cmds.viewFit(cmds.listRelatives(shapes[:100], parent=True))
+            cmds.modelEditor(panel, edit=True, rendererName=kLegacyRenderer)
+            cmds.setFocus(panel)
+            cmds.refresh(force=True)
+
+            view = OpenMayaUI.M3dView.active3dView()
+            width = view.portWidth()
+            height = view.portHeight()
+
+            # the first pick builds the index
+            start = time.time()
+            OpenMaya.MGlobal.selectFromScreen(width // 2, height // 2, OpenMaya.MGlobal.kReplaceList)
+            printResult("%d proxies first pick" % proxyCount, time.time() - start, 1)
+
+            pickIndex.stats(reset=True)
+            start = time.time()
+            for i in range(pickCount):
+                x = (i * 37) % width
+                y = (i * 53) % height
+                OpenMaya.MGlobal.selectFromScreen(x, y, OpenMaya.MGlobal.kReplaceList)
+            printResult("%d proxies click" % proxyCount, time.time() - start, pickCount)
+
+            start = time.time()
+            for i in range(pickCount):
+                x = (i * 37) % (width // 2)
+                y = (i * 53) % (height // 2)
+                OpenMaya.MGlobal.selectFromScreen(x, y, x + width // 4, y + height // 4,
+                                                  OpenMaya.MGlobal.kReplaceList)
+            printResult("%d proxies marquee" % proxyCount, time.time() - start, pickCount)
+
+            stats = pickIndex.stats()
+            print "    %d picks, %.1f proxies tested and %.1f hit per pick" % (
+                stats["picks"], stats["candidates"] / float(max(stats["picks"], 1)),
+                stats["hits"] / float(max(stats["picks"], 1)))
+
+            # moving proxies only re-indexes them
+            cmds.move(0.0, 1.0, 0.0, cmds.listRelatives(shapes[:10], parent=True), relative=True)
+            pickIndex.stats(reset=True)
+            start = time.time()
+            OpenMaya.MGlobal.selectFromScreen(width // 2, height // 2, OpenMaya.MGlobal.kReplaceList)
+            printResult("%d proxies pick after a move" % proxyCount, time.time() - start, 1)
+            print "    re-indexed %d proxies" % pickIndex.stats()["reindexed"]
+    finally:
+        cmds.modelEditor(panel, edit=True, rendererName=previousRenderer)
+
+
+def benchmarkPreview(alembicFilePath, patch, proxyCount=20, frameCount=24, percents=(1.0, 10.0, 50.0)):
+    """
+     Times Viewport 2.0 playback of proxyCount proxies previewing the root
+     points of a patch, for several preview percentages.
+    """
+    panel = modelPanel()
+    previousRenderer = cmds.modelEditor(panel, query=True, rendererName=True)
+    try:
+        newScene()
+        shapes = createProxies(proxyCount)
+        for shape in shapes:
+            cmds.setAttr(shape + ".alembicFilePath", alembicFilePath, type="string")
+            cmds.setAttr(shape + ".patch", patch, type="string")
+            cmds.setAttr(shape + ".previewMode", 2)
+            cmds.connectAttr("time1.outTime", shape + ".time")
+        cmds.viewFit(all=True)
+        cmds.modelEditor(panel, edit=True, rendererName=kViewport2Renderer)
+
+        preview = sys.modules["xgenProxyPreview"]
+        for percent in percents:
+            for shape in shapes:
+                cmds.setAttr(shape + ".previewPercent", percent)
+            preview.clearMemoryCache()
+            for label in ("first playthrough", "cached playthrough"):
+                start = time.time()
+                for frame in range(1, frameCount + 1):
+                    cmds.currentTime(frame, update=True)
+                    cmds.refresh(force=True, currentView=True)
+                printResult("%g%% %s" % (percent, label), time.time() - start, frameCount)
+    finally:
+        cmds.modelEditor(panel, edit=True, rendererName=previousRenderer)
+
+
+def benchmarkPrefetch(alembicFilePath, patch, proxyCount=100, frameCount=48, prefetchFrames=(0, 4, 16),
+                      previewMode=0):
+    """
+     Plays frameCount frames of proxyCount proxies reading alembicFilePath,
+     which should use frame tokens to exercise per frame files, with
+     several prefetch depths, and prints the frame rate and the prefetch
+     hit rate. The memory caches are emptied before every run.
+    """
+    prefetch = sys.modules["xgenProxyPrefetch"]
+    previousFrames = prefetch._optionVar(prefetch.kPrefetchFramesOptionVar, prefetch.kDefaultPrefetchFrames)
+    try:
+        newScene()
+        shapes = createProxies(proxyCount)
+        for shape in shapes:
+            cmds.setAttr(shape + ".alembicFilePath", alembicFilePath, type="string")
+            cmds.setAttr(shape + ".patch", patch, type="string")
+            cmds.setAttr(shape + ".previewMode", previewMode)
+            cmds.connectAttr("time1.outTime", shape + ".time")
+        cmds.viewFit(all=True)
+
+        for frames in prefetchFrames:
+            cmds.optionVar(intValue=(prefetch.kPrefetchFramesOptionVar, frames))
+            prefetch.uninstall()
+            prefetch.install()
+            sys.modules["xgenProxyBounds"].clearMemoryCache()
+            sys.modules["xgenProxyPreview"].clearMemoryCache()
+            cmds.currentTime(0, update=True)
+            prefetch.stats(reset=True)
+
+            start = time.time()
+            for frame in range(1, frameCount + 1):
+                cmds.currentTime(frame, update=True)
+                cmds.refresh(force=True, currentView=True)
+            total = time.time() - start
+
+            printResult("prefetching %d frames" % frames, total, frameCount)
+            stats = prefetch.stats()
+            print "    %.1f fps, hit rate %.0f%%, %d jobs completed, %d cancelled" % (
+                frameCount / total, stats["hitRate"] * 100.0, stats.get("completed", 0), stats.get("cancelled", 0))
+    finally:
+        cmds.optionVar(intValue=(prefetch.kPrefetchFramesOptionVar, previousFrames))
+        prefetch.uninstall()
+        prefetch.install()
+
+
+def benchmarkPlaybackCache(alembicFilePath, patch, proxyCount=1000, frameCount=48, previewMode=0):
+    """
+     Plays frameCount frames of proxyCount proxies twice, and prints the
+     frame rate of both playthroughs with the playback cache counters.
+    """
+    cache = sys.modules["xgenProxyPlaybackCache"]
+    newScene()
+    shapes = createProxies(proxyCount)
+    for shape in shapes:
+        cmds.setAttr(shape + ".alembicFilePath", alembicFilePath, type="string")
+        cmds.setAttr(shape + ".patch", patch, type="string")
+        cmds.setAttr(shape + ".previewMode", previewMode)
+        cmds.connectAttr("time1.outTime", shape + ".time")
+    cmds.viewFit(all=True)
+    cache.clear()
+
+    for label in ("first playthrough", "second playthrough"):
+        cache.stats(reset=True)
+        start = time.time()
+        for frame in range(1, frameCount + 1):
+            cmds.currentTime(frame, update=True)
+            cmds.refresh(force=True, currentView=True)
+        total = time.time() - start
+        printResult(label, total, frameCount)
+        stats = cache.stats()
+        print "    %.1f fps, hits %d misses %d, %d frames in %.1f MB" % (
+            frameCount / total, stats["hits"], stats["misses"], stats["frames"], stats["bytes"] / 1048576.0)
+
+    # editing an input other than time drops the cached frames
+    cmds.setAttr(shapes[0] + ".groomPadding", 2.0)
+    print "after editing one proxy: %d frames cached" % cache.stats()["frames"]
+
+
+def benchmarkBatchExport(proxyCount=1000, frameCount=48, processCounts=(1, 2, 4, 8), outputDir=None):
+    """
+     Writes the description of proxyCount proxies once, then exports their
+     procedurals for frameCount frames with the headless batch exporter
+     and every number of processes, and prints the summaries.
+    """
+    outputDir = outputDir or tempfile.mkdtemp(prefix="xgenProxyBatchExport")
+    newScene()
+    shapes = createProxies(proxyCount)
+    for shape in shapes:
+        cmds.connectAttr("time1.outTime", shape + ".time")
+
+    scenePath = os.path.join(outputDir, "scene.json")
+    start = time.time()
+    xgenProxySceneSnapshot.writeSnapshot(scenePath, 1, frameCount)
+    printResult("snapshot %d proxies" % proxyCount, time.time() - start, proxyCount)
+
+    # run like on the farm, outside of the Maya process
+    mayapy = os.path.join(os.environ["MAYA_LOCATION"], "bin", "mayapy")
+    script = os.path.splitext(xgenProxyBatchExport.__file__)[0] + ".py"
+    for processes in processCounts:
+        command = [mayapy, script, scenePath, "-o", os.path.join(outputDir, "j%d" % processes),
+                   "-j", str(processes)]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        for line in process.communicate()[0].splitlines()[:len(xgenProxyBatchExport.kStages) + 1]:
+            print line
@@ -0,0 +1,349 @@
+###############################################################################
+##
+## xgenProxyBounds.py
+##
+## Description:
+##    Bounding boxes of xgen patches, read from the Alembic file the
+##    xgen procedural grows the description on (the proxy's
+##    "alembicFilePath" attribute).
+##
+##    Bounds are those of the patch geometry only. Callers pad them by the
+##    groom length of the description, see padBounds() and
+##    xgenProxyCollection.groomLength(). Unpadded bounds are cached in
+##    memory and on disk, keyed by Alembic file path, its modification time
+##    and the sample time in seconds, so each patch is only read once per
+##    sample and file version across sessions, whatever the frame rate.
+##    Failed reads are not cached, they are tried again by the next query.
+##
+##    The disk cache of a file is a json lines file. Bounds read while
+##    evaluating nodes are queued and appended in batches by
+##    xgenProxyDiskCache.flushWrites(), outside of compute. The memory
+##    cache holds at most kMemoryCacheEntries bounds, whole files being
+##    dropped least recently used first, and at most kOpenArchives Alembic
+##    archives are kept open, see archive().
+##
+##    The patch attribute of a proxy may name several patches, separated by
+##    spaces or commas, and use glob patterns ("body_*"), see
+##    resolvePatches().
+##
+##    Reading Alembic files requires the PyAlembic module ("alembic"). When
+##    it is not available every query returns None, meaning the bounds are
+##    unknown, and glob patterns match nothing.
+##
+################################################################################
+
+import collections
+import fnmatch
+import os
+import re
+import threading
+
+import xgenProxyDiskCache
+import xgenProxyProcedural
+
+try:
+    import alembic
+except ImportError:
+    alembic = None
+
+kCacheName = "bounds"
+
+# Version of the lines of the disk cache, lines of other versions are
+# dropped.
+kCacheVersion = 2
+
+# Number of bounds kept in memory (about 200 bytes each) and of Alembic
+# archives kept open.
+kMemoryCacheEntries = 200000
+kOpenArchives = 16
+
+# (path, mtime) -> {"patch@seconds": bounds}, most recently used last
+_memoryCache = collections.OrderedDict()
+_memoryState = {"entries": 0}
+
+# (path, mtime) -> {"archive": IArchive, "lock": Lock, "objects": {patch: IObject}},
+# most recently used last
+_archives = collections.OrderedDict()
+
+# (path, mtime) -> names of the objects in the archive
+_namesCache = {}
+
+_lock = threading.RLock()
+
+kPatchSeparators = re.compile("[%s]+" % re.escape(xgenProxyProcedural.kPatchSeparators))
+kGlobCharacters = re.compile("[%s]" % re.escape(xgenProxyProcedural.kPatchGlobCharacters))
+
+
+def available():
+    """
+     Returns True when Alembic files can be read.
+    """
+    return alembic is not None
+
+
+def padBounds(bounds, padding):
+    """
+     Returns bounds grown by padding on every side.
+    """
+    return (bounds[0] - padding, bounds[1] - padding, bounds[2] - padding,
+            bounds[3] + padding, bounds[4] + padding, bounds[5] + padding)
+
+
+def _sampleKey(patch, seconds):
+    return "%s@%.6f" % (patch, seconds)
+
+
+def _cacheFile(path):
+    return os.path.join(xgenProxyDiskCache.cacheDirectory(kCacheName),
+                        xgenProxyDiskCache.keyFileName(path) + ".jsonl")
+
+
+def _decode(value):
+    return tuple(value) if value else None
+
+
+def _loadEntries(path, mtime):
+    """
+     Returns the bounds of the file version cached on disk. Lines of
+     other versions are dropped from the file.
+    """
+    cacheFile = _cacheFile(path)
+    entries = {}
+    stale = False
+    for data in xgenProxyDiskCache.readJsonLines(cacheFile):
+        if not isinstance(data, dict) or data.get("version") != kCacheVersion or data.get("path") != path \
+                or data.get("mtime") != mtime:
+            stale = True
+            continue
+        for key, value in data.get("bounds", {}).items():
+            entries[key] = _decode(value)
+    if stale:
+        xgenProxyDiskCache.queueJson(cacheFile, {
+            "version": kCacheVersion,
+            "path": path,
+            "mtime": mtime,
+            "bounds": dict((k, list(v) if v else None) for k, v in entries.items()),
+        })
+    return entries
+
+
+def _fileEntries(path, mtime):
+    """
+     Returns the memory cache of the file version, loading it from disk
+     on first use. Must be called with _lock held.
+    """
+    entries = _memoryCache.pop((path, mtime), None)
+    if entries is None:
+        # first query of this file version, pick up earlier sessions' work
+        entries = _loadEntries(path, mtime)
+        _memoryState["entries"] += len(entries)
+    _memoryCache[(path, mtime)] = entries
+    return entries
+
+
+def _trimMemoryCache():
+    # keeps the file in use, even alone above the limit
+    while _memoryState["entries"] > kMemoryCacheEntries and len(_memoryCache) > 1:
+        _, entries = _memoryCache.popitem(last=False)
+        _memoryState["entries"] -= len(entries)
+
+
+def archive(path, mtime):
+    """
+     Returns the archive of the Alembic file version at path, as a dict
+     holding the "archive", the "lock" to hold while reading it and the
+     "objects" found in it by name. Archives are opened once and shared.
+    """
+    with _lock:
+        entry = _archives.pop((path, mtime), None)
+        if entry is None:
+            entry = {
+                "archive": alembic.Abc.IArchive(path),
+                "lock": threading.Lock(),
+                "objects": {},
+            }
+        _archives[(path, mtime)] = entry
+        while len(_archives) > kOpenArchives:
+            # readers still holding an evicted archive keep it alive
+            _archives.popitem(last=False)
+    return entry
+
+
+def findObject(entry, name):
+    """
+     Returns the object called name in the archive entry, see archive(),
+     or None. Must be called with the entry's lock held.
+    """
+    objects = entry["objects"]
+    if name not in objects:
+        objects[name] = _findObject(entry["archive"].getTop(), name)
+    return objects[name]
+
+
+def _findObject(parent, name):
+    for i in range(parent.getNumChildren()):
+        child = parent.getChild(i)
+        if child.getName() == name:
+            return child
+        found = _findObject(child, name)
+        if found is not None:
+            return found
+    return None
+
+
+def _geometrySchema(obj):
+    """
+     Returns the schema of the geometry held by obj. A transform holding
+     a single geometry, as written by the Maya exporter, is looked
+     through.
+    """
+    for geomType in (alembic.AbcGeom.IPolyMesh, alembic.AbcGeom.ISubD, alembic.AbcGeom.INuPatch):
+        if geomType.matches(obj.getHeader()):
+            return geomType(obj, alembic.Abc.WrapExistingFlag.kWrapExisting).getSchema()
+
+    for i in range(obj.getNumChildren()):
+        schema = _geometrySchema(obj.getChild(i))
+        if schema is not None:
+            return schema
+    return None
+
+
+def _readBounds(path, mtime, patch, seconds):
+    entry = archive(path, mtime)
+    with entry["lock"]:
+        obj = findObject(entry, patch)
+        if obj is None:
+            return None
+
+        schema = _geometrySchema(obj)
+        if schema is None:
+            return None
+
+        box = schema.getSelfBoundsProperty().getValue(alembic.Abc.ISampleSelector(seconds))
+    low = box.min()
+    high = box.max()
+    if low[0] > high[0]:
+        # empty box
+        return None
+    return (low[0], low[1], low[2], high[0], high[1], high[2])
+
+
+def patchBounds(path, patch, frame, fps):
+    """
+     Returns the bounds of the patch geometry called patch in the Alembic
+     file at path, at the given frame, as a (xmin, ymin, zmin, xmax, ymax,
+     zmax) tuple. Returns None when they cannot be determined.
+    """
+    if not path or not patch or not available():
+        return None
+
+    mtime = xgenProxyDiskCache.fileStamp(path)
+    if mtime is None:
+        return None
+
+    # proxies evaluated in parallel share the cache
+    seconds = frame / float(fps)
+    key = _sampleKey(patch, seconds)
+    with _lock:
+        entries = _fileEntries(path, mtime)
+        if key in entries:
+            return entries[key]
+
+    try:
+        bounds = _readBounds(path, mtime, patch, seconds)
+    except Exception:
+        # not cached, the next query reads again
+        return None
+
+    with _lock:
+        # the file may have been dropped from memory in the meantime
+        entries = _fileEntries(path, mtime)
+        if key not in entries:
+            _memoryState["entries"] += 1
+        entries[key] = bounds
+        _trimMemoryCache()
+    xgenProxyDiskCache.queueAppend(_cacheFile(path), {
+        "version": kCacheVersion,
+        "path": path,
+        "mtime": mtime,
+        "bounds": {key: list(bounds) if bounds else None},
+    })
+    return bounds
+
+
+def unionBounds(path, patches, frame, fps):
+    """
+     Returns the bounds enclosing all the given patches, or None when the
+     bounds of any of them are unknown.
+    """
+    result = None
+    for patch in patches:
+        bounds = patchBounds(path, patch, frame, fps)
+        if bounds is None:
+            return None
+        if result is None:
+            result = bounds
+        else:
+            result = (min(result[0], bounds[0]), min(result[1], bounds[1]), min(result[2], bounds[2]),
+                      max(result[3], bounds[3]), max(result[4], bounds[4]), max(result[5], bounds[5]))
+    return result
+
+
+def _collectNames(parent, names):
+    for i in range(parent.getNumChildren()):
+        child = parent.getChild(i)
+        names.append(child.getName())
+        _collectNames(child, names)
+
+
+def patchNames(path):
+    """
+     Returns the names of all the objects in the Alembic file at path.
+    """
+    if not path or not available():
+        return []
+
+    mtime = xgenProxyDiskCache.fileStamp(path)
+    if mtime is None:
+        return []
+
+    with _lock:
+        names = _namesCache.get((path, mtime))
+        if names is None:
+            names = []
+            try:
+                entry = archive(path, mtime)
+                with entry["lock"]:
+                    _collectNames(entry["archive"].getTop(), names)
+            except Exception:
+                pass
+            _namesCache[(path, mtime)] = names
+    return names
+
+
+def resolvePatches(path, patch):
+    """
+     Returns the list of patch names described by the patch attribute
+     value. Glob patterns are matched against the objects of the Alembic
+     file at path, plain names are kept as they are.
+    """
+    result = []
+    for token in kPatchSeparators.split(patch.strip()):
+        if not token:
+            continue
+        if kGlobCharacters.search(token):
+            matches = [name for name in patchNames(path) if fnmatch.fnmatchcase(name, token)]
+        else:
+            matches = [token]
+        for name in matches:
+            if name not in result:
+                result.append(name)
+    return result
+
+
+def clearMemoryCache():
+    with _lock:
+        _memoryCache.clear()
+        _memoryState["entries"] = 0
+        _namesCache.clear()
+        _archives.clear()
@@ -0,0 +1,405 @@
+###############################################################################
+##
+## xgenProxyCollection.py
+##
+## Description:
+##    Index of xgen collection files (the proxy's "xgenFilePath"), used to
+##    validate and resolve the palette, description and patch names of a
+##    proxy without every proxy reading the file.
+##
+##    A collection file is a list of sections. A section starts with an
+##    unindented line giving its type ("Palette", "Description", "Patches",
+##    a primitive, generator or FX module type, ...), followed by indented
+##    "attribute value" lines, and usually ends with an "end..." line.
+##    Sections following a Palette belong to it, sections following a
+##    Description belong to that description.
+##
+##    Building the index only keeps the type, name and byte range of every
+##    section. The attributes of a section are parsed on demand from its
+##    byte range, see XgenCollection.attributes(). The groom length of a
+##    description, used to pad its patch bounds, is read from the "length"
+##    attribute of its primitive module, see groomLength(), and its density,
+##    which sizes the point preview, from the "density" attribute of its
+##    generator module, see groomDensity().
+##
+##    Indexes are cached in memory (least recently used first out) and on
+##    disk, keyed by file path and modification time. Indexes built while
+##    evaluating nodes are written to disk later, see
+##    xgenProxyDiskCache.queueJson().
+##
+################################################################################
+
+import collections
+import os
+import re
+import threading
+
+import xgenProxyDiskCache
+
+kCacheName = "collections"
+kIndexVersion = 1
+kMemoryCacheSize = 32
+
+kPaletteSection = "Palette"
+kDescriptionSection = "Description"
+kPrimitiveSuffix = "Primitive"
+kLengthAttribute = "length"
+kGeneratorSuffix = "Generator"
+kDensityAttribute = "density"
+
+# value of the slider expressions xgen writes, "$a=1.0000;#0.05,5.0\n$a"
+kSliderExpression = re.compile(r'^"?\s*\$\w+\s*=\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*;')
+
+# (path, mtime) -> XgenCollection, most recently used last
+_memoryCache = collections.OrderedDict()
+_lock = threading.RLock()
+
+
+def _isPatchSection(sectionType):
+    return sectionType == "Patches" or sectionType.endswith("Patch")
+
+
+def _decode(raw):
+    return raw.decode("utf-8", "replace").rstrip("\r\n")
+
+
+def _scanSections(path):
+    """
+     Returns the sections of the collection file at path as a list of
+     [type, arguments, name, patches, start, end] entries. start and end
+     are the byte range of the section in the file.
+    """
+    sections = []
+    current = None
+    offset = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            start = offset
+            offset += len(raw)
+
+            line = _decode(raw)
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+
+            if not line[0].isspace():
+                tokens = stripped.split()
+                if tokens[0].startswith("end"):
+                    if current is not None:
+                        current[5] = offset
+                    current = None
+                else:
+                    current = [tokens[0], tokens[1:], None, [], start, offset]
+                    sections.append(current)
+                continue
+
+            if current is None:
+                continue
+            current[5] = offset
+
+            tokens = stripped.split(None, 1)
+            if tokens[0] == "name" and current[2] is None and len(tokens) > 1:
+                current[2] = tokens[1].strip()
+            elif tokens[0] == "Patch" and _isPatchSection(current[0]):
+                current[3].append(stripped.split()[-1])
+    return sections
+
+
+def _buildIndex(sections):
+    """
+     Groups the scanned sections into palettes, descriptions, patches and
+     modules.
+    """
+    palettes = collections.OrderedDict()
+    palette = None
+    description = None
+
+    for i, (sectionType, args, name, patches, start, end) in enumerate(sections):
+        if sectionType == kPaletteSection:
+            palette = name or (args[0] if args else "")
+            palettes[palette] = {"section": i, "descriptions": collections.OrderedDict()}
+            description = None
+
+        elif sectionType == kDescriptionSection:
+            if palette is None:
+                continue
+            description = name or (args[0] if args else "")
+            palettes[palette]["descriptions"][description] = {"section": i, "patches": [], "modules": []}
+
+        elif palette is None:
+            continue
+
+        elif _isPatchSection(sectionType):
+            # the header may name the description the patches belong to
+            descriptions = palettes[palette]["descriptions"]
+            target = description
+            for arg in args:
+                if arg in descriptions:
+                    target = arg
+            if target is None:
+                continue
+            names = patches or [name or (args[-1] if args else "")]
+            entry = descriptions[target]["patches"]
+            entry.extend(patch for patch in names if patch and patch not in entry)
+
+        elif description is not None:
+            palettes[palette]["descriptions"][description]["modules"].append([sectionType, name or sectionType, i])
+
+    return palettes
+
+
+class XgenCollection(object):
+    """
+     Index of one xgen collection file.
+    """
+
+    def __init__(self, path, mtime, sections, palettes):
+        self.path = path
+        self.mtime = mtime
+        self.__sections = sections
+        self.__palettes = palettes
+        self.__attributes = {}
+
+    @classmethod
+    def fromFile(cls, path, mtime):
+        sections = _scanSections(path)
+        return cls(path, mtime, sections, _buildIndex(sections))
+
+    @classmethod
+    def fromData(cls, data):
+        palettes = collections.OrderedDict()
+        for palette, paletteData in data["palettes"]:
+            descriptions = collections.OrderedDict(paletteData["descriptions"])
+            palettes[palette] = {"section": paletteData["section"], "descriptions": descriptions}
+        return cls(data["path"], data["mtime"], data["sections"], palettes)
+
+    def toData(self):
+        palettes = [[palette, {"section": paletteData["section"],
+                               "descriptions": list(paletteData["descriptions"].items())}]
+                    for palette, paletteData in self.__palettes.items()]
+        return {"version": kIndexVersion, "path": self.path, "mtime": self.mtime,
+                "sections": self.__sections, "palettes": palettes}
+
+    def palettes(self):
+        return list(self.__palettes.keys())
+
+    def descriptions(self, palette):
+        paletteData = self.__palettes.get(palette)
+        return list(paletteData["descriptions"].keys()) if paletteData else []
+
+    def __description(self, palette, description):
+        paletteData = self.__palettes.get(palette)
+        if paletteData is None:
+            return None
+        return paletteData["descriptions"].get(description)
+
+    def patches(self, palette, description):
+        data = self.__description(palette, description)
+        return list(data["patches"]) if data else []
+
+    def modules(self, palette, description):
+        """
+         Returns the (type, name) of the modules of a description.
+        """
+        data = self.__description(palette, description)
+        return [(module[0], module[1]) for module in data["modules"]] if data else []
+
+    def attributes(self, palette, description=None):
+        """
+         Returns the attributes of a palette, or of one of its descriptions,
+         as a dictionary. Only that section of the file is read.
+        """
+        if description is None:
+            paletteData = self.__palettes.get(palette)
+            section = paletteData["section"] if paletteData else None
+        else:
+            data = self.__description(palette, description)
+            section = data["section"] if data else None
+        return self.__sectionAttributes(section)
+
+    def moduleAttributes(self, palette, description, suffix):
+        """
+         Returns the attributes of the first module of a description whose
+         type ends with suffix as a dictionary.
+        """
+        data = self.__description(palette, description)
+        for module in (data["modules"] if data else []):
+            if module[0].endswith(suffix):
+                return self.__sectionAttributes(module[2])
+        return {}
+
+    def primitiveAttributes(self, palette, description):
+        """
+         Returns the attributes of the primitive module ("SplinePrimitive",
+         "CardPrimitive", ...) of a description as a dictionary.
+        """
+        return self.moduleAttributes(palette, description, kPrimitiveSuffix)
+
+    def generatorAttributes(self, palette, description):
+        """
+         Returns the attributes of the generator module ("RandomGenerator",
+         "UniformGenerator", ...) of a description as a dictionary.
+        """
+        return self.moduleAttributes(palette, description, kGeneratorSuffix)
+
+    def __sectionAttributes(self, section):
+        if section is None:
+            return {}
+
+        attributes = self.__attributes.get(section)
+        if attributes is None:
+            start, end = self.__sections[section][4:6]
+            attributes = {}
+            with open(self.path, "rb") as f:
+                f.seek(start)
+                lines = f.read(end - start).splitlines()
+            for raw in lines[1:]:
+                line = _decode(raw)
+                if not line or not line[0].isspace():
+                    # closing "end..." line
+                    continue
+                tokens = line.strip().split(None, 1)
+                if tokens and not tokens[0].startswith("#"):
+                    attributes[tokens[0]] = tokens[1].strip() if len(tokens) > 1 else ""
+            self.__attributes[section] = attributes
+        return attributes
+
+
+def _cacheFile(path, mtime):
+    return os.path.join(xgenProxyDiskCache.cacheDirectory(kCacheName),
+                        xgenProxyDiskCache.keyFileName(path, mtime) + ".json")
+
+
+def collection(path):
+    """
+     Returns the index of the collection file at path, or None if it
+     cannot be read.
+    """
+    if not path:
+        return None
+    mtime = xgenProxyDiskCache.fileStamp(path)
+    if mtime is None:
+        return None
+
+    key = (path, mtime)
+    # proxies evaluated in parallel share the index, only one builds it
+    with _lock:
+        result = _memoryCache.pop(key, None)
+        if result is None:
+            data = xgenProxyDiskCache.readJson(_cacheFile(path, mtime))
+            if data and data.get("version") == kIndexVersion and data.get("path") == path:
+                result = XgenCollection.fromData(data)
+            else:
+                try:
+                    result = XgenCollection.fromFile(path, mtime)
+                except (IOError, OSError):
+                    return None
+                xgenProxyDiskCache.queueJson(_cacheFile(path, mtime), result.toData())
+
+        _memoryCache[key] = result
+        while len(_memoryCache) > kMemoryCacheSize:
+            _memoryCache.popitem(last=False)
+    return result
+
+
+def resolveNames(path, palette, description):
+    """
+     Returns the (palette, description) to use for a proxy. An empty name
+     is resolved when the collection leaves a single choice.
+    """
+    index = collection(path)
+    if index is None:
+        return palette, description
+
+    if not palette:
+        palettes = index.palettes()
+        if len(palettes) == 1:
+            palette = palettes[0]
+    if not description and palette:
+        descriptions = index.descriptions(palette)
+        if len(descriptions) == 1:
+            description = descriptions[0]
+    return palette, description
+
+
+def _number(value):
+    try:
+        return float(value.strip('"'))
+    except ValueError:
+        match = kSliderExpression.match(value)
+        return float(match.group(1)) if match else None
+
+
+def groomLength(path, palette, description):
+    """
+     Returns the groom length of a description, the value of the "length"
+     attribute of its primitive module, or None when the collection does
+     not give it as a number or a slider expression.
+    """
+    index = collection(path)
+    if index is None:
+        return None
+    value = index.primitiveAttributes(palette, description).get(kLengthAttribute)
+    if value is None:
+        return None
+    length = _number(value)
+    return abs(length) if length is not None else None
+
+
+def groomDensity(path, palette, description):
+    """
+     Returns the density of a description, in primitives per unit of
+     area, the value of the "density" attribute of its generator module,
+     or None when the collection does not give it as a number or a slider
+     expression.
+    """
+    index = collection(path)
+    if index is None:
+        return None
+    value = index.generatorAttributes(palette, description).get(kDensityAttribute)
+    if value is None:
+        return None
+    density = _number(value)
+    return max(density, 0.0) if density is not None else None
+
+
+def validate(path, palette, description, patches=()):
+    """
+     Returns a message describing the first name that is not part of the
+     collection at path, or an empty string when all names are valid.
+    """
+    if not path:
+        return "no xgen collection file"
+    index = collection(path)
+    if index is None:
+        return "cannot read xgen collection file %s" % path
+
+    if palette not in index.palettes():
+        return "palette '%s' is not in %s" % (palette, path)
+    if description not in index.descriptions(palette):
+        return "description '%s' is not in palette '%s'" % (description, palette)
+
+    # files without patch sections cannot be used to check patches
+    known = index.patches(palette, description)
+    if known:
+        for patch in patches:
+            if patch not in known:
+                return "patch '%s' is not bound to description '%s'" % (patch, description)
+    return ""
+
+
+def descriptionChoices(path):
+    """
+     Returns every description of the collection at path as a
+     "palette/description" string, for menus.
+    """
+    index = collection(path)
+    if index is None:
+        return []
+    return ["%s/%s" % (palette, description)
+            for palette in index.palettes() for description in index.descriptions(palette)]
+
+
+def clearMemoryCache():
+    with _lock:
+        _memoryCache.clear()
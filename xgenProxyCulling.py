@@ -0,0 +1,103 @@
+###############################################################################
+##
+## xgenProxyCulling.py
+##
+## Description:
+##    Maya independent view frustum tests for the legacy viewport draw of
+##    the xgenProxy shape. xgenProxy.py builds one Frustum per model panel
+##    refresh, from the panel camera, and tests the world bounds of every
+##    proxy against it before queueing any draw request.
+##
+##    Matrices are 4x4 nested lists using Maya's row vector convention
+##    (a point is transformed as p * M).
+##
+################################################################################
+
+import math
+
+
+def multiply(a, b):
+    return [[sum(a[i][k] * b[k][j] for k in range(4)) for j in range(4)] for i in range(4)]
+
+
+def perspective(left, right, bottom, top, near, far):
+    """
+     Returns the OpenGL perspective projection of the given near plane
+     window, as a row vector matrix.
+    """
+    return [[2.0 * near / (right - left), 0.0, 0.0, 0.0],
+            [0.0, 2.0 * near / (top - bottom), 0.0, 0.0],
+            [(right + left) / (right - left), (top + bottom) / (top - bottom), -(far + near) / (far - near), -1.0],
+            [0.0, 0.0, -2.0 * far * near / (far - near), 0.0]]
+
+
+def orthographic(left, right, bottom, top, near, far):
+    """
+     Returns the OpenGL orthographic projection of the given window, as a
+     row vector matrix.
+    """
+    return [[2.0 / (right - left), 0.0, 0.0, 0.0],
+            [0.0, 2.0 / (top - bottom), 0.0, 0.0],
+            [0.0, 0.0, -2.0 / (far - near), 0.0],
+            [-(right + left) / (right - left), -(top + bottom) / (top - bottom), -(far + near) / (far - near), 1.0]]
+
+
+def frustumPlanes(matrix):
+    """
+     Returns the left, right, bottom, top, near and far planes of the
+     world to clip space matrix as normalized (a, b, c, d) tuples, the
+     inside being where a * x + b * y + c * z + d >= 0.
+    """
+    columns = [[matrix[i][j] for i in range(4)] for j in range(4)]
+    planes = []
+    for axis in range(3):
+        for sign in (1.0, -1.0):
+            plane = [columns[3][i] + sign * columns[axis][i] for i in range(4)]
+            length = math.sqrt(plane[0] * plane[0] + plane[1] * plane[1] + plane[2] * plane[2])
+            if length > 0.0:
+                plane = [value / length for value in plane]
+            planes.append(tuple(plane))
+    return planes
+
+
+class Frustum(object):
+    """
+     View frustum of a camera, with the projection scale needed to
+     estimate sizes in pixels.
+    """
+
+    def __init__(self, worldToView, projection, portHeight):
+        self.matrix = multiply(worldToView, projection)
+        self.planes = frustumPlanes(self.matrix)
+        # pixels per unit of normalized device coordinate, vertically
+        self.__pixelScale = projection[1][1] * portHeight / 2.0
+        self.__perspective = projection[2][3] != 0.0
+
+    def boxVisible(self, low, high):
+        """
+         Returns False when the world space box is entirely outside one
+         of the planes.
+        """
+        for a, b, c, d in self.planes:
+            # corner of the box furthest along the plane normal
+            x = high[0] if a >= 0.0 else low[0]
+            y = high[1] if b >= 0.0 else low[1]
+            z = high[2] if c >= 0.0 else low[2]
+            if a * x + b * y + c * z + d < 0.0:
+                return False
+        return True
+
+    def pixelRadius(self, center, radius):
+        """
+         Returns the approximate radius, in pixels, of a world space sphere
+         once projected. Spheres reaching behind the eye are reported as
+         infinitely large.
+        """
+        if not self.__perspective:
+            return radius * self.__pixelScale
+
+        m = self.matrix
+        w = center[0] * m[0][3] + center[1] * m[1][3] + center[2] * m[2][3] + m[3][3]
+        if w <= radius:
+            return float("inf")
+        return radius * self.__pixelScale / w
@@ -0,0 +1,320 @@
+###############################################################################
+##
+## xgenProxyDiskCache.py
+##
+## Description:
+##    Small helpers shared by the xgenProxy modules that keep data on disk
+##    between sessions.
+##
+##    The cache root is $XGEN_PROXY_CACHE_DIR when set, otherwise an
+##    "xgenProxyCache" directory in the system temp directory. Every
+##    module keeps its files in its own sub directory of the root.
+##
+##    The root may be shared by render nodes on a network file system.
+##    Only atomic file replacements are safe there (see writeJson()),
+##    file locks and memory mapped files such as the ones of SQLite are
+##    not. isNetworkPath() tells such roots, and localCacheDirectory()
+##    gives the directory of this host for the data that cannot be shared.
+##
+##    File modification times are cached for a short while, so that
+##    thousands of proxies sharing a file do not stat it again each, see
+##    fileStamp().
+##
+##    Writes made while evaluating nodes are queued, see queueAppend() and
+##    queueJson(), and done together by flushWrites(): from idle time in
+##    Maya (the xgenProxy plug-in sets the scheduler, see
+##    setFlushScheduler()), by the batch exporter after every frame, and
+##    when the process exits.
+##
+################################################################################
+
+import atexit
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+kCacheDirEnv = "XGEN_PROXY_CACHE_DIR"
+kDefaultCacheDirName = "xgenProxyCache"
+
+# Number of paths, and seconds, file modification times are cached for.
+kStampCacheSize = 4096
+kStampLifetime = 2.0
+
+# path -> (time of the stat, mtime or None), most recently used last
+_stampCache = collections.OrderedDict()
+_stampLock = threading.Lock()
+
+# File system types of /proc/mounts that are network file systems.
+kNetworkFileSystems = frozenset(("nfs", "nfs4", "cifs", "smbfs", "smb3", "afs", "ncpfs", "9p", "ceph", "lustre",
+                                 "gpfs", "beegfs", "glusterfs", "fuse.glusterfs", "fuse.sshfs", "fuse.s3fs"))
+
+# Windows GetDriveType() value of network drives.
+kDriveRemote = 4
+
+# path -> whether it is on a network file system
+_networkPaths = {}
+
+# (path, "append" or "json") -> lines to append, or data to write, in the
+# order they were queued
+_pendingWrites = collections.OrderedDict()
+_pendingLock = threading.Lock()
+_flushState = {"scheduler": None, "scheduled": False}
+
+
+def cacheRoot():
+    return os.environ.get(kCacheDirEnv) or os.path.join(tempfile.gettempdir(), kDefaultCacheDirName)
+
+
+def cacheDirectory(name):
+    """
+     Returns the cache sub directory called name, creating it if needed.
+    """
+    return makeDirectory(os.path.join(cacheRoot(), name))
+
+
+def localCacheDirectory(name):
+    """
+     Returns the directory called name on this host for the cache root,
+     in the system temp directory, creating it if needed. Each root gets
+     its own.
+    """
+    local = "%s-%s" % (name, keyFileName(os.path.abspath(cacheRoot()))[:12])
+    return makeDirectory(os.path.join(tempfile.gettempdir(), kDefaultCacheDirName, "local", local))
+
+
+def makeDirectory(path):
+    """
+     Creates the directory path, and its parents, if needed and returns
+     it.
+    """
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            # created by another process in the meantime
+            if not os.path.isdir(path):
+                raise
+    return path
+
+
+def keyFileName(*parts):
+    """
+     Returns a file name safe digest of the given key parts.
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _fileSystemType(path, mounts):
+    """
+     Returns the type of the file system path is on, from the lines of
+     /proc/mounts, None when no mount point holds it.
+    """
+    best = None
+    fileSystem = None
+    for line in mounts:
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        # spaces and tabs of mount points are octal escapes
+        point = fields[1].replace("\\040", " ").replace("\\011", "\t")
+        if path == point or path.startswith(point.rstrip("/") + "/"):
+            if best is None or len(point) >= len(best):
+                best, fileSystem = point, fields[2]
+    return fileSystem
+
+
+def isNetworkPath(path):
+    """
+     Returns whether path, existing or not, is on a network file system:
+     a UNC path or network drive on Windows, a kNetworkFileSystems mount
+     on Linux. Other systems are assumed local. Results are cached.
+    """
+    path = os.path.abspath(path)
+    result = _networkPaths.get(path)
+    if result is not None:
+        return result
+
+    if os.name == "nt":
+        drive = os.path.splitdrive(path)[0]
+        result = drive.startswith("\\\\") or drive.startswith("//")
+        if not result and drive:
+            try:
+                import ctypes
+                result = ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == kDriveRemote
+            except (ImportError, AttributeError, OSError):
+                result = False
+    else:
+        existing = path
+        while not os.path.exists(existing) and os.path.dirname(existing) != existing:
+            existing = os.path.dirname(existing)
+        try:
+            with open("/proc/mounts", "r") as f:
+                result = _fileSystemType(os.path.realpath(existing), f) in kNetworkFileSystems
+        except (IOError, OSError):
+            result = False
+    _networkPaths[path] = result
+    return result
+
+
+def fileStamp(path):
+    """
+     Returns the modification time of path, or None if it does not exist.
+     Results, missing files included, are reused for kStampLifetime
+     seconds.
+    """
+    now = time.time()
+    with _stampLock:
+        entry = _stampCache.pop(path, None)
+    if entry is None or now - entry[0] > kStampLifetime:
+        try:
+            entry = (now, os.path.getmtime(path))
+        except OSError:
+            entry = (now, None)
+
+    with _stampLock:
+        _stampCache[path] = entry
+        while len(_stampCache) > kStampCacheSize:
+            _stampCache.popitem(last=False)
+    return entry[1]
+
+
+def clearStampCache():
+    with _stampLock:
+        _stampCache.clear()
+
+
+def readJson(path):
+    """
+     Returns the decoded content of a json cache file, or None when the
+     file is missing or unreadable.
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def writeJson(path, data):
+    """
+     Atomically replaces path with data encoded as json, so concurrent
+     readers never see a partially written file. Failures are ignored,
+     the cache is only an optimization.
+    """
+    tmpPath = None
+    try:
+        handle, tmpPath = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(handle, "w") as f:
+            json.dump(data, f)
+            # a json lines file, lines may be appended, see queueAppend()
+            f.write("\n")
+        if os.name == "nt" and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmpPath, path)
+    except (IOError, OSError):
+        if tmpPath and os.path.exists(tmpPath):
+            os.remove(tmpPath)
+
+
+def readJsonLines(path):
+    """
+     Returns the decoded lines of a json lines cache file, skipping the
+     ones that cannot be decoded (a line cut short by a crash), or an
+     empty list when the file is missing or unreadable.
+    """
+    result = []
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    result.append(json.loads(line))
+                except ValueError:
+                    pass
+    except (IOError, OSError):
+        pass
+    return result
+
+
+def _schedule():
+    with _pendingLock:
+        if _flushState["scheduled"] or _flushState["scheduler"] is None:
+            return
+        _flushState["scheduled"] = True
+        scheduler = _flushState["scheduler"]
+    scheduler(flushWrites)
+
+
+def queueAppend(path, data):
+    """
+     Queues data, encoded as one json line, to be appended to path by the
+     next flushWrites().
+    """
+    line = json.dumps(data, separators=(",", ":")) + "\n"
+    with _pendingLock:
+        # a whole file queued for path is written first
+        _pendingWrites.setdefault((path, "append"), []).append(line)
+    _schedule()
+
+
+def queueJson(path, data):
+    """
+     Queues path to be replaced with data encoded as json by the next
+     flushWrites(), see writeJson(). Lines queued for path before are
+     dropped, data is expected to hold them.
+    """
+    with _pendingLock:
+        _pendingWrites.pop((path, "append"), None)
+        _pendingWrites.pop((path, "json"), None)
+        _pendingWrites[(path, "json")] = data
+    _schedule()
+
+
+def pendingWrites():
+    with _pendingLock:
+        return len(_pendingWrites)
+
+
+def flushWrites():
+    """
+     Does the queued writes, each file being opened once. Failures are
+     ignored like in writeJson().
+    """
+    with _pendingLock:
+        writes = list(_pendingWrites.items())
+        _pendingWrites.clear()
+        _flushState["scheduled"] = False
+
+    for (path, kind), value in writes:
+        if kind == "json":
+            writeJson(path, value)
+            continue
+        try:
+            # one write per file, appended whole by concurrent processes
+            handle = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+            try:
+                os.write(handle, "".join(value).encode("utf-8"))
+            finally:
+                os.close(handle)
+        except (IOError, OSError):
+            pass
+
+
+def setFlushScheduler(scheduler):
+    """
+     Sets the function called with flushWrites() when writes get queued,
+     to run it later, None to only flush on demand and at exit.
+    """
+    with _pendingLock:
+        _flushState["scheduler"] = scheduler
+        _flushState["scheduled"] = False
+
+
+atexit.register(flushWrites)
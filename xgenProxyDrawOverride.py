@@ -0,0 +1,741 @@
+###############################################################################
+##
+## xgenProxyDrawOverride.py
+##
+## Description:
+##    Viewport 2.0 geometry override for the "xgenProxy" shape.
+##
+##    xgenProxy.py is written against the Maya Python API 1.0, which has no
+##    MPxGeometryOverride, so the override lives in this separate API 2.0
+##    plug-in. xgenProxy.py loads it automatically and registers the shape
+##    with the "drawdb/geometry/xgenProxy" classification this override
+##    is bound to.
+##
+##    The rectangle/circle/triangle is uploaded once into vertex and index
+##    buffers. The buffers are only rebuilt when shapeType, radius, width2
+##    or height change, everything else (transforms, selection, display
+##    status) is handled by Maya without touching the geometry.
+##
+##    When the proxy's previewMode shows the primitive root points, they are
+##    appended to the vertex buffer and drawn as a point item, see
+##    xgenProxyPreview.py. They are re-uploaded when the frame, the patches
+##    or previewPercent change.
+##
+##    With the "xgenProxyInstancedDraw" option var set, a sub-scene override
+##    is registered instead, see setInstancedDrawing(). All proxies of the
+##    same shape type then draw the same vertex and index buffers of the
+##    unit shape, scaled to their radius, width2 and height by their
+##    instance transforms, and share their shaders, which lets Viewport 2.0
+##    consolidate them. The DAG instances of a proxy are hardware instances
+##    of its render items, with their own transform and wireframe color.
+##    Every proxy still has its own override and render items: different
+##    proxies are only grouped by that consolidation, they are not batched
+##    into one instanced item.
+##
+##    The callbacks of a sub-scene override and the unit buffers it draws
+##    are held by an _OverrideState, not by the override, so Maya holding
+##    the callbacks does not keep the override alive. They are released
+##    when the node is removed, when the override of the node is replaced
+##    and when the plug-in is unloaded. The unit buffers of a shape type
+##    are freed once no proxy draws it.
+##
+################################################################################
+
+import maya.api.OpenMaya as OpenMaya
+import maya.api.OpenMayaRender as OpenMayaRender
+
+import maya.cmds as cmds
+
+import array
+import ctypes
+import os
+import sys
+
+localPath = os.path.dirname(os.path.realpath(__file__))
+if localPath not in sys.path:
+    sys.path.append(localPath)
+
+import xgenProxyCollection
+import xgenProxyPreview
+import xgenProxyShapes
+
+kDrawClassification = "drawdb/geometry/xgenProxy"
+kDrawRegistrantId = "xgenProxyDrawOverride"
+
+kWireframeItemName = "xgenProxyWireframe"
+kShadedItemName = "xgenProxyShaded"
+kPreviewItemName = "xgenProxyPreview"
+kPreviewPointSize = 2.0
+
+kInstancedOptionVar = "xgenProxyInstancedDraw"
+
+# override type currently registered, see setInstancedDrawing()
+kInstancedDrawing = [False]
+
+# MObjectHandle hash code -> _OverrideState of the sub-scene overrides
+_overrideStates = {}
+
+# callbacks of the plug-in, see initializePlugin()
+_pluginCallbacks = []
+
+# shape type -> [(vertex buffers, line indices, triangle indices, bounds) of
+# the unit shape, number of sub-scene overrides drawing it]
+_geometryPool = {}
+
+# "wire", "points" or "shaded" -> shader instance shared by instanced proxies
+_shaderPool = {}
+
+
+def maya_useNewAPI():
+    """
+     Tells Maya this plug-in uses the Python API 2.0.
+    """
+    pass
+
+
+class PreviewPlugs(object):
+    """
+     The plugs of a proxy its preview points are pulled from.
+    """
+
+    def __init__(self, node):
+        self.__modePlug = node.findPlug("previewMode", False)
+        self.__percentPlug = node.findPlug("previewPercent", False)
+        self.__pathPlug = node.findPlug("resolvedAlembicFilePath", False)
+        self.__patchesPlug = node.findPlug("resolvedPatches", False)
+        self.__timePlug = node.findPlug("time", False)
+        self.__xgenPathPlug = node.findPlug("resolvedXgenFilePath", False)
+        self.__palettePlug = node.findPlug("resolvedPalette", False)
+        self.__descriptionPlug = node.findPlug("resolvedDescription", False)
+
+    def pull(self):
+        """
+         Returns the preview mode, a key identifying the points and the
+         points, None when they are not shown or still being scattered.
+        """
+        mode = self.__modePlug.asShort()
+        if not xgenProxyPreview.showsPoints(mode):
+            return mode, None, None
+
+        uiUnit = OpenMaya.MTime.uiUnit()
+        frame = self.__timePlug.asMTime().asUnits(uiUnit)
+        fps = OpenMaya.MTime(1.0, OpenMaya.MTime.kSeconds).asUnits(uiUnit)
+        path = self.__pathPlug.asString()
+        patches = self.__patchesPlug.asString().split()
+        percent = self.__percentPlug.asDouble()
+        density = xgenProxyCollection.groomDensity(self.__xgenPathPlug.asString(), self.__palettePlug.asString(),
+                                                   self.__descriptionPlug.asString())
+
+        points = xgenProxyPreview.previewPoints(path, patches, frame, fps, percent, density, wait=False)
+        if points is None or points is xgenProxyPreview.kReadFailed:
+            # the proxy is dirtied once the points are scattered, failed
+            # reads are tried again by the next pull
+            return mode, None, None
+        return mode, (path, tuple(patches), round(frame, 3), round(percent, 3), density), points
+
+
+class xgenProxyGeometryOverride(OpenMayaRender.MPxGeometryOverride):
+    @staticmethod
+    def creator(obj):
+        return xgenProxyGeometryOverride(obj)
+
+    def __init__(self, obj):
+        OpenMayaRender.MPxGeometryOverride.__init__(self, obj)
+
+        node = OpenMaya.MFnDependencyNode(obj)
+        self.__shapeTypePlug = node.findPlug("shapeType", False)
+        self.__radiusPlug = node.findPlug("radius", False)
+        self.__widthPlug = node.findPlug("width2", False)
+        self.__heightPlug = node.findPlug("height", False)
+        self.__preview = PreviewPlugs(node)
+
+        # key of the geometry pulled in the last updateDG and of the
+        # geometry currently held in the vertex/index buffers
+        self.__key = None
+        self.__uploadedKey = None
+        self.__outline = None
+        self.__previewMode = xgenProxyPreview.kPreviewPlaceholder
+        self.__previewPoints = None
+
+    # override
+    def supportedDrawAPIs(self):
+        return OpenMayaRender.MRenderer.kAllDevices
+
+    # override
+    def hasUIDrawables(self):
+        return False
+
+    # override
+    def updateDG(self):
+        """
+         Pull the attributes that define the geometry. This is the only
+         place the override touches the DG.
+        """
+        shapeType = self.__shapeTypePlug.asShort()
+        radius, width, height = xgenProxyShapes.clampDimensions(self.__radiusPlug.asDouble(),
+                                                                self.__widthPlug.asDouble(),
+                                                                self.__heightPlug.asDouble())
+
+        self.__previewMode, previewKey, self.__previewPoints = self.__preview.pull()
+        key = (xgenProxyShapes.geometryKey(shapeType, radius, width, height), previewKey)
+        if key != self.__key:
+            self.__key = key
+            self.__outline = xgenProxyShapes.outline(shapeType, radius, width, height)
+
+    # override
+    def requiresGeometryUpdate(self):
+        """
+         Only ask Maya for new buffers when the shape actually changed.
+        """
+        return self.__key != self.__uploadedKey
+
+    # override
+    def updateRenderItems(self, path, renderItems):
+        shaderManager = OpenMayaRender.MRenderer.getShaderManager()
+        if shaderManager is None:
+            return
+
+        # wireframe, drawn in every display mode so the shape stays visible
+        # and highlights correctly when selected
+        index = renderItems.indexOf(kWireframeItemName)
+        if index < 0:
+            wireItem = OpenMayaRender.MRenderItem.create(kWireframeItemName,
+                                                         OpenMayaRender.MRenderItem.DecorationItem,
+                                                         OpenMayaRender.MGeometry.kLines)
+            wireItem.setDrawMode(OpenMayaRender.MGeometry.kAll)
+            wireItem.setDepthPriority(OpenMayaRender.MRenderItem.sActiveWireDepthPriority)
+            shader = shaderManager.getStockShader(OpenMayaRender.MShaderManager.k3dSolidShader)
+            if shader:
+                wireItem.setShader(shader)
+                shaderManager.releaseShader(shader)
+            renderItems.append(wireItem)
+        else:
+            wireItem = renderItems[index]
+
+        color = OpenMayaRender.MGeometryUtilities.wireframeColor(path)
+        shader = wireItem.getShader()
+        if shader:
+            shader.setParameter("solidColor", (color.r, color.g, color.b, color.a))
+        placeholder = xgenProxyPreview.showsPlaceholder(self.__previewMode)
+        wireItem.enable(placeholder)
+
+        # primitive root points of the preview
+        index = renderItems.indexOf(kPreviewItemName)
+        if index < 0:
+            previewItem = OpenMayaRender.MRenderItem.create(kPreviewItemName,
+                                                            OpenMayaRender.MRenderItem.DecorationItem,
+                                                            OpenMayaRender.MGeometry.kPoints)
+            previewItem.setDrawMode(OpenMayaRender.MGeometry.kAll)
+            shader = shaderManager.getStockShader(OpenMayaRender.MShaderManager.k3dFatPointShader)
+            if shader:
+                previewItem.setShader(shader)
+                shaderManager.releaseShader(shader)
+            renderItems.append(previewItem)
+        else:
+            previewItem = renderItems[index]
+
+        shader = previewItem.getShader()
+        if shader:
+            shader.setParameter("solidColor", (color.r, color.g, color.b, color.a))
+            shader.setParameter("pointSize", (kPreviewPointSize, kPreviewPointSize))
+        previewItem.enable(bool(self.__previewPoints))
+
+        # filled polygon for the shaded and textured display modes
+        index = renderItems.indexOf(kShadedItemName)
+        if index < 0:
+            shadedItem = OpenMayaRender.MRenderItem.create(kShadedItemName,
+                                                           OpenMayaRender.MRenderItem.MaterialSceneItem,
+                                                           OpenMayaRender.MGeometry.kTriangles)
+            shadedItem.setDrawMode(OpenMayaRender.MGeometry.kShaded | OpenMayaRender.MGeometry.kTextured)
+            shader = shaderManager.getStockShader(OpenMayaRender.MShaderManager.k3dBlinnShader)
+            if shader:
+                shadedItem.setShader(shader)
+                shaderManager.releaseShader(shader)
+            renderItems.append(shadedItem)
+        else:
+            shadedItem = renderItems[index]
+        shadedItem.enable(placeholder)
+
+    # override
+    def populateGeometry(self, requirements, renderItems, data):
+        """
+         Fill the vertex and index buffers from the cached outline.
+        """
+        if self.__outline is None:
+            return
+
+        vertexCount = len(self.__outline) // 3
+        points = self.__outline
+        if self.__previewPoints:
+            points = self.__outline + self.__previewPoints
+        totalCount = len(points) // 3
+
+        for desc in requirements.vertexRequirements():
+            semantic = desc.semantic
+            if semantic == OpenMayaRender.MGeometry.kPosition:
+                values = points
+            elif semantic == OpenMayaRender.MGeometry.kNormal:
+                values = [0.0, 0.0, 1.0] * totalCount
+            elif semantic == OpenMayaRender.MGeometry.kTexture:
+                # the legacy draw uses the XY position as texture coordinate
+                values = []
+                for i in range(totalCount):
+                    values.extend((points[i * 3], points[i * 3 + 1]))
+            else:
+                continue
+
+            vertexBuffer = data.createVertexBuffer(desc)
+            address = vertexBuffer.acquire(totalCount, True)
+            if address:
+                count = len(values)
+                buf = (ctypes.c_float * count).from_address(address)
+                buf[:] = values[:]
+                vertexBuffer.commit(address)
+
+        for item in renderItems:
+            if item.primitive() == OpenMayaRender.MGeometry.kLines:
+                indices = xgenProxyShapes.lineIndices(vertexCount)
+            elif item.primitive() == OpenMayaRender.MGeometry.kTriangles:
+                indices = xgenProxyShapes.triangleIndices(vertexCount)
+            elif item.primitive() == OpenMayaRender.MGeometry.kPoints and totalCount > vertexCount:
+                indices = array.array('I', range(vertexCount, totalCount))
+            else:
+                continue
+
+            indexBuffer = data.createIndexBuffer(OpenMayaRender.MGeometry.kUnsignedInt32)
+            address = indexBuffer.acquire(len(indices), True)
+            if address:
+                buf = (ctypes.c_uint * len(indices)).from_address(address)
+                buf[:] = indices[:]
+                indexBuffer.commit(address)
+                item.associateWithIndexBuffer(indexBuffer)
+
+        self.__uploadedKey = self.__key
+
+    # override
+    def cleanUp(self):
+        pass
+
+
+def _fillVertexBuffer(semantic, size, values):
+    desc = OpenMayaRender.MVertexBufferDescriptor("", semantic, OpenMayaRender.MGeometry.kFloat, size)
+    vertexBuffer = OpenMayaRender.MVertexBuffer(desc)
+    address = vertexBuffer.acquire(len(values) // size, True)
+    if address:
+        buf = (ctypes.c_float * len(values)).from_address(address)
+        buf[:] = values[:]
+        vertexBuffer.commit(address)
+    return vertexBuffer
+
+
+def _fillIndexBuffer(indices):
+    indexBuffer = OpenMayaRender.MIndexBuffer(OpenMayaRender.MGeometry.kUnsignedInt32)
+    address = indexBuffer.acquire(len(indices), True)
+    if address:
+        buf = (ctypes.c_uint * len(indices)).from_address(address)
+        buf[:] = indices[:]
+        indexBuffer.commit(address)
+    return indexBuffer
+
+
+def acquireGeometry(shapeType):
+    """
+     Returns the buffers of the unit shape of the shape type, shared by all
+     instanced proxies, as (vertex buffer array, line index buffer, triangle
+     index buffer, bounding box). They are built for the first proxy and
+     kept until releaseGeometry() was called for every acquireGeometry().
+    """
+    entry = _geometryPool.get(shapeType)
+    if entry is None:
+        points = xgenProxyShapes.outline(shapeType, 1.0, 1.0, 1.0)
+        vertexCount = len(points) // 3
+
+        texture = []
+        for i in range(vertexCount):
+            texture.extend((points[i * 3], points[i * 3 + 1]))
+
+        vertexBuffers = OpenMayaRender.MVertexBufferArray()
+        vertexBuffers.append(_fillVertexBuffer(OpenMayaRender.MGeometry.kPosition, 3, points), "positions")
+        vertexBuffers.append(_fillVertexBuffer(OpenMayaRender.MGeometry.kNormal, 3, [0.0, 0.0, 1.0] * vertexCount),
+                             "normals")
+        vertexBuffers.append(_fillVertexBuffer(OpenMayaRender.MGeometry.kTexture, 2, texture), "uvs")
+
+        bounds = OpenMaya.MBoundingBox()
+        for i in range(vertexCount):
+            bounds.expand(OpenMaya.MPoint(points[i * 3], points[i * 3 + 1], points[i * 3 + 2]))
+
+        entry = [(vertexBuffers,
+                  _fillIndexBuffer(xgenProxyShapes.lineIndices(vertexCount)),
+                  _fillIndexBuffer(xgenProxyShapes.triangleIndices(vertexCount)),
+                  bounds), 0]
+        _geometryPool[shapeType] = entry
+    entry[1] += 1
+    return entry[0]
+
+
+def releaseGeometry(shapeType):
+    entry = _geometryPool.get(shapeType)
+    if entry is not None:
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del _geometryPool[shapeType]
+
+
+def sharedShader(key, stockShader):
+    """
+     Returns the shader instance shared by the instanced proxies drawn
+     with the given stock shader. Colors are set per instance.
+    """
+    shader = _shaderPool.get(key)
+    if shader is None:
+        shaderManager = OpenMayaRender.MRenderer.getShaderManager()
+        if shaderManager is None:
+            return None
+        stock = shaderManager.getStockShader(stockShader)
+        if stock is None:
+            return None
+        shader = stock.clone()
+        shaderManager.releaseShader(stock)
+        _shaderPool[key] = shader
+    return shader
+
+
+def releaseSharedData():
+    shaderManager = OpenMayaRender.MRenderer.getShaderManager()
+    if shaderManager is not None:
+        for shader in _shaderPool.values():
+            shaderManager.releaseShader(shader)
+    _shaderPool.clear()
+    _geometryPool.clear()
+
+
+def _removeCallbacks(callbackIds):
+    for callbackId in callbackIds:
+        try:
+            OpenMaya.MMessage.removeCallback(callbackId)
+        except RuntimeError:
+            pass
+
+
+def _markDirty(*args):
+    # the client data, last argument of every callback, is the state
+    args[-1].dirty = True
+
+
+class _OverrideState(object):
+    """
+     The callbacks and the unit geometry of the sub-scene override of a
+     node. The callbacks are given the state, not the override, as client
+     data, so they do not keep the override alive.
+    """
+
+    def __init__(self, node):
+        self.node = node
+        self.dirty = True
+        # shape type of the acquired unit geometry
+        self.shapeType = None
+        self.released = True
+        self.__nodeCallbacks = []
+        # full path name -> world matrix callback of the DAG instance
+        self.__pathCallbacks = {}
+
+    def watch(self, paths):
+        """
+         Registers the callbacks of the node and of its DAG instances that
+         have none yet, and removes those of instances that are gone.
+        """
+        if self.released:
+            # again after an undone removal of the node
+            self.__nodeCallbacks = [OpenMaya.MNodeMessage.addNodeDirtyCallback(self.node.object(), _markDirty, self)]
+            states = _overrideStates.setdefault(self.node.hashCode(), [])
+            if self not in states:
+                states.append(self)
+            self.released = False
+        names = set(path.fullPathName() for path in paths)
+        _removeCallbacks([self.__pathCallbacks.pop(name) for name in list(self.__pathCallbacks) if name not in names])
+        for path in paths:
+            name = path.fullPathName()
+            if name not in self.__pathCallbacks:
+                self.__pathCallbacks[name] = OpenMaya.MDagMessage.addWorldMatrixModifiedCallback(path, _markDirty,
+                                                                                                 self)
+
+    def geometry(self, shapeType):
+        """
+         Returns the unit buffers of the shape type, see acquireGeometry(),
+         and whether they changed since the last call.
+        """
+        if shapeType == self.shapeType:
+            return _geometryPool[shapeType][0], False
+        if self.shapeType is not None:
+            releaseGeometry(self.shapeType)
+        geometry = acquireGeometry(shapeType)
+        self.shapeType = shapeType
+        return geometry, True
+
+    def release(self):
+        """
+         Removes the callbacks and releases the unit geometry. The state
+         registers them again on the next update of its override.
+        """
+        _removeCallbacks(self.__nodeCallbacks + list(self.__pathCallbacks.values()))
+        self.__nodeCallbacks = []
+        self.__pathCallbacks = {}
+        if self.shapeType is not None:
+            releaseGeometry(self.shapeType)
+        self.shapeType = None
+        self.released = True
+        self.dirty = True
+
+
+def _releaseOverrides(obj=None):
+    """
+     Releases the states of the sub-scene overrides of the node, or of all
+     nodes. The states register themselves again on their next update.
+    """
+    if obj is None:
+        for states in _overrideStates.values():
+            for state in states:
+                state.release()
+        _overrideStates.clear()
+        return
+    hashCode = OpenMaya.MObjectHandle(obj).hashCode()
+    states = _overrideStates.get(hashCode, [])
+    for state in [state for state in states if state.node.object() == obj]:
+        state.release()
+        states.remove(state)
+    if not states:
+        _overrideStates.pop(hashCode, None)
+
+
+def _nodeRemoved(node, clientData):
+    _releaseOverrides(node)
+
+
+class xgenProxySubSceneOverride(OpenMayaRender.MPxSubSceneOverride):
+    @staticmethod
+    def creator(obj):
+        return xgenProxySubSceneOverride(obj)
+
+    def __init__(self, obj):
+        OpenMayaRender.MPxSubSceneOverride.__init__(self, obj)
+
+        self.__node = OpenMaya.MObjectHandle(obj)
+        node = OpenMaya.MFnDependencyNode(obj)
+        self.__shapeTypePlug = node.findPlug("shapeType", False)
+        self.__radiusPlug = node.findPlug("radius", False)
+        self.__widthPlug = node.findPlug("width2", False)
+        self.__heightPlug = node.findPlug("height", False)
+        self.__preview = PreviewPlugs(node)
+
+        # callbacks and unit geometry, released when the node is removed,
+        # with those of the override this one replaces
+        _releaseOverrides(obj)
+        self.__state = _OverrideState(self.__node)
+        # preview points are specific to the proxy, never shared
+        self.__previewKey = None
+        self.__previewGeometry = None
+        self.__paths = []
+        self.__colors = None
+
+    def __allPaths(self):
+        if not self.__node.isValid():
+            return []
+        return OpenMaya.MDagPath.getAllPathsTo(self.__node.object())
+
+    def __buildPreview(self, points):
+        """
+         Returns the buffers and bounds of the preview points, as taken by
+         setGeometryForRenderItem().
+        """
+        vertexBuffers = OpenMayaRender.MVertexBufferArray()
+        vertexBuffers.append(_fillVertexBuffer(OpenMayaRender.MGeometry.kPosition, 3, points), "positions")
+        bounds = OpenMaya.MBoundingBox()
+        for i in range(0, len(points), 3):
+            bounds.expand(OpenMaya.MPoint(points[i], points[i + 1], points[i + 2]))
+        return vertexBuffers, _fillIndexBuffer(array.array('I', range(len(points) // 3))), bounds
+
+    def __item(self, container, name, itemType, primitive, drawMode, shader):
+        """
+         Returns the render item called name and whether it was just
+         created.
+        """
+        item = container.find(name)
+        if item is not None:
+            return item, False
+        item = OpenMayaRender.MRenderItem.create(name, itemType, primitive)
+        item.setDrawMode(drawMode)
+        if shader:
+            item.setShader(shader)
+        container.add(item)
+        return item, True
+
+    # override
+    def supportedDrawAPIs(self):
+        return OpenMayaRender.MRenderer.kAllDevices
+
+    # override
+    def requiresUpdate(self, container, frameContext):
+        """
+         Only update when the geometry, a transform, the DAG instances or
+         the display status, which sets the wireframe color, changed.
+        """
+        if self.__state.dirty:
+            return True
+        colors = [(path.fullPathName(), tuple(OpenMayaRender.MGeometryUtilities.wireframeColor(path)))
+                  for path in self.__allPaths()]
+        return colors != self.__colors
+
+    # override
+    def update(self, container, frameContext):
+        shapeType = self.__shapeTypePlug.asShort()
+        radius, width, height = xgenProxyShapes.clampDimensions(self.__radiusPlug.asDouble(),
+                                                                self.__widthPlug.asDouble(),
+                                                                self.__heightPlug.asDouble())
+        paths = self.__allPaths()
+        if not paths:
+            self.__state.release()
+            container.clear()
+            return
+        # instances added since the last update get their callbacks
+        self.__state.watch(paths)
+        (vertexBuffers, lineIndices, triangleIndices, bounds), geometryChanged = self.__state.geometry(shapeType)
+
+        mode, previewKey, points = self.__preview.pull()
+        previewChanged = previewKey != self.__previewKey
+        if previewChanged:
+            self.__previewKey = previewKey
+            self.__previewGeometry = self.__buildPreview(points) if points else None
+        placeholder = xgenProxyPreview.showsPlaceholder(mode)
+
+        # one hardware instance per DAG path of the proxy, the unit shape
+        # being scaled to the proxy dimensions
+        sx, sy = xgenProxyShapes.unitScale(shapeType, radius, width, height)
+        scale = OpenMaya.MMatrix(((sx, 0.0, 0.0, 0.0), (0.0, sy, 0.0, 0.0), (0.0, 0.0, 1.0, 0.0),
+                                  (0.0, 0.0, 0.0, 1.0)))
+        matrices = OpenMaya.MMatrixArray()
+        shapeMatrices = OpenMaya.MMatrixArray()
+        colors = []
+        colorValues = OpenMaya.MFloatArray()
+        for path in paths:
+            matrix = path.inclusiveMatrix()
+            matrices.append(matrix)
+            shapeMatrices.append(scale * matrix)
+            color = tuple(OpenMayaRender.MGeometryUtilities.wireframeColor(path))
+            colors.append((path.fullPathName(), color))
+            for value in color:
+                colorValues.append(value)
+
+        wireItem, created = self.__item(container, kWireframeItemName, OpenMayaRender.MRenderItem.DecorationItem,
+                                        OpenMayaRender.MGeometry.kLines, OpenMayaRender.MGeometry.kAll,
+                                        sharedShader("wire", OpenMayaRender.MShaderManager.k3dSolidShader))
+        if created:
+            wireItem.setDepthPriority(OpenMayaRender.MRenderItem.sActiveWireDepthPriority)
+        if created or geometryChanged:
+            self.setGeometryForRenderItem(wireItem, vertexBuffers, lineIndices, bounds)
+        self.setInstanceTransformArray(wireItem, shapeMatrices)
+        self.setExtraInstanceData(wireItem, "solidColor", colorValues)
+        wireItem.enable(placeholder)
+
+        shadedItem, created = self.__item(container, kShadedItemName, OpenMayaRender.MRenderItem.MaterialSceneItem,
+                                          OpenMayaRender.MGeometry.kTriangles,
+                                          OpenMayaRender.MGeometry.kShaded | OpenMayaRender.MGeometry.kTextured,
+                                          sharedShader("shaded", OpenMayaRender.MShaderManager.k3dBlinnShader))
+        if created or geometryChanged:
+            self.setGeometryForRenderItem(shadedItem, vertexBuffers, triangleIndices, bounds)
+        self.setInstanceTransformArray(shadedItem, shapeMatrices)
+        shadedItem.enable(placeholder)
+
+        if self.__previewGeometry is None:
+            previewItem = container.find(kPreviewItemName)
+            if previewItem is not None:
+                previewItem.enable(False)
+        else:
+            shader = sharedShader("points", OpenMayaRender.MShaderManager.k3dFatPointShader)
+            if shader:
+                shader.setParameter("pointSize", (kPreviewPointSize, kPreviewPointSize))
+            previewItem, created = self.__item(container, kPreviewItemName, OpenMayaRender.MRenderItem.DecorationItem,
+                                               OpenMayaRender.MGeometry.kPoints, OpenMayaRender.MGeometry.kAll,
+                                               shader)
+            if created or previewChanged:
+                self.setGeometryForRenderItem(previewItem, *self.__previewGeometry)
+            # the points are in object space, not scaled with the shape
+            self.setInstanceTransformArray(previewItem, matrices)
+            self.setExtraInstanceData(previewItem, "solidColor", colorValues)
+            previewItem.enable(True)
+
+        self.__paths = paths
+        self.__colors = colors
+        self.__state.dirty = False
+
+    # override
+    def getInstancedSelectionPath(self, renderItem, intersection, dagPath):
+        """
+         Selects the DAG instance of the proxy whose hardware instance was
+         hit. Instance ids start at 1.
+        """
+        index = intersection.instanceID - 1
+        if not 0 <= index < len(self.__paths):
+            return False
+        dagPath.set(self.__paths[index])
+        return True
+
+
+def _registerOverride(instanced):
+    if instanced:
+        OpenMayaRender.MDrawRegistry.registerSubSceneOverrideCreator(kDrawClassification, kDrawRegistrantId,
+                                                                     xgenProxySubSceneOverride.creator)
+    else:
+        OpenMayaRender.MDrawRegistry.registerGeometryOverrideCreator(kDrawClassification, kDrawRegistrantId,
+                                                                     xgenProxyGeometryOverride.creator)
+    kInstancedDrawing[0] = instanced
+
+
+def _deregisterOverride():
+    if kInstancedDrawing[0]:
+        OpenMayaRender.MDrawRegistry.deregisterSubSceneOverrideCreator(kDrawClassification, kDrawRegistrantId)
+    else:
+        OpenMayaRender.MDrawRegistry.deregisterGeometryOverrideCreator(kDrawClassification, kDrawRegistrantId)
+
+
+def setInstancedDrawing(enabled):
+    """
+     Switches every proxy between the geometry override and the instanced
+     sub-scene override, and remembers the choice in the
+     "xgenProxyInstancedDraw" option var.
+    """
+    enabled = bool(enabled)
+    cmds.optionVar(intValue=(kInstancedOptionVar, int(enabled)))
+    if enabled == kInstancedDrawing[0]:
+        return
+    _deregisterOverride()
+    _releaseOverrides()
+    _registerOverride(enabled)
+    # recreate the overrides of the existing proxies
+    cmds.ogs(reset=True)
+
+
+# initialize the script plug-in
+def initializePlugin(obj):
+    plugin = OpenMaya.MFnPlugin(obj, "Autodesk", "2017", "Any")
+    instanced = bool(cmds.optionVar(query=kInstancedOptionVar)) if cmds.optionVar(exists=kInstancedOptionVar) \
+        else False
+    try:
+        _registerOverride(instanced)
+        _pluginCallbacks.append(OpenMaya.MDGMessage.addNodeRemovedCallback(_nodeRemoved, "xgenProxy"))
+    except:
+        sys.stderr.write("Failed to register draw override: %s" % kDrawRegistrantId)
+        raise
+
+
+# uninitialize the script plug-in
+def uninitializePlugin(obj):
+    plugin = OpenMaya.MFnPlugin(obj)
+    try:
+        _deregisterOverride()
+    except:
+        sys.stderr.write("Failed to deregister draw override: %s" % kDrawRegistrantId)
+        raise
+    _removeCallbacks(_pluginCallbacks)
+    del _pluginCallbacks[:]
+    _releaseOverrides()
+    releaseSharedData()
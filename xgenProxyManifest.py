@@ -0,0 +1,129 @@
+###############################################################################
+##
+## xgenProxyManifest.py
+##
+## Description:
+##    Reads the manifests of the xgenProxyCreate command, which creates many
+##    proxies in one go. A manifest is either:
+##
+##       a JSON file holding a list of proxies, or an object with a
+##       "proxies" list, every proxy being an object of the fields below
+##
+##       a CSV file whose first row names the fields of the columns
+##
+##    Fields, all optional:
+##
+##       name                    : transform name, the shape gets "Shape" added
+##       xgenFilePath, alembicFilePath, palette, description, patch
+##       cullingCamera           : camera connected to the cullingCamera attribute
+##       shapeType               : 0, 1, 2 or rectangle, circle, triangle
+##       radius, width2, height, groomPadding
+##       translate               : [x, y, z] (JSON) or "x y z" (CSV), also
+##                                 translateX, translateY, translateZ
+##
+################################################################################
+
+import csv
+import json
+import os
+
+kStringFields = ("xgenFilePath", "alembicFilePath", "palette", "description", "patch")
+kDoubleFields = ("radius", "width2", "height", "groomPadding")
+kShapeTypes = ("rectangle", "circle", "triangle")
+
+
+class ManifestError(Exception):
+    pass
+
+
+def _shapeType(value):
+    text = str(value).strip().lower()
+    if text in kShapeTypes:
+        return kShapeTypes.index(text)
+    shapeType = float(text)
+    if shapeType != int(shapeType) or not 0 <= shapeType < len(kShapeTypes):
+        raise ValueError("shapeType %s is not one of 0, 1, 2, %s" % (value, ", ".join(kShapeTypes)))
+    return int(shapeType)
+
+
+def _translate(entry):
+    value = entry.get("translate")
+    if value not in (None, ""):
+        if not isinstance(value, (list, tuple)):
+            value = str(value).replace(",", " ").split()
+        if len(value) != 3:
+            raise ValueError("translate needs 3 values")
+        return tuple(float(v) for v in value)
+
+    axes = [entry.get("translate" + axis) for axis in "XYZ"]
+    if all(v in (None, "") for v in axes):
+        return None
+    return tuple(float(v or 0.0) for v in axes)
+
+
+def proxyFromEntry(entry):
+    """
+     Returns the proxy described by a manifest entry, with the values
+     converted to the types of the xgenProxy attributes and the empty ones
+     left out.
+    """
+    proxy = {}
+    name = entry.get("name")
+    if name:
+        proxy["name"] = str(name).strip()
+    camera = entry.get("cullingCamera")
+    if camera:
+        proxy["cullingCamera"] = str(camera).strip()
+
+    for field in kStringFields:
+        value = entry.get(field)
+        if value not in (None, ""):
+            proxy[field] = str(value)
+    for field in kDoubleFields:
+        value = entry.get(field)
+        if value not in (None, ""):
+            proxy[field] = float(value)
+
+    value = entry.get("shapeType")
+    if value not in (None, ""):
+        proxy["shapeType"] = _shapeType(value)
+
+    translate = _translate(entry)
+    if translate is not None:
+        proxy["translate"] = translate
+    return proxy
+
+
+def _readEntries(path):
+    if os.path.splitext(path)[1].lower() == ".csv":
+        with open(path, "r") as f:
+            return list(csv.DictReader(f))
+
+    with open(path, "r") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("proxies", [])
+    if not isinstance(data, list):
+        raise ManifestError("%s does not hold a list of proxies" % path)
+    return data
+
+
+def readManifest(path):
+    """
+     Returns the proxies of the manifest at path as a list of dictionaries.
+     Raises ManifestError when the file or one of its entries is invalid.
+    """
+    try:
+        entries = _readEntries(path)
+    except (IOError, OSError, ValueError) as e:
+        raise ManifestError("cannot read manifest %s: %s" % (path, e))
+
+    proxies = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ManifestError("%s: entry %d is not an object" % (path, i + 1))
+        try:
+            proxies.append(proxyFromEntry(entry))
+        except ValueError as e:
+            raise ManifestError("%s: entry %d: %s" % (path, i + 1, e))
+    return proxies
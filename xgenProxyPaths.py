@@ -0,0 +1,82 @@
+###############################################################################
+##
+## xgenProxyPaths.py
+##
+## Description:
+##    Frame tokens in the xgenFilePath and alembicFilePath attributes of a
+##    proxy, so per frame files can be used without an expression or a
+##    script job per node. A path may contain:
+##
+##       <frame>   : the frame number, unpadded
+##       ####      : the frame number, zero padded to the number of #
+##       $F, $F4   : the frame number, unpadded or zero padded to the digit,
+##                   unless followed by a letter, digit or underscore
+##                   ($FOO, $F4x are left as they are)
+##
+##    Fractional frames are rounded to the nearest whole frame. Resolved
+##    paths are memoized per (template, frame). The modules reading the
+##    resolved files stat them through the short lived, bounded cache of
+##    xgenProxyDiskCache.fileStamp().
+##
+################################################################################
+
+import re
+
+import xgenProxyDiskCache
+
+kFrameToken = re.compile(r"<frame>|#+|\$F(\d*)(?!\w)")
+
+# Number of (template, frame) entries kept before the memo is reset.
+kResolvedCacheSize = 65536
+
+# (template, frame) -> resolved path
+_resolvedCache = {}
+
+
+def hasTokens(template):
+    """
+     Returns True when template contains frame tokens.
+    """
+    return kFrameToken.search(template) is not None
+
+
+def frameNumber(frame):
+    return int(frame + 0.5) if frame >= 0 else -int(-frame + 0.5)
+
+
+def _expand(template, frame):
+    number = frameNumber(frame)
+
+    def replace(match):
+        token = match.group(0)
+        if token == "<frame>":
+            return str(number)
+        if token.startswith("#"):
+            return "%0*d" % (len(token), number)
+        padding = match.group(1)
+        return "%0*d" % (int(padding), number) if padding else str(number)
+
+    return kFrameToken.sub(replace, template)
+
+
+def resolvePath(template, frame):
+    """
+     Returns template with its frame tokens replaced for the given frame.
+     Paths without tokens are returned unchanged.
+    """
+    if not template:
+        return template
+
+    key = (template, frameNumber(frame))
+    path = _resolvedCache.get(key)
+    if path is None:
+        path = _expand(template, frame) if hasTokens(template) else template
+        if len(_resolvedCache) >= kResolvedCacheSize:
+            _resolvedCache.clear()
+        _resolvedCache[key] = path
+    return path
+
+
+def clearCaches():
+    _resolvedCache.clear()
+    xgenProxyDiskCache.clearStampCache()
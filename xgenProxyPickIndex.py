@@ -0,0 +1,332 @@
+###############################################################################
+##
+## xgenProxyPickIndex.py
+##
+## Description:
+##    Scene wide spatial index of the drawn outline of every xgenProxy
+##    instance, used by the legacy viewport selection (xgenProxyUI.select)
+##    to hit test the rectangle, circle or triangle actually drawn instead
+##    of accepting every bounding box hit, see xgenProxyPicking.py.
+##
+##    Maya calls select() once per proxy whose bounding box is hit. The
+##    first call of a selection queries the grid and hit tests the proxies
+##    found there, the following calls only look their proxy up in that
+##    result. For a single click selection only the nearest proxy hit is
+##    kept.
+##
+##    Instances are updated incrementally: a world matrix changed callback
+##    per instance, xgenProxy.setDependentsDirty() and DAG changes flag them,
+##    and they are re-indexed by the next pick. Node creation and deletion
+##    and scene changes are handled like in xgenProxyRegistry.py.
+##    The xgenProxy plug-in installs the callbacks, see install().
+##
+################################################################################
+
+import maya.OpenMaya as OpenMaya
+import maya.OpenMayaUI as OpenMayaUI
+
+import xgenProxyCulling
+import xgenProxyPicking
+import xgenProxyShapes
+
+kNodeType = "xgenProxy"
+
+# Segments of the circles hit tested, finer than the pixel precision of a
+# pick at any size the circle can be selected at.
+kCircleSegments = 64
+
+# (node hash, instance number) -> (MDagPath, world space outline)
+_instances = {}
+
+# node hash -> MObjectHandle of the proxies to re-index
+_dirty = {}
+
+# (node hash, instance number) -> world matrix changed callback id
+_matrixCallbacks = {}
+
+# scene, DAG and node added/removed callback ids
+_callbacks = []
+
+_state = {"grid": None, "stale": True, "pick": None, "hits": {}}
+_stats = {"picks": 0, "candidates": 0, "hits": 0, "reindexed": 0}
+
+
+def _hash(obj):
+    return OpenMaya.MObjectHandle(obj).hashCode()
+
+
+def instanceKey(path):
+    return _hash(path.node()), path.instanceNumber()
+
+
+def _outline(path):
+    """
+     Returns the world space outline drawn for the instance at path as a
+     flat list of points, and its bounds.
+    """
+    node = OpenMaya.MFnDependencyNode(path.node())
+    shapeType = node.findPlug("shapeType").asShort()
+    radius, width, height = xgenProxyShapes.clampDimensions(node.findPlug("radius").asDouble(),
+                                                            node.findPlug("width2").asDouble(),
+                                                            node.findPlug("height").asDouble())
+    points = xgenProxyShapes.outline(shapeType, radius, width, height, kCircleSegments)
+
+    matrix = path.inclusiveMatrix()
+    outline = []
+    for i in range(0, len(points), 3):
+        p = OpenMaya.MPoint(points[i], points[i + 1], points[i + 2]) * matrix
+        outline.extend((p.x, p.y, p.z))
+    low = tuple(min(outline[i::3]) for i in range(3))
+    high = tuple(max(outline[i::3]) for i in range(3))
+    return outline, low, high
+
+
+def _matrixChanged(transform, modified, clientData):
+    handle = clientData
+    if handle.isValid():
+        _dirty[handle.hashCode()] = handle
+
+
+def _unindexNode(nodeHash):
+    grid = _state["grid"]
+    for key in [key for key in _instances if key[0] == nodeHash]:
+        del _instances[key]
+        if grid is not None:
+            grid.remove(key)
+        callbackId = _matrixCallbacks.pop(key, None)
+        if callbackId is not None:
+            OpenMaya.MMessage.removeCallback(callbackId)
+
+
+def _indexNode(obj):
+    nodeHash = _hash(obj)
+    _unindexNode(nodeHash)
+
+    grid = _state["grid"]
+    handle = OpenMaya.MObjectHandle(obj)
+    paths = OpenMaya.MDagPathArray()
+    OpenMaya.MDagPath.getAllPathsTo(obj, paths)
+    for i in range(paths.length()):
+        path = OpenMaya.MDagPath(paths[i])
+        key = instanceKey(path)
+        outline, low, high = _outline(path)
+        _instances[key] = (path, outline)
+        grid.insert(key, low, high)
+        _matrixCallbacks[key] = OpenMaya.MDagMessage.addWorldMatrixModifiedCallback(path, _matrixChanged, handle)
+    _stats["reindexed"] += 1
+
+
+def _scan():
+    result = []
+    it = OpenMaya.MItDependencyNodes(OpenMaya.MFn.kPluginShape)
+    while not it.isDone():
+        obj = it.thisNode()
+        if OpenMaya.MFnDependencyNode(obj).typeName() == kNodeType:
+            result.append(obj)
+        it.next()
+    return result
+
+
+def rebuild():
+    """
+     Rebuilds the index from the instances of the scene. The grid cell
+     size follows the median size of the proxies.
+    """
+    for callbackId in _matrixCallbacks.values():
+        OpenMaya.MMessage.removeCallback(callbackId)
+    _matrixCallbacks.clear()
+    _instances.clear()
+    _dirty.clear()
+
+    nodes = _scan()
+    outlines = []
+    for obj in nodes:
+        paths = OpenMaya.MDagPathArray()
+        OpenMaya.MDagPath.getAllPathsTo(obj, paths)
+        for i in range(paths.length()):
+            outlines.append(_outline(paths[i])[1:])
+    _state["grid"] = xgenProxyPicking.Grid(xgenProxyPicking.cellSizeFor(outlines))
+
+    for obj in nodes:
+        _indexNode(obj)
+    _state["stale"] = False
+    _state["pick"] = None
+
+
+def _update():
+    if _state["stale"] or _state["grid"] is None:
+        rebuild()
+        return
+    for nodeHash, handle in list(_dirty.items()):
+        if handle.isValid():
+            _indexNode(handle.object())
+        else:
+            _unindexNode(nodeHash)
+    _dirty.clear()
+
+
+def nodeDirty(obj):
+    """
+     Flags a proxy whose drawn shape changed, called by
+     xgenProxy.setDependentsDirty().
+    """
+    _dirty[_hash(obj)] = OpenMaya.MObjectHandle(obj)
+
+
+def _nodeAdded(obj, clientData):
+    if OpenMaya.MFileIO.isReadingFile():
+        _state["stale"] = True
+        return
+    nodeDirty(obj)
+
+
+def _nodeRemoved(obj, clientData):
+    nodeHash = _hash(obj)
+    _dirty.pop(nodeHash, None)
+    _unindexNode(nodeHash)
+
+
+def _sceneChanged(clientData):
+    _state["stale"] = True
+
+
+def _dagChanged(msgType, child, parent, clientData):
+    """
+     Reparenting or instancing changes the paths of the proxies below
+     child, flag them.
+    """
+    if not child.isValid():
+        return
+    it = OpenMaya.MItDag(OpenMaya.MItDag.kDepthFirst, OpenMaya.MFn.kPluginShape)
+    it.reset(child.node(), OpenMaya.MItDag.kDepthFirst, OpenMaya.MFn.kPluginShape)
+    while not it.isDone():
+        obj = it.currentItem()
+        if OpenMaya.MFnDependencyNode(obj).typeName() == kNodeType:
+            nodeDirty(obj)
+        it.next()
+
+
+def _selectionFrustum(selectInfo):
+    """
+     Returns the frustum of the selection rectangle of selectInfo, and a
+     tuple identifying the selection.
+    """
+    view = selectInfo.view()
+    cameraPath = OpenMaya.MDagPath()
+    view.getCamera(cameraPath)
+    camera = OpenMaya.MFnCamera(cameraPath)
+
+    utils = [OpenMaya.MScriptUtil() for i in range(4)]
+    ptrs = [util.asUintPtr() for util in utils]
+    selectInfo.selectRect(ptrs[0], ptrs[1], ptrs[2], ptrs[3])
+    x, y, width, height = [OpenMaya.MScriptUtil.getUint(ptr) for ptr in ptrs]
+
+    utils = [OpenMaya.MScriptUtil() for i in range(4)]
+    ptrs = [util.asDoublePtr() for util in utils]
+    aspect = float(view.portWidth()) / max(view.portHeight(), 1)
+    camera.getViewingFrustum(aspect, ptrs[0], ptrs[1], ptrs[2], ptrs[3], True, False, True)
+    window = [OpenMaya.MScriptUtil.getDouble(ptr) for ptr in ptrs]
+
+    near = camera.nearClippingPlane()
+    far = camera.farClippingPlane()
+    if camera.isOrtho():
+        projection = xgenProxyCulling.orthographic(window[0], window[1], window[2], window[3], near, far)
+    else:
+        projection = xgenProxyCulling.perspective(window[0], window[1], window[2], window[3], near, far)
+
+    inverse = cameraPath.inclusiveMatrixInverse()
+    worldToView = [[inverse(i, j) for j in range(4)] for i in range(4)]
+    pick = xgenProxyPicking.pickMatrix(x, y, width, height, view.portWidth(), view.portHeight())
+
+    # identifies the selection, every select() call of one pick shares it
+    signature = (x, y, width, height, view.portWidth(), view.portHeight(), tuple(map(tuple, worldToView)),
+                 tuple(window), near, far, camera.isOrtho(), selectInfo.singleSelection())
+    return xgenProxyPicking.pickFrustum(worldToView, projection, pick), signature
+
+
+def _pick(selectInfo):
+    """
+     Returns the instances hit by the selection of selectInfo as a
+     dictionary of instance key -> (depth, world space point).
+    """
+    _update()
+    frustum, signature = _selectionFrustum(selectInfo)
+    filled = selectInfo.view().displayStyle() != OpenMayaUI.M3dView.kWireFrame
+    signature += (filled, _state["grid"].version)
+    if _state["pick"] == signature:
+        return _state["hits"]
+
+    candidates = _state["grid"].query(frustum)
+    hits = {}
+    for key in candidates:
+        result = xgenProxyPicking.hitPoint(_instances[key][1], frustum.matrix, filled)
+        if result is not None:
+            hits[key] = result
+
+    if hits and selectInfo.singleSelection():
+        nearest = min(hits, key=lambda key: hits[key][0])
+        hits = {nearest: hits[nearest]}
+
+    _stats["picks"] += 1
+    _stats["candidates"] += len(candidates)
+    _stats["hits"] += len(hits)
+    _state["pick"] = signature
+    _state["hits"] = hits
+    return hits
+
+
+def hit(selectInfo):
+    """
+     Returns the world space point at which the instance being selected
+     by selectInfo is hit, or None when its drawn shape is missed.
+    """
+    result = _pick(selectInfo).get(instanceKey(selectInfo.selectPath()))
+    return result[1] if result else None
+
+
+def stats(reset=False):
+    """
+     Returns the number of picks, of proxies hit tested and of proxies
+     hit, and how many proxies were re-indexed.
+    """
+    result = dict(_stats)
+    result["indexed"] = len(_instances)
+    if reset:
+        for name in _stats:
+            _stats[name] = 0
+    return result
+
+
+def install():
+    """
+     Adds the callbacks maintaining the index.
+    """
+    if _callbacks:
+        return
+    _callbacks.append(OpenMaya.MDGMessage.addNodeAddedCallback(_nodeAdded, kNodeType))
+    _callbacks.append(OpenMaya.MDGMessage.addNodeRemovedCallback(_nodeRemoved, kNodeType))
+    # reparenting and instancing change the paths of the instances
+    _callbacks.append(OpenMaya.MDagMessage.addAllDagChangesCallback(_dagChanged))
+    for message in (OpenMaya.MSceneMessage.kAfterOpen, OpenMaya.MSceneMessage.kAfterNew,
+                    OpenMaya.MSceneMessage.kAfterImport, OpenMaya.MSceneMessage.kAfterCreateReference,
+                    OpenMaya.MSceneMessage.kAfterRemoveReference, OpenMaya.MSceneMessage.kAfterLoadReference,
+                    OpenMaya.MSceneMessage.kAfterUnloadReference):
+        _callbacks.append(OpenMaya.MSceneMessage.addCallback(message, _sceneChanged))
+    _state["stale"] = True
+
+
+def uninstall():
+    """
+     Removes every callback and empties the index.
+    """
+    for callbackId in _callbacks:
+        OpenMaya.MMessage.removeCallback(callbackId)
+    del _callbacks[:]
+    for callbackId in _matrixCallbacks.values():
+        OpenMaya.MMessage.removeCallback(callbackId)
+    _matrixCallbacks.clear()
+    _instances.clear()
+    _dirty.clear()
+    _state["grid"] = None
+    _state["stale"] = True
+    _state["pick"] = None
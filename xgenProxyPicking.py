@@ -0,0 +1,336 @@
+###############################################################################
+##
+## xgenProxyPicking.py
+##
+## Description:
+##    Maya independent hit testing for the legacy viewport selection of the
+##    xgenProxy shape, see xgenProxyPickIndex.py.
+##
+##    The world bounds of the proxies are kept in a two level sparse grid,
+##    so a pick only visits the cells its frustum goes through. The proxies
+##    found there are then tested against the outline of the drawn
+##    rectangle, circle or triangle, projected through the pick matrix of
+##    the selection rectangle: a proxy is hit when its outline (or, for
+##    shaded views, its interior) crosses the [-1, 1] square. The hit point
+##    is where the pick ray, through the centre of the square, meets the
+##    interior, or else the point of the outline nearest to the ray.
+##
+##    Matrices are 4x4 nested lists using Maya's row vector convention, like
+##    xgenProxyCulling.py.
+##
+################################################################################
+
+import math
+
+import xgenProxyCulling
+
+# Number of fine cells along each side of a coarse cell.
+kCoarseFactor = 8
+
+# Entries overlapping more fine cells than this are kept apart and tested
+# by every query.
+kMaxCellsPerEntry = 64
+
+# Points closer to the eye plane than this are clipped.
+kNearW = 1e-6
+
+
+def pickMatrix(x, y, width, height, portWidth, portHeight):
+    """
+     Returns the matrix mapping the selection rectangle, in port pixels,
+     to the [-1, 1] square once applied after the projection, like
+     gluPickMatrix.
+    """
+    width = max(float(width), 1.0)
+    height = max(float(height), 1.0)
+    sx = portWidth / width
+    sy = portHeight / height
+    cx = 2.0 * (x + width / 2.0) / portWidth - 1.0
+    cy = 2.0 * (y + height / 2.0) / portHeight - 1.0
+    return [[sx, 0.0, 0.0, 0.0],
+            [0.0, sy, 0.0, 0.0],
+            [0.0, 0.0, 1.0, 0.0],
+            [-sx * cx, -sy * cy, 0.0, 1.0]]
+
+
+def transformPoints(points, matrix):
+    """
+     Returns the flat list of (x, y, z) points transformed by matrix as a
+     list of (x, y, z, w) tuples.
+    """
+    m = matrix
+    result = []
+    for i in range(0, len(points), 3):
+        x, y, z = points[i], points[i + 1], points[i + 2]
+        result.append((x * m[0][0] + y * m[1][0] + z * m[2][0] + m[3][0],
+                       x * m[0][1] + y * m[1][1] + z * m[2][1] + m[3][1],
+                       x * m[0][2] + y * m[1][2] + z * m[2][2] + m[3][2],
+                       x * m[0][3] + y * m[1][3] + z * m[2][3] + m[3][3]))
+    return result
+
+
+def _clipPolygon(points, world):
+    """
+     Clips the closed polygon of homogeneous points to the half space in
+     front of the eye and returns it as (x, y, z, w, world point) tuples,
+     x, y and z being divided by w and world the matching point of the
+     world space polygon.
+    """
+    result = []
+    count = len(points)
+    for i in range(count):
+        a, aWorld = points[i], world[i]
+        b, bWorld = points[(i + 1) % count], world[(i + 1) % count]
+        aIn = a[3] > kNearW
+        bIn = b[3] > kNearW
+        if aIn:
+            result.append((a, aWorld))
+        if aIn != bIn:
+            t = (kNearW - a[3]) / (b[3] - a[3])
+            result.append((tuple(a[k] + t * (b[k] - a[k]) for k in range(4)),
+                           tuple(aWorld[k] + t * (bWorld[k] - aWorld[k]) for k in range(3))))
+    return [(p[0] / p[3], p[1] / p[3], p[2] / p[3], p[3], w) for p, w in result]
+
+
+def _clipSegment(a, b):
+    """
+     Returns the (t0, t1) parameter range of the 2D segment from a to b
+     inside the [-1, 1] square (Liang-Barsky clipping), None when the
+     segment misses it.
+    """
+    t0, t1 = 0.0, 1.0
+    dx = b[0] - a[0]
+    dy = b[1] - a[1]
+    for p, q in ((-dx, a[0] + 1.0), (dx, 1.0 - a[0]), (-dy, a[1] + 1.0), (dy, 1.0 - a[1])):
+        if p == 0.0:
+            if q < 0.0:
+                return None
+        else:
+            t = q / p
+            if p < 0.0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return None
+    return t0, t1
+
+
+def segmentHitsSquare(a, b):
+    """
+     Returns True when the 2D segment from a to b crosses the [-1, 1]
+     square.
+    """
+    return _clipSegment(a, b) is not None
+
+
+def _containsOrigin(points):
+    inside = False
+    count = len(points)
+    for i in range(count):
+        x0, y0 = points[i][0], points[i][1]
+        x1, y1 = points[(i + 1) % count][0], points[(i + 1) % count][1]
+        if (y0 > 0.0) != (y1 > 0.0):
+            if x0 + (0.0 - y0) * (x1 - x0) / (y1 - y0) > 0.0:
+                inside = not inside
+    return inside
+
+
+def _interpolate(points, weights):
+    """
+     Returns the depth and the world point at the pick space point with
+     the given barycentric weights of points. Depths are linear in pick
+     space, world points are interpolated with perspective correction.
+    """
+    depth = sum(weight * p[2] for weight, p in zip(weights, points))
+    weights = [weight / p[3] for weight, p in zip(weights, points)]
+    total = sum(weights)
+    world = tuple(sum(weight * p[4][k] for weight, p in zip(weights, points)) / total for k in range(3))
+    return depth, world
+
+
+def _interiorHit(points):
+    """
+     Returns the depth and world point of the interior of the convex
+     polygon at the origin of pick space, None when no triangle of its
+     fan covers the origin.
+    """
+    a = points[0]
+    for i in range(1, len(points) - 1):
+        b, c = points[i], points[i + 1]
+        area = (b[0] - a[0]) * (c[1] - a[1]) - (c[0] - a[0]) * (b[1] - a[1])
+        if area == 0.0:
+            continue
+        u = (b[0] * c[1] - c[0] * b[1]) / area
+        v = (c[0] * a[1] - a[0] * c[1]) / area
+        w = 1.0 - u - v
+        if u >= 0.0 and v >= 0.0 and w >= 0.0:
+            return _interpolate((a, b, c), (u, v, w))
+    return None
+
+
+def _outlineHit(points):
+    """
+     Returns the depth and world point of the nearest point, to the pick
+     ray, of the outline edges crossing the pick square, None when no
+     edge does.
+    """
+    result = None
+    count = len(points)
+    for i in range(count):
+        a, b = points[i], points[(i + 1) % count]
+        clipped = _clipSegment(a, b)
+        if clipped is None:
+            continue
+        dx = b[0] - a[0]
+        dy = b[1] - a[1]
+        length = dx * dx + dy * dy
+        t = -(a[0] * dx + a[1] * dy) / length if length > 0.0 else 0.0
+        t = min(max(t, clipped[0]), clipped[1])
+        hit = _interpolate((a, b), (1.0 - t, t))
+        if result is None or hit[0] < result[0]:
+            result = hit
+    return result
+
+
+def hitPoint(outline, matrix, filled):
+    """
+     Tests the closed convex outline, a flat list of world space points,
+     against the pick region of the world to pick space matrix. Returns
+     the normalized depth and the world space point at which it is hit,
+     None when it is missed.
+    """
+    world = [tuple(outline[i:i + 3]) for i in range(0, len(outline), 3)]
+    points = _clipPolygon(transformPoints(outline, matrix), world)
+    if len(points) < 2:
+        return None
+
+    if filled and len(points) > 2 and _containsOrigin(points):
+        hit = _interiorHit(points)
+        if hit is not None:
+            return hit
+    return _outlineHit(points)
+
+
+def cellSizeFor(boundsList):
+    """
+     Returns a fine cell size suited to boxes given as (low, high) pairs:
+     twice the median of their largest side.
+    """
+    sizes = sorted(max(high[i] - low[i] for i in range(3)) for low, high in boundsList)
+    if not sizes:
+        return 1.0
+    return max(sizes[len(sizes) // 2] * 2.0, 1e-3)
+
+
+class Grid(object):
+    """
+     Sparse two level grid of boxes given by key. Coarse cells hold the
+     fine cells inside them, fine cells hold the keys of the boxes
+     overlapping them.
+    """
+
+    def __init__(self, cellSize):
+        self.cellSize = float(cellSize)
+        # increased by every change, to key caches of query results
+        self.version = 0
+        # key -> (low, high, fine cells)
+        self.__entries = {}
+        # coarse cell -> {fine cell: set of keys}
+        self.__cells = {}
+        # keys of the boxes spanning too many cells
+        self.__large = set()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def __fineRange(self, low, high):
+        size = self.cellSize
+        return [(int(math.floor(low[i] / size)), int(math.floor(high[i] / size))) for i in range(3)]
+
+    def insert(self, key, low, high):
+        """
+         Adds the box of key, or moves it when key is already there.
+        """
+        self.remove(key)
+        ranges = self.__fineRange(low, high)
+        cellCount = 1
+        for first, last in ranges:
+            cellCount *= last - first + 1
+
+        cells = []
+        if cellCount > kMaxCellsPerEntry:
+            self.__large.add(key)
+        else:
+            for i in range(ranges[0][0], ranges[0][1] + 1):
+                for j in range(ranges[1][0], ranges[1][1] + 1):
+                    for k in range(ranges[2][0], ranges[2][1] + 1):
+                        cell = (i, j, k)
+                        coarse = (i // kCoarseFactor, j // kCoarseFactor, k // kCoarseFactor)
+                        self.__cells.setdefault(coarse, {}).setdefault(cell, set()).add(key)
+                        cells.append(cell)
+        self.__entries[key] = (tuple(low), tuple(high), cells)
+        self.version += 1
+
+    def remove(self, key):
+        entry = self.__entries.pop(key, None)
+        if entry is None:
+            return
+        self.__large.discard(key)
+        for cell in entry[2]:
+            coarse = (cell[0] // kCoarseFactor, cell[1] // kCoarseFactor, cell[2] // kCoarseFactor)
+            fine = self.__cells[coarse]
+            keys = fine[cell]
+            keys.discard(key)
+            if not keys:
+                del fine[cell]
+                if not fine:
+                    del self.__cells[coarse]
+        self.version += 1
+
+    def clear(self):
+        self.__entries.clear()
+        self.__cells.clear()
+        self.__large.clear()
+        self.version += 1
+
+    def bounds(self, key):
+        entry = self.__entries.get(key)
+        return (entry[0], entry[1]) if entry else None
+
+    def __cellVisible(self, frustum, cell, size):
+        low = (cell[0] * size, cell[1] * size, cell[2] * size)
+        high = (low[0] + size, low[1] + size, low[2] + size)
+        return frustum.boxVisible(low, high)
+
+    def query(self, frustum):
+        """
+         Returns the keys of the boxes inside the xgenProxyCulling.Frustum,
+         or crossing it.
+        """
+        candidates = set(self.__large)
+        coarseSize = self.cellSize * kCoarseFactor
+        for coarse, fine in self.__cells.items():
+            if not self.__cellVisible(frustum, coarse, coarseSize):
+                continue
+            for cell, keys in fine.items():
+                if self.__cellVisible(frustum, cell, self.cellSize):
+                    candidates.update(keys)
+
+        result = []
+        for key in candidates:
+            low, high = self.__entries[key][:2]
+            if frustum.boxVisible(low, high):
+                result.append(key)
+        return result
+
+
+def pickFrustum(worldToView, projection, pick):
+    """
+     Returns the xgenProxyCulling.Frustum of the selection rectangle given
+     by its pick matrix.
+    """
+    return xgenProxyCulling.Frustum(worldToView, xgenProxyCulling.multiply(projection, pick), 1.0)
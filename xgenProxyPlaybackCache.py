@@ -0,0 +1,184 @@
+###############################################################################
+##
+## xgenProxyPlaybackCache.py
+##
+## Description:
+##    Per frame cache of the time dependent draw data of the proxies, the
+##    groom bounds and the preview points, so playing a frame range again
+##    does not evaluate the bounds and rebuild the preview of every proxy,
+##    in the spirit of Maya's cached playback.
+##
+##    Every proxy owns a FrameStore holding its frames in contiguous
+##    arrays: six doubles of bounds per frame and all the preview points
+##    one after the other. xgenProxy.setDependentsDirty() drops the store
+##    of a proxy when an input other than time changes, including inputs
+##    animated by a connection, which are then never cached.
+##
+##    All stores share a memory budget, in megabytes, read from the
+##    "xgenProxyPlaybackCacheMB" option var when the plug-in loads, see
+##    setBudget(). The least recently used stores are dropped first, 0
+##    disables the cache.
+##
+################################################################################
+
+import array
+import collections
+import itertools
+import threading
+
+kBudgetOptionVar = "xgenProxyPlaybackCacheMB"
+kDefaultBudgetMB = 512
+
+_state = {"budget": kDefaultBudgetMB * 1024 * 1024, "bytes": 0}
+_stats = {"hits": 0, "misses": 0, "evicted": 0}
+
+# owner -> FrameStore, most recently used last
+_stores = collections.OrderedDict()
+_lock = threading.Lock()
+
+_owners = itertools.count(1)
+
+
+def newOwner():
+    """
+     Returns a key identifying a proxy for its whole life, ids of deleted
+     nodes are never reused.
+    """
+    return next(_owners)
+
+
+def frameKey(frame):
+    return round(frame, 3)
+
+
+class FrameStore(object):
+    """
+     Frames of one proxy. Frame i of the store has its bounds at
+     bounds[i * 6:i * 6 + 6] and its points at points[offsets[i]:offsets[i] +
+     counts[i]].
+    """
+
+    def __init__(self):
+        self.__slots = {}
+        self.__bounds = array.array('d')
+        self.__valid = array.array('b')
+        self.__offsets = array.array('L')
+        self.__counts = array.array('L')
+        self.__points = array.array('f')
+
+    def __contains__(self, frame):
+        return frame in self.__slots
+
+    def __len__(self):
+        return len(self.__slots)
+
+    def nbytes(self):
+        arrays = (self.__bounds, self.__valid, self.__offsets, self.__counts, self.__points)
+        return sum(len(a) * a.itemsize for a in arrays)
+
+    def add(self, frame, bounds, points):
+        """
+         Appends a frame, bounds being None when unknown and points None
+         when there is no preview. Returns the number of bytes added.
+        """
+        before = self.nbytes()
+        self.__slots[frame] = len(self.__valid)
+        self.__valid.append(1 if bounds is not None else 0)
+        self.__bounds.extend(bounds if bounds is not None else (0.0,) * 6)
+        self.__offsets.append(len(self.__points))
+        self.__counts.append(len(points) if points is not None else 0)
+        if points is not None:
+            self.__points.extend(points)
+        return self.nbytes() - before
+
+    def get(self, frame):
+        """
+         Returns the (bounds, points) of a frame, points being None when
+         the frame had no preview.
+        """
+        slot = self.__slots[frame]
+        bounds = tuple(self.__bounds[slot * 6:slot * 6 + 6]) if self.__valid[slot] else None
+        count = self.__counts[slot]
+        points = None
+        if count:
+            offset = self.__offsets[slot]
+            points = self.__points[offset:offset + count]
+        return bounds, points
+
+
+def lookup(owner, frame):
+    """
+     Returns the (bounds, points) cached for a proxy at frame, or None.
+    """
+    with _lock:
+        frames = _stores.pop(owner, None)
+        if frames is not None:
+            _stores[owner] = frames
+            if frame in frames:
+                _stats["hits"] += 1
+                return frames.get(frame)
+        _stats["misses"] += 1
+    return None
+
+
+def store(owner, frame, bounds, points):
+    """
+     Caches the draw data of a proxy at frame, within the budget.
+    """
+    if _state["budget"] <= 0:
+        return
+    with _lock:
+        frames = _stores.pop(owner, None)
+        if frames is None:
+            frames = FrameStore()
+        if frame not in frames:
+            _state["bytes"] += frames.add(frame, bounds, points)
+        _stores[owner] = frames
+
+        while _state["bytes"] > _state["budget"] and _stores:
+            evicted = _stores.popitem(last=False)[1]
+            _state["bytes"] -= evicted.nbytes()
+            _stats["evicted"] += 1
+
+
+def invalidate(owner):
+    """
+     Drops every frame cached for a proxy.
+    """
+    with _lock:
+        frames = _stores.pop(owner, None)
+        if frames is not None:
+            _state["bytes"] -= frames.nbytes()
+
+
+def clear(*args):
+    with _lock:
+        _stores.clear()
+        _state["bytes"] = 0
+
+
+def setBudget(megabytes):
+    """
+     Sets the memory budget shared by all the proxies, in megabytes.
+    """
+    with _lock:
+        _state["budget"] = int(max(megabytes, 0) * 1024 * 1024)
+    if _state["budget"] <= 0:
+        clear()
+
+
+def stats(reset=False):
+    """
+     Returns the hits, misses and stores evicted since the last reset,
+     with the number of proxies and frames cached and the bytes used.
+    """
+    with _lock:
+        result = dict(_stats)
+        result["proxies"] = len(_stores)
+        result["frames"] = sum(len(frames) for frames in _stores.values())
+        result["bytes"] = _state["bytes"]
+        result["budget"] = _state["budget"]
+        if reset:
+            for name in _stats:
+                _stats[name] = 0
+    return result
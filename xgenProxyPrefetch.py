@@ -0,0 +1,381 @@
+###############################################################################
+##
+## xgenProxyPrefetch.py
+##
+## Description:
+##    Background loading of the per frame data of the proxies during
+##    playback, so frame changes do not wait on file reads.
+##
+##    On every frame change the next kPrefetchFramesOptionVar frames of
+##    every visible proxy are queued to a pool of kPrefetchThreadsOptionVar
+##    worker threads. A worker maps the Alembic file of the frame in memory
+##    and touches its pages, which pulls it into the system file cache
+##    before PyAlembic reads it, then evaluates the patch bounds and, for
+##    proxies previewing points, the preview points through their cached
+##    readers (xgenProxyBounds.py, xgenProxyPreview.py). Memory is bounded
+##    by those caches, the preview cache by kMemoryCacheBytes.
+##
+##    The proxies read are listed once, hidden ones included, and only
+##    listed again when proxies are added or removed (see
+##    xgenProxyRegistry.addListener()), when an attribute they are read
+##    from changes (see invalidateTargets()) or on jumps backwards or past
+##    the prefetched frames.
+##    Which of them are visible is checked on every frame change, so
+##    unhiding a proxy prefetches it from the next frame on. Only the
+##    first kWarmBytesPerFile bytes of a file are pulled in the file cache.
+##
+##    Stepping or scrubbing backwards cancels all queued work. stats()
+##    reports the playback frame rate and how many frames were ready when
+##    playback reached them, to size the number of frames and threads:
+##
+##       import xgenProxyPrefetch
+##       xgenProxyPrefetch.stats()
+##
+##    The xgenProxy plug-in installs the time changed callback in
+##    interactive sessions, see install().
+##
+################################################################################
+
+import collections
+import mmap
+import os
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import maya.OpenMaya as OpenMaya
+import maya.cmds as cmds
+
+import xgenProxyBounds
+import xgenProxyCollection
+import xgenProxyDiskCache
+import xgenProxyPaths
+import xgenProxyPreview
+import xgenProxyRegistry
+
+kNodeType = "xgenProxy"
+
+kPrefetchFramesOptionVar = "xgenProxyPrefetchFrames"
+kPrefetchThreadsOptionVar = "xgenProxyPrefetchThreads"
+kDefaultPrefetchFrames = 8
+kDefaultPrefetchThreads = 4
+
+# Pages are touched every kPageSize bytes, up to kWarmBytesPerFile bytes per
+# file. Files are only warmed once per version, kWarmedFiles of them are
+# remembered.
+kPageSize = mmap.PAGESIZE
+kWarmBytesPerFile = 64 * 1024 * 1024
+kWarmedFiles = 4096
+
+# Frames kept to compute the playback frame rate.
+kFrameRateWindow = 48
+
+
+def _optionVar(name, default):
+    if cmds.optionVar(exists=name):
+        return cmds.optionVar(query=name)
+    return default
+
+
+def warmFile(path, limit=kWarmBytesPerFile):
+    """
+     Maps the first limit bytes of the file at path in memory and touches
+     every page of them, so the next read is served from the system file
+     cache. Returns the number of bytes touched.
+    """
+    try:
+        with open(path, "rb") as f:
+            size = min(os.fstat(f.fileno()).st_size, limit)
+            if size <= 0:
+                return 0
+            mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            try:
+                for offset in range(0, size, kPageSize):
+                    mapped[offset]
+            finally:
+                mapped.close()
+    except (IOError, OSError, ValueError):
+        return 0
+    return size
+
+
+class Prefetcher(object):
+    """
+     Pool of worker threads running the jobs of upcoming frames. Jobs
+     are callables, they are dropped when cancel() is called before a
+     worker gets to them.
+    """
+
+    def __init__(self, threadCount):
+        self.__queue = queue.Queue()
+        self.__lock = threading.Lock()
+        # bumped by cancel(), jobs of older generations are skipped
+        self.__generation = 0
+        # frame -> number of its jobs not done yet
+        self.__pending = {}
+        self.__done = set()
+        self.__counts = {"queued": 0, "completed": 0, "cancelled": 0, "failed": 0}
+        self.__threads = []
+        for i in range(threadCount):
+            thread = threading.Thread(target=self.__work, name="xgenProxyPrefetch%d" % i)
+            thread.daemon = True
+            thread.start()
+            self.__threads.append(thread)
+
+    def __work(self):
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                return
+            generation, frame, job = item
+            with self.__lock:
+                current = generation == self.__generation
+                if not current:
+                    self.__counts["cancelled"] += 1
+            if current:
+                try:
+                    job()
+                except Exception:
+                    with self.__lock:
+                        self.__counts["failed"] += 1
+            with self.__lock:
+                if generation == self.__generation:
+                    self.__counts["completed"] += 1
+                    self.__pending[frame] -= 1
+                    if not self.__pending[frame]:
+                        del self.__pending[frame]
+                        self.__done.add(frame)
+
+    def submit(self, frame, jobs):
+        """
+         Queues the jobs loading frame, unless it is done or queued.
+        """
+        with self.__lock:
+            if frame in self.__done or frame in self.__pending:
+                return
+            if not jobs:
+                self.__done.add(frame)
+                return
+            self.__pending[frame] = len(jobs)
+            self.__counts["queued"] += len(jobs)
+            generation = self.__generation
+        for job in jobs:
+            self.__queue.put((generation, frame, job))
+
+    def isReady(self, frame):
+        with self.__lock:
+            return frame in self.__done
+
+    def forget(self, frames):
+        """
+         Forgets done frames outside of frames, their data may have been
+         evicted from the caches since.
+        """
+        with self.__lock:
+            self.__done &= set(frames)
+
+    def cancel(self):
+        with self.__lock:
+            self.__generation += 1
+            self.__pending.clear()
+            self.__done.clear()
+
+    def counts(self):
+        with self.__lock:
+            result = dict(self.__counts)
+            result["pending"] = sum(self.__pending.values())
+        return result
+
+    def shutdown(self):
+        self.cancel()
+        for thread in self.__threads:
+            self.__queue.put(None)
+        del self.__threads[:]
+
+
+# "targets" lists the (MDagPath, target) of every proxy, see _targets()
+# "submitted" the targets of the queued jobs
+_state = {"prefetcher": None, "callback": None, "frame": None, "targets": None, "submitted": None,
+          "lastTime": None}
+_stats = {"hits": 0, "misses": 0}
+_frameTimes = collections.deque(maxlen=kFrameRateWindow)
+
+# (path, mtime) of the files warmed, most recently used last
+_warmed = collections.OrderedDict()
+_warmedLock = threading.Lock()
+
+
+def _warmOnce(path):
+    mtime = xgenProxyDiskCache.fileStamp(path)
+    if mtime is None:
+        return
+    key = (path, mtime)
+    with _warmedLock:
+        if key in _warmed:
+            return
+        _warmed[key] = True
+        while len(_warmed) > kWarmedFiles:
+            _warmed.popitem(last=False)
+    warmFile(path)
+
+
+def invalidateTargets(*args):
+    """
+     Lists the proxies read again on the next frame change. Called when
+     proxies are added or removed and by xgenProxy.setDependentsDirty().
+    """
+    _state["targets"] = None
+
+
+def _targets():
+    """
+     Returns the (MDagPath, target) of every proxy instance of the scene,
+     target being the (alembic file path, patch, preview percent or None,
+     xgen file path, palette, description) it reads, the names only being
+     kept for previews.
+    """
+    result = []
+    it = OpenMaya.MItDag(OpenMaya.MItDag.kDepthFirst, OpenMaya.MFn.kPluginShape)
+    while not it.isDone():
+        path = OpenMaya.MDagPath()
+        it.getPath(path)
+        node = OpenMaya.MFnDependencyNode(path.node())
+        if node.typeName() == kNodeType:
+            template = node.findPlug("alembicFilePath").asString()
+            patch = node.findPlug("patch").asString()
+            percent = None
+            names = ("", "", "")
+            if xgenProxyPreview.showsPoints(node.findPlug("previewMode").asShort()):
+                percent = node.findPlug("previewPercent").asDouble()
+                names = tuple(node.findPlug(name).asString() for name in ("xgenFilePath", "palette", "description"))
+            if template and patch:
+                result.append((path, (template, patch, percent) + names))
+        it.next()
+    return result
+
+
+def _visibleTargets():
+    """
+     Returns the distinct targets of the visible proxies.
+    """
+    if _state["targets"] is None or not all(path.isValid() for path, target in _state["targets"]):
+        _state["targets"] = _targets()
+    return sorted(set(target for path, target in _state["targets"] if path.isVisible()))
+
+
+def _job(target, frame, fps):
+    template, patch, percent, xgenTemplate, palette, description = target
+
+    def load():
+        path = xgenProxyPaths.resolvePath(template, frame)
+        _warmOnce(path)
+        density = None
+        if percent is not None:
+            xgenPath = xgenProxyPaths.resolvePath(xgenTemplate, frame)
+            density = xgenProxyCollection.groomDensity(
+                xgenPath, *xgenProxyCollection.resolveNames(xgenPath, palette, description))
+        for name in xgenProxyBounds.resolvePatches(path, patch):
+            xgenProxyBounds.patchBounds(path, name, frame, fps)
+            if percent is not None:
+                xgenProxyPreview.patchPoints(path, name, frame, fps, percent, density)
+    return load
+
+
+def _timeChanged(newTime, clientData):
+    prefetcher = _state["prefetcher"]
+    if prefetcher is None:
+        return
+
+    uiUnit = OpenMaya.MTime.uiUnit()
+    frame = newTime.asUnits(uiUnit)
+    fps = OpenMaya.MTime(1.0, OpenMaya.MTime.kSeconds).asUnits(uiUnit)
+    now = time.time()
+
+    count = int(_optionVar(kPrefetchFramesOptionVar, kDefaultPrefetchFrames))
+    previous = _state["frame"]
+    step = 1.0
+    # frames prefetched ahead are as far apart as those played
+    stride = 1.0
+    if previous is not None:
+        step = frame - previous
+        if step < 0.0:
+            # scrubbing backwards, everything queued is useless
+            prefetcher.cancel()
+        if step < 0.0 or step > max(count, 1):
+            # a jump, not playback, the proxies are listed again
+            _frameTimes.clear()
+            _state["targets"] = None
+        elif step > 0.0:
+            # playback, also when it skips frames to keep up
+            _frameTimes.append(now - _state["lastTime"])
+            stride = step
+
+    if previous is not None and step > 0.0:
+        if prefetcher.isReady(frame):
+            _stats["hits"] += 1
+        else:
+            _stats["misses"] += 1
+    _state["frame"] = frame
+    _state["lastTime"] = now
+
+    targets = _visibleTargets()
+    if targets != _state["submitted"]:
+        # frames done or queued miss the new targets
+        prefetcher.cancel()
+        _state["submitted"] = targets
+    frames = [frame + i * stride for i in range(1, count + 1)]
+    prefetcher.forget(frames)
+    for upcoming in frames:
+        prefetcher.submit(upcoming, [_job(target, upcoming, fps) for target in targets])
+
+
+def stats(reset=False):
+    """
+     Returns the playback frame rate, the number of frames that were (hits)
+     and were not (misses) prefetched when playback reached them, the
+     work done by the threads and the bytes held by the preview cache.
+    """
+    result = dict(_stats)
+    total = result["hits"] + result["misses"]
+    result["hitRate"] = result["hits"] / float(total) if total else 0.0
+    result["fps"] = len(_frameTimes) / sum(_frameTimes) if _frameTimes and sum(_frameTimes) > 0.0 else 0.0
+    if _state["prefetcher"] is not None:
+        result.update(_state["prefetcher"].counts())
+    result["previewBytes"] = xgenProxyPreview.cacheBytes()
+    if reset:
+        _stats["hits"] = 0
+        _stats["misses"] = 0
+        _frameTimes.clear()
+    return result
+
+
+def install():
+    """
+     Starts the worker threads and the time changed callback. Does nothing
+     when kPrefetchFramesOptionVar is 0.
+    """
+    if _state["callback"] is not None:
+        return
+    if int(_optionVar(kPrefetchFramesOptionVar, kDefaultPrefetchFrames)) <= 0:
+        return
+    threadCount = max(int(_optionVar(kPrefetchThreadsOptionVar, kDefaultPrefetchThreads)), 1)
+    _state["prefetcher"] = Prefetcher(threadCount)
+    _state["callback"] = OpenMaya.MDGMessage.addTimeChangeCallback(_timeChanged)
+    xgenProxyRegistry.addListener(invalidateTargets)
+
+
+def uninstall():
+    if _state["callback"] is not None:
+        OpenMaya.MMessage.removeCallback(_state["callback"])
+        _state["callback"] = None
+        xgenProxyRegistry.removeListener(invalidateTargets)
+    if _state["prefetcher"] is not None:
+        _state["prefetcher"].shutdown()
+        _state["prefetcher"] = None
+    _state["frame"] = None
+    _state["targets"] = None
+    _state["submitted"] = None
@@ -0,0 +1,407 @@
+###############################################################################
+##
+## xgenProxyPreview.py
+##
+## Description:
+##    Point cloud preview of where the primitives of a description grow,
+##    drawn by the xgenProxy shape when its "previewMode" attribute asks
+##    for it.
+##
+##    The procedural grows primitives from the patch geometry of the
+##    Alembic file (the proxy's "alembicFilePath"). The preview scatters
+##    root points uniformly over the area of every patch, the way xgen's
+##    random generator does, and moves them with the patch on every frame.
+##    A patch gets as many root points as the density of its description
+##    (see xgenProxyCollection.groomDensity()) grows primitives on its area,
+##    at most kRootPointsPerPatch, and kRootPointsPerPatch when the density
+##    is unknown.
+##
+##    Every root point has a fixed id, and where it lies on the patch is
+##    decided once, from the first sample of the file. The "previewPercent"
+##    attribute keeps the points whose hashed id falls below that
+##    percentage, so the same points are drawn on every frame and raising
+##    the percentage only adds points.
+##
+##    Point positions are returned as contiguous float arrays of x, y, z
+##    triplets and cached in memory, least recently used first out, within
+##    kMemoryCacheBytes. Reads that fail return kReadFailed, they are not
+##    cached and are tried again by the next draw. The layouts of the root
+##    points are kept for the kLayoutCount most recently used patches.
+##
+##    Scattering a patch takes long. Once setLayoutCallback() was given a
+##    callback, as the xgenProxy plug-in does in interactive sessions,
+##    reads that must not wait (wait=False, from compute and draw code)
+##    scatter on a background thread and get None until it is done, the
+##    callback is then called, from that thread, so the proxies can be
+##    evaluated again.
+##    Reading requires the PyAlembic module, see xgenProxyBounds.py, when
+##    it is not available there is nothing to preview.
+##
+################################################################################
+
+import array
+import bisect
+import collections
+import math
+import threading
+import zlib
+
+import xgenProxyBounds
+import xgenProxyDiskCache
+
+kPreviewPlaceholder, kPreviewPoints, kPreviewBoth = range(3)
+kPreviewModes = ("placeholder", "points", "placeholderAndPoints")
+
+kRootPointsPerPatch = 50000
+kDefaultPreviewPercent = 10.0
+
+# Bytes of point arrays kept in memory, the prefetcher fills the cache
+# ahead of playback, see xgenProxyPrefetch.py.
+kMemoryCacheBytes = 256 * 1024 * 1024
+
+# Sets of kept ids, by percent, remembered per layout.
+kIdSetsPerLayout = 4
+
+# Layouts kept in memory, each one takes at most 20 bytes per root point
+# and its kept ids 4 bytes per point and set.
+kLayoutCount = 128
+
+# Returned instead of points when reading the patch failed, the caller
+# must not keep it either.
+kReadFailed = object()
+
+# (path, mtime, patch, density) -> layout of the root points, see _layout(),
+# most recently used last
+_layouts = collections.OrderedDict()
+
+# (path, mtime, patch, frame, percent) -> point array, most recently used last
+_memoryCache = collections.OrderedDict()
+_cacheBytes = [0]
+
+_lock = threading.RLock()
+
+# called with the path and patch of every layout scattered in the background
+_state = {"layoutCallback": None}
+
+
+def showsPlaceholder(mode):
+    return mode != kPreviewPoints
+
+
+def showsPoints(mode):
+    return mode in (kPreviewPoints, kPreviewBoth)
+
+
+def _mix(value):
+    """
+     Returns a well distributed 32 bit hash of a 32 bit integer.
+    """
+    value &= 0xffffffff
+    value = ((value ^ (value >> 16)) * 0x45d9f3b) & 0xffffffff
+    value = ((value ^ (value >> 16)) * 0x45d9f3b) & 0xffffffff
+    return value ^ (value >> 16)
+
+
+def _unit(seed, i):
+    return _mix(seed ^ (i * 0x9e3779b1)) / 4294967296.0
+
+
+def _patchSeed(patch):
+    return zlib.crc32(patch.encode("utf-8")) & 0xffffffff
+
+
+def keptIds(seed, count, percent):
+    """
+     Returns the ids, among count, whose hash falls below percent. The
+     result for a given seed only grows with percent.
+    """
+    limit = max(0.0, min(percent, 100.0)) / 100.0
+    return array.array('I', [i for i in range(count) if _unit(seed + 1, i) < limit])
+
+
+def setLayoutCallback(callback):
+    """
+     Scatters the layouts read with wait=False on background threads and
+     calls callback(path, patch) once each is done, or scatters them
+     right away when callback is None.
+    """
+    _state["layoutCallback"] = callback
+
+
+def _readMesh(path, mtime, patch, seconds=None):
+    """
+     Returns the positions, face counts and face indices of the patch
+     geometry at the given time, or at the first sample when seconds is
+     None, or None when there is no such polygon patch. The archive is
+     shared with xgenProxyBounds.py.
+    """
+    alembic = xgenProxyBounds.alembic
+    entry = xgenProxyBounds.archive(path, mtime)
+    with entry["lock"]:
+        obj = xgenProxyBounds.findObject(entry, patch)
+        if obj is None:
+            return None
+        schema = xgenProxyBounds._geometrySchema(obj)
+        if schema is None:
+            return None
+
+        selector = alembic.Abc.ISampleSelector() if seconds is None else alembic.Abc.ISampleSelector(seconds)
+        sample = schema.getValue(selector)
+        if not hasattr(sample, "getFaceCounts"):
+            # NURBS patches
+            return None
+        return sample.getPositions(), sample.getFaceCounts(), sample.getFaceIndices()
+
+
+def rootPointCount(area, density):
+    """
+     Returns the number of root points of a patch of the given area, for
+     a description of the given density or None when it is unknown.
+    """
+    if density is None:
+        return kRootPointsPerPatch
+    return max(0, min(kRootPointsPerPatch, int(math.ceil(area * density))))
+
+
+def scatter(seed, positions, faceCounts, faceIndices, density=None):
+    """
+     Returns where the root points of the polygons lie, see
+     rootPointCount(): the indices of the corners of their triangle and
+     their barycentric coordinates, as arrays (a, b, c, u, v). Points are
+     spread by triangle area.
+    """
+    triangles = []
+    areas = []
+    total = 0.0
+    start = 0
+    for faceCount in faceCounts:
+        for k in range(1, faceCount - 1):
+            a, b, c = faceIndices[start], faceIndices[start + k], faceIndices[start + k + 1]
+            pa, pb, pc = positions[a], positions[b], positions[c]
+            e1 = [pb[i] - pa[i] for i in range(3)]
+            e2 = [pc[i] - pa[i] for i in range(3)]
+            cross = (e1[1] * e2[2] - e1[2] * e2[1], e1[2] * e2[0] - e1[0] * e2[2], e1[0] * e2[1] - e1[1] * e2[0])
+            total += math.sqrt(cross[0] * cross[0] + cross[1] * cross[1] + cross[2] * cross[2]) / 2.0
+            triangles.append((a, b, c))
+            areas.append(total)
+        start += faceCount
+
+    layout = (array.array('I'), array.array('I'), array.array('I'), array.array('f'), array.array('f'))
+    if not triangles or total <= 0.0:
+        return layout
+
+    count = rootPointCount(total, density)
+    for i in range(count):
+        # stratified along the cumulative area, jittered by the id hash
+        target = (i + _unit(seed, i)) / count * total
+        a, b, c = triangles[min(bisect.bisect_left(areas, target), len(triangles) - 1)]
+        u = _unit(seed + 2, i)
+        v = _unit(seed + 3, i)
+        if u + v > 1.0:
+            u, v = 1.0 - u, 1.0 - v
+        layout[0].append(a)
+        layout[1].append(b)
+        layout[2].append(c)
+        layout[3].append(u)
+        layout[4].append(v)
+    return layout
+
+
+def evaluate(layout, ids, positions):
+    """
+     Returns the positions of the root points ids of layout on the
+     polygons with the given vertex positions.
+    """
+    corners0, corners1, corners2, us, vs = layout
+    points = array.array('f')
+    for i in ids:
+        pa = positions[corners0[i]]
+        pb = positions[corners1[i]]
+        pc = positions[corners2[i]]
+        u = us[i]
+        v = vs[i]
+        w = 1.0 - u - v
+        points.extend((w * pa[0] + u * pb[0] + v * pc[0],
+                       w * pa[1] + u * pb[1] + v * pc[1],
+                       w * pa[2] + u * pb[2] + v * pc[2]))
+    return points
+
+
+def _scatterLayout(key, entry):
+    """
+     Scatters the layout of entry. A failed read drops the entry, so the
+     next read tries again, and raises.
+    """
+    path, mtime, patch, density = key
+    try:
+        mesh = _readMesh(path, mtime, patch)
+        entry["layout"] = scatter(_patchSeed(patch), mesh[0], mesh[1], mesh[2], density) if mesh else None
+    except Exception:
+        with _lock:
+            if _layouts.get(key) is entry:
+                del _layouts[key]
+        entry["failed"] = True
+        raise
+    finally:
+        entry["ready"].set()
+
+
+def _scatterInBackground(key, entry, callback):
+    try:
+        _scatterLayout(key, entry)
+    except Exception:
+        return
+    callback(key[0], key[2])
+
+
+def _layout(path, mtime, patch, density, wait):
+    """
+     Returns the layout of the root points of a patch, with its kept ids
+     by percent, scattered once per file version and density. Returns
+     None when wait is False and the layout is being scattered in the
+     background, see setLayoutCallback().
+    """
+    key = (path, mtime, patch, density)
+    callback = _state["layoutCallback"]
+    with _lock:
+        entry = _layouts.pop(key, None)
+        scatterIt = entry is None
+        if scatterIt:
+            entry = {"layout": None, "ids": collections.OrderedDict(), "ready": threading.Event(), "failed": False}
+        _layouts[key] = entry
+        while len(_layouts) > kLayoutCount:
+            _layouts.popitem(last=False)
+
+    if scatterIt:
+        if not wait and callback is not None:
+            thread = threading.Thread(target=_scatterInBackground, args=(key, entry, callback),
+                                      name="xgenProxyPreviewLayout")
+            thread.daemon = True
+            thread.start()
+            return None
+        _scatterLayout(key, entry)
+    elif not entry["ready"].is_set():
+        if not wait:
+            return None
+        entry["ready"].wait()
+
+    if entry["failed"]:
+        raise IOError("cannot read patch %s of %s" % (patch, path))
+    return entry
+
+
+def _keptIds(entry, patch, percent):
+    """
+     Returns the ids of the layout entry kept by percent, remembering the
+     last kIdSetsPerLayout sets.
+    """
+    percentKey = round(percent, 3)
+    with _lock:
+        ids = entry["ids"].pop(percentKey, None)
+    if ids is None:
+        ids = keptIds(_patchSeed(patch), len(entry["layout"][0]), percent)
+    with _lock:
+        entry["ids"][percentKey] = ids
+        while len(entry["ids"]) > kIdSetsPerLayout:
+            entry["ids"].popitem(last=False)
+    return ids
+
+
+def _nbytes(points):
+    return len(points) * points.itemsize
+
+
+def _cacheKey(path, mtime, patch, frame, percent, density):
+    return (path, mtime, patch, round(frame, 3), round(percent, 3),
+            round(density, 6) if density is not None else None)
+
+
+def patchPoints(path, patch, frame, fps, percent, density=None, wait=True):
+    """
+     Returns the root points of one patch kept by percent at the given
+     frame, as a float array of x, y, z triplets, for a description of
+     the given density. Returns None when wait is False and the patch is
+     still being scattered, kReadFailed when it could not be read.
+    """
+    empty = array.array('f')
+    if not path or not patch or not xgenProxyBounds.available() or percent <= 0.0:
+        return empty
+    mtime = xgenProxyDiskCache.fileStamp(path)
+    if mtime is None:
+        return empty
+
+    key = _cacheKey(path, mtime, patch, frame, percent, density)
+    with _lock:
+        points = _memoryCache.pop(key, None)
+        if points is not None:
+            _memoryCache[key] = points
+            return points
+
+    try:
+        entry = _layout(path, mtime, patch, key[-1], wait)
+        if entry is None:
+            return None
+        layout = entry["layout"]
+        if layout is None or not layout[0]:
+            points = empty
+        else:
+            ids = _keptIds(entry, patch, percent)
+            mesh = _readMesh(path, mtime, patch, frame / float(fps))
+            points = evaluate(layout, ids, mesh[0]) if mesh else empty
+    except Exception:
+        # not cached, the next read tries again
+        return kReadFailed
+
+    with _lock:
+        previous = _memoryCache.pop(key, None)
+        if previous is not None:
+            _cacheBytes[0] -= _nbytes(previous)
+        _memoryCache[key] = points
+        _cacheBytes[0] += _nbytes(points)
+        while _cacheBytes[0] > kMemoryCacheBytes and len(_memoryCache) > 1:
+            _cacheBytes[0] -= _nbytes(_memoryCache.popitem(last=False)[1])
+    return points
+
+
+def isCached(path, patch, frame, percent, density=None):
+    """
+     Returns True when the points of a patch at frame are in memory.
+    """
+    mtime = xgenProxyDiskCache.fileStamp(path)
+    with _lock:
+        return _cacheKey(path, mtime, patch, frame, percent, density) in _memoryCache
+
+
+def cacheBytes():
+    return _cacheBytes[0]
+
+
+def previewPoints(path, patches, frame, fps, percent, density=None, wait=True):
+    """
+     Returns the root points of all the patches kept by percent at the
+     given frame, as one float array of x, y, z triplets. Returns None
+     when wait is False and one of the patches is still being scattered,
+     else kReadFailed when one of them could not be read.
+    """
+    result = array.array('f')
+    pending = False
+    failed = False
+    for patch in patches:
+        points = patchPoints(path, patch, frame, fps, percent, density, wait)
+        if points is None:
+            # keep going, so every patch starts scattering
+            pending = True
+        elif points is kReadFailed:
+            failed = True
+        elif not pending and not failed:
+            result.extend(points)
+    if pending:
+        return None
+    return kReadFailed if failed else result
+
+
+def clearMemoryCache():
+    with _lock:
+        _layouts.clear()
+        _memoryCache.clear()
+        _cacheBytes[0] = 0
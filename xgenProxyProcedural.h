@@ -0,0 +1,83 @@
+// Generated by xgenProxyProcedural.py from its tables, do not edit.
+// Run python xgenProxyProcedural.py after changing them.
+
+#ifndef __XGENPROXYPROCEDURAL_H__
+#define __XGENPROXYPROCEDURAL_H__
+
+// flags of the procedural data string
+#define DATA_LOG_FORMAT "-debug %d -warning %d -stats %d -frame %f "
+#define DATA_FILE_FLAG " -file "
+#define DATA_PALETTE_FLAG " -palette "
+#define DATA_GEOM_FLAG " -geom "
+#define DATA_PATCH_FLAG " -patch "
+#define DATA_DESCRIPTION_FLAG " -description "
+#define DATA_FPS_FORMAT " -fps %f "
+#define DATA_SAMPLES_LOOKUP_FLAG " -motionSamplesLookup "
+#define DATA_SAMPLES_PLACEMENT_FLAG " -motionSamplesPlacement "
+#define DATA_SAMPLE_FORMAT "%f "
+#define DATA_NO_SAMPLES "0.0"
+#define DATA_WORLD_FLAG " -world "
+
+// separators of the names of the patch attribute, the characters of
+// glob patterns and the separator of the names of the patch procedurals
+#define PATCH_SEPARATORS " \t\r\n,"
+#define PATCH_GLOB_CHARACTERS "*?["
+#define PATCH_NAME_SEPARATOR "@"
+
+#define DEFER_LOAD_ENV "XGEN_PROXY_DEFER_LOAD"
+#define UNKNOWN_BOUNDS_SIZE 10000.0f
+
+// user parameters of the procedurals and their declarations
+#define PARAM_CAMERA "irRenderCam"
+#define PARAM_CAMERA_TYPE "constant STRING"
+#define PARAM_CAMERA_FOV "irRenderCamFOV"
+#define PARAM_CAMERA_FOV_TYPE "constant STRING"
+#define PARAM_CAMERA_XFORM "irRenderCamXform"
+#define PARAM_CAMERA_XFORM_TYPE "constant STRING"
+#define PARAM_CAMERA_RATIO "irRenderCamRatio"
+#define PARAM_CAMERA_RATIO_TYPE "constant STRING"
+#define PARAM_TYPED_CAMERA_ORTHO "irRenderCameraOrtho"
+#define PARAM_TYPED_CAMERA_ORTHO_TYPE "constant BOOL"
+#define PARAM_TYPED_CAMERA_POS "irRenderCameraPos"
+#define PARAM_TYPED_CAMERA_POS_TYPE "constant ARRAY FLOAT"
+#define PARAM_TYPED_CAMERA_FOV "irRenderCameraFOV"
+#define PARAM_TYPED_CAMERA_FOV_TYPE "constant FLOAT"
+#define PARAM_TYPED_CAMERA_XFORM "irRenderCameraXform"
+#define PARAM_TYPED_CAMERA_XFORM_TYPE "constant MATRIX"
+#define PARAM_TYPED_CAMERA_RATIO "irRenderCameraRatio"
+#define PARAM_TYPED_CAMERA_RATIO_TYPE "constant FLOAT"
+#define PARAM_RENDER_METHOD "xgen_renderMethod"
+#define PARAM_RENDER_METHOD_TYPE "constant STRING"
+#define PARAM_AI_MODE "ai_mode"
+#define PARAM_AI_MODE_TYPE "constant INT"
+#define PARAM_AI_MIN_PIXEL_WIDTH "ai_min_pixel_width"
+#define PARAM_AI_MIN_PIXEL_WIDTH_TYPE "constant FLOAT"
+#define PARAM_TIME_SAMPLES "time_samples"
+#define PARAM_TIME_SAMPLES_TYPE "constant ARRAY FLOAT"
+#define PARAM_SHADER "xgen_shader"
+#define PARAM_SHADER_TYPE "constant ARRAY NODE"
+
+// linear units -> centimeters, the text is written in the procedural data
+struct XgProxyUnitFactor
+{
+	const char* unit;
+	const char* text;
+	float value;
+};
+
+static const XgProxyUnitFactor UNIT_FACTORS[] =
+{
+	{ "in", "2.54", 2.54f },
+	{ "ft", "30.48", 30.48f },
+	{ "yd", "91.44", 91.44f },
+	{ "mi", "160934.4", 160934.4f },
+	{ "mm", "0.1", 0.1f },
+	{ "km", "100000.0", 100000.0f },
+	{ "m", "100.0", 100.0f },
+	{ "dm", "10.0", 10.0f },
+};
+
+#define UNIT_FACTOR_COUNT (sizeof(UNIT_FACTORS) / sizeof(UNIT_FACTORS[0]))
+#define DEFAULT_UNIT_FACTOR "1"
+
+#endif
@@ -0,0 +1,235 @@
+###############################################################################
+##
+## xgenProxyProcedural.py
+##
+## Description:
+##    The rules shared by CXgProxyDescriptionTranslator::Update() and
+##    xgenProxyBatchExport.py to build the xgen procedurals of a proxy: the
+##    flags of the procedural data string, the linear unit factors, how
+##    the patch attribute is split, how the procedurals of the patches are
+##    named and the user parameters they are given.
+##
+##    They are kept here only. xgenProxyProcedural.h is generated from
+##    these tables for the translator, run this module after changing
+##    them:
+##
+##       python xgenProxyProcedural.py
+##
+##    tests/test_xgenProxyProcedural.py fails while the header is stale.
+##
+################################################################################
+
+import os
+import sys
+
+# Flags of the procedural data string, in their order, as
+# (header macro, text). Formats are filled with printf.
+kDataFlags = [
+    ("DATA_LOG_FORMAT", "-debug %d -warning %d -stats %d -frame %f "),
+    ("DATA_FILE_FLAG", " -file "),
+    ("DATA_PALETTE_FLAG", " -palette "),
+    ("DATA_GEOM_FLAG", " -geom "),
+    ("DATA_PATCH_FLAG", " -patch "),
+    ("DATA_DESCRIPTION_FLAG", " -description "),
+    ("DATA_FPS_FORMAT", " -fps %f "),
+    ("DATA_SAMPLES_LOOKUP_FLAG", " -motionSamplesLookup "),
+    ("DATA_SAMPLES_PLACEMENT_FLAG", " -motionSamplesPlacement "),
+    ("DATA_SAMPLE_FORMAT", "%f "),
+    ("DATA_NO_SAMPLES", "0.0"),
+    ("DATA_WORLD_FLAG", " -world "),
+]
+kData = dict(kDataFlags)
+
+# Linear units -> centimeters, as written in the procedural data. Units
+# that are not listed are written with a factor of "1".
+kUnitFactors = [
+    ("in", "2.54"),
+    ("ft", "30.48"),
+    ("yd", "91.44"),
+    ("mi", "160934.4"),
+    ("mm", "0.1"),
+    ("km", "100000.0"),
+    ("m", "100.0"),
+    ("dm", "10.0"),
+]
+kDefaultUnitFactor = "1"
+
+# Separators of the names of the patch attribute, and the characters of
+# glob patterns, only matched against the Alembic file by the shape.
+kPatchSeparators = " \t\r\n,"
+kPatchGlobCharacters = "*?["
+
+# Procedurals of the patches after the first add their patch name to the
+# name of the proxy after a character Maya names cannot hold.
+kPatchNameSeparator = "@"
+
+# Environment variable deciding the load mode "Use Global".
+kDeferLoadEnv = "XGEN_PROXY_DEFER_LOAD"
+
+# Half size, in centimeters, of the box used when the bounds of a proxy are
+# unknown.
+kUnknownBoundsSize = "10000.0"
+
+# User parameters of the procedurals, as (header macro, name, declaration).
+kParameters = [
+    ("PARAM_CAMERA", "irRenderCam", "constant STRING"),
+    ("PARAM_CAMERA_FOV", "irRenderCamFOV", "constant STRING"),
+    ("PARAM_CAMERA_XFORM", "irRenderCamXform", "constant STRING"),
+    ("PARAM_CAMERA_RATIO", "irRenderCamRatio", "constant STRING"),
+    ("PARAM_TYPED_CAMERA_ORTHO", "irRenderCameraOrtho", "constant BOOL"),
+    ("PARAM_TYPED_CAMERA_POS", "irRenderCameraPos", "constant ARRAY FLOAT"),
+    ("PARAM_TYPED_CAMERA_FOV", "irRenderCameraFOV", "constant FLOAT"),
+    ("PARAM_TYPED_CAMERA_XFORM", "irRenderCameraXform", "constant MATRIX"),
+    ("PARAM_TYPED_CAMERA_RATIO", "irRenderCameraRatio", "constant FLOAT"),
+    ("PARAM_RENDER_METHOD", "xgen_renderMethod", "constant STRING"),
+    ("PARAM_AI_MODE", "ai_mode", "constant INT"),
+    ("PARAM_AI_MIN_PIXEL_WIDTH", "ai_min_pixel_width", "constant FLOAT"),
+    ("PARAM_TIME_SAMPLES", "time_samples", "constant ARRAY FLOAT"),
+    ("PARAM_SHADER", "xgen_shader", "constant ARRAY NODE"),
+]
+kParameterDeclarations = dict((name, declaration) for _, name, declaration in kParameters)
+
+kHeaderName = "xgenProxyProcedural.h"
+
+
+def unitFactor(linearUnit):
+    """
+     Returns the factor to centimeters of a linear unit, as written in the
+     procedural data.
+    """
+    return dict(kUnitFactors).get(linearUnit, kDefaultUnitFactor)
+
+
+def worldArgument(factor):
+    """
+     Returns the -world argument of the procedural data for the factor
+     text of unitFactor().
+    """
+    return kData["DATA_WORLD_FLAG"] + ";".join((factor, "0", "0", "0", "0", factor, "0", "0",
+                                                "0", "0", factor, "0", "0", "0", "0", "1"))
+
+
+def splitPatches(value):
+    """
+     Returns the tokens of a patch attribute value, in their order.
+    """
+    tokens = []
+    token = ""
+    for c in value:
+        if c in kPatchSeparators:
+            if token:
+                tokens.append(token)
+            token = ""
+        else:
+            token += c
+    if token:
+        tokens.append(token)
+    return tokens
+
+
+def isPattern(token):
+    return any(c in kPatchGlobCharacters for c in token)
+
+
+def dataPrefix(debug, warning, info, frame, xgenPath, palette, alembicPath):
+    """
+     Returns the procedural data before the patch name.
+    """
+    return (kData["DATA_LOG_FORMAT"] % (debug, warning, info, frame) +
+            kData["DATA_FILE_FLAG"] + xgenPath + kData["DATA_PALETTE_FLAG"] + palette +
+            kData["DATA_GEOM_FLAG"] + alembicPath + kData["DATA_PATCH_FLAG"])
+
+
+def dataSuffix(description, fps, samples, world):
+    """
+     Returns the procedural data after the patch name. world is the
+     argument of worldArgument().
+    """
+    suffix = kData["DATA_DESCRIPTION_FLAG"] + description + kData["DATA_FPS_FORMAT"] % fps
+    for flag in ("DATA_SAMPLES_LOOKUP_FLAG", "DATA_SAMPLES_PLACEMENT_FLAG"):
+        suffix += kData[flag] + "".join(kData["DATA_SAMPLE_FORMAT"] % sample for sample in samples)
+        if not samples:
+            suffix += kData["DATA_NO_SAMPLES"]
+    return suffix + world
+
+
+def patchNodeName(name, index, patch):
+    """
+     Returns the name of the procedural of the index-th patch of a proxy.
+    """
+    return name if index == 0 else name + kPatchNameSeparator + patch
+
+
+def _cString(value):
+    escapes = {"\\": "\\\\", "\"": "\\\"", "\t": "\\t", "\r": "\\r", "\n": "\\n"}
+    return "\"" + "".join(escapes.get(c, c) for c in value) + "\""
+
+
+def headerText():
+    """
+     Returns the text of xgenProxyProcedural.h, with the CRLF line endings
+     of the translator sources.
+    """
+    lines = [
+        "// Generated by xgenProxyProcedural.py from its tables, do not edit.",
+        "// Run python xgenProxyProcedural.py after changing them.",
+        "",
+        "#ifndef __XGENPROXYPROCEDURAL_H__",
+        "#define __XGENPROXYPROCEDURAL_H__",
+        "",
+        "// flags of the procedural data string",
+    ]
+    lines.extend("#define %s %s" % (macro, _cString(text)) for macro, text in kDataFlags)
+    lines.extend([
+        "",
+        "// separators of the names of the patch attribute, the characters of",
+        "// glob patterns and the separator of the names of the patch procedurals",
+        "#define PATCH_SEPARATORS %s" % _cString(kPatchSeparators),
+        "#define PATCH_GLOB_CHARACTERS %s" % _cString(kPatchGlobCharacters),
+        "#define PATCH_NAME_SEPARATOR %s" % _cString(kPatchNameSeparator),
+        "",
+        "#define DEFER_LOAD_ENV %s" % _cString(kDeferLoadEnv),
+        "#define UNKNOWN_BOUNDS_SIZE %sf" % kUnknownBoundsSize,
+        "",
+        "// user parameters of the procedurals and their declarations",
+    ])
+    for macro, name, declaration in kParameters:
+        lines.append("#define %s %s" % (macro, _cString(name)))
+        lines.append("#define %s_TYPE %s" % (macro, _cString(declaration)))
+    lines.extend([
+        "",
+        "// linear units -> centimeters, the text is written in the procedural data",
+        "struct XgProxyUnitFactor",
+        "{",
+        "\tconst char* unit;",
+        "\tconst char* text;",
+        "\tfloat value;",
+        "};",
+        "",
+        "static const XgProxyUnitFactor UNIT_FACTORS[] =",
+        "{",
+    ])
+    lines.extend("\t{ %s, %s, %sf }," % (_cString(unit), _cString(text), text) for unit, text in kUnitFactors)
+    lines.extend([
+        "};",
+        "",
+        "#define UNIT_FACTOR_COUNT (sizeof(UNIT_FACTORS) / sizeof(UNIT_FACTORS[0]))",
+        "#define DEFAULT_UNIT_FACTOR %s" % _cString(kDefaultUnitFactor),
+        "",
+        "#endif",
+        "",
+    ])
+    return "\r\n".join(lines)
+
+
+def headerPath():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), kHeaderName)
+
+
+def writeHeader(path=None):
+    with open(path or headerPath(), "wb") as f:
+        f.write(headerText().encode("ascii"))
+
+
+if __name__ == "__main__":
+    writeHeader(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,446 @@
+###############################################################################
+##
+## xgenProxyRecordCache.py
+##
+## Description:
+##    Content addressed on-disk cache of the export records of the batch
+##    exporter, see xgenProxyBatchExport.py. A record is everything the
+##    translator sets on the procedural of a proxy at a frame: data string,
+##    bounds, time samples, camera parameters, ...
+##
+##    Records are stored once under the hash of their content. The key of
+##    the inputs a record was resolved from (proxy attributes, frame, scene
+##    settings and the versions of the files read) points to that hash, so
+##    exporting the same proxy again, on another render node, after a retry
+##    or with other proxies changed, is a lookup. Proxies and frames
+##    resolving to the same record share it. The hashes are also what the
+##    exporter lists in its manifests, to tell which proxies changed
+##    between two exports.
+##
+##    Records are kept in an SQLite database in the "records" sub directory
+##    of the cache root (see xgenProxyDiskCache.py), so the thousands of
+##    records of a frame are read and written in one query instead of a
+##    file each. Worker processes share it, each opening its own
+##    connection.
+##
+##    SQLite relies on file locks, and its write ahead log on shared
+##    memory, that network file systems do not provide. When the cache
+##    root is on one (see xgenProxyDiskCache.isNetworkPath(), or set
+##    $XGEN_PROXY_RECORD_CACHE_SHARED to 1 or 0 to decide), the database
+##    is never opened there:
+##
+##       records/objects/ab/<content hash>.json   a record
+##       records/keys/cd/<input key>.json         {"digest": content hash}
+##
+##    Those files are only ever replaced atomically (see writeJson()), so
+##    render nodes share them safely. Each host keeps the database in its
+##    own directory (see localCacheDirectory()) as an index of the records
+##    it read or wrote, and only goes to the files for the keys it misses.
+##
+##    The records are limited to $XGEN_PROXY_RECORD_CACHE_MB megabytes,
+##    kDefaultLimitMB by default. trim() drops the least recently used
+##    ones once over the limit, down to kTrimRatio of it. On a shared root
+##    the use of a record is the modification time of its file, touched
+##    at most every kTouchInterval seconds by a host. Like the other
+##    caches, failures only make lookups miss.
+##
+################################################################################
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+import xgenProxyDiskCache
+
+kCacheName = "records"
+kDatabaseName = "records.db"
+kRecordVersion = 4
+
+kSharedEnv = "XGEN_PROXY_RECORD_CACHE_SHARED"
+kObjectsName = "objects"
+kKeysName = "keys"
+
+# Seconds between the updates of the modification time of a shared record
+# file by a host reading it.
+kTouchInterval = 3600.0
+
+kLimitEnv = "XGEN_PROXY_RECORD_CACHE_MB"
+kDefaultLimitMB = 1024
+
+# Fraction of the limit the cache is trimmed down to, so that trimming
+# does not run again on every export.
+kTrimRatio = 0.9
+
+# Bytes accounted for every key, on top of the records.
+kKeyBytes = 96
+
+# Keys per query, below the SQLite limit of bound parameters.
+kQueryChunk = 500
+
+kBusyTimeout = 60.0
+
+_state = {"connection": None, "path": None, "pid": None}
+_stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+
+def contentHash(record):
+    """
+     Returns the hash of the content of a record, the same for equal
+     records in every process.
+    """
+    text = json.dumps(record, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def isShared():
+    """
+     Returns whether the records are kept in files of the cache root, the
+     database being the index of this host.
+    """
+    value = os.environ.get(kSharedEnv)
+    if value:
+        try:
+            return int(value) != 0
+        except ValueError:
+            pass
+    return xgenProxyDiskCache.isNetworkPath(xgenProxyDiskCache.cacheRoot())
+
+
+def _sharedDirectory():
+    return xgenProxyDiskCache.cacheDirectory(kCacheName) if isShared() else None
+
+
+def _connection():
+    """
+     Returns the connection of this process to the database, None when it
+     cannot be opened. Processes forked with an open connection open
+     their own.
+    """
+    if isShared():
+        directory = xgenProxyDiskCache.localCacheDirectory(kCacheName)
+    else:
+        directory = xgenProxyDiskCache.cacheDirectory(kCacheName)
+    path = os.path.join(directory, kDatabaseName)
+    if _state["connection"] is not None and _state["path"] == path and _state["pid"] == os.getpid():
+        return _state["connection"]
+
+    try:
+        connection = sqlite3.connect(path, timeout=kBusyTimeout)
+        # pages freed by trim() are given back to the file system
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # readers do not wait for the writing process
+        connection.execute("PRAGMA journal_mode = WAL")
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS records "
+                               "(digest TEXT PRIMARY KEY, record TEXT, size INTEGER, used REAL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY, digest TEXT)")
+            connection.execute("CREATE INDEX IF NOT EXISTS recordsUsed ON records (used)")
+    except sqlite3.Error:
+        return None
+    _state.update(connection=connection, path=path, pid=os.getpid())
+    return connection
+
+
+def _chunks(values):
+    for i in range(0, len(values), kQueryChunk):
+        yield values[i:i + kQueryChunk]
+
+
+def _sharedPath(shared, kind, name):
+    return os.path.join(shared, kind, name[:2], name + ".json")
+
+
+def _writeShared(path, data):
+    try:
+        xgenProxyDiskCache.makeDirectory(os.path.dirname(path))
+    except OSError:
+        return
+    xgenProxyDiskCache.writeJson(path, data)
+
+
+def _touch(path):
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _readShared(shared, keys):
+    """
+     Returns the (input key, content hash, record) entries of the shared
+     files of the given keys, keys not cached being left out. Keys whose
+     record was evicted are removed.
+    """
+    entries = []
+    for key in keys:
+        keyPath = _sharedPath(shared, kKeysName, key)
+        pointer = xgenProxyDiskCache.readJson(keyPath)
+        if not isinstance(pointer, dict) or not pointer.get("digest"):
+            continue
+        recordPath = _sharedPath(shared, kObjectsName, pointer["digest"])
+        record = xgenProxyDiskCache.readJson(recordPath)
+        if record is None:
+            try:
+                os.remove(keyPath)
+            except OSError:
+                pass
+            continue
+        _touch(recordPath)
+        entries.append((key, pointer["digest"], record))
+    return entries
+
+
+def lookup(keys):
+    """
+     Returns a dictionary of the (content hash, record) cached for the
+     given input keys, keys not cached being left out.
+    """
+    result = {}
+    touched = []
+    now = time.time()
+    connection = _connection()
+    if connection is not None and keys:
+        try:
+            with connection:
+                for chunk in _chunks(list(keys)):
+                    marks = ",".join("?" * len(chunk))
+                    rows = connection.execute("SELECT keys.key, records.digest, records.record, records.used "
+                                              "FROM keys JOIN records ON keys.digest = records.digest "
+                                              "WHERE keys.key IN (%s)" % marks, chunk).fetchall()
+                    for key, digest, text, used in rows:
+                        result[key] = (digest, json.loads(text))
+                        if now - used > kTouchInterval:
+                            touched.append(digest)
+                digests = list(set(digest for digest, record in result.values()))
+                for chunk in _chunks(digests):
+                    marks = ",".join("?" * len(chunk))
+                    connection.execute("UPDATE records SET used = ? WHERE digest IN (%s)" % marks, [now] + chunk)
+        except (sqlite3.Error, ValueError):
+            result = {}
+            touched = []
+
+    shared = _sharedDirectory()
+    if shared is not None and keys:
+        # records used by this host are kept by the trim() of the others
+        for digest in set(touched):
+            _touch(_sharedPath(shared, kObjectsName, digest))
+        entries = _readShared(shared, [key for key in keys if key not in result])
+        for key, digest, record in entries:
+            result[key] = (digest, record)
+        _index(connection, entries, now)
+    _stats["hits"] += len(result)
+    _stats["misses"] += len(keys) - len(result)
+    return result
+
+
+def _index(connection, entries, now):
+    """
+     Adds (input key, content hash, record) entries to the database,
+     returns whether it succeeded.
+    """
+    if connection is None or not entries:
+        return False
+    records = {}
+    for key, digest, record in entries:
+        if digest not in records:
+            text = json.dumps(record, sort_keys=True, separators=(",", ":"))
+            records[digest] = (digest, text, len(text), now)
+    try:
+        with connection:
+            connection.executemany("INSERT OR IGNORE INTO records VALUES (?, ?, ?, ?)", records.values())
+            connection.executemany("INSERT OR REPLACE INTO keys VALUES (?, ?)",
+                                   [(key, digest) for key, digest, record in entries])
+    except sqlite3.Error:
+        return False
+    return True
+
+
+def store(entries):
+    """
+     Caches the records of (input key, content hash, record) entries.
+    """
+    if not entries:
+        return
+    stored = _index(_connection(), entries, time.time())
+    shared = _sharedDirectory()
+    if shared is not None:
+        written = set()
+        for key, digest, record in entries:
+            recordPath = _sharedPath(shared, kObjectsName, digest)
+            if digest not in written and not os.path.exists(recordPath):
+                _writeShared(recordPath, record)
+            written.add(digest)
+            # the record is written before the key pointing to it
+            _writeShared(_sharedPath(shared, kKeysName, key), {"digest": digest})
+        stored = True
+    if stored:
+        _stats["stored"] += len(entries)
+
+
+def limitBytes():
+    try:
+        megabytes = float(os.environ.get(kLimitEnv, kDefaultLimitMB))
+    except ValueError:
+        megabytes = kDefaultLimitMB
+    return int(max(megabytes, 0.0) * 1024 * 1024)
+
+
+def usage():
+    """
+     Returns the number of records and keys of the database and the bytes
+     they are accounted for, those of the index of this host on a shared
+     root.
+    """
+    connection = _connection()
+    if connection is None:
+        return 0, 0, 0
+    try:
+        records, size = connection.execute("SELECT COUNT(*), TOTAL(size) FROM records").fetchone()
+        keys = connection.execute("SELECT COUNT(*) FROM keys").fetchone()[0]
+    except sqlite3.Error:
+        return 0, 0, 0
+    return records, keys, int(size) + keys * kKeyBytes
+
+
+def _vacuum(connection):
+    """
+     Gives the pages freed by deletions back to the file system. The pragma
+     frees one page per step, executescript() runs it to the end.
+    """
+    connection.executescript("PRAGMA incremental_vacuum;")
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+
+def _sharedFiles(shared, kind):
+    """
+     Returns the (modification time, size, path) of the shared files of a
+     kind, temporary files of writes in progress left out.
+    """
+    files = []
+    for directory, names, fileNames in os.walk(os.path.join(shared, kind)):
+        for fileName in fileNames:
+            if not fileName.endswith(".json"):
+                continue
+            path = os.path.join(directory, fileName)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def _trimShared(shared, limit):
+    """
+     Drops the least recently used shared records, and the keys pointing
+     to them, when they use more than limit bytes. Returns the number of
+     records dropped.
+    """
+    records = _sharedFiles(shared, kObjectsName)
+    keys = _sharedFiles(shared, kKeysName)
+    total = sum(size for used, size, path in records) + len(keys) * kKeyBytes
+    if total <= limit:
+        return 0
+
+    target = limit * kTrimRatio
+    evicted = set()
+    for used, size, path in sorted(records):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        evicted.add(os.path.basename(path)[:-len(".json")])
+        total -= size + kKeyBytes * len(keys) / max(len(records), 1)
+
+    for used, size, path in keys:
+        pointer = xgenProxyDiskCache.readJson(path)
+        if not isinstance(pointer, dict) or pointer.get("digest") in evicted:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return len(evicted)
+
+
+def _trimIndex(limit):
+    """
+     Drops the least recently used records of the database, and the keys
+     pointing to them, when they use more than limit bytes. Returns the
+     number of records dropped.
+    """
+    records, keys, total = usage()
+    if total <= limit:
+        return 0
+
+    connection = _connection()
+    target = limit * kTrimRatio
+    evicted = []
+    try:
+        with connection:
+            for digest, size, used in connection.execute("SELECT digest, size, used FROM records ORDER BY used"):
+                if total <= target:
+                    break
+                evicted.append((digest,))
+                # keys pointing to the record go with it, count them once
+                total -= size + kKeyBytes * keys / max(records, 1)
+            connection.executemany("DELETE FROM records WHERE digest = ?", evicted)
+            connection.execute("DELETE FROM keys WHERE digest NOT IN (SELECT digest FROM records)")
+        _vacuum(connection)
+    except sqlite3.Error:
+        return 0
+    return len(evicted)
+
+
+def trim(limit=None):
+    """
+     Drops the least recently used records, and the keys pointing to them,
+     when the cache uses more than limit bytes, limitBytes() by default.
+     Returns the number of records dropped. On a shared root, the index of
+     this host is trimmed too, the records it drops stay in the files, and
+     the records dropped from both are counted.
+    """
+    if limit is None:
+        limit = limitBytes()
+    evicted = _trimIndex(limit)
+    shared = _sharedDirectory()
+    if shared is not None:
+        evicted += _trimShared(shared, limit)
+    _stats["evicted"] += evicted
+    return evicted
+
+
+def clear():
+    """
+     Drops every record, the shared ones included.
+    """
+    shared = _sharedDirectory()
+    if shared is not None:
+        for kind in (kObjectsName, kKeysName):
+            shutil.rmtree(os.path.join(shared, kind), ignore_errors=True)
+    connection = _connection()
+    if connection is None:
+        return
+    try:
+        with connection:
+            connection.execute("DELETE FROM records")
+            connection.execute("DELETE FROM keys")
+        _vacuum(connection)
+    except sqlite3.Error:
+        pass
+
+
+def stats(reset=False):
+    """
+     Returns the hits, misses, records stored and records evicted by this
+     process since the last reset.
+    """
+    result = dict(_stats)
+    if reset:
+        for name in _stats:
+            _stats[name] = 0
+    return result
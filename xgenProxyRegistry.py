@@ -0,0 +1,403 @@
+###############################################################################
+##
+## xgenProxyRegistry.py
+##
+## Description:
+##    Scene wide index of the xgenProxy nodes by palette, description,
+##    patch and culling camera, so tools can find the proxies of a
+##    description without listing and reading every proxy of the scene:
+##
+##       import xgenProxyRegistry
+##       xgenProxyRegistry.proxies(palette="crowd", description="hair")
+##
+##    The index is kept up to date by node added/removed callbacks and by
+##    an attribute changed callback on every proxy, which also cover undo
+##    and redo. Opening, importing or (un)loading references only flags it
+##    as stale, it is rebuilt by the next query. The xgenProxy plug-in
+##    installs the callbacks, see install().
+##
+##    Values are indexed as they are typed in the attributes: patches are
+##    split like xgenProxyBounds.resolvePatches() does but glob patterns
+##    are kept as they are. Proxies and cameras are tracked by node, so
+##    renaming them does not affect the index. A culling camera is indexed
+##    under both its transform and its shape, whichever of the two is
+##    connected, so either name finds its proxies.
+##
+##    Callbacks given to addListener() are called whenever proxies are
+##    added or removed, or the scene changed.
+##
+##    Nodes are identified by comparing their MObjectHandles, the hash
+##    code of a handle only picks the bucket to search as two nodes can
+##    share one.
+##
+################################################################################
+
+import maya.OpenMaya as OpenMaya
+
+import xgenProxyBounds
+
+kNodeType = "xgenProxy"
+
+kPalette = "palette"
+kDescription = "description"
+kPatch = "patch"
+kCullingCamera = "cullingCamera"
+kIndexedAttributes = (kPalette, kDescription, kPatch, kCullingCamera)
+
+# handle hash code -> list of (MObjectHandle, node key) of the proxies
+# and cameras known to the index
+_keys = {}
+
+# node key -> (MObjectHandle, {attribute: set of indexed values})
+_records = {}
+
+# attribute -> {value: set of node keys}
+_indexes = dict((attribute, {}) for attribute in kIndexedAttributes)
+
+# node key -> attribute changed callback id
+_nodeCallbacks = {}
+
+# scene and node added/removed callback ids
+_callbacks = []
+
+# functions called when the proxies of the scene change, see addListener()
+_listeners = []
+
+_state = {"suspended": 0, "stale": True, "nextKey": 0}
+
+
+def _key(obj, add=True):
+    """
+     Returns the key of the node obj, a new one when the node has none
+     yet and add is set, else None.
+    """
+    handle = OpenMaya.MObjectHandle(obj)
+    bucket = _keys.get(handle.hashCode())
+    if bucket:
+        for other, key in bucket:
+            if other.isValid() and other.object() == obj:
+                return key
+    if not add:
+        return None
+
+    # deleted nodes only leave invalid handles behind
+    bucket = [entry for entry in bucket or () if entry[0].isValid()]
+    _state["nextKey"] += 1
+    bucket.append((handle, _state["nextKey"]))
+    _keys[handle.hashCode()] = bucket
+    return _state["nextKey"]
+
+
+def _forget(obj):
+    hashCode = OpenMaya.MObjectHandle(obj).hashCode()
+    bucket = [entry for entry in _keys.get(hashCode, ()) if entry[0].isValid() and not entry[0].object() == obj]
+    if bucket:
+        _keys[hashCode] = bucket
+    else:
+        _keys.pop(hashCode, None)
+
+
+def _cameraNodes(obj):
+    """
+     Returns the camera node obj with its shapes when it is a transform,
+     or with its transforms when it is a shape.
+    """
+    result = [obj]
+    if not obj.hasFn(OpenMaya.MFn.kDagNode):
+        return result
+    dagNode = OpenMaya.MFnDagNode(obj)
+    if obj.hasFn(OpenMaya.MFn.kTransform):
+        for i in range(dagNode.childCount()):
+            child = dagNode.child(i)
+            if child.hasFn(OpenMaya.MFn.kCamera):
+                result.append(child)
+    else:
+        for i in range(dagNode.parentCount()):
+            result.append(dagNode.parent(i))
+    return result
+
+
+def _values(obj):
+    """
+     Returns the indexed values of a proxy, by attribute.
+    """
+    node = OpenMaya.MFnDependencyNode(obj)
+    values = {}
+    for attribute in (kPalette, kDescription):
+        value = node.findPlug(attribute).asString()
+        values[attribute] = set([value]) if value else set()
+
+    patch = node.findPlug(kPatch).asString()
+    values[kPatch] = set(p for p in xgenProxyBounds.kPatchSeparators.split(patch.strip()) if p)
+
+    sources = OpenMaya.MPlugArray()
+    node.findPlug(kCullingCamera).connectedTo(sources, True, False)
+    values[kCullingCamera] = set(_key(camera) for i in range(sources.length())
+                                 for camera in _cameraNodes(sources[i].node()))
+    return values
+
+
+def _unindex(key):
+    record = _records.pop(key, None)
+    if record is None:
+        return
+    for attribute, values in record[1].items():
+        index = _indexes[attribute]
+        for value in values:
+            nodes = index.get(value)
+            if nodes is not None:
+                nodes.discard(key)
+                if not nodes:
+                    del index[value]
+
+
+def _index(obj):
+    key = _key(obj)
+    _unindex(key)
+    values = _values(obj)
+    _records[key] = (OpenMaya.MObjectHandle(obj), values)
+    for attribute, attributeValues in values.items():
+        index = _indexes[attribute]
+        for value in attributeValues:
+            index.setdefault(value, set()).add(key)
+
+
+def _attributeChanged(msg, plug, otherPlug, clientData):
+    if not msg & (OpenMaya.MNodeMessage.kAttributeSet | OpenMaya.MNodeMessage.kConnectionMade |
+                  OpenMaya.MNodeMessage.kConnectionBroken):
+        return
+    if OpenMaya.MFnAttribute(plug.attribute()).name() not in kIndexedAttributes:
+        return
+    if _state["suspended"]:
+        _state["stale"] = True
+        return
+    _index(plug.node())
+
+
+def _watch(obj):
+    key = _key(obj)
+    if key not in _nodeCallbacks:
+        _nodeCallbacks[key] = OpenMaya.MNodeMessage.addAttributeChangedCallback(obj, _attributeChanged)
+
+
+def _unwatch(key):
+    callbackId = _nodeCallbacks.pop(key, None)
+    if callbackId is not None:
+        OpenMaya.MMessage.removeCallback(callbackId)
+
+
+def addListener(callback):
+    """
+     Calls callback(), with no argument, whenever proxies are added or
+     removed, or the scene changed.
+    """
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+
+def removeListener(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def _notify():
+    for callback in list(_listeners):
+        callback()
+
+
+def _nodeAdded(obj, clientData):
+    _notify()
+    if _state["suspended"] or OpenMaya.MFileIO.isReadingFile():
+        _state["stale"] = True
+        return
+    _watch(obj)
+    _index(obj)
+
+
+def _nodeRemoved(obj, clientData):
+    _notify()
+    key = _key(obj, add=False)
+    if key is not None:
+        _unwatch(key)
+        _unindex(key)
+    _forget(obj)
+
+
+def _sceneChanged(clientData):
+    _notify()
+    _state["stale"] = True
+
+
+def _scan():
+    """
+     Returns every xgenProxy node of the scene.
+    """
+    result = []
+    it = OpenMaya.MItDependencyNodes(OpenMaya.MFn.kPluginShape)
+    while not it.isDone():
+        obj = it.thisNode()
+        if OpenMaya.MFnDependencyNode(obj).typeName() == kNodeType:
+            result.append(obj)
+        it.next()
+    return result
+
+
+def rebuild():
+    """
+     Rebuilds the index from the nodes of the scene.
+    """
+    for key in list(_nodeCallbacks.keys()):
+        _unwatch(key)
+    _keys.clear()
+    _records.clear()
+    for index in _indexes.values():
+        index.clear()
+
+    for obj in _scan():
+        _watch(obj)
+        _index(obj)
+    _state["stale"] = False
+
+
+def _ensureIndexed():
+    if _state["stale"] and not _state["suspended"]:
+        rebuild()
+
+
+def suspend():
+    """
+     Stops updating the index until resume() is called, for operations
+     creating or editing many proxies at once. Calls nest.
+    """
+    _state["suspended"] += 1
+
+
+def resume():
+    _state["suspended"] = max(_state["suspended"] - 1, 0)
+
+
+def _names(keys):
+    result = []
+    for key in keys:
+        handle = _records[key][0]
+        if handle.isValid():
+            result.append(OpenMaya.MFnDagNode(handle.object()).partialPathName())
+    return sorted(result)
+
+
+def _cameraKey(camera):
+    """
+     Returns the key of the camera transform or shape called camera, None
+     when no proxy uses it.
+    """
+    selection = OpenMaya.MSelectionList()
+    obj = OpenMaya.MObject()
+    try:
+        selection.add(camera)
+        selection.getDependNode(0, obj)
+    except RuntimeError:
+        return None
+    return _key(obj, add=False)
+
+
+def proxies(palette=None, description=None, patch=None, camera=None):
+    """
+     Returns the names of the proxies matching all the given values. With
+     no value given every proxy is returned.
+    """
+    _ensureIndexed()
+
+    sets = []
+    for attribute, value in ((kPalette, palette), (kDescription, description), (kPatch, patch)):
+        if value is not None:
+            sets.append(_indexes[attribute].get(value, set()))
+    if camera is not None:
+        sets.append(_indexes[kCullingCamera].get(_cameraKey(camera), set()))
+
+    if not sets:
+        return _names(_records.keys())
+
+    sets.sort(key=len)
+    keys = set(sets[0])
+    for other in sets[1:]:
+        keys &= other
+    return _names(keys)
+
+
+def palettes():
+    _ensureIndexed()
+    return sorted(_indexes[kPalette].keys())
+
+
+def descriptions():
+    _ensureIndexed()
+    return sorted(_indexes[kDescription].keys())
+
+
+def patches():
+    _ensureIndexed()
+    return sorted(_indexes[kPatch].keys())
+
+
+def verify():
+    """
+     Compares the index with a scan of the scene and returns the
+     differences as a list of messages, empty when the index is
+     consistent.
+    """
+    _ensureIndexed()
+
+    errors = []
+    scanned = {}
+    for obj in _scan():
+        key = _key(obj, add=False)
+        name = OpenMaya.MFnDagNode(obj).partialPathName()
+        record = _records.get(key)
+        if key is not None:
+            scanned[key] = obj
+        if record is None:
+            errors.append("%s is not indexed" % name)
+        elif record[1] != _values(obj):
+            errors.append("%s is indexed with stale values" % name)
+    for key in _records:
+        if key not in scanned:
+            errors.append("deleted proxy %s is still indexed" % key)
+
+    for attribute, index in _indexes.items():
+        for value, keys in index.items():
+            for key in keys:
+                if key not in _records or value not in _records[key][1][attribute]:
+                    errors.append("%s index entry %s is stale" % (attribute, value))
+    return errors
+
+
+def install():
+    """
+     Adds the callbacks maintaining the index.
+    """
+    if _callbacks:
+        return
+    _callbacks.append(OpenMaya.MDGMessage.addNodeAddedCallback(_nodeAdded, kNodeType))
+    _callbacks.append(OpenMaya.MDGMessage.addNodeRemovedCallback(_nodeRemoved, kNodeType))
+    for message in (OpenMaya.MSceneMessage.kAfterOpen, OpenMaya.MSceneMessage.kAfterNew,
+                    OpenMaya.MSceneMessage.kAfterImport, OpenMaya.MSceneMessage.kAfterCreateReference,
+                    OpenMaya.MSceneMessage.kAfterRemoveReference, OpenMaya.MSceneMessage.kAfterLoadReference,
+                    OpenMaya.MSceneMessage.kAfterUnloadReference):
+        _callbacks.append(OpenMaya.MSceneMessage.addCallback(message, _sceneChanged))
+    _state["stale"] = True
+
+
+def uninstall():
+    """
+     Removes every callback and empties the index.
+    """
+    for callbackId in _callbacks:
+        OpenMaya.MMessage.removeCallback(callbackId)
+    del _callbacks[:]
+    for key in list(_nodeCallbacks.keys()):
+        _unwatch(key)
+    _keys.clear()
+    _records.clear()
+    for index in _indexes.values():
+        index.clear()
+    _state["stale"] = True
@@ -0,0 +1,168 @@
+###############################################################################
+##
+## xgenProxySceneSnapshot.py
+##
+## Description:
+##    Writes the scene description read by the headless batch exporter,
+##    see xgenProxyBatchExport.py, from the open Maya scene:
+##
+##       import xgenProxySceneSnapshot
+##       xgenProxySceneSnapshot.writeSnapshot("/jobs/shot010/xgenProxies.json", 1, 240)
+##
+##    Every xgenProxy instance is read once, at the current time: its
+##    attribute values, with the path templates before their frame tokens
+##    are replaced, its culling camera and the shader of its shading group.
+##    World matrices of the proxies and cameras are read once when they are
+##    not animated, otherwise at every frame of the range and at the motion
+##    samples of the Arnold render options.
+##
+##    The render attributes added by the translator (aiMode, motionBlurMode,
+##    ...) keep their defaults when MtoA is not loaded.
+##
+################################################################################
+
+import json
+
+import maya.OpenMaya as OpenMaya
+import maya.OpenMayaAnim as OpenMayaAnim
+import maya.cmds as cmds
+
+import xgenProxyBatchExport
+
+kNodeType = "xgenProxy"
+kRenderOptions = "defaultArnoldRenderOptions"
+
+# Fields of the scene description that are not plain attribute values.
+kSpecialFields = ("cullingCamera", "shader")
+
+
+def _plugValue(node, name, default):
+    try:
+        plug = node.findPlug(name)
+    except RuntimeError:
+        return default
+    if isinstance(default, bool):
+        return plug.asBool()
+    if isinstance(default, int):
+        return plug.asInt()
+    if isinstance(default, float):
+        return plug.asDouble()
+    return plug.asString()
+
+
+def _flatten(matrix):
+    return [matrix(i, j) for i in range(4) for j in range(4)]
+
+
+def _matrixEntry(path, times):
+    """
+     Returns the "matrix" of a DAG path, or its "matrices" at times when it
+     is animated.
+    """
+    if not OpenMayaAnim.MAnimUtil.isAnimated(path, True):
+        return {"matrix": _flatten(path.inclusiveMatrix())}
+    plug = "%s.worldMatrix[%d]" % (path.fullPathName(), path.instanceNumber())
+    return {"matrices": dict((xgenProxyBatchExport.frameKey(t), cmds.getAttr(plug, time=t)) for t in times)}
+
+
+def _motionBlur():
+    if not cmds.objExists(kRenderOptions):
+        return {"enable": False}
+    values = {}
+    for field, attribute in (("enable", "motion_blur_enable"), ("steps", "motion_steps"),
+                             ("rangeType", "range_type"), ("length", "motion_frames"),
+                             ("start", "motion_start"), ("end", "motion_end")):
+        if cmds.attributeQuery(attribute, node=kRenderOptions, exists=True):
+            values[field] = cmds.getAttr(kRenderOptions + "." + attribute)
+    return values
+
+
+def _cullingCamera(node):
+    connections = OpenMaya.MPlugArray()
+    node.findPlug("cullingCamera").connectedTo(connections, True, False)
+    if connections.length() == 0:
+        return None
+    camera = OpenMaya.MDagPath()
+    try:
+        OpenMaya.MDagPath.getAPathTo(connections[0].node(), camera)
+    except RuntimeError:
+        return None
+    if not camera.hasFn(OpenMaya.MFn.kCamera):
+        return None
+    return camera
+
+
+def _shader(path):
+    plug = "%s.instObjGroups[%d]" % (path.fullPathName(), path.instanceNumber())
+    for shadingGroup in cmds.listConnections(plug, type="shadingEngine") or []:
+        shaders = cmds.listConnections(shadingGroup + ".surfaceShader") or []
+        if shaders:
+            return shaders[0]
+    return ""
+
+
+def snapshot(startFrame, endFrame, step=1.0):
+    """
+     Returns the description of the proxies of the scene for the frame
+     range, see xgenProxyBatchExport.py.
+    """
+    motionBlur = _motionBlur()
+    offsets = xgenProxyBatchExport.motionOffsets(motionBlur) or [0.0]
+    times = sorted(set(frame + offset for frame in xgenProxyBatchExport.frameRange(startFrame, endFrame, step)
+                       for offset in offsets))
+
+    uiUnit = OpenMaya.MTime.uiUnit()
+    scene = {
+        "version": xgenProxyBatchExport.kSceneVersion,
+        "fps": OpenMaya.MTime(1.0, OpenMaya.MTime.kSeconds).asUnits(uiUnit),
+        "linearUnit": cmds.currentUnit(query=True, linear=True),
+        "frames": {"start": startFrame, "end": endFrame, "step": step},
+        "motionBlur": motionBlur,
+        "cameras": {},
+        "proxies": [],
+    }
+
+    it = OpenMaya.MItDag(OpenMaya.MItDag.kDepthFirst, OpenMaya.MFn.kPluginShape)
+    while not it.isDone():
+        path = OpenMaya.MDagPath()
+        it.getPath(path)
+        node = OpenMaya.MFnDependencyNode(path.node())
+        if node.typeName() == kNodeType:
+            proxy = {"name": path.fullPathName(), "shader": _shader(path)}
+            for name, default in xgenProxyBatchExport.kProxyDefaults.items():
+                if name not in kSpecialFields:
+                    proxy[name] = _plugValue(node, name, default)
+            proxy.update(_matrixEntry(path, times))
+
+            camera = _cullingCamera(node)
+            if camera is not None:
+                cameraName = camera.fullPathName()
+                proxy["cullingCamera"] = cameraName
+                if cameraName not in scene["cameras"]:
+                    fnCamera = OpenMaya.MFnCamera(camera)
+                    entry = {
+                        "ortho": fnCamera.isOrtho(),
+                        "horizontalFieldOfView": fnCamera.horizontalFieldOfView(),
+                        "verticalFieldOfView": fnCamera.verticalFieldOfView(),
+                        "aspectRatio": fnCamera.aspectRatio(),
+                    }
+                    entry.update(_matrixEntry(camera, times))
+                    scene["cameras"][cameraName] = entry
+            scene["proxies"].append(proxy)
+        it.next()
+    return scene
+
+
+def writeSnapshot(path, startFrame=None, endFrame=None, step=1.0):
+    """
+     Writes the description of the proxies of the scene to path, for the
+     playback range by default. Returns the number of proxies written.
+    """
+    if startFrame is None:
+        startFrame = cmds.playbackOptions(query=True, minTime=True)
+    if endFrame is None:
+        endFrame = cmds.playbackOptions(query=True, maxTime=True)
+    scene = snapshot(startFrame, endFrame, step)
+    with open(path, "w") as f:
+        json.dump(scene, f)
+    return len(scene["proxies"])
@@ -0,0 +1,144 @@
+###############################################################################
+##
+## xgenProxyShapes.py
+##
+## Description:
+##    Maya independent geometry for the xgenProxy placeholder shapes.
+##    Both the legacy draw code in xgenProxy.py and the Viewport 2.0
+##    override in xgenProxyDrawOverride.py build their vertices here so
+##    the two paths always draw the same rectangle, circle and triangle.
+##
+##    All shapes lie in the XY plane, centred on the origin, facing +Z.
+##
+################################################################################
+
+import array
+import math
+
+kRectangle, kCircle, kTriangle = range(3)
+
+# Tessellation levels of the circle, in segments. The finest level matches
+# the original one-degree circle.
+kCircleLevels = (8, 16, 32, 64, 128, 360)
+kCircleSegments = kCircleLevels[-1]
+
+# Longest circle segment, in pixels, before the next level is used.
+kCirclePixelsPerSegment = 4.0
+
+
+def _unitCircle(segments):
+    table = array.array('f')
+    for i in range(segments):
+        rad = (i * 2 * math.pi) / segments
+        table.extend((math.cos(rad), math.sin(rad)))
+    return table
+
+
+# Unit circle x, y pairs per tessellation level, shared by every proxy.
+kUnitCircles = dict((segments, _unitCircle(segments)) for segments in kCircleLevels)
+
+
+def circleLevel(pixelRadius):
+    """
+     Returns the number of segments needed to draw a circle of the given
+     projected radius, in pixels, without visible facets.
+    """
+    wanted = (2 * math.pi * pixelRadius) / kCirclePixelsPerSegment
+    for segments in kCircleLevels:
+        if segments >= wanted:
+            return segments
+    return kCircleSegments
+
+
+def unitCircle(segments=kCircleSegments):
+    """
+     Returns the shared unit circle table for the given level as a float
+     array of x, y pairs. The table must not be modified.
+    """
+    return kUnitCircles[segments]
+
+
+def clampDimensions(radius, width, height):
+    """
+     Returns the (radius, width, height) actually drawn for the attribute
+     values: the radius is at least 0, a width or height that is not
+     positive is drawn as 0.1.
+    """
+    radius = max(radius, 0.0)
+    if width <= 0:
+        width = 0.1
+    if height <= 0:
+        height = 0.1
+    return radius, width, height
+
+
+def geometryKey(shapeType, radius, width, height):
+    """
+     Returns a hashable key describing the drawn geometry.
+     Values that do not affect the current shape type are left out so
+     that, for example, changing the radius of a rectangle does not
+     force a re-upload.
+    """
+    if shapeType == kCircle:
+        return (kCircle, radius)
+    return (shapeType, width, height)
+
+
+def unitScale(shapeType, radius, width, height):
+    """
+     Returns the x and y scales turning the unit outline of the shape
+     type, outline(shapeType, 1.0, 1.0, 1.0), into the outline of the
+     given dimensions.
+    """
+    if shapeType == kCircle:
+        return radius, radius
+    return width, height
+
+
+def outline(shapeType, radius, width, height, segments=kCircleSegments):
+    """
+     Returns the outline of the shape as a contiguous float array of
+     x, y, z triplets, in counter-clockwise order. Circles use the
+     tessellation level given by segments.
+    """
+    if shapeType == kCircle:
+        table = unitCircle(segments)
+        points = array.array('f', [0.0]) * (len(table) // 2 * 3)
+        points[0::3] = array.array('f', [radius * x for x in table[0::2]])
+        points[1::3] = array.array('f', [radius * y for y in table[1::2]])
+        return points
+
+    w = width / 2.0
+    h = height / 2.0
+    if shapeType == kRectangle:
+        return array.array('f', (-w, -h, 0.0,
+                                 w, -h, 0.0,
+                                 w, h, 0.0,
+                                 -w, h, 0.0))
+
+    # triangle
+    return array.array('f', (-w, -h, 0.0,
+                             w, -h, 0.0,
+                             0.0, h, 0.0))
+
+
+def triangleIndices(vertexCount):
+    """
+     Returns the indices of a triangle fan covering a convex outline
+     of vertexCount points.
+    """
+    indices = array.array('I')
+    for i in range(1, vertexCount - 1):
+        indices.extend((0, i, i + 1))
+    return indices
+
+
+def lineIndices(vertexCount):
+    """
+     Returns the indices of a closed line loop around an outline of
+     vertexCount points, as separate line segments.
+    """
+    indices = array.array('I')
+    for i in range(vertexCount):
+        indices.extend((i, (i + 1) % vertexCount))
+    return indices
@@ -7,9 +7,19 @@
 #include <utils/time.h>
 
 #include <maya/MFileObject.h>
+#include <maya/MCallbackIdArray.h>
+#include <maya/MDGContext.h>
+#include <maya/MEventMessage.h>
+#include <maya/MFnCamera.h>
+#include <maya/MFnMatrixData.h>
+#include <maya/MSceneMessage.h>
 
 #include "xgenProxyTranslator.h"
+#include "xgenProxyProcedural.h"
 
+#include <algorithm>
+#include <cmath>
+#include <cstring>
 #include <string>
 
 
@@ -33,10 +43,13 @@ extern "C"
 		status = extension.RegisterTranslator("xgenProxy",
 			"",
 			CXgProxyDescriptionTranslator::creator, CXgProxyDescriptionTranslator::NodeInitializer);
+		CXgProxyDescriptionTranslator::AddUnitsCallbacks();
 	}
 
 	DLLEXPORT void deinitializeExtension(CExtension& extension)
 	{
+		CXgProxyDescriptionTranslator::ReportExportStats();
+		CXgProxyDescriptionTranslator::RemoveUnitsCallbacks();
 	}
 
 }
@@ -92,11 +105,18 @@ struct DescInfo
 	float fCameraPos[3];
 	float fCameraFOV;
 	float fCameraInvMat[16];
+	double dCameraInverse[4][4]; // world inverse matrix of the camera
 	float fCamRatio;
 	float fBoundingBox[6];
+	bool  hasBoundingBox;
 
 	std::string auxRenderPatch;
 	bool useAuxRenderPatch;
+	int loadMode; // use global, load at init, deferred
+
+	bool  frustumCull;
+	float cullingMargin;
+	bool  typedUserData;
 
 	void setBoundingBox(float xmin, float ymin, float zmin, float xmax, float ymax, float zmax)
 	{
@@ -140,18 +160,19 @@ struct DescInfo
 	}
 };
 
-void CXgProxyDescriptionTranslator::Update(AtNode* procedural)
+bool CXgProxyDescriptionTranslator::s_unitsValid = false;
+const void* CXgProxyDescriptionTranslator::s_unitsSession = NULL;
+float CXgProxyDescriptionTranslator::s_unitConvFactor = 1.f;
+std::string CXgProxyDescriptionTranslator::s_unitConvMat;
+MCallbackIdArray CXgProxyDescriptionTranslator::s_unitsCallbacks;
+
+// Resolve the scene linear unit to centimeters conversion once per export
+// session. It is shared by every proxy and only queried again after the
+// scene units change or another scene is loaded.
+void CXgProxyDescriptionTranslator::GetUnitConversion(float& factor, std::string& matrix)
 {
-	AiMsgInfo("[CXgProxyDescriptionTranslator] Update()");
-	// Build the path to the procedural dso
-#ifdef _WIN32
-	static string strDSO = string(getenv("MTOA_PATH")) + string("/procedurals/xgen_procedural.dll");
-#else 
-	static string strDSO = string(getenv("MTOA_PATH")) + string("/procedurals/xgen_procedural.so");
-#endif
-	
-	std::string strUnitConvMat;
-	float fUnitConvFactor = 1.f;
+	const void* session = CMayaScene::GetArnoldSession();
+	if (!s_unitsValid || session != s_unitsSession)
 	{
 		std::string strCurrentUnits;
 		{
@@ -160,31 +181,274 @@ void CXgProxyDescriptionTranslator::Update(AtNode* procedural)
 			strCurrentUnits = mstrCurrentUnits.asChar();
 		}
 
-		static std::map<std::string, std::pair<std::string, float> > s_mapUnitsConv;
-		if (s_mapUnitsConv.empty())
+		// the unit table is generated by xgenProxyProcedural.py
+		std::string strFactor = DEFAULT_UNIT_FACTOR;
+		s_unitConvFactor = 1.f;
+		for (size_t i = 0; i < UNIT_FACTOR_COUNT; i++)
 		{
-			s_mapUnitsConv["in"] = std::pair<std::string, float>("2.54", 2.54f);
-			s_mapUnitsConv["ft"] = std::pair<std::string, float>("30.48", 30.48f);
-			s_mapUnitsConv["yd"] = std::pair<std::string, float>("91.44", 91.44f);
-			s_mapUnitsConv["mi"] = std::pair<std::string, float>("160934.4", 160934.4f);
-			s_mapUnitsConv["mm"] = std::pair<std::string, float>("0.1", 0.1f);
-			s_mapUnitsConv["km"] = std::pair<std::string, float>("100000.0", 100000.f);
-			s_mapUnitsConv["m"] = std::pair<std::string, float>("100.0", 100.f);
-			s_mapUnitsConv["dm"] = std::pair<std::string, float>("10.0", 10.f);
+			if (strCurrentUnits == UNIT_FACTORS[i].unit)
+			{
+				strFactor = UNIT_FACTORS[i].text;
+				s_unitConvFactor = UNIT_FACTORS[i].value;
+				break;
+			}
 		}
+		s_unitConvMat = DATA_WORLD_FLAG + strFactor + ";0;0;0;0;" + strFactor + ";0;0;0;0;" + strFactor + ";0;0;0;0;1";
+
+		s_unitsValid = true;
+		s_unitsSession = session;
+	}
+
+	factor = s_unitConvFactor;
+	matrix = s_unitConvMat;
+}
+
+void CXgProxyDescriptionTranslator::InvalidateUnits(void*)
+{
+	s_unitsValid = false;
+}
+
+void CXgProxyDescriptionTranslator::AddUnitsCallbacks()
+{
+	MStatus status;
+	MCallbackId id = MEventMessage::addEventCallback("linearUnitChanged", InvalidateUnits, NULL, &status);
+	if (status == MS::kSuccess)
+		s_unitsCallbacks.append(id);
+
+	id = MSceneMessage::addCallback(MSceneMessage::kAfterOpen, InvalidateUnits, NULL, &status);
+	if (status == MS::kSuccess)
+		s_unitsCallbacks.append(id);
+
+	id = MSceneMessage::addCallback(MSceneMessage::kAfterNew, InvalidateUnits, NULL, &status);
+	if (status == MS::kSuccess)
+		s_unitsCallbacks.append(id);
+}
+
+void CXgProxyDescriptionTranslator::RemoveUnitsCallbacks()
+{
+	if (s_unitsCallbacks.length() > 0)
+		MMessage::removeCallbacks(s_unitsCallbacks);
+	s_unitsCallbacks.clear();
+	s_unitsValid = false;
+}
 
-		std::string factor = "1";
-		std::map<std::string, std::pair<std::string, float> >::const_iterator it = s_mapUnitsConv.find(strCurrentUnits);
-		if (it != s_mapUnitsConv.end())
+// 64-bit FNV-1a, used to detect what changed between two updates of a proxy.
+class CDescHash
+{
+public:
+	CDescHash() : m_value(14695981039346656037ULL) {}
+
+	void Add(const void* data, size_t size)
+	{
+		const unsigned char* bytes = static_cast<const unsigned char*>(data);
+		for (size_t i = 0; i < size; i++)
 		{
-			factor = it->second.first;
-			fUnitConvFactor = it->second.second;
+			m_value ^= bytes[i];
+			m_value *= 1099511628211ULL;
 		}
-		strUnitConvMat = " -world " + factor + ";0;0;0;0;" + factor + ";0;0;0;0;" + factor + ";0;0;0;0;1";
 	}
 
+	void Add(const std::string& value)
+	{
+		// include the terminator so consecutive strings cannot run together
+		Add(value.c_str(), value.size() + 1);
+	}
+
+	template <typename T>
+	void Add(const T& value)
+	{
+		Add(&value, sizeof(T));
+	}
+
+	unsigned long long Value() const { return m_value; }
+
+private:
+	unsigned long long m_value;
+};
+
+CXgProxyDescriptionTranslator::ExportStats CXgProxyDescriptionTranslator::s_exportStats = { NULL, 0.0, 0, 0, 0, 0, 0, 0, 0, 0 };
+unsigned int CXgProxyDescriptionTranslator::s_liveTranslators = 0;
+std::map<std::string, AtNode*> CXgProxyDescriptionTranslator::s_shaderCache;
+
+// Print the culling and shader export summary of the frame being exported,
+// then start counting from zero.
+void CXgProxyDescriptionTranslator::ReportExportStats()
+{
+	if (s_exportStats.tested > 0)
+	{
+		AiMsgInfo("[CXgProxyDescriptionTranslator] frame %g: culled %u of %u xgen procedurals outside the culling camera",
+			s_exportStats.frame, s_exportStats.culled, s_exportStats.tested);
+	}
+	if (s_exportStats.shaderHits + s_exportStats.shaderMisses > 0)
+	{
+		AiMsgInfo("[CXgProxyDescriptionTranslator] frame %g: shading group cache %u hits, %u misses",
+			s_exportStats.frame, s_exportStats.shaderHits, s_exportStats.shaderMisses);
+	}
+	if (s_exportStats.exported > 0)
+	{
+		AiMsgInfo("[CXgProxyDescriptionTranslator] frame %g: %u xgen procedurals, %u strings of %lu bytes set, data buffer grown %u times",
+			s_exportStats.frame, s_exportStats.exported, s_exportStats.strings,
+			(unsigned long)s_exportStats.stringBytes, s_exportStats.dataGrowths);
+	}
+	s_exportStats.tested = 0;
+	s_exportStats.culled = 0;
+	s_exportStats.shaderHits = 0;
+	s_exportStats.shaderMisses = 0;
+	s_exportStats.exported = 0;
+	s_exportStats.strings = 0;
+	s_exportStats.stringBytes = 0;
+	s_exportStats.dataGrowths = 0;
+}
+
+// MtoA deletes the translators of a session once its render is done, the
+// last proxy translator deleted ends the export session, see
+// EndExportSession(). Sessions rendering several frames report each frame
+// when the first proxy of the next one is exported.
+CXgProxyDescriptionTranslator::~CXgProxyDescriptionTranslator()
+{
+	if (s_liveTranslators > 0 && --s_liveTranslators == 0)
+		EndExportSession();
+}
+
+// Print the summary of the last frame of the session as soon as its render
+// is done. The cached shaders are deleted along with the session, another
+// session allocated at the same address must not find them.
+void CXgProxyDescriptionTranslator::EndExportSession()
+{
+	ReportExportStats();
+	s_exportStats.session = NULL;
+	s_shaderCache.clear();
+}
+
+void CXgProxyDescriptionTranslator::BeginExportFrame(double frame)
+{
+	const void* session = CMayaScene::GetArnoldSession();
+	if (session != s_exportStats.session || frame != s_exportStats.frame)
+	{
+		ReportExportStats();
+		s_exportStats.session = session;
+		s_exportStats.frame = frame;
+		s_shaderCache.clear();
+	}
+}
+
+// Returns true when the box lies entirely on the outer side of one of the
+// frustum planes of a camera, given the matrix from the space of the box to
+// the camera space (the object world matrix times the camera inverse world
+// matrix). Maya cameras look down -Z. tanX and tanY are the tangents of the
+// half field of views, already grown by the culling margin.
+static bool IsOutsideFrustum(const float* bounds, const MMatrix& toCamera, double tanX, double tanY)
+{
+	// Count the corners on the outer side of each plane:
+	// behind, left, right, bottom, top.
+	unsigned int outside[5] = { 0, 0, 0, 0, 0 };
+	for (unsigned int corner = 0; corner < 8; corner++)
+	{
+		MPoint p(bounds[(corner & 1) ? 3 : 0], bounds[(corner & 2) ? 4 : 1], bounds[(corner & 4) ? 5 : 2]);
+		p *= toCamera;
+
+		double depth = -p.z;
+		if (depth <= 0.0) outside[0]++;
+		if (p.x < -depth * tanX) outside[1]++;
+		if (p.x > depth * tanX) outside[2]++;
+		if (p.y < -depth * tanY) outside[3]++;
+		if (p.y > depth * tanY) outside[4]++;
+	}
+
+	for (unsigned int plane = 0; plane < 5; plane++)
+	{
+		if (outside[plane] == 8)
+			return true;
+	}
+	return false;
+}
+
+// Test the procedural bounds against the culling camera frustum at every
+// motion sample frame, the procedural is kept if it is visible at any of
+// them. bounds enclose the groom over all the frames, in the object space
+// of the proxy: they are moved by its world matrix at each frame.
+bool CXgProxyDescriptionTranslator::IsCulled(const MDagPath& object, const MDagPath& camera, const float* bounds,
+	float margin, const std::vector<double>& frames)
+{
+	MStatus status;
+	MFnCamera fnCamera(camera);
+	if (fnCamera.isOrtho())
+		return false;
+
+	double tanX = tan(fnCamera.horizontalFieldOfView(&status) * 0.5) * (1.0 + margin);
+	double tanY = tan(fnCamera.verticalFieldOfView(&status) * 0.5) * (1.0 + margin);
+
+	if (frames.empty())
+	{
+		return IsOutsideFrustum(bounds, object.inclusiveMatrix() * camera.inclusiveMatrixInverse(), tanX, tanY);
+	}
+
+	MPlug inverseMatrixPlug = MFnDagNode(camera).findPlug("worldInverseMatrix").elementByLogicalIndex(camera.instanceNumber());
+	MPlug worldMatrixPlug = MFnDagNode(object).findPlug("worldMatrix").elementByLogicalIndex(object.instanceNumber());
+	for (size_t i = 0; i < frames.size(); i++)
+	{
+		MDGContext context(MTime(frames[i], MTime::uiUnit()));
+		MFnMatrixData worldData(worldMatrixPlug.asMObject(context));
+		MMatrix world = worldData.matrix();
+		MFnMatrixData inverseData(inverseMatrixPlug.asMObject(context));
+		if (!IsOutsideFrustum(bounds, world * inverseData.matrix(), tanX, tanY))
+			return false;
+	}
+	return true;
+}
+
+// Split the patch attribute into plain patch names. Glob patterns can only
+// be matched against the Alembic file, by the shape, they are left out.
+static void SplitPatches(const std::string& value, std::vector<std::string>& patches)
+{
+	size_t start = value.find_first_not_of(PATCH_SEPARATORS);
+	while (start != std::string::npos)
+	{
+		size_t end = value.find_first_of(PATCH_SEPARATORS, start);
+		std::string token = value.substr(start, end == std::string::npos ? std::string::npos : end - start);
+		if (token.find_first_of(PATCH_GLOB_CHARACTERS) != std::string::npos)
+			AiMsgWarning("[CXgProxyDescriptionTranslator] patch pattern %s matches no patch", token.c_str());
+		else if (std::find(patches.begin(), patches.end(), token) == patches.end())
+			patches.push_back(token);
+		start = value.find_first_not_of(PATCH_SEPARATORS, end);
+	}
+}
+
+// Grow bounds, in render units, by the groom bounds the shape computes at
+// frame. Returns false when those are unknown.
+static bool AddGroomBounds(const MFnDagNode& xgenDesc, double frame, float unitConvFactor, float* bounds)
+{
+	MDGContext context(MTime(frame, MTime::uiUnit()));
+	if (!xgenDesc.findPlug("groomBoundsValid").asBool(context))
+		return false;
+
+	MPlug boundsMin = xgenDesc.findPlug("groomBoundsMin");
+	MPlug boundsMax = xgenDesc.findPlug("groomBoundsMax");
+	for (unsigned int i = 0; i < 3; i++)
+	{
+		bounds[i] = std::min(bounds[i], boundsMin.child(i).asFloat(context) * unitConvFactor);
+		bounds[i + 3] = std::max(bounds[i + 3], boundsMax.child(i).asFloat(context) * unitConvFactor);
+	}
+	return true;
+}
+
+void CXgProxyDescriptionTranslator::Update(AtNode* procedural)
+{
+	AiMsgInfo("[CXgProxyDescriptionTranslator] Update()");
+	// Build the path to the procedural dso
+#ifdef _WIN32
+	static string strDSO = string(getenv("MTOA_PATH")) + string("/procedurals/xgen_procedural.dll");
+#else 
+	static string strDSO = string(getenv("MTOA_PATH")) + string("/procedurals/xgen_procedural.so");
+#endif
+	
+	std::string strUnitConvMat;
+	float fUnitConvFactor = 1.f;
+	GetUnitConversion(fUnitConvFactor, strUnitConvMat);
+
 	// Extract description info from the current maya shape node.
 	DescInfo info;
+	MDagPath camera;
 	{
 		// The Description node being exported
 		MFnDagNode  xgenDesc;
@@ -195,21 +459,60 @@ void CXgProxyDescriptionTranslator::Update(AtNode* procedural)
 		MFnDependencyNode renderOptions;
 		renderOptions.setObject(m_renderOptions);
 
-		// Hardcoded values for now.
-		float s = 10000.f * fUnitConvFactor;
-		info.setBoundingBox(-s, -s, -s, s, s, s);
+		// Groom bounds computed by the shape from the patch geometry.
+		// Fall back to a huge box when they are unknown.
+		if (xgenDesc.findPlug("groomBoundsValid").asBool())
+		{
+			MPlug boundsMin = xgenDesc.findPlug("groomBoundsMin");
+			MPlug boundsMax = xgenDesc.findPlug("groomBoundsMax");
+			info.setBoundingBox(
+				boundsMin.child(0).asFloat() * fUnitConvFactor,
+				boundsMin.child(1).asFloat() * fUnitConvFactor,
+				boundsMin.child(2).asFloat() * fUnitConvFactor,
+				boundsMax.child(0).asFloat() * fUnitConvFactor,
+				boundsMax.child(1).asFloat() * fUnitConvFactor,
+				boundsMax.child(2).asFloat() * fUnitConvFactor);
+			info.hasBoundingBox = true;
+		}
+		else
+		{
+			float s = UNKNOWN_BOUNDS_SIZE * fUnitConvFactor;
+			info.setBoundingBox(-s, -s, -s, s, s, s);
+			info.hasBoundingBox = false;
+		}
 		info.bCameraOrtho = false;
 		info.fCamRatio = 1.0;
+		info.fCameraFOV = 0.f;
+		info.setCameraPos(0.f, 0.f, 0.f);
+		info.setCameraInvMat(0.f, 0.f, 0.f, 0.f, 0.f, 0.f, 0.f, 0.f, 0.f, 0.f, 0.f, 0.f, 0.f, 0.f, 0.f, 0.f);
+		memset(info.dCameraInverse, 0, sizeof(info.dCameraInverse));
 		info.fFrame = (float)MAnimControl::currentTime().value();
 
 		// Get Description and Palette from the dag paths.
 		// The current dag path points to the desciption.
 		// We get the parent to get the palette name.
-		info.xgenFilePath = xgenDesc.findPlug("xgenFilePath").asString().asChar();
-		info.strPalette = xgenDesc.findPlug("palette").asString().asChar();
-		info.alembicFilePath = xgenDesc.findPlug("alembicFilePath").asString().asChar();
+		// paths with their frame tokens replaced by the shape
+		info.xgenFilePath = xgenDesc.findPlug("resolvedXgenFilePath").asString().asChar();
+		// palette and description as resolved and checked against the
+		// collection file by the shape
+		info.strPalette = xgenDesc.findPlug("resolvedPalette").asString().asChar();
+		info.alembicFilePath = xgenDesc.findPlug("resolvedAlembicFilePath").asString().asChar();
 		info.strPatch = xgenDesc.findPlug("patch").asString().asChar();
-		info.strDescription = xgenDesc.findPlug("description").asString().asChar();
+		{
+			// patch may list several patches or glob patterns, the shape
+			// resolves them against the Alembic file
+			MStringArray patches;
+			xgenDesc.findPlug("resolvedPatches").asString().split(' ', patches);
+			for (unsigned int i = 0; i < patches.length(); i++)
+			{
+				if (patches[i].length() > 0)
+					info.vecPatches.push_back(patches[i].asChar());
+			}
+		}
+		info.strDescription = xgenDesc.findPlug("resolvedDescription").asString().asChar();
+		MString namesStatus = xgenDesc.findPlug("xgenNamesStatus").asString();
+		if (namesStatus.length() > 0)
+			AiMsgWarning("[CXgProxyDescriptionTranslator] %s: %s", xgenDesc.partialPathName().asChar(), namesStatus.asChar());
 		info.strDebug = xgenDesc.findPlug("xgenDebugLogLevel").asInt();
 		info.strWarning = xgenDesc.findPlug("xgenWarningLogLevel").asInt();
 		info.strInfo = xgenDesc.findPlug("xgenInfoLogLevel").asInt();
@@ -223,6 +526,10 @@ void CXgProxyDescriptionTranslator::Update(AtNode* procedural)
 		info.moblurFactor = 0.5;
 		info.auxRenderPatch = xgenDesc.findPlug("aiAuxRenderPatch").asString().asChar();
 		info.useAuxRenderPatch = xgenDesc.findPlug("aiUseAuxRenderPatch").asBool();
+		info.loadMode = xgenDesc.findPlug("aiLoadMode").asInt();
+		info.frustumCull = xgenDesc.findPlug("aiFrustumCull").asBool();
+		info.cullingMargin = xgenDesc.findPlug("aiCullingMargin").asFloat();
+		info.typedUserData = xgenDesc.findPlug("aiTypedUserData").asBool();
 
 		//  use render globals moblur settings
 		bool motionBlurEnabled = renderOptions.findPlug("motion_blur_enable").asBool();
@@ -245,7 +552,6 @@ void CXgProxyDescriptionTranslator::Update(AtNode* procedural)
 
 		// culling Camera setup
 		MPlug cullingCameraPlug = xgenDesc.findPlug("cullingCamera");
-		MDagPath camera;
 		MPlugArray connections;
 		cullingCameraPlug.connectedTo(connections, true, false);
 		if (connections.length() > 0)
@@ -279,6 +585,8 @@ void CXgProxyDescriptionTranslator::Update(AtNode* procedural)
 				(float)tm[0][1], (float)tm[1][1], (float)tm[2][1], (float)tm[1][3],
 				(float)tm[0][2], (float)tm[1][2], (float)tm[2][2], (float)tm[2][3],
 				(float)tmi[3][0], (float)tmi[3][1], (float)tmi[3][2], (float)tm[3][3]);
+			// the typed irRenderCameraXform is the real inverse matrix
+			tmi.get(info.dCameraInverse);
 
 			MFnCamera fnCamera(camera);
 			// info.fCameraFOV
@@ -290,21 +598,17 @@ void CXgProxyDescriptionTranslator::Update(AtNode* procedural)
 	}
 
 	char buf[512];
-	string mbSamplesString;
 
-	// motion blur
+	// motion blur time samples
+	std::vector<float> timeSamples;
 	if (info.moblur != 2 && info.motionBlurSteps > 1 && info.moblurFactor > 0.0f)
 	{
 		if (info.moblur == 0) // use render globals
 		{
-			AiNodeDeclare(procedural, "time_samples", "constant ARRAY FLOAT");
-			AtArray* samples = AiArrayAllocate(info.motionBlurSteps, 1, AI_TYPE_FLOAT);
-
 			unsigned int motionFramesCount;
 			const double *steps = CXgProxyDescriptionTranslator::GetMotionFramesExpanded(motionFramesCount);
 			if (steps != NULL && motionFramesCount > 0)
 			{
-
 				for (uint sampCount = 0; sampCount < info.motionBlurSteps; sampCount++)
 				{
 					float sample = float(steps[sampCount] - GetExportFrame());
@@ -313,47 +617,41 @@ void CXgProxyDescriptionTranslator::Update(AtNode* procedural)
 					if (sampCount == 0 && sample == 0.0f)
 						sample = 0.0001f;
 
-					sprintf(buf, "%f", sample);
-					mbSamplesString += std::string(buf) + " ";
-
-					AiArraySetFlt(samples, sampCount, sample);
+					timeSamples.push_back(sample);
 				}
-				AiNodeSetArray(procedural, "time_samples", samples);
 			}
 		}
 		else // xgen blur on
 		{
-			MFloatArray steps;
 			float stepSize = info.moblurFactor / (info.motionBlurSteps - 1);
 
-			AiNodeDeclare(procedural, "time_samples", "constant ARRAY FLOAT");
-			AtArray* samples = AiArrayAllocate(info.motionBlurSteps, 1, AI_TYPE_FLOAT);
-
 			for (uint stepCount = 0; stepCount < info.motionBlurSteps; stepCount++)
 			{
 				if (info.moblurmode == 0)
-					steps.append(float(0.0001 + (stepSize*stepCount))); // If 0.0 used as start step. XGen will not refresh next mb changes
+					timeSamples.push_back(float(0.0001 + (stepSize*stepCount))); // If 0.0 used as start step. XGen will not refresh next mb changes
 				else if (info.moblurmode == 1)
-					steps.append(float((0.0 - (info.moblurFactor / 2.0)) + (stepSize*stepCount)));
+					timeSamples.push_back(float((0.0 - (info.moblurFactor / 2.0)) + (stepSize*stepCount)));
 				else
-					steps.append(float((0.0 - info.moblurFactor) + (stepSize*stepCount)));
+					timeSamples.push_back(float((0.0 - info.moblurFactor) + (stepSize*stepCount)));
 			}
-
-			for (uint sampCount = 0; sampCount < info.motionBlurSteps; sampCount++)
-			{
-				float sample = steps[sampCount];
-
-				sprintf(buf, "%f", sample);
-				mbSamplesString += std::string(buf) + " ";
-
-				AiArraySetFlt(samples, sampCount, sample);
-			}
-			AiNodeSetArray(procedural, "time_samples", samples);
 		}
 	}
-	else
+
+	// The groom moves during the shutter, grow the bounds to enclose it at
+	// every motion sample so neither culling nor deferred loading miss it.
+	std::vector<double> sampleFrames;
+	for (size_t i = 0; i < timeSamples.size(); i++)
+		sampleFrames.push_back(GetExportFrame() + timeSamples[i]);
+	if (info.hasBoundingBox)
 	{
-		mbSamplesString += std::string("0.0");
+		MFnDagNode xgenDesc(m_dagPath.node());
+		for (size_t i = 0; i < sampleFrames.size() && info.hasBoundingBox; i++)
+			info.hasBoundingBox = AddGroomBounds(xgenDesc, sampleFrames[i], fUnitConvFactor, info.fBoundingBox);
+		if (!info.hasBoundingBox)
+		{
+			float s = UNKNOWN_BOUNDS_SIZE * fUnitConvFactor;
+			info.setBoundingBox(-s, -s, -s, s, s, s);
+		}
 	}
 
 	AtNode* rootShader = NULL;
@@ -363,78 +661,344 @@ void CXgProxyDescriptionTranslator::Update(AtNode* procedural)
 
 	//ExportMatrix(shape, info.motionBlurSteps);
 
-	AiNodeSetStr(shape, "name", NodeUniqueName(shape, buf));
-	ProcessRenderFlags(shape);
+	BeginExportFrame(GetExportFrame());
 
 	// Export shaders
 	rootShader = ExportShaders(shape);
-	AiNodeDeclare(shape, "xgen_shader", "constant ARRAY NODE");
-	AiNodeSetArray(shape, "xgen_shader", AiArray(1, 1, AI_TYPE_NODE, rootShader));
-	// Set the procedural arguments
-	{
-		std::string strData;
-		sprintf(buf, "%d", info.strDebug);
-		strData += "-debug " + std::string(buf);
-		sprintf(buf, "%d", info.strWarning);
-		strData += " -warning " + std::string(buf);
-		sprintf(buf, "%d", info.strInfo);
-		strData += " -stats " + std::string(buf);
-		sprintf(buf, "%f ", GetExportFrame());
-		strData += " -frame " + std::string(buf);
-		strData += " -file " + info.xgenFilePath;
-		strData += " -palette " + info.strPalette;
-		strData += " -geom " + info.alembicFilePath;
-		strData += " -patch " + info.strPatch;
-		strData += " -description " + info.strDescription;
+
+	// The xgen procedural renders a single patch, the last -patch flag of
+	// its data, so every patch gets its own procedural. The patches are
+	// those resolved by the shape, or the plain names of the attribute when
+	// it could not resolve them.
+	std::vector<std::string> patches = info.vecPatches;
+	bool unresolved = false;
+	if (patches.empty())
+	{
+		SplitPatches(info.strPatch, patches);
+		if (patches.empty())
+		{
+			// an empty attribute leaves the patch to the procedural, a
+			// list of unmatched patterns leaves nothing to render
+			unresolved = info.strPatch.find_first_not_of(PATCH_SEPARATORS) != std::string::npos;
+			patches.push_back("");
+		}
+	}
+
+	// Build the procedural arguments shared by all the patches into single
+	// buffers, reserved up front so the appends below do not reallocate.
+	// The summary counts the times the reservation fell short.
+	std::string strPrefix;
+	std::string strSuffix;
+	{
+		strPrefix.reserve(128 + info.xgenFilePath.size() + info.strPalette.size() + info.alembicFilePath.size());
+		strSuffix.reserve(128 + 16 * timeSamples.size() * 2 + strUnitConvMat.size() + info.strDescription.size());
+		size_t reserved = strPrefix.capacity() + strSuffix.capacity();
+
+		sprintf(buf, DATA_LOG_FORMAT, info.strDebug, info.strWarning, info.strInfo, GetExportFrame());
+		strPrefix += buf;
+		strPrefix += DATA_FILE_FLAG;
+		strPrefix += info.xgenFilePath;
+		strPrefix += DATA_PALETTE_FLAG;
+		strPrefix += info.strPalette;
+		strPrefix += DATA_GEOM_FLAG;
+		strPrefix += info.alembicFilePath;
+		strPrefix += DATA_PATCH_FLAG;
+
+		strSuffix += DATA_DESCRIPTION_FLAG;
+		strSuffix += info.strDescription;
 
 		MTime oneSec(1.0, MTime::kSeconds);
 		float fps = (float)oneSec.asUnits(MTime::uiUnit());
-		sprintf(buf, "%f ", fps);
-		strData += " -fps " + std::string(buf);
+		sprintf(buf, DATA_FPS_FORMAT, fps);
+		strSuffix += buf;
+
+		static const char* s_samplesFlags[] = { DATA_SAMPLES_LOOKUP_FLAG, DATA_SAMPLES_PLACEMENT_FLAG };
+		for (unsigned int flag = 0; flag < 2; flag++)
+		{
+			strSuffix += s_samplesFlags[flag];
+			for (size_t sampCount = 0; sampCount < timeSamples.size(); sampCount++)
+			{
+				sprintf(buf, DATA_SAMPLE_FORMAT, timeSamples[sampCount]);
+				strSuffix += buf;
+			}
+			if (timeSamples.empty())
+				strSuffix += DATA_NO_SAMPLES;
+		}
+
+		strSuffix += strUnitConvMat;
+		if (strPrefix.capacity() + strSuffix.capacity() != reserved)
+			s_exportStats.dataGrowths++;
+	}
+
+	std::vector<std::string> patchData(patches.size());
+	for (size_t i = 0; i < patches.size(); i++)
+	{
+		patchData[i].reserve(strPrefix.size() + patches[i].size() + strSuffix.size());
+		patchData[i] += strPrefix;
+		patchData[i] += patches[i];
+		patchData[i] += strSuffix;
+	}
+
+	// A deferred procedural is only expanded once a ray hits its bounds,
+	// which is only safe when those bounds are known.
+	bool deferLoad = false;
+	switch (info.loadMode)
+	{
+	case 1: deferLoad = false; break;
+	case 2: deferLoad = true; break;
+	default:
+		{
+			const char* deferEnv = getenv(DEFER_LOAD_ENV);
+			deferLoad = deferEnv != NULL && atoi(deferEnv) != 0;
+		}
+		break;
+	}
+
+	// Procedurals entirely outside the culling camera are kept as an
+	// invisible, never expanded placeholder so IPR can bring them back.
+	bool culled = false;
+	if (info.frustumCull && info.hasBoundingBox && camera.isValid() && camera.hasFn(MFn::kCamera))
+	{
+		// test the object space bounds in scene units, as the matrices are
+		float bounds[6];
+		for (unsigned int i = 0; i < 6; i++)
+			bounds[i] = info.fBoundingBox[i] / fUnitConvFactor;
+
+		culled = IsCulled(m_dagPath, camera, bounds, info.cullingMargin, sampleFrames);
+		s_exportStats.tested++;
+		if (culled)
+			s_exportStats.culled++;
+	}
+	// placeholders of patterns that matched nothing are never expanded either
+	bool hidden = culled || unresolved;
+
+	// Skip the update when nothing the procedural depends on has changed,
+	// so IPR does not regenerate the groom for unrelated edits.
+	// Only the camera parameters are refreshed when they alone changed.
+	CDescHash descHash;
+	descHash.Add(std::string(m_dagPath.fullPathName().asChar()));
+	descHash.Add(strDSO);
+	for (size_t i = 0; i < patchData.size(); i++)
+		descHash.Add(patchData[i]);
+	descHash.Add(info.renderMode);
+	descHash.Add(info.aiMode);
+	descHash.Add(info.aiMinPixelWidth);
+	descHash.Add(info.typedUserData);
+	descHash.Add(info.fBoundingBox, sizeof(info.fBoundingBox));
+	descHash.Add(deferLoad && info.hasBoundingBox);
+	descHash.Add(hidden);
+	descHash.Add(rootShader);
+	descHash.Add(timeSamples.size());
+	if (!timeSamples.empty())
+		descHash.Add(&timeSamples[0], timeSamples.size() * sizeof(float));
+	AddRenderFlagsHash(descHash);
+
+	CDescHash cameraHash;
+	cameraHash.Add(info.bCameraOrtho);
+	cameraHash.Add(info.fCameraPos, sizeof(info.fCameraPos));
+	cameraHash.Add(info.fCameraFOV);
+	cameraHash.Add(info.fCameraInvMat, sizeof(info.fCameraInvMat));
+	cameraHash.Add(info.dCameraInverse, sizeof(info.dCameraInverse));
+	cameraHash.Add(info.fCamRatio);
+
+	if (m_hasExportHash && descHash.Value() == m_descHash)
+	{
+		if (cameraHash.Value() != m_cameraHash)
+		{
+			AiMsgDebug("[CXgProxyDescriptionTranslator] %s: culling camera changed", GetMayaNodeName().asChar());
+			for (size_t i = 0; i < patchData.size(); i++)
+				ExportCameraParams(PatchNode((unsigned int)i), info);
+			m_cameraHash = cameraHash.Value();
+		}
+		else
+		{
+			AiMsgDebug("[CXgProxyDescriptionTranslator] %s: unchanged, skipping update", GetMayaNodeName().asChar());
+		}
+		return;
+	}
+	m_hasExportHash = true;
+	m_descHash = descHash.Value();
+	m_cameraHash = cameraHash.Value();
+
+	if (culled)
+		AiMsgDebug("[CXgProxyDescriptionTranslator] %s is outside the culling camera", GetMayaNodeName().asChar());
+
+	std::string strName = NodeUniqueName(shape, buf);
+	for (size_t i = 0; i < patchData.size(); i++)
+	{
+		// the first patch keeps the name of the translator's node, the
+		// others add their patch name after a character Maya names cannot hold
+		std::string strPatchName = (i == 0) ? strName : strName + PATCH_NAME_SEPARATOR + patches[i];
+		ExportProcedural(PatchNode((unsigned int)i), strPatchName, strDSO, patchData[i], info, timeSamples, rootShader,
+			!(deferLoad && info.hasBoundingBox) && !hidden, hidden);
+	}
+
+	// patches removed since the previous update keep their procedural, it
+	// is hidden and never expanded
+	for (unsigned int i = (unsigned int)patchData.size(); i < m_patchCount; i++)
+	{
+		AtNode* node = PatchNode(i);
+		AiNodeSetBool(node, "load_at_init", false);
+		AiNodeSetByte(node, "visibility", 0);
+	}
+	m_patchCount = std::max(m_patchCount, (unsigned int)patchData.size());
+}
+
+// Returns the procedural of the index-th patch of the proxy, the
+// translator's node for the first one, created on first use for the others.
+AtNode* CXgProxyDescriptionTranslator::PatchNode(unsigned int index)
+{
+	if (index == 0)
+		return GetArnoldRootNode();
+
+	char tag[32];
+	sprintf(tag, "patch%u", index);
+	AtNode* node = GetArnoldNode(tag);
+	return (node != NULL) ? node : AddArnoldNode("procedural", tag);
+}
+
+void CXgProxyDescriptionTranslator::ExportProcedural(AtNode* shape, const std::string& name, const std::string& dso,
+	const std::string& data, const DescInfo& info, const std::vector<float>& timeSamples, AtNode* rootShader,
+	bool loadAtInit, bool hidden)
+{
+	char buf[64];
 
-		strData += " -motionSamplesLookup " + mbSamplesString;
-		strData += " -motionSamplesPlacement " + mbSamplesString;
+	if (!timeSamples.empty())
+	{
+		if (!AiNodeLookUpUserParameter(shape, PARAM_TIME_SAMPLES))
+			AiNodeDeclare(shape, PARAM_TIME_SAMPLES, PARAM_TIME_SAMPLES_TYPE);
+		AtArray* samples = AiArrayConvert((uint)timeSamples.size(), 1, AI_TYPE_FLOAT, &timeSamples[0]);
+		AiNodeSetArray(shape, PARAM_TIME_SAMPLES, samples);
+	}
+
+	SetString(shape, "name", name.c_str());
+	s_exportStats.exported++;
+	ProcessRenderFlags(shape);
 
-		strData += strUnitConvMat;
+	if (rootShader != NULL)
+		AiNodeSetPtr(shape, "shader", rootShader);
+	AiNodeDeclare(shape, PARAM_SHADER, PARAM_SHADER_TYPE);
+	AiNodeSetArray(shape, PARAM_SHADER, AiArray(1, 1, AI_TYPE_NODE, rootShader));
 
-		// Set other arguments
-		AiNodeSetBool(shape, "load_at_init", true);
-		AiNodeSetStr(shape, "dso", strDSO.c_str());
-		AiNodeSetStr(shape, "data", strData.c_str());
+	// Set the procedural arguments
+	{
+		AiNodeSetBool(shape, "load_at_init", loadAtInit);
+		if (hidden)
+			AiNodeSetByte(shape, "visibility", 0);
+		SetString(shape, "dso", dso.c_str());
+		SetString(shape, "data", data.c_str());
 		AiNodeSetPnt(shape, "min", info.fBoundingBox[0], info.fBoundingBox[1], info.fBoundingBox[2]);
 		AiNodeSetPnt(shape, "max", info.fBoundingBox[3], info.fBoundingBox[4], info.fBoundingBox[5]);
 
-		AiNodeDeclare(shape, "irRenderCam", "constant STRING");
-		AiNodeDeclare(shape, "irRenderCamFOV", "constant STRING");
-		AiNodeDeclare(shape, "irRenderCamXform", "constant STRING");
-		AiNodeDeclare(shape, "irRenderCamRatio", "constant STRING");
+		ExportCameraParams(shape, info);
 
-		sprintf(buf, "%s,%f,%f,%f", info.bCameraOrtho ? "true" : "false", info.fCameraPos[0], info.fCameraPos[1], info.fCameraPos[2]);
-		AiNodeSetStr(shape, "irRenderCam", buf);
+		AiNodeDeclare(shape, PARAM_RENDER_METHOD, PARAM_RENDER_METHOD_TYPE);
+		sprintf(buf, "%i", info.renderMode);
+		SetString(shape, PARAM_RENDER_METHOD, buf);
 
-		sprintf(buf, "%f", info.fCameraFOV);
-		AiNodeSetStr(shape, "irRenderCamFOV", buf);
+		AiNodeDeclare(shape, PARAM_AI_MODE, PARAM_AI_MODE_TYPE);
+		AiNodeSetInt(shape, PARAM_AI_MODE, info.aiMode);
 
-		sprintf(buf, "%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f",
-			info.fCameraInvMat[0], info.fCameraInvMat[1], info.fCameraInvMat[2], info.fCameraInvMat[3],
-			info.fCameraInvMat[4], info.fCameraInvMat[5], info.fCameraInvMat[6], info.fCameraInvMat[7],
-			info.fCameraInvMat[8], info.fCameraInvMat[9], info.fCameraInvMat[10], info.fCameraInvMat[11],
-			info.fCameraInvMat[12], info.fCameraInvMat[13], info.fCameraInvMat[14], info.fCameraInvMat[15]);
-		AiNodeSetStr(shape, "irRenderCamXform", buf);
+		AiNodeDeclare(shape, PARAM_AI_MIN_PIXEL_WIDTH, PARAM_AI_MIN_PIXEL_WIDTH_TYPE);
+		AiNodeSetFlt(shape, PARAM_AI_MIN_PIXEL_WIDTH, info.aiMinPixelWidth);
+	}
+}
 
-		sprintf(buf, "%f", info.fCamRatio);
-		AiNodeSetStr(shape, "irRenderCamRatio", buf);
-		AiNodeDeclare(shape, "xgen_renderMethod", "constant STRING");
-		sprintf(buf, "%i", info.renderMode);
-		AiNodeSetStr(shape, "xgen_renderMethod", buf);
+// The culling camera is passed to the xgen procedural as the strings it
+// parses. aiTypedUserData adds the same values as typed user data, at full
+// precision, for procedurals reading those. The legacy irRenderCamXform
+// string mixes the camera matrix and its inverse the way xgen expects, the
+// typed irRenderCameraXform is the camera's world inverse matrix.
+void CXgProxyDescriptionTranslator::ExportCameraParams(AtNode* shape, const DescInfo& info)
+{
+	char buf[512];
+
+	if (!AiNodeLookUpUserParameter(shape, PARAM_CAMERA))
+	{
+		AiNodeDeclare(shape, PARAM_CAMERA, PARAM_CAMERA_TYPE);
+		AiNodeDeclare(shape, PARAM_CAMERA_FOV, PARAM_CAMERA_FOV_TYPE);
+		AiNodeDeclare(shape, PARAM_CAMERA_XFORM, PARAM_CAMERA_XFORM_TYPE);
+		AiNodeDeclare(shape, PARAM_CAMERA_RATIO, PARAM_CAMERA_RATIO_TYPE);
+	}
 
-		AiNodeDeclare(shape, "ai_mode", "constant INT");
-		AiNodeSetInt(shape, "ai_mode", info.aiMode);
+	sprintf(buf, "%s,%f,%f,%f", info.bCameraOrtho ? "true" : "false", info.fCameraPos[0], info.fCameraPos[1], info.fCameraPos[2]);
+	SetString(shape, PARAM_CAMERA, buf);
 
-		AiNodeDeclare(shape, "ai_min_pixel_width", "constant FLOAT");
-		AiNodeSetFlt(shape, "ai_min_pixel_width", info.aiMinPixelWidth);
+	sprintf(buf, "%f", info.fCameraFOV);
+	SetString(shape, PARAM_CAMERA_FOV, buf);
+
+	sprintf(buf, "%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f",
+		info.fCameraInvMat[0], info.fCameraInvMat[1], info.fCameraInvMat[2], info.fCameraInvMat[3],
+		info.fCameraInvMat[4], info.fCameraInvMat[5], info.fCameraInvMat[6], info.fCameraInvMat[7],
+		info.fCameraInvMat[8], info.fCameraInvMat[9], info.fCameraInvMat[10], info.fCameraInvMat[11],
+		info.fCameraInvMat[12], info.fCameraInvMat[13], info.fCameraInvMat[14], info.fCameraInvMat[15]);
+	SetString(shape, PARAM_CAMERA_XFORM, buf);
+
+	sprintf(buf, "%f", info.fCamRatio);
+	SetString(shape, PARAM_CAMERA_RATIO, buf);
+
+	if (info.typedUserData)
+	{
+		if (!AiNodeLookUpUserParameter(shape, PARAM_TYPED_CAMERA_XFORM))
+		{
+			AiNodeDeclare(shape, PARAM_TYPED_CAMERA_ORTHO, PARAM_TYPED_CAMERA_ORTHO_TYPE);
+			AiNodeDeclare(shape, PARAM_TYPED_CAMERA_POS, PARAM_TYPED_CAMERA_POS_TYPE);
+			AiNodeDeclare(shape, PARAM_TYPED_CAMERA_FOV, PARAM_TYPED_CAMERA_FOV_TYPE);
+			AiNodeDeclare(shape, PARAM_TYPED_CAMERA_XFORM, PARAM_TYPED_CAMERA_XFORM_TYPE);
+			AiNodeDeclare(shape, PARAM_TYPED_CAMERA_RATIO, PARAM_TYPED_CAMERA_RATIO_TYPE);
+		}
+
+		AiNodeSetBool(shape, PARAM_TYPED_CAMERA_ORTHO, info.bCameraOrtho);
+		AiNodeSetArray(shape, PARAM_TYPED_CAMERA_POS, AiArrayConvert(3, 1, AI_TYPE_FLOAT, info.fCameraPos));
+		AiNodeSetFlt(shape, PARAM_TYPED_CAMERA_FOV, info.fCameraFOV);
+
+		AtMatrix matrix;
+		for (unsigned int row = 0; row < 4; row++)
+			for (unsigned int col = 0; col < 4; col++)
+				matrix[row][col] = (float)info.dCameraInverse[row][col];
+		AiNodeSetMatrix(shape, PARAM_TYPED_CAMERA_XFORM, matrix);
+
+		AiNodeSetFlt(shape, PARAM_TYPED_CAMERA_RATIO, info.fCamRatio);
 	}
+}
 
+// Every string parameter of the procedural is set through here, so the
+// export summary can report how many strings, and bytes, each frame copies
+// into Arnold.
+void CXgProxyDescriptionTranslator::SetString(AtNode* node, const char* param, const char* value)
+{
+	AiNodeSetStr(node, param, value);
+	s_exportStats.strings++;
+	s_exportStats.stringBytes += strlen(value) + 1;
+}
+
+// ProcessRenderFlags reads these attributes, include them in the update
+// hash so visibility edits are not skipped.
+void CXgProxyDescriptionTranslator::AddRenderFlagsHash(CDescHash& hash)
+{
+	static const char* s_renderFlagAttrs[] = {
+		"castsShadows", "receiveShadows", "primaryVisibility",
+		"visibleInReflections", "visibleInRefractions", "doubleSided", "opposite",
+		"aiSelfShadows", "aiOpaque", "aiMatte",
+		"aiVisibleInDiffuseReflection", "aiVisibleInSpecularReflection",
+		"aiVisibleInDiffuseTransmission", "aiVisibleInSpecularTransmission",
+		"aiVisibleInVolume", "aiTraceSets", "aiSssSetname"
+	};
+
+	MFnDependencyNode fnNode(m_dagPath.node());
+	for (unsigned int i = 0; i < sizeof(s_renderFlagAttrs) / sizeof(s_renderFlagAttrs[0]); i++)
+	{
+		MStatus status;
+		MPlug plug = fnNode.findPlug(s_renderFlagAttrs[i], &status);
+		if (status != MS::kSuccess)
+			continue;
+
+		hash.Add(std::string(s_renderFlagAttrs[i]));
+		if (plug.attribute().hasFn(MFn::kTypedAttribute))
+			hash.Add(std::string(plug.asString().asChar()));
+		else
+			hash.Add(plug.asDouble());
+	}
 }
 
 void CXgProxyDescriptionTranslator::ExportMotion(AtNode* shape, unsigned int step)
@@ -444,6 +1008,8 @@ void CXgProxyDescriptionTranslator::ExportMotion(AtNode* shape, unsigned int ste
 
 	// Set transform matrix
 	ExportMatrix(shape, step);
+	for (unsigned int i = 1; i < m_patchCount; i++)
+		ExportMatrix(PatchNode(i), step);
 }
 
 void CXgProxyDescriptionTranslator::NodeInitializer(CAbTranslator context)
@@ -513,22 +1079,63 @@ void CXgProxyDescriptionTranslator::NodeInitializer(CAbTranslator context)
 	data.name = "aiAuxRenderPatch";
 	data.shortName = "ai_batch_render_patch";
 	helper.MakeInputString(data);
+
+	// "Use Global" follows the XGEN_PROXY_DEFER_LOAD environment variable.
+	MStringArray  loadModeEnum;
+	loadModeEnum.append("Use Global");
+	loadModeEnum.append("Load At Init");
+	loadModeEnum.append("Deferred");
+	data.defaultValue.INT = 0;
+	data.name = "aiLoadMode";
+	data.shortName = "ai_load_mode";
+	data.enums = loadModeEnum;
+	helper.MakeInputEnum(data);
+
+	data.defaultValue.BOOL = false;
+	data.name = "aiFrustumCull";
+	data.shortName = "ai_frustum_cull";
+	helper.MakeInputBoolean(data);
+
+	// fraction by which the culling camera field of view is widened
+	data.defaultValue.FLT = 0.1f;
+	data.name = "aiCullingMargin";
+	data.shortName = "ai_culling_margin";
+	helper.MakeInputFloat(data);
+
+	// Also export the culling camera as typed user data, next to the
+	// strings the xgen procedural reads.
+	data.defaultValue.BOOL = false;
+	data.name = "aiTypedUserData";
+	data.shortName = "ai_typed_user_data";
+	helper.MakeInputBoolean(data);
 }
 
+// Proxies sharing a shading group share its exported root shader. Outside of
+// IPR the shading group is only looked up through ExportNode once per frame,
+// IPR always goes through ExportNode so shader edits keep being tracked for
+// every proxy.
 AtNode* CXgProxyDescriptionTranslator::ExportShaders(AtNode* instance)
 {
 	MPlug shadingGroupPlug = GetNodeShadingGroup(m_dagPath.node(), 0);
-	if (!shadingGroupPlug.isNull())
+	if (shadingGroupPlug.isNull())
+		return NULL;
+
+	CArnoldSession* session = CMayaScene::GetArnoldSession();
+	if (session == NULL || session->GetSessionMode() == MTOA_SESSION_IPR)
+		return ExportNode(shadingGroupPlug);
+
+	std::string key = MFnDependencyNode(shadingGroupPlug.node()).name().asChar();
+	std::map<std::string, AtNode*>::const_iterator it = s_shaderCache.find(key);
+	if (it != s_shaderCache.end())
 	{
-		AtNode *rootShader = ExportNode(shadingGroupPlug);
-		if (rootShader != NULL)
-		{
-			AiNodeSetPtr(instance, "shader", rootShader);
-			return rootShader;
-		}
+		s_exportStats.shaderHits++;
+		return it->second;
 	}
 
-	return NULL;
+	AtNode *rootShader = ExportNode(shadingGroupPlug);
+	s_shaderCache[key] = rootShader;
+	s_exportStats.shaderMisses++;
+	return rootShader;
 }
 
 
@@ -10,10 +10,26 @@
 
 #include <translators/shape/ShapeTranslator.h>
 
+#include <maya/MCallbackIdArray.h>
+
+#include <map>
+#include <string>
+#include <vector>
+
+struct DescInfo;
+class CDescHash;
+
 class CXgProxyDescriptionTranslator : public CShapeTranslator
 {
 public:
 
+	CXgProxyDescriptionTranslator()
+		: m_hasExportHash(false), m_descHash(0), m_cameraHash(0), m_patchCount(1)
+	{
+		s_liveTranslators++;
+	}
+	virtual ~CXgProxyDescriptionTranslator();
+
 	AtNode* CreateArnoldNodes();
 	virtual void Export(AtNode* shape);
 	virtual void Update(AtNode* shape);
@@ -25,9 +41,64 @@ public:
 		return new CXgProxyDescriptionTranslator();
 	}
 	static void NodeInitializer(CAbTranslator context);
+	static void ReportExportStats();
+	static void AddUnitsCallbacks();
+	static void RemoveUnitsCallbacks();
 private:
 
-	AtNode* ExportShaders(AtNode* instance); protected:
+	AtNode* ExportShaders(AtNode* instance);
+	AtNode* PatchNode(unsigned int index);
+	void ExportProcedural(AtNode* shape, const std::string& name, const std::string& dso,
+		const std::string& data, const DescInfo& info, const std::vector<float>& timeSamples,
+		AtNode* rootShader, bool loadAtInit, bool hidden);
+	void ExportCameraParams(AtNode* shape, const DescInfo& info);
+	static void SetString(AtNode* node, const char* param, const char* value);
+	void AddRenderFlagsHash(CDescHash& hash);
+	bool IsCulled(const MDagPath& object, const MDagPath& camera, const float* bounds, float margin,
+		const std::vector<double>& frames);
+	static void BeginExportFrame(double frame);
+	static void EndExportSession();
+
+	// per frame export summary, see ReportExportStats()
+	struct ExportStats
+	{
+		const void* session;
+		double frame;
+		unsigned int tested;
+		unsigned int culled;
+		unsigned int shaderHits;
+		unsigned int shaderMisses;
+		unsigned int exported;
+		unsigned int strings;
+		size_t stringBytes;
+		unsigned int dataGrowths;
+	};
+	static ExportStats s_exportStats;
+
+	// translators alive, the export session ends when the last one is deleted
+	static unsigned int s_liveTranslators;
+
+	// root shader exported for each shading group during the current frame,
+	// cleared when another frame starts or the session ends
+	static std::map<std::string, AtNode*> s_shaderCache;
+
+	// scene linear unit conversion shared by all proxies, see GetUnitConversion()
+	static void GetUnitConversion(float& factor, std::string& matrix);
+	static void InvalidateUnits(void*);
+	static bool s_unitsValid;
+	static const void* s_unitsSession;
+	static float s_unitConvFactor;
+	static std::string s_unitConvMat;
+	static MCallbackIdArray s_unitsCallbacks;
+
+	// hashes of the last exported arguments, see Update()
+	bool m_hasExportHash;
+	unsigned long long m_descHash;
+	unsigned long long m_cameraHash;
+
+	// procedurals created for the patches, one per patch, see PatchNode()
+	unsigned int m_patchCount;
+protected:
 };
 
 #endif
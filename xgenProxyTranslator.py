@@ -16,6 +16,10 @@ class xgenProxyDescriptionTemplate(templates.ShapeTranslatorTemplate):
         self.addControl("aiMode", label= "Curve Mode")
         self.addControl("aiUseAuxRenderPatch", label = "Use Aux Render Patch")
         self.addControl("aiAuxRenderPatch", label= "Auxilary Render Patch")
+        self.addControl("aiLoadMode", label= "Load Mode")
+        self.addControl("aiFrustumCull", label= "Cull Outside Culling Camera")
+        self.addControl("aiCullingMargin", label= "Culling Margin")
+        self.addControl("aiTypedUserData", label= "Typed User Data")
         
 
 templates.registerTranslatorUI(xgenProxyDescriptionTemplate, "xgenProxy", "xgenProxyTranslator")